@@ -0,0 +1,133 @@
+"""
+Load test: posting N messages one by one versus in one batch request.
+
+Runs through the local emulator (KV_LATENCY seconds per KV operation)
+with the posts rate limit raised out of the way, and compares:
+
+- sequential: N single POST /api/v2/agent/messages, one after another
+  (an agent's loop);
+- concurrent: N single posts issued at once;
+- batch: one POST /api/v2/agent/messages/batch with N messages.
+
+Reports wall time, messages per second, requests, and KV operations per
+message including background analytics writes (token validation is
+cached per isolate in all cases).
+
+The emulator does not model the Workers limit of six simultaneous
+connections per invocation, which the batch handler observes
+(MAX_CONCURRENT_KV); concurrent single posts are therefore an upper
+bound that a single client rarely reaches, at N times the requests.
+
+Usage: python benchmarks/bench_batch.py
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+from emulator import Emulator  # noqa: E402
+
+KV_LATENCY = 0.002
+SIZES = (10, 50, 100)
+ADMIN = {"X-Admin-Key": "mock-admin-key"}
+RATE_LIMITS = json.dumps(
+    {"posts_per_minute": 1_000_000, "reads_per_minute": 60}
+)
+
+
+async def authenticate(emulator):
+    response = await emulator.request(
+        "POST",
+        "/api/v2/agent/auth",
+        json={"public_key": "pk", "purpose": "bench", "agent_id": "bench"},
+    )
+    created = json.loads(response.body)
+    await emulator.request(
+        "POST",
+        f"/api/v2/admin/auth-requests/{created['auth_request_id']}/approve",
+        headers=ADMIN,
+    )
+    response = await emulator.request("GET", created["poll_endpoint"])
+    token = json.loads(response.body)["access_token"]
+    await emulator.drain()
+    return {"Authorization": f"Bearer {token}"}
+
+
+def messages(count):
+    return [
+        {"content": f"step output {i}", "topic": "fan-out", "ttl": 600}
+        for i in range(count)
+    ]
+
+
+async def post_sequential(emulator, auth, items):
+    for item in items:
+        await emulator.request(
+            "POST", "/api/v2/agent/messages", json=item, headers=auth
+        )
+    return len(items)
+
+
+async def post_concurrent(emulator, auth, items):
+    await asyncio.gather(
+        *(
+            emulator.request(
+                "POST", "/api/v2/agent/messages", json=item, headers=auth
+            )
+            for item in items
+        )
+    )
+    return len(items)
+
+
+async def post_batch(emulator, auth, items):
+    response = await emulator.request(
+        "POST",
+        "/api/v2/agent/messages/batch",
+        json={"messages": items},
+        headers=auth,
+    )
+    assert json.loads(response.body)["delivered"] == len(items)
+    return 1
+
+
+async def measure(mode, count):
+    emulator = Emulator(latency=KV_LATENCY, RATE_LIMITS=RATE_LIMITS)
+    auth = await authenticate(emulator)
+    emulator.reset_ops()
+
+    started = time.perf_counter()
+    requests = await mode(emulator, auth, messages(count))
+    elapsed = time.perf_counter() - started
+    await emulator.drain()
+    return elapsed, sum(emulator.kv_ops.values()), requests
+
+
+def main():
+    print(f"KV latency {KV_LATENCY * 1000:g} ms")
+    print(
+        f"{'messages':>8} {'mode':<11} {'ms':>8} {'msg/s':>9} "
+        f"{'kv ops/msg':>10} {'requests':>8}"
+    )
+    for count in SIZES:
+        for name, mode in (
+            ("sequential", post_sequential),
+            ("concurrent", post_concurrent),
+            ("batch", post_batch),
+        ):
+            elapsed, kv_ops, requests = asyncio.run(measure(mode, count))
+            print(
+                f"{count:>8} {name:<11} {elapsed * 1000:>8.1f} "
+                f"{count / elapsed:>9,.0f} {kv_ops / count:>10.2f} "
+                f"{requests:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
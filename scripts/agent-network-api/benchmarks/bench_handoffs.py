@@ -0,0 +1,94 @@
+"""
+Load test: handoff POST latency against the number of target agents.
+
+Runs through the local emulator (KV_LATENCY seconds per KV operation)
+and, for each target count, measures:
+
+- post: the POST /api/v2/agent/handoff response time, which is all the
+  initiator waits for;
+- fan-out: the time to finish the deferred delivery work (inbox
+  messages and delivery records, run from ctx.waitUntil);
+- KV operations made before the response and after it.
+
+The post column should stay flat as the number of targets grows; only
+the fan-out grows, in steps of MAX_CONCURRENT_KV.
+
+Usage: python benchmarks/bench_handoffs.py
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+from emulator import Emulator  # noqa: E402
+
+KV_LATENCY = 0.002
+SIZES = (1, 10, 50)
+ADMIN = {"X-Admin-Key": "mock-admin-key"}
+
+
+async def authenticate(emulator):
+    response = await emulator.request(
+        "POST",
+        "/api/v2/agent/auth",
+        json={"public_key": "pk", "purpose": "bench", "agent_id": "bench"},
+    )
+    created = json.loads(response.body)
+    await emulator.request(
+        "POST",
+        f"/api/v2/admin/auth-requests/{created['auth_request_id']}/approve",
+        headers=ADMIN,
+    )
+    response = await emulator.request("GET", created["poll_endpoint"])
+    token = json.loads(response.body)["access_token"]
+    await emulator.drain()
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def measure(count):
+    emulator = Emulator(latency=KV_LATENCY)
+    auth = await authenticate(emulator)
+    emulator.reset_ops()
+
+    started = time.perf_counter()
+    response = await emulator.request(
+        "POST",
+        "/api/v2/agent/handoff",
+        json={
+            "target_agents": [f"agent-{i}" for i in range(count)],
+            "task_description": "review the release notes",
+        },
+        headers=auth,
+    )
+    posted = time.perf_counter()
+    assert response.status == 202
+    before_drain = sum(emulator.kv_ops.values())
+
+    await emulator.drain()
+    drained = time.perf_counter()
+    after_drain = sum(emulator.kv_ops.values()) - before_drain
+    return posted - started, drained - posted, before_drain, after_drain
+
+
+def main():
+    print(f"KV latency {KV_LATENCY * 1000:g} ms")
+    print(
+        f"{'targets':>7} {'post ms':>8} "
+        f"{'fan-out ms':>10} {'kv ops (post)':>13} {'kv ops (deferred)':>17}"
+    )
+    for count in SIZES:
+        post, fan_out, inline_ops, deferred_ops = asyncio.run(measure(count))
+        print(
+            f"{count:>7} {post * 1000:>8.1f} "
+            f"{fan_out * 1000:>10.1f} {inline_ops:>13} {deferred_ops:>17}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: GET /api/v2/agent/messages page reads against large mailboxes.
+
+Populates an in-memory KV with N messages spread over the last day,
+then measures a first page, a recent `since` page and a filtered page,
+reporting wall time (with simulated KV latency) and KV operations.
+Serial body fetches (the one-await-per-key approach) are shown for
+comparison with the bounded concurrent fetch. A second run keeps one
+inbox fixed while total volume grows, to show that indexed reads do
+not depend on how many other messages exist.
+
+Usage: python benchmarks/bench_messages.py
+"""
+
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+import messages  # noqa: E402
+from memory_kv import MemoryKV  # noqa: E402
+
+KV_LATENCY = 0.002
+DAY_MS = 86_400_000
+
+
+async def populate(store, count):
+    now_ms = int(time.time() * 1000)
+    for seq in range(count):
+        created = now_ms - DAY_MS + seq * DAY_MS // count
+        await messages.store_message(
+            store,
+            {
+                "id": f"{created:012x}-{random.getrandbits(64):016x}",
+                "content": "x" * 200,
+                "recipient": f"agent-{seq % 20}",
+                "topic": f"topic-{seq % 7}",
+                "created_at": "",
+                "ttl": 3600,
+            },
+        )
+
+
+async def measure(store, label, **kwargs):
+    store.reset_ops()
+    started = time.perf_counter()
+    page = await messages.list_messages(store, **kwargs)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(
+        f"  {label:<28} {len(page['messages']):>4} msgs "
+        f"{elapsed:>8.1f} ms  ops={dict(store.ops)}"
+    )
+
+
+async def main():
+    for count in (10_000, 50_000):
+        store = MemoryKV()
+        await populate(store, count)
+        store.latency = KV_LATENCY
+        print(f"{count} messages, {KV_LATENCY * 1000:.0f}ms KV latency")
+
+        recent_ms = int(time.time() * 1000) - 60_000
+        for reads in (1, messages.MAX_CONCURRENT_KV):
+            messages.MAX_CONCURRENT_KV = reads
+            mode = "serial" if reads == 1 else f"concurrency={reads}"
+            await measure(store, f"first page ({mode})", limit=50)
+        await measure(store, "since last minute", since_ms=recent_ms)
+        await measure(store, "recipient filter", recipient="agent-3")
+
+
+async def indexed_reads():
+    print("Fixed 50-message inbox, growing total volume")
+    for count in (1_000, 10_000, 50_000):
+        store = MemoryKV()
+        await populate(store, count)
+        now_ms = int(time.time() * 1000)
+        for seq in range(50):
+            await messages.store_message(
+                store,
+                {
+                    "id": f"{now_ms - seq:012x}-{seq:016x}",
+                    "content": "x" * 200,
+                    "recipient": "watched-agent",
+                    "topic": None,
+                    "created_at": "",
+                    "ttl": 3600,
+                },
+            )
+        store.latency = KV_LATENCY
+        await measure(store, f"{count} total", recipient="watched-agent")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    asyncio.run(indexed_reads())
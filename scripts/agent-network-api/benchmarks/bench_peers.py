@@ -0,0 +1,88 @@
+"""
+Load test: peer discovery against a growing directory.
+
+Registers N peers in an in-memory KV, builds a snapshot (the periodic
+reload) and then times discovery requests served from it: the full
+listing, a status filter (pre-encoded), and capability/provider filters
+(index lookups, cached after the first request). Compares with the
+previous approach of building the list and re-encoding it per request.
+
+Usage: python benchmarks/bench_peers.py
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+from memory_kv import MemoryKV  # noqa: E402
+from peers import PeerDirectory, build_peer, store_peer  # noqa: E402
+
+REQUESTS = 2_000
+
+
+def populate(store, count):
+    async def write():
+        for i in range(count):
+            await store_peer(
+                store,
+                build_peer(
+                    f"agent-{i:05d}",
+                    {
+                        "provider": f"provider-{i % 20}",
+                        "capabilities": ["message", f"skill-{i % 50}"],
+                        "status": ("online", "busy")[i % 7 == 0],
+                    },
+                ),
+            )
+
+    asyncio.run(write())
+
+
+def per_request_us(func):
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        func()
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+def main():
+    print(
+        f"{'peers':>6} {'load ms':>8} {'rebuild':>10} {'all':>8} "
+        f"{'status':>8} {'cap+prov':>9} {'uncached':>9}"
+    )
+    for count in (100, 1_000, 5_000):
+        store = MemoryKV()
+        populate(store, count)
+        directory = PeerDirectory(demo_peers=())
+
+        started = time.perf_counter()
+        snapshot = asyncio.run(directory.snapshot(store))
+        load_ms = (time.perf_counter() - started) * 1000
+        peers = [json.loads(fragment) for fragment in snapshot.fragments]
+
+        def rebuild():
+            # Previous behaviour: filter and encode the list per request
+            selected = [p for p in peers if p["status"] == "online"]
+            json.dumps({"peers": selected, "total": len(selected)})
+
+        filters = {"capability": "skill-7", "provider": "provider-7"}
+        timings = (
+            per_request_us(rebuild),
+            per_request_us(snapshot.body),
+            per_request_us(lambda: snapshot.body(status="online")),
+            per_request_us(lambda: snapshot.body(**filters)),
+            per_request_us(lambda: snapshot.select(**filters)),
+        )
+        print(
+            f"{count:>6} {load_ms:>8.1f} {timings[0]:>8.1f}us "
+            + " ".join(f"{t:>6.2f}us" for t in timings[1:])
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Load test: per-request overhead of the rate limiter.
+
+Replays requests from a growing population of tokens through
+RateLimiter.check (the only work on the response path) and reports the
+mean cost per check, then the KV operations and time of one background
+sync against an in-memory KV with simulated latency (a sync handles at
+most MAX_SYNC_KEYS keys; the rest wait for the next one).
+
+Usage: python benchmarks/bench_rate_limit.py
+"""
+
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+from memory_kv import MemoryKV  # noqa: E402
+from rate_limit import (  # noqa: E402
+    SPEC_RATE_LIMITS,
+    RateLimiter,
+    parse_rate_limits,
+)
+
+REQUESTS = 100_000
+KV_LATENCY = 0.002
+
+
+def main():
+    limits = parse_rate_limits(SPEC_RATE_LIMITS)
+    print(
+        f"{'tokens':>7} {'ns/check':>9} {'denied':>7} "
+        f"{'sync ops':>24} {'sync ms':>8}"
+    )
+    for tokens in (10, 1_000, 10_000):
+        limiter = RateLimiter(limits)
+        population = [f"token-{i}" for i in range(tokens)]
+        workload = [
+            (random.choice(("posts", "reads")), random.choice(population))
+            for _ in range(REQUESTS)
+        ]
+
+        started = time.perf_counter()
+        denied = sum(
+            not limiter.check(bucket, token).allowed
+            for bucket, token in workload
+        )
+        per_check = (time.perf_counter() - started) / REQUESTS * 1e9
+
+        store = MemoryKV(latency=KV_LATENCY)
+        started = time.perf_counter()
+        asyncio.run(limiter.sync(store))
+        sync_ms = (time.perf_counter() - started) * 1000
+
+        print(
+            f"{tokens:>7} {per_check:>9.0f} {denied:>7} "
+            f"{str(dict(store.ops)):>24} {sync_ms:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
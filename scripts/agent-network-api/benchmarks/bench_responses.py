@@ -0,0 +1,120 @@
+"""
+Microbenchmark: per-response CPU of JSON encoding and header building.
+
+Compares the previous response path (json.dumps with default settings
+and a fresh headers dict per response) with the current one (shared
+compact encoder, shared header dict, and cached bodies for constant
+documents), for a constant document, a page of 50 messages and a page
+of 200 auth attempt rows. Also reports the cost and size of gzip for
+the listings, which only applies when COMPRESS_RESPONSES is enabled.
+
+Usage: python benchmarks/bench_responses.py
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from responses import StaticJSON, compress, encode_json  # noqa: E402
+
+ITERATIONS = 5_000
+
+JSON_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+}
+
+DISCOVERY = {
+    "auth_method": "ciba",
+    "description": "Client Initiated Backchannel Authentication",
+    "flow": "POST public_key and purpose to initiate auth request",
+    "required_fields": {"public_key": "PEM or JWK", "purpose": "why"},
+    "optional_fields": {"callback_url": "URL", "agent_id": "identifier"},
+    "next_step": "POST to this endpoint with required fields",
+}
+
+MESSAGES = {
+    "messages": [
+        {
+            "id": f"0194a6b3c2d1-{i:016x}",
+            "content": f"Status update {i}: build finished, 3 tests flaky",
+            "recipient": "agent-7",
+            "topic": "ci",
+            "created_at": "2025-01-28T12:00:00.000000+00:00",
+            "ttl": 3600,
+        }
+        for i in range(50)
+    ],
+    "next_cursor": "0194a6b3c2d1-0000000000000031",
+    "has_more": True,
+}
+
+ATTEMPTS = {
+    "auth_attempts": [
+        {
+            "id": f"fe6b594c3d2e-{i:016x}",
+            "timestamp": "2025-01-28T12:00:00.000000+00:00",
+            "success": i % 3 != 0,
+            "reason": "request_created" if i % 3 else "missing_fields",
+            "purpose": "Coordinate task handoff between coding agents",
+            "public_key_hash": f"{i:016x}",
+            "agent_id": f"agent-{i % 10}",
+        }
+        for i in range(200)
+    ],
+    "total": 200,
+    "next_cursor": "opaque",
+    "has_more": True,
+}
+
+
+def old_response(data):
+    headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+    }
+    return json.dumps(data, default=str), headers
+
+
+def new_response(data):
+    return encode_json(data), JSON_HEADERS
+
+
+def per_call_us(func, *args):
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(*args)
+    return (time.perf_counter() - started) / ITERATIONS * 1e6
+
+
+def main():
+    static = StaticJSON(DISCOVERY)
+    print(
+        f"{'payload':>10} {'old':>9} {'new':>9} {'bytes old':>10} "
+        f"{'bytes new':>10} {'gzip':>9} {'gz bytes':>9}"
+    )
+    for name, data in (
+        ("discovery", DISCOVERY),
+        ("messages", MESSAGES),
+        ("attempts", ATTEMPTS),
+    ):
+        old = per_call_us(old_response, data)
+        if data is DISCOVERY:
+            new = per_call_us(lambda: (static.body, JSON_HEADERS))
+        else:
+            new = per_call_us(new_response, data)
+        body = encode_json(data).encode()
+        gzip_us = per_call_us(compress, body, "gzip") if len(body) > 1024 else 0
+        print(
+            f"{name:>10} {old:>7.2f}us {new:>7.2f}us "
+            f"{len(old_response(data)[0]):>10} {len(body):>10} "
+            f"{gzip_us:>7.1f}us {len(compress(body, 'gzip')):>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
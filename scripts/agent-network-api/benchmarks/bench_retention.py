@@ -0,0 +1,112 @@
+"""
+Storage benchmark: the raw analytics event log in AGENT_EVENTS.
+
+Replays SESSIONS agent sessions (auth, polls, posts, reads, discovery;
+one analytics flush per request, as in the worker) and compares what
+AGENT_EVENTS holds:
+
+- raw: every event kept as `event:` batches, never compacted (before);
+- sampled: the same with high-volume events sampled (retention.py);
+- compacted: sampled batches folded into rollups and archived as
+  compressed hourly NDJSON segments, then deleted (after).
+
+Usage: python benchmarks/bench_retention.py [sessions]
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+from analytics import AnalyticsBuffer  # noqa: E402
+from memory_kv import MemoryKV  # noqa: E402
+from retention import Sampler  # noqa: E402
+from rollups import COMPACT_DELAY, compact_events  # noqa: E402
+
+SESSIONS = 2_000
+
+# Events recorded by one request, for each request of a session
+SESSION = (
+    [("auth_request_created", {"request_id": "018f1234abcd-0123456789abcdef"})]
+    + [("auth_poll", {"request_id": "018f1234abcd-0123456789abcdef"})] * 6
+    + [("message_posted", {"message_id": "018f1234abcd-0123456789abcdef"})]
+    * 5
+    + [("messages_read", {"count": 20})] * 2
+    + [("peers_discovered", {})] * 3
+)
+
+
+def replay(store, sampler):
+    buffer = AnalyticsBuffer(sampler=sampler)
+
+    async def run():
+        for _ in range(SESSIONS):
+            for event_type, data in SESSION:
+                buffer.record(event_type, data)
+                await buffer.flush(store)
+
+    asyncio.run(run())
+
+
+def usage(store, prefix=""):
+    keys = 0
+    size = 0
+    for name, entry in store._data.items():
+        if name.startswith(prefix):
+            keys += 1
+            value = entry["value"]
+            size += len(name) + len(
+                value if isinstance(value, bytes) else value.encode()
+            )
+    return keys, size
+
+
+def main():
+    global SESSIONS
+    if len(sys.argv) > 1:
+        SESSIONS = int(sys.argv[1])
+
+    print(f"{SESSIONS} sessions, {SESSIONS * len(SESSION)} events")
+    print(
+        f"{'':<10} {'event keys':>10} {'rollup/seg':>10} {'bytes':>12}"
+    )
+
+    raw = MemoryKV()
+    replay(raw, Sampler({}))
+    sampled = MemoryKV()
+    replay(sampled, Sampler())
+
+    compacted = MemoryKV()
+    replay(compacted, Sampler())
+    started = time.perf_counter()
+    runs = 0
+    while asyncio.run(
+        compact_events(compacted, now=time.time() + COMPACT_DELAY + 1)
+    ):
+        runs += 1
+    elapsed = time.perf_counter() - started
+
+    for label, store in (
+        ("raw", raw),
+        ("sampled", sampled),
+        ("compacted", compacted),
+    ):
+        events, event_bytes = usage(store, "event:")
+        rollups, rollup_bytes = usage(store, "rollup:")
+        segments, segment_bytes = usage(store, "archive:")
+        print(
+            f"{label:<10} {events:>10} {rollups + segments:>10} "
+            f"{event_bytes + rollup_bytes + segment_bytes:>12,}"
+        )
+    print(
+        f"compaction: {runs} cron runs, {elapsed * 1000 / max(runs, 1):.1f} "
+        f"ms per run"
+    )
+
+
+if __name__ == "__main__":
+    main()
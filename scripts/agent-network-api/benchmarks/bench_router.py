@@ -0,0 +1,111 @@
+"""
+Microbenchmark: compiled route table vs. the original if/elif chain.
+
+The chain compares path and method branch by branch, so dispatch cost
+grows with the number of routes and with how late a route is declared.
+The compiled router does one dict lookup for static paths and, for
+parameterised ones, one rpartition and one dict lookup, plus building
+the params dict and the match. Each figure is the best of REPEATS runs.
+
+Usage: python benchmarks/bench_router.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from router import Router  # noqa: E402
+
+ITERATIONS = 100_000
+REPEATS = 5
+
+
+def build_routes(extra: int) -> list:
+    """The worker's route table padded with `extra` synthetic routes."""
+    routes = [
+        ("GET", "/api/v2/agent/auth"),
+        ("POST", "/api/v2/agent/auth"),
+        ("POST", "/api/v2/agent/messages"),
+        ("GET", "/api/v2/agent/messages"),
+        ("POST", "/api/v2/agent/questions"),
+        ("GET", "/api/v2/agent/peers"),
+        ("POST", "/api/v2/agent/subscribe"),
+        ("POST", "/api/v2/secret"),
+        ("POST", "/api/v2/agent/handoff"),
+        ("GET", "/api/v2/admin/analytics"),
+        ("GET", "/api/v2/admin/auth-attempts"),
+        ("GET", "/health"),
+    ]
+    routes += [("GET", f"/api/v2/extra/route{i}") for i in range(extra)]
+    return routes
+
+
+def make_chain(routes):
+    """
+    Emulate the if/elif chain: a linear scan with the auth poll prefix
+    check in third place, as in the original Default.fetch, and a
+    questions/{id} prefix check appended after the existing routes.
+    """
+
+    def dispatch(method, path):
+        for position, (route_method, route_path) in enumerate(routes):
+            if position == 2:
+                if path.startswith("/api/v2/agent/auth/") and method == "GET":
+                    return path.split("/")[-1]
+            if path == route_path and method == route_method:
+                return route_path
+        if path.startswith("/api/v2/agent/questions/") and method == "GET":
+            return path.split("/")[-1]
+        return None
+
+    return dispatch
+
+
+def make_router(routes):
+    router = Router()
+    for method, path in routes:
+        router.add(method, path, path)
+    router.add("GET", "/api/v2/agent/auth/{auth_request_id}", "poll")
+    router.add("GET", "/api/v2/agent/questions/{question_id}", "question")
+    return router.route
+
+
+def main():
+    print(f"{'routes':>7} {'target':>10} {'chain ns':>10} {'router ns':>10}")
+    for extra in (0, 50, 200):
+        routes = build_routes(extra)
+        chain = make_chain(routes)
+        route = make_router(routes)
+        targets = {
+            "first": ("GET", routes[0][1]),
+            "last": routes[-1],
+            "param": ("GET", "/api/v2/agent/auth/018f1234-abcd"),
+            "lateparam": ("GET", "/api/v2/agent/questions/018f1234-abcd"),
+            "missing": ("GET", "/nope"),
+        }
+        for label, (method, path) in targets.items():
+            chain_ns = min(
+                timeit.repeat(
+                    lambda: chain(method, path),
+                    number=ITERATIONS,
+                    repeat=REPEATS,
+                )
+            )
+            router_ns = min(
+                timeit.repeat(
+                    lambda: route(method, path),
+                    number=ITERATIONS,
+                    repeat=REPEATS,
+                )
+            )
+            print(
+                f"{len(routes):>7} {label:>10} "
+                f"{chain_ns / ITERATIONS * 1e9:>10.0f} "
+                f"{router_ns / ITERATIONS * 1e9:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Contention benchmark: many readers racing to reveal the same secret.
+
+Runs through the local emulator (KV_LATENCY seconds per KV operation)
+with ISOLATES isolates and the reads rate limit raised out of the way.
+For each reader count, one secret is created and every reader POSTs
+/api/v2/secret/reveal for it at once. Reports wall time, how many
+readers got the secret, and KV operations.
+
+Two burn coordinators are compared:
+
+- shared: one coordinator for all isolates, standing in for the
+  SecretBurnObject Durable Object (the emulator has no Durable Objects);
+- per-isolate: the in-process stand-in each isolate uses without the
+  SECRET_BURNS binding, which is only exactly-once within an isolate.
+
+A second table reveals secrets of increasing size with a single reader,
+to show what encryption costs per byte.
+
+Usage: python benchmarks/bench_secrets.py
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+from emulator import Emulator  # noqa: E402
+from secret_store import BurnCoordinator  # noqa: E402
+
+KV_LATENCY = 0.002
+ISOLATES = 4
+READERS = (10, 100, 1000)
+SIZES = (1 << 10, 64 << 10, 1 << 20)
+ADMIN = {"X-Admin-Key": "mock-admin-key"}
+RATE_LIMITS = json.dumps(
+    {
+        "posts_per_minute": 10,
+        "reads_per_minute": 1_000_000,
+        "secrets_per_hour": 1_000_000,
+    }
+)
+
+
+async def authenticate(emulator):
+    response = await emulator.request(
+        "POST",
+        "/api/v2/agent/auth",
+        json={"public_key": "pk", "purpose": "bench", "agent_id": "bench"},
+    )
+    created = json.loads(response.body)
+    await emulator.request(
+        "POST",
+        f"/api/v2/admin/auth-requests/{created['auth_request_id']}/approve",
+        headers=ADMIN,
+    )
+    response = await emulator.request("GET", created["poll_endpoint"])
+    token = json.loads(response.body)["access_token"]
+    await emulator.drain()
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def create_secret(emulator, auth, size):
+    response = await emulator.request(
+        "POST",
+        "/api/v2/secret",
+        json={"secret": "x" * size, "ttl": 600},
+        headers=auth,
+    )
+    return json.loads(response.body)["secret_key"]
+
+
+def reveal(emulator, auth, secret_key, isolate=None):
+    return emulator.request(
+        "POST",
+        "/api/v2/secret/reveal",
+        json={"secret_key": secret_key},
+        headers=auth,
+        isolate=isolate,
+    )
+
+
+async def race(readers, shared):
+    emulator = Emulator(
+        isolates=ISOLATES, latency=KV_LATENCY, RATE_LIMITS=RATE_LIMITS
+    )
+    if shared:
+        coordinator = BurnCoordinator()
+        for isolate in emulator.isolates:
+            isolate.module._burn_coordinator = coordinator
+    # Every isolate validates the token once up front
+    auth = await authenticate(emulator)
+    for index in range(ISOLATES):
+        await emulator.request(
+            "GET", "/api/v2/agent/peers", headers=auth, isolate=index
+        )
+    secret_key = await create_secret(emulator, auth, 1024)
+    await emulator.drain()
+    emulator.reset_ops()
+
+    started = time.perf_counter()
+    responses = await asyncio.gather(
+        *(reveal(emulator, auth, secret_key) for _ in range(readers))
+    )
+    elapsed = time.perf_counter() - started
+    await emulator.drain()
+    winners = sum(response.status == 200 for response in responses)
+    return elapsed, winners, sum(emulator.kv_ops.values())
+
+
+async def reveal_size(size):
+    emulator = Emulator(latency=KV_LATENCY, RATE_LIMITS=RATE_LIMITS)
+    auth = await authenticate(emulator)
+    started = time.perf_counter()
+    secret_key = await create_secret(emulator, auth, size)
+    created = time.perf_counter()
+    response = await reveal(emulator, auth, secret_key)
+    revealed = time.perf_counter()
+    assert response.status == 200
+    return created - started, revealed - created
+
+
+def main():
+    print(f"KV latency {KV_LATENCY * 1000:g} ms, {ISOLATES} isolates")
+    print(
+        f"{'readers':>7} {'coordinator':<12} {'ms':>8} "
+        f"{'winners':>7} {'kv ops':>7}"
+    )
+    for readers in READERS:
+        for name, shared in (("shared", True), ("per-isolate", False)):
+            elapsed, winners, kv_ops = asyncio.run(race(readers, shared))
+            print(
+                f"{readers:>7} {name:<12} {elapsed * 1000:>8.1f} "
+                f"{winners:>7} {kv_ops:>7}"
+            )
+
+    print()
+    print(f"{'bytes':>9} {'create ms':>9} {'reveal ms':>9}")
+    for size in SIZES:
+        create_time, reveal_time = asyncio.run(reveal_size(size))
+        print(
+            f"{size:>9} {create_time * 1000:>9.1f} {reveal_time * 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
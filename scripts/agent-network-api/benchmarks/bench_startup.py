@@ -0,0 +1,137 @@
+"""
+Cold-start benchmark: importing the worker and serving its first requests.
+
+Each sample runs in a fresh interpreter, so nothing is cached between
+samples (bytecode is compiled up front, as a deployed worker's would
+be). The emulator's runtime stand-ins (js, workers, pyodide.ffi) and
+asyncio are imported before the clock starts, since Pyodide provides
+them; what is timed is the worker's own code:
+
+- import: executing src/main.py and every module it imports, as a new
+  isolate does (or as a deploy-time memory snapshot captures);
+- first/next: the first and second request to each route, in order.
+  The first request pays for work deferred out of import (lazy modules,
+  compiled validators, parsed configuration); the second is steady state.
+
+Also reports how many worker modules are loaded after import and after
+the requests. Reports median and max over SAMPLES runs.
+
+Usage: python benchmarks/bench_startup.py [checkout root] [samples]
+
+The optional root benchmarks another checkout of this directory (e.g. a
+`git worktree` of an earlier commit) for before/after comparisons.
+"""
+
+import compileall
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLES = 15
+
+# Runs in the child interpreter; prints one JSON sample
+PROBE = r"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+root = Path(sys.argv[1])
+src = root / "src"
+for path in (root / "emulator" / "runtime", root / "emulator"):
+    sys.path.insert(0, str(path))
+
+import js, workers, pyodide.ffi  # noqa: F401  provided by the runtime
+from emulator import Emulator, load_worker
+import emulator as emulator_module
+
+def worker_modules():
+    return sorted(
+        name for name, module in sys.modules.items()
+        if str(getattr(module, "__file__", "") or "").startswith(str(src))
+    )
+
+# Time the isolate's import on its own, then build the emulator around it
+started = time.perf_counter()
+module = load_worker()
+import_ms = (time.perf_counter() - started) * 1000
+imported = len(worker_modules())
+emulator_module.load_worker = lambda: module
+emulator = Emulator(isolates=1)
+
+ADMIN = {"X-Admin-Key": "mock-admin-key"}
+ROUTES = [
+    ("health", "GET", "/health", None, None),
+    ("auth discovery", "GET", "/api/v2/agent/auth", None, None),
+    ("auth request", "POST", "/api/v2/agent/auth",
+     {"public_key": "pk", "purpose": "startup"}, None),
+    ("admin analytics", "GET", "/api/v2/admin/analytics", None, ADMIN),
+    ("admin range", "GET", "/api/v2/admin/analytics/range", None, ADMIN),
+]
+
+async def requests():
+    timings = {}
+    for name, method, path, body, headers in ROUTES:
+        samples = []
+        for _ in range(2):
+            started = time.perf_counter()
+            response = await emulator.request(
+                method, path, json=body, headers=headers
+            )
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status >= 400:
+                raise RuntimeError(f"{name}: {response.status}")
+        timings[name] = samples
+    await emulator.drain()
+    return timings
+
+timings = asyncio.run(requests())
+print(json.dumps({
+    "import": import_ms,
+    "imported": imported,
+    "loaded": len(worker_modules()),
+    "routes": timings,
+}))
+"""
+
+
+def sample(root: Path) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, str(root)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    root = Path(sys.argv[1]).resolve() if len(sys.argv) > 1 else ROOT
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else SAMPLES
+    for directory in ("src", "emulator"):
+        compileall.compile_dir(root / directory, quiet=1)
+    runs = [sample(root) for _ in range(samples)]
+
+    print(f"{root} ({samples} fresh interpreters)")
+    imports = [run["import"] for run in runs]
+    print(
+        f"import main.py      median {statistics.median(imports):7.2f} ms"
+        f"   max {max(imports):7.2f} ms"
+    )
+    print(
+        f"worker modules      {runs[0]['imported']} after import,"
+        f" {runs[0]['loaded']} after the requests below"
+    )
+    print(f"{'route':<18} {'first (ms)':>12} {'next (ms)':>12}")
+    for name in runs[0]["routes"]:
+        first = statistics.median(run["routes"][name][0] for run in runs)
+        then = statistics.median(run["routes"][name][1] for run in runs)
+        print(f"{name:<18} {first:>12.2f} {then:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
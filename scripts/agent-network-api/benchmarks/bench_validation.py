@@ -0,0 +1,118 @@
+"""
+Microbenchmark: request body validation overhead.
+
+For typical bodies, reports the time to parse the JSON alone, and the
+extra time to validate it with:
+
+- compiled: the validator built once per isolate (validation.validator);
+- per request: compiling the schema again for every body, the cost of
+  walking the schema on each request.
+
+Compiling a request schema is also timed once, to show what the first
+request of an isolate pays.
+
+Usage: python benchmarks/bench_validation.py
+"""
+
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from schemas import REQUEST_SCHEMAS  # noqa: E402
+from validation import compile_schema, validator  # noqa: E402
+
+ITERATIONS = 5_000
+# Compiling per body is slow enough that fewer runs suffice
+UNCOMPILED_ITERATIONS = 100
+
+AGENT_MESSAGE = {
+    "version": "1.0",
+    "type": "task_handoff",
+    "agent_id": "agent_018f1234-5678-7abc-8def-0123456789ab",
+    "timestamp": "2025-01-28T14:00:00Z",
+    "payload": {
+        "task_description": "Review the open pull requests",
+        "recipient_criteria": {"capabilities": ["review"]},
+        "priority": "high",
+    },
+}
+
+BODIES = [
+    ("message (text)", "message", {"content": "build ok", "topic": "ci"}),
+    ("message (agent)", "message", {"content": AGENT_MESSAGE, "ttl": 600}),
+    (
+        "handoff",
+        "handoff",
+        {
+            "target_agent": "agent-b",
+            "task_description": "Review the open pull requests",
+            "priority": "normal",
+        },
+    ),
+    (
+        "batch of 100",
+        "message_batch",
+        {"messages": [{"content": f"m{i}", "topic": "ci"} for i in range(100)]},
+    ),
+]
+
+
+def per_call(statement, number=ITERATIONS) -> float:
+    """Microseconds per call."""
+    return timeit.timeit(statement, number=number) / number * 1e6
+
+
+def main():
+    print(
+        f"{'body':<16} {'bytes':>6} {'parse us':>9} "
+        f"{'compiled us':>11} {'per request us':>14}"
+    )
+    for label, name, body in BODIES:
+        text = json.dumps(body)
+        parsed = json.loads(text)
+        validate = validator(name)
+        if name == "message_batch":
+            # Items are validated one by one, as the batch handler does
+            item = validator("message")
+
+            def compiled():
+                validate(parsed)
+                for message in parsed["messages"]:
+                    item(message)
+
+            def uncompiled():
+                compile_schema(REQUEST_SCHEMAS[name])(parsed)
+                for message in parsed["messages"]:
+                    compile_schema(REQUEST_SCHEMAS["message"])(message)
+
+        else:
+
+            def compiled():
+                validate(parsed)
+
+            def uncompiled():
+                compile_schema(REQUEST_SCHEMAS[name])(parsed)
+
+        assert validate(parsed) == []
+        parse = per_call(lambda: json.loads(text))
+        slow = per_call(uncompiled, UNCOMPILED_ITERATIONS)
+        print(
+            f"{label:<16} {len(text):>6} {parse:>9.1f} "
+            f"{per_call(compiled):>11.1f} {slow:>14.1f}"
+        )
+
+    started = timeit.default_timer()
+    for name, schema in REQUEST_SCHEMAS.items():
+        compile_schema(schema)
+    elapsed = timeit.default_timer() - started
+    print(
+        f"\ncompiling all {len(REQUEST_SCHEMAS)} request schemas once: "
+        f"{elapsed * 1000:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
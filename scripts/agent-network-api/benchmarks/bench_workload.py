@@ -0,0 +1,144 @@
+"""
+Load test: the agent workload end to end, through the local emulator.
+
+AGENTS concurrent agents each run auth -> admin approve -> poll -> POSTS
+message posts -> read -> peer discovery against src/main.py in the
+emulator (several isolates sharing MemoryKV namespaces with KV_LATENCY
+seconds per operation). Reports throughput, per-step p50/p99 latency
+and KV operations per request, from the emulator's KV counters and the
+isolates' own route metrics.
+
+A pending poll is not repeated per agent: the worker throttles polls to
+one per POLL_INTERVAL, so agents poll once, after approval.
+
+Usage: python benchmarks/bench_workload.py [agents] [isolates] [latency_ms]
+"""
+
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+from emulator import Emulator  # noqa: E402
+from metrics import merge_snapshots  # noqa: E402
+
+AGENTS = 200
+ISOLATES = 4
+KV_LATENCY = 0.002
+POSTS = 5
+ADMIN = {"X-Admin-Key": "mock-admin-key"}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def agent(emulator, index, timings):
+    async def step(name, method, path, **kwargs):
+        started = time.perf_counter()
+        response = await emulator.request(method, path, **kwargs)
+        timings[name].append((time.perf_counter() - started) * 1000)
+        if response.status >= 400:
+            raise RuntimeError(f"{name}: {response.status} {response.body}")
+        return json.loads(response.body) if response.body else None
+
+    created = await step(
+        "auth",
+        "POST",
+        "/api/v2/agent/auth",
+        json={
+            "public_key": f"pk-{index}",
+            "purpose": "load test",
+            "agent_id": f"agent-{index:04d}",
+            "capabilities": ["message", f"skill-{index % 10}"],
+        },
+    )
+    auth_request_id = created["auth_request_id"]
+    await step(
+        "approve",
+        "POST",
+        f"/api/v2/admin/auth-requests/{auth_request_id}/approve",
+        headers=ADMIN,
+    )
+    polled = await step("poll", "GET", created["poll_endpoint"])
+    auth = {"Authorization": f"Bearer {polled['access_token']}"}
+
+    for n in range(POSTS):
+        await step(
+            "post",
+            "POST",
+            "/api/v2/agent/messages",
+            json={"content": f"message {n} from {index}", "topic": "load"},
+            headers=auth,
+        )
+    await step(
+        "read", "GET", "/api/v2/agent/messages?topic=load", headers=auth
+    )
+    await step(
+        "peers", "GET", "/api/v2/agent/peers?capability=message", headers=auth
+    )
+
+
+async def run(agents, isolates, latency):
+    emulator = Emulator(isolates=isolates, latency=latency)
+    timings = defaultdict(list)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(agent(emulator, index, timings) for index in range(agents))
+    )
+    elapsed = time.perf_counter() - started
+    await emulator.drain()
+
+    requests = sum(len(values) for values in timings.values())
+    print(
+        f"{agents} agents, {isolates} isolates, "
+        f"{latency * 1000:g} ms KV latency"
+    )
+    print(
+        f"{requests} requests in {elapsed:.2f}s "
+        f"= {requests / elapsed:,.0f} req/s"
+    )
+    kv_ops = emulator.kv_ops
+    print(
+        f"KV ops (incl. background): {sum(kv_ops.values())} "
+        f"= {sum(kv_ops.values()) / requests:.2f}/request {dict(kv_ops)}"
+    )
+
+    routes = merge_snapshots(
+        isolate.module.metrics.to_dict() for isolate in emulator.isolates
+    )
+    print()
+    print(f"{'step':<8} {'count':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, values in timings.items():
+        print(
+            f"{name:<8} {len(values):>6} {percentile(values, 0.5):>8.2f} "
+            f"{percentile(values, 0.99):>8.2f}"
+        )
+    print()
+    print(f"{'route':<60} {'requests':>8} {'kv ops':>7} {'per req':>8}")
+    for route, stats in sorted(routes.items()):
+        summary = stats.summary()
+        print(
+            f"{route:<60} {summary['requests']:>8} "
+            f"{sum(stats.kv.values()):>7} {summary['kv_ops_per_request']:>8}"
+        )
+
+
+def main():
+    args = sys.argv[1:]
+    agents = int(args[0]) if len(args) > 0 else AGENTS
+    isolates = int(args[1]) if len(args) > 1 else ISOLATES
+    latency = float(args[2]) / 1000 if len(args) > 2 else KV_LATENCY
+    asyncio.run(run(agents, isolates, latency))
+
+
+if __name__ == "__main__":
+    main()
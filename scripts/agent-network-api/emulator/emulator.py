@@ -0,0 +1,127 @@
+"""
+Local emulator for the Agent Network API worker.
+
+Runs src/main.py unmodified in CPython: `runtime/` provides stand-ins for
+the Pyodide `js`, `pyodide.ffi` and `workers` modules, and the KV
+bindings are MemoryKV namespaces (TTL, prefix listing, metadata,
+injectable latency and per-operation counts).
+
+Each emulated isolate is a separately imported copy of main.py, so
+module-level isolate state (caches, analytics buffer, rate limiter,
+metrics) is per isolate while KV is shared, as in production. Work passed
+to ctx.waitUntil is collected and run by `drain()`.
+
+    emulator = Emulator(isolates=2, latency=0.002)
+    response = await emulator.request(
+        "POST", "/api/v2/agent/auth",
+        json={"public_key": "...", "purpose": "..."},
+    )
+    await emulator.drain()
+"""
+
+import asyncio
+import importlib.util
+import itertools
+import sys
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+HERE = Path(__file__).resolve().parent
+SRC = HERE.parent / "src"
+RUNTIME = HERE / "runtime"
+
+for _path in (HERE, SRC, RUNTIME):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+from memory_kv import MemoryKV  # noqa: E402
+from workers import Request  # noqa: E402
+
+KV_BINDINGS = ("AGENT_AUTH", "AGENT_MESSAGES", "AGENT_EVENTS")
+BASE_URL = "https://agent-network.local"
+DEFAULT_VARS = {
+    "ENVIRONMENT": "emulator",
+    "COUNTER_SHARDS": "4",
+    "COMPRESS_RESPONSES": "false",
+}
+
+_worker_ids = itertools.count()
+
+
+def load_worker():
+    """Import a fresh copy of src/main.py (a new isolate)."""
+    name = f"agent_network_worker_{next(_worker_ids)}"
+    spec = importlib.util.spec_from_file_location(name, SRC / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ExecutionContext:
+    """Collects ctx.waitUntil work for Emulator.drain()."""
+
+    def __init__(self):
+        self.pending = []
+
+    def waitUntil(self, task):
+        self.pending.append(task)
+
+
+class Isolate:
+    def __init__(self, env):
+        self.module = load_worker()
+        self.ctx = ExecutionContext()
+        self.entrypoint = self.module.Default(self.ctx, env)
+
+
+class Emulator:
+    """A set of worker isolates sharing in-memory KV namespaces."""
+
+    def __init__(self, isolates: int = 1, latency: float = 0.0, **variables):
+        self.kv = {
+            name: MemoryKV(latency=latency, js_metadata=True)
+            for name in KV_BINDINGS
+        }
+        self.env = SimpleNamespace(**self.kv, **{**DEFAULT_VARS, **variables})
+        self.isolates = [Isolate(self.env) for _ in range(isolates)]
+        self._next = itertools.cycle(range(isolates))
+
+    @property
+    def kv_ops(self) -> Counter:
+        """KV operations across all namespaces."""
+        total = Counter()
+        for store in self.kv.values():
+            total.update(store.ops)
+        return total
+
+    def reset_ops(self):
+        for store in self.kv.values():
+            store.reset_ops()
+
+    async def request(
+        self, method, path, json=None, headers=None, isolate=None
+    ):
+        """
+        Send a request to an isolate (round-robin unless `isolate` is
+        given) and return the worker's Response.
+        """
+        index = next(self._next) if isolate is None else isolate
+        request = Request(f"{BASE_URL}{path}", method, headers, json)
+        return await self.isolates[index].entrypoint.fetch(request)
+
+    async def drain(self):
+        """Run all pending waitUntil work, including work it schedules."""
+        while True:
+            pending = []
+            for isolate in self.isolates:
+                pending.extend(isolate.ctx.pending)
+                isolate.ctx.pending.clear()
+            if not pending:
+                return
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def scheduled(self, isolate: int = 0):
+        """Fire the cron trigger on one isolate."""
+        entry = self.isolates[isolate].entrypoint
+        await entry.scheduled(None, self.env, entry.ctx)
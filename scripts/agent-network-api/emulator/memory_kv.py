@@ -0,0 +1,111 @@
+"""
+In-memory stand-in for a Workers KV namespace binding.
+
+Implements the subset of the KV API the worker uses (get, put, delete,
+list with prefix/cursor/limit, expirationTtl, metadata) and counts every
+operation so tests and benchmarks can assert how many KV round-trips a
+code path costs. Every operation yields
+to the event loop (sleeping `latency` seconds, default 0) like a real
+network round-trip, so concurrent callers interleave.
+
+With `js_metadata`, put only accepts metadata that was converted to a JS
+object (anything with `to_py`, like the emulator's js.JsObject), as the
+Workers runtime does: a bare Python dict would reach KV as a proxy, not
+an object. Emulated isolates use this; unit tests pass dicts directly.
+"""
+
+import asyncio
+import bisect
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+
+class MemoryKV:
+    """Dict-backed KV namespace with TTL support and op accounting."""
+
+    def __init__(self, latency: float = 0.0, js_metadata: bool = False):
+        self._data = {}
+        self._names = []
+        self.ops = Counter()
+        self.latency = latency
+        self.js_metadata = js_metadata
+
+    @property
+    def total_ops(self) -> int:
+        return sum(self.ops.values())
+
+    def reset_ops(self):
+        self.ops.clear()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] is not None and entry["expires_at"] <= time.time():
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key):
+        if self._data.pop(key, None) is not None:
+            del self._names[bisect.bisect_left(self._names, key)]
+
+    async def get(self, key, type=None):
+        # Values come back as stored, so `type` needs no conversion
+        self.ops["get"] += 1
+        await asyncio.sleep(self.latency)
+        entry = self._live(key)
+        return entry["value"] if entry else None
+
+    async def put(self, key, value, expirationTtl=None, metadata=None):
+        if self.js_metadata and metadata is not None:
+            if not hasattr(metadata, "to_py"):
+                raise TypeError(
+                    f"metadata for {key!r} is a {type(metadata).__name__}, "
+                    "not a JS object"
+                )
+        self.ops["put"] += 1
+        await asyncio.sleep(self.latency)
+        expires_at = time.time() + expirationTtl if expirationTtl else None
+        if key not in self._data:
+            bisect.insort(self._names, key)
+        self._data[key] = {
+            "value": value,
+            "expires_at": expires_at,
+            "metadata": metadata,
+        }
+
+    async def delete(self, key):
+        self.ops["delete"] += 1
+        await asyncio.sleep(self.latency)
+        self._remove(key)
+
+    async def list(self, prefix="", cursor=None, limit=1000):
+        self.ops["list"] += 1
+        await asyncio.sleep(self.latency)
+        # The cursor is the last key name of the previous page
+        index = bisect.bisect_right(self._names, cursor or prefix)
+        if not cursor:
+            index = bisect.bisect_left(self._names, prefix)
+        page = []
+        while index < len(self._names) and len(page) < limit:
+            name = self._names[index]
+            if not name.startswith(prefix):
+                break
+            if self._live(name):
+                page.append(name)
+                index += 1
+        complete = len(page) < limit or not any(
+            name.startswith(prefix) for name in self._names[index : index + 1]
+        )
+        return SimpleNamespace(
+            keys=[
+                SimpleNamespace(
+                    name=name, metadata=self._data[name]["metadata"]
+                )
+                for name in page
+            ],
+            list_complete=complete,
+            cursor=None if complete else page[-1],
+        )
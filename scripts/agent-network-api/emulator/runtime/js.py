@@ -0,0 +1,139 @@
+"""
+Emulator stand-in for Pyodide's `js` module (only what the worker uses).
+"""
+
+import asyncio
+
+
+class Headers(dict):
+    """Case-insensitive header map; `Headers.new(items)` mirrors the JS API."""
+
+    def __init__(self, items=()):
+        super().__init__()
+        for name, value in dict(items).items():
+            self[name] = value
+
+    @classmethod
+    def new(cls, items=()):
+        return cls(items)
+
+    def __setitem__(self, name, value):
+        super().__setitem__(name.lower(), str(value))
+
+    def __getitem__(self, name):
+        return super().__getitem__(name.lower())
+
+    def __contains__(self, name):
+        return super().__contains__(name.lower())
+
+    def get(self, name, default=None):
+        return super().get(name.lower(), default)
+
+
+class _Closed(Exception):
+    pass
+
+
+class _ReadableStream:
+    """Readable side of a TransformStream; iterate it to read chunks."""
+
+    def __init__(self, queue):
+        self._queue = queue
+        self.cancelled = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self._queue.get()
+        if chunk is _Closed:
+            raise StopAsyncIteration
+        return chunk
+
+    async def read_text(self) -> str:
+        """Next chunk decoded, or None once the stream has closed."""
+        try:
+            return bytes(await self.__anext__()).decode()
+        except StopAsyncIteration:
+            return None
+
+    def cancel(self):
+        """The client disconnects: later writes fail."""
+        self.cancelled = True
+
+
+class _Writer:
+    def __init__(self, readable):
+        self._readable = readable
+
+    async def write(self, chunk):
+        if self._readable.cancelled:
+            raise _Closed("stream cancelled by the client")
+        await self._readable._queue.put(chunk)
+
+    async def close(self):
+        await self._readable._queue.put(_Closed)
+
+
+class _WritableStream:
+    def __init__(self, readable):
+        self._readable = readable
+
+    def getWriter(self):
+        return _Writer(self._readable)
+
+
+class TransformStream:
+    """Identity TransformStream: chunks written are read unchanged."""
+
+    def __init__(self):
+        self.readable = _ReadableStream(asyncio.Queue())
+        self.writable = _WritableStream(self.readable)
+
+    @classmethod
+    def new(cls):
+        return cls()
+
+
+class JsObject(dict):
+    """A plain JS object built from a Python dict (see Object.fromEntries)."""
+
+    def to_py(self):
+        return dict(self)
+
+
+class Object:
+    """Only Object.fromEntries, as used with to_js(dict_converter=...)."""
+
+    fromEntries = JsObject
+
+
+class _SubtleCrypto:
+    """
+    AES-GCM subset of crypto.subtle, backed by the `cryptography` package
+    (imported on first use, so only secrets need it).
+    """
+
+    async def importKey(self, fmt, key_data, algorithm, extractable, usages):
+        return bytes(key_data)
+
+    async def encrypt(self, params, key, data):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        return AESGCM(key).encrypt(
+            bytes(params["iv"]), bytes(data), bytes(params["additionalData"])
+        )
+
+    async def decrypt(self, params, key, data):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        return AESGCM(key).decrypt(
+            bytes(params["iv"]), bytes(data), bytes(params["additionalData"])
+        )
+
+
+class _Crypto:
+    subtle = _SubtleCrypto()
+
+
+crypto = _Crypto()
@@ -0,0 +1 @@
+"""Emulator stand-in for the `pyodide` package."""
@@ -0,0 +1,17 @@
+"""
+Emulator stand-in for `pyodide.ffi`: there is no JavaScript side, so
+values are passed through unchanged, except that dicts (at any depth)
+go through `dict_converter` when one is given, as in Pyodide.
+"""
+
+
+def to_js(value, dict_converter=None, **options):
+    if dict_converter is None:
+        return value
+    if isinstance(value, dict):
+        return dict_converter(
+            (key, to_js(item, dict_converter)) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return [to_js(item, dict_converter) for item in value]
+    return value
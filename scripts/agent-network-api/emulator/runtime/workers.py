@@ -0,0 +1,91 @@
+"""
+Emulator stand-in for the Python Workers `workers` module.
+
+Provides Request/Response objects with the attributes the worker reads,
+the WorkerEntrypoint and DurableObject base classes, and `fetch` for
+outgoing subrequests (real HTTP, run in a thread).
+"""
+
+import asyncio
+import json
+import urllib.error
+import urllib.request
+
+from js import Headers
+
+
+class Request:
+    """An incoming request as seen by the worker."""
+
+    def __init__(self, url, method="GET", headers=None, body=None):
+        self.url = url
+        self.method = method
+        self.headers = Headers(headers or {})
+        if body is not None and not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        # Chunked requests carry no length
+        sized = "Content-Length" in self.headers
+        chunked = "Transfer-Encoding" in self.headers
+        if body is not None and not sized and not chunked:
+            size = len(body.encode() if isinstance(body, str) else body)
+            self.headers["Content-Length"] = size
+        self._body = body
+
+    async def text(self):
+        body = self._body or ""
+        return body.decode() if isinstance(body, bytes) else body
+
+    async def json(self):
+        return json.loads(await self.text())
+
+
+class Response:
+    """A response returned by the worker or by `fetch`."""
+
+    def __init__(self, body=None, status=200, headers=None, **options):
+        self.body = body
+        self.status = status
+        self.headers = Headers(headers or {})
+        self.options = options
+
+    @classmethod
+    def new(cls, body=None, status=200, headers=None, **options):
+        return cls(body, status=status, headers=headers, **options)
+
+    async def text(self):
+        body = self.body or ""
+        return body.decode() if isinstance(body, bytes) else body
+
+    async def json(self):
+        return json.loads(await self.text())
+
+
+class WorkerEntrypoint:
+    def __init__(self, ctx, env):
+        self.ctx = ctx
+        self.env = env
+
+
+class DurableObject:
+    def __init__(self, ctx, env):
+        self.ctx = ctx
+        self.env = env
+
+
+def _send(url, method, body, headers):
+    data = body.encode() if isinstance(body, str) else body
+    request = urllib.request.Request(
+        url, data=data, headers=dict(headers or {}), method=method
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, dict(error.headers), error.read()
+
+
+async def fetch(url, method="GET", body=None, headers=None):
+    status, response_headers, content = await asyncio.to_thread(
+        _send, url, method, body, headers
+    )
+    return Response(content, status=status, headers=response_headers)
@@ -0,0 +1,190 @@
+"""
+Buffered analytics for the Agent Network API.
+
+Handlers record events into an in-isolate buffer without touching KV.
+The entrypoint flushes the buffer off the response path (ctx.waitUntil),
+writing all pending events as one batch key (with its per-hour counts
+as metadata, for rollups.py; high-volume events are sampled, see
+retention.py), raw records (auth attempts)
+concurrently, and one sharded counter write per distinct counter key
+(see counters.py).
+
+Before: every log_analytics() call cost 3 serial KV round-trips on the
+response path (put event, get counter, put counter).
+After: recording is free; a flush costs 1 + records + distinct counters
+puts, issued concurrently after the response is sent.
+
+Event batches are coalesced: an isolate writes its batch once it is
+`batch_interval` seconds old or holds MAX_BATCH_EVENTS events, not on
+every request, so the number of batches the cron has to compact follows
+the number of busy isolates rather than the request rate. Records and
+counters are still written on every flush. Events buffered in an isolate
+that is evicted before its batch is written are lost from the rollups
+(the daily counters still have them).
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+
+from counters import ShardedCounters
+from retention import DEFAULT_RETENTION, Sampler, ttl_options
+from utils import (
+    generate_id,
+    get_date,
+    get_timestamp,
+    log_failure,
+)
+
+# Event batches are written here and read back by rollups.py and
+# archive.py, which are only needed by the cron trigger and admin
+# queries, so the batch format lives with the writer and they import it
+EVENT_PREFIX = "event:"
+
+# Length of the "YYYY-MM-DDTHH" prefix of ISO timestamps
+HOUR_LENGTH = 13
+
+# KV metadata is limited to 1024 bytes
+MAX_METADATA_SIZE = 1000
+
+# An isolate writes its event batch at most this often (seconds), unless
+# the batch fills up first
+BATCH_INTERVAL = 10
+MAX_BATCH_EVENTS = 500
+
+
+def batch_metadata(hours: dict):
+    """Key metadata for an event batch, or None if it would be too large."""
+    metadata = {"hours": hours}
+    encoded = json.dumps(metadata, separators=(",", ":")).encode()
+    if len(encoded) > MAX_METADATA_SIZE:
+        return None
+    return metadata
+
+
+class AnalyticsBuffer:
+    """Collects analytics events, raw records and counter deltas."""
+
+    def __init__(
+        self,
+        counters: ShardedCounters = None,
+        sampler: Sampler = None,
+        retention: dict = None,
+        batch_interval: float = BATCH_INTERVAL,
+        clock=time.time,
+    ):
+        self.counters = counters or ShardedCounters()
+        self.sampler = sampler or Sampler()
+        self.retention = retention or DEFAULT_RETENTION
+        self.batch_interval = batch_interval
+        self._clock = clock
+        self._events = []
+        self._hours = {}
+        self._batch_started = None
+        self._batch_size = 0
+        self._records = []
+        self._counters = Counter()
+
+    @property
+    def pending(self) -> bool:
+        """True when there is anything due to be flushed."""
+        return bool(self._records or self._counters) or self.batch_due()
+
+    def batch_due(self) -> bool:
+        """True when the open event batch is old or full enough to write."""
+        return bool(self._hours) and (
+            self._batch_size >= MAX_BATCH_EVENTS
+            or self._clock() - self._batch_started >= self.batch_interval
+        )
+
+    def record(self, event_type: str, data: dict, count: int = 1):
+        """
+        Count an analytics event (daily counter and hourly batch counts)
+        and buffer it for the raw event log if the sampler keeps it.
+        `count` records one event standing for several (e.g. a batch).
+        """
+        timestamp = get_timestamp()
+        hour = timestamp[:HOUR_LENGTH]
+        if not self._hours:
+            self._batch_started = self._clock()
+        self._batch_size += 1
+        counts = self._hours.get(hour)
+        if counts is None:
+            counts = self._hours[hour] = Counter()
+        counts[event_type] += count
+        self._counters[f"counter:{event_type}:{get_date()}"] += count
+
+        rate = self.sampler.sample(event_type)
+        if rate is None:
+            return
+        event = {"type": event_type, "timestamp": timestamp, "data": data}
+        if count != 1:
+            event["count"] = count
+        if rate < 1:
+            event["sample_rate"] = rate
+        self._events.append(event)
+
+    def record_put(
+        self, key: str, value: str, metadata: dict = None, family: str = None
+    ):
+        """
+        Buffer a raw KV write (e.g. an auth attempt log entry); `family`
+        names its retention policy.
+        """
+        ttl = self.retention.get(family) if family else None
+        self._records.append((key, value, metadata, ttl))
+
+    def drain(
+        self, force: bool = False
+    ) -> tuple[list, dict, list, Counter]:
+        """
+        Take the buffered records and counters, and the event batch if it
+        is due (or `force` is set), and reset what was taken.
+
+        The swap happens before any await, so requests that record while
+        a flush is in flight land in the next batch instead of being lost.
+        """
+        events, hours = [], {}
+        if force or self.batch_due():
+            events, hours = self._events, self._hours
+            self._events, self._hours = [], {}
+            self._batch_size = 0
+        drained = events, hours, self._records, self._counters
+        self._records, self._counters = [], Counter()
+        return drained
+
+    async def flush(self, store, force: bool = False):
+        """
+        Write buffered analytics to `store` (the AGENT_EVENTS binding),
+        including the event batch when it is due or `force` is set.
+        """
+        events, hours, records, counters = self.drain(force)
+
+        ops = []
+        if hours:
+            # Counts cover sampled-out events too, for rollups
+            hours = {hour: dict(counts) for hour, counts in hours.items()}
+            ops.append(
+                store.put(
+                    f"{EVENT_PREFIX}{generate_id()}",
+                    json.dumps({"hours": hours, "events": events}),
+                    metadata=batch_metadata(hours),
+                    **ttl_options(self.retention["event"]),
+                )
+            )
+        for key, value, metadata, ttl in records:
+            ops.append(
+                store.put(key, value, metadata=metadata, **ttl_options(ttl))
+            )
+        if counters:
+            ops.append(
+                self.counters.apply(
+                    store, counters, ttl=self.retention["counter"]
+                )
+            )
+
+        results = await asyncio.gather(*ops, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                log_failure("analytics_flush", result)
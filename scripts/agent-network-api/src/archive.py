@@ -0,0 +1,71 @@
+"""
+Archive of raw analytics events in AGENT_EVENTS.
+
+Before compaction deletes settled event batches (rollups.compact_events),
+their events are packed into one segment per hour:
+
+    archive:{YYYY-MM-DDTHH}:{id of the first batch}
+
+A segment is gzip-compressed NDJSON, one event per line in batch order.
+Its event count and sizes travel as key metadata, so listing
+`archive:2025-01-28` describes a day's segments without reading them.
+Segments expire after the "archive" retention (see retention.py).
+
+Raw batches cost one key and about 100 bytes of JSON per event. A
+segment stores an hour of a compaction run's events under a single key,
+at roughly a tenth of the size.
+"""
+
+import gzip
+import json
+
+from analytics import EVENT_PREFIX, HOUR_LENGTH
+
+SEGMENT_PREFIX = "archive:"
+GZIP_LEVEL = 9
+
+_encoder = json.JSONEncoder(
+    separators=(",", ":"), ensure_ascii=False, default=str
+)
+
+
+def segment_key(hour: str, batch_name: str) -> str:
+    return f"{SEGMENT_PREFIX}{hour}:{batch_name[len(EVENT_PREFIX):]}"
+
+
+def build_segments(batches) -> list:
+    """
+    Pack [(batch_name, events)] into [(key, data, metadata)], one segment
+    per hour. Batches are expected oldest first.
+    """
+    hours = {}
+    for name, events in batches:
+        for event in events:
+            hour = event["timestamp"][:HOUR_LENGTH]
+            segment = hours.get(hour)
+            if segment is None:
+                segment = hours[hour] = {"first": name, "lines": []}
+            segment["lines"].append(_encoder.encode(event))
+
+    segments = []
+    for hour, segment in sorted(hours.items()):
+        raw = ("\n".join(segment["lines"]) + "\n").encode()
+        data = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+        segments.append(
+            (
+                segment_key(hour, segment["first"]),
+                data,
+                {
+                    "events": len(segment["lines"]),
+                    "bytes": len(data),
+                    "raw_bytes": len(raw),
+                },
+            )
+        )
+    return segments
+
+
+def read_segment(data: bytes) -> list:
+    """Events stored in a segment."""
+    text = gzip.decompress(bytes(data)).decode()
+    return [json.loads(line) for line in text.splitlines() if line]
@@ -0,0 +1,170 @@
+"""
+Authentication attempt log for the Agent Network API.
+
+Attempts are written to AGENT_EVENTS as `auth_log:{reverse_id}`, where
+the ID's timestamp counts down (utils.generate_reverse_id). KV lists keys
+in ascending order, so a plain prefix list returns the newest attempts
+first and the admin listing never has to read the whole log.
+
+Each key also carries the entry's summary fields as KV metadata, so a
+single list call returns renderable rows: a page costs one list call
+instead of one get per attempt. The full record is fetched on demand via
+get_auth_attempt. Text fields are cut to a UTF-8 byte budget; entries
+without metadata (written before it was added, or whose summary would
+exceed KV's limit) fall back to a get, with bounded concurrency.
+
+Pages are driven by KV's own list cursor and list at most `limit` keys,
+so the cost of a page depends on the page size, not on how large the log
+is. Filters are applied to the rows; a filtered page may hold fewer than
+`limit` rows, with `has_more` telling the caller to continue.
+"""
+
+import json
+
+from utils import (
+    MAX_CONCURRENT_KV,
+    bounded_map,
+    generate_reverse_id,
+    get_timestamp,
+    key_metadata,
+    public_key_digest,
+)
+
+AUTH_LOG_PREFIX = "auth_log:"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# List calls per page when filters discard most entries
+MAX_SCANS_PER_PAGE = 4
+
+# KV metadata is limited to 1024 bytes; text fields are cut to
+# MAX_METADATA_TEXT bytes to stay well under it
+MAX_METADATA_TEXT = 128
+MAX_METADATA_BYTES = 1000
+SUMMARY_FIELDS = (
+    "timestamp",
+    "success",
+    "reason",
+    "purpose",
+    "public_key_hash",
+    "agent_id",
+)
+
+
+def build_auth_attempt(
+    request_data: dict, success: bool, reason: str = None
+) -> tuple:
+    """Return the (key, entry) for an auth attempt log record."""
+    entry = {
+        "timestamp": get_timestamp(),
+        "public_key_hash": public_key_digest(
+            request_data.get("public_key")
+        )[:16],
+        "purpose": request_data.get("purpose", "unknown"),
+        "success": success,
+        "reason": reason,
+        "agent_id": request_data.get("agent_id"),
+    }
+    return f"{AUTH_LOG_PREFIX}{generate_reverse_id()}", entry
+
+
+def truncate_bytes(text: str, limit: int) -> str:
+    """Cut `text` to at most `limit` UTF-8 bytes, on a character boundary."""
+    encoded = text.encode()
+    if len(encoded) <= limit:
+        return text
+    return encoded[:limit].decode(errors="ignore")
+
+
+def auth_attempt_metadata(entry: dict):
+    """
+    Summary fields stored as key metadata (long text is truncated), or
+    None if they would still exceed KV's metadata limit; such entries are
+    read with a get instead.
+    """
+    metadata = {}
+    for field in SUMMARY_FIELDS:
+        value = entry.get(field)
+        if isinstance(value, str):
+            value = truncate_bytes(value, MAX_METADATA_TEXT)
+        metadata[field] = value
+    encoded = json.dumps(metadata, ensure_ascii=False).encode()
+    if len(encoded) > MAX_METADATA_BYTES:
+        return None
+    return metadata
+
+
+def _matches(entry: dict, filters: dict) -> bool:
+    return all(entry.get(field) == value for field, value in filters.items())
+
+
+async def list_auth_attempts(
+    store,
+    cursor: str = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    filters: dict = None,
+) -> dict:
+    """
+    Return one page of auth attempt summaries, newest first.
+
+    `filters` maps summary fields (success, reason, agent_id) to the
+    value they must equal. `next_cursor` is an opaque KV list cursor.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    filters = filters or {}
+    attempts = []
+    scans = 0
+    while len(attempts) < limit and scans < MAX_SCANS_PER_PAGE:
+        result = await store.list(
+            prefix=AUTH_LOG_PREFIX, cursor=cursor, limit=limit - len(attempts)
+        )
+        scans += 1
+
+        rows = []
+        missing = []
+        for key in result.keys:
+            metadata = key_metadata(key)
+            if metadata is None:
+                missing.append(key.name)
+            rows.append((key.name, metadata))
+        if missing:
+            bodies = await bounded_map(
+                store.get, missing, MAX_CONCURRENT_KV
+            )
+            fetched = dict(zip(missing, bodies))
+            rows = [
+                (name, row if row is not None else _parse(fetched[name]))
+                for name, row in rows
+            ]
+
+        for name, row in rows:
+            # Entries can expire between the list and the get
+            if row is not None and _matches(row, filters):
+                attempts.append(
+                    {"id": name[len(AUTH_LOG_PREFIX):], **_summary(row)}
+                )
+        cursor = None if result.list_complete else result.cursor
+        if cursor is None:
+            break
+
+    return {
+        "auth_attempts": attempts,
+        "total": len(attempts),
+        "next_cursor": cursor,
+        "has_more": cursor is not None,
+    }
+
+
+async def get_auth_attempt(store, attempt_id: str):
+    """Fetch the full record for one auth attempt, or None."""
+    body = await store.get(f"{AUTH_LOG_PREFIX}{attempt_id}")
+    return json.loads(body) if body else None
+
+
+def _parse(body):
+    return json.loads(body) if body else None
+
+
+def _summary(entry: dict) -> dict:
+    return {field: entry.get(field) for field in SUMMARY_FIELDS}
@@ -0,0 +1,55 @@
+"""
+Auth request (CIBA) polling support for the Agent Network API.
+
+Agents that cannot receive callbacks poll GET /api/v2/agent/auth/{id}.
+Pending responses tell them how long to wait (`interval` and a
+Retry-After header), and PollThrottle answers polls that arrive too
+early with a CIBA-style `slow_down` error straight from the isolate,
+without touching KV.
+"""
+
+import time
+from collections import OrderedDict
+
+# Seconds agents should wait between polls
+POLL_INTERVAL = 5
+
+# Polls closer together than this are rejected with slow_down
+MIN_POLL_SPACING = POLL_INTERVAL - 1
+
+MAX_TRACKED_REQUESTS = 4096
+
+
+class PollThrottle:
+    """Remembers the last poll per auth request in this isolate."""
+
+    def __init__(
+        self,
+        min_spacing: float = MIN_POLL_SPACING,
+        max_size: int = MAX_TRACKED_REQUESTS,
+        clock=time.time,
+    ):
+        self.min_spacing = min_spacing
+        self.max_size = max_size
+        self._clock = clock
+        self._last_poll = OrderedDict()
+
+    def check(self, auth_request_id: str) -> int:
+        """
+        Record a poll. Returns 0 if it may proceed, otherwise the number
+        of seconds the agent should wait before polling again.
+        """
+        now = self._clock()
+        last = self._last_poll.get(auth_request_id)
+        if last is not None and now - last < self.min_spacing:
+            return max(1, round(self.min_spacing - (now - last)))
+
+        self._last_poll[auth_request_id] = now
+        self._last_poll.move_to_end(auth_request_id)
+        while len(self._last_poll) > self.max_size:
+            self._last_poll.popitem(last=False)
+        return 0
+
+    def forget(self, auth_request_id: str):
+        """Stop tracking a request that is no longer pending."""
+        self._last_poll.pop(auth_request_id, None)
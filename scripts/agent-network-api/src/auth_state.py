@@ -0,0 +1,254 @@
+"""
+Auth request state machine for the Agent Network API.
+
+An auth request moves pending -> approved | denied | expired, exactly
+once. Every transition for a given request goes through one coordinator,
+the single writer for that request's state, so concurrent polls or admin
+clicks cannot mint more than one token:
+
+- AuthRequestCoordinator serializes transitions per request with a lock
+  and keeps the authoritative record in memory. Used as-is it is the
+  in-process stand-in (tests, `wrangler dev`, deployments without the
+  Durable Object binding); inside AuthRequestObject (see main.py) each
+  instance owns a single request, which makes it single-writer across
+  isolates, and decisions are persisted to the object's storage.
+- DurableObjectCoordinator has the same interface and forwards
+  transitions to the AUTH_REQUESTS Durable Object namespace.
+
+The coordinator writes decided records to `auth_request:{id}` in
+AGENT_AUTH, which stays the read path: once a request is decided a poll
+is a single KV get and never reaches the coordinator. Poll counts for the
+mock auto-approval only live in coordinator memory.
+
+With durable `storage` (a Durable Object's strongly consistent
+ctx.storage), a decision is stored there before it is written to KV, and
+records are loaded from it before KV. KV is then only a read replica: a
+coordinator that was evicted and reloads never sees a stale `pending`
+record from KV, so a repeated approval cannot mint a second token. After
+a reload, a decided record is copied to KV again (with the same token)
+in case the previous instance failed to replicate it.
+"""
+
+import asyncio
+import json
+import secrets
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple
+
+from token_cache import TOKEN_TTL
+from utils import get_timestamp, kv_ttl
+
+AUTH_REQUEST_PREFIX = "auth_request:"
+AUTH_REQUEST_TTL = 3600
+
+PENDING = "pending"
+APPROVED = "approved"
+DENIED = "denied"
+EXPIRED = "expired"
+
+# Mock behaviour: approve after this many polls (None disables it)
+AUTO_APPROVE_POLLS = 3
+
+MAX_CACHED_RECORDS = 4096
+
+# Event -> the state it moves a pending request to
+EVENT_TARGETS = {"approve": APPROVED, "deny": DENIED}
+
+
+class Outcome(NamedTuple):
+    """Result of a transition; `error` is "not_found" or "conflict"."""
+
+    record: dict = None
+    changed: bool = False
+    error: str = None
+
+
+def request_expiry(record: dict) -> float:
+    """Epoch expiry of an auth request record."""
+    if record.get("expires_at"):
+        return float(record["expires_at"])
+    # Requests created before expires_at was recorded
+    created = datetime.fromisoformat(record["created_at"])
+    return created.timestamp() + AUTH_REQUEST_TTL
+
+
+class AuthRequestCoordinator:
+    """Single writer for auth request state (in-process stand-in)."""
+
+    def __init__(
+        self,
+        store,
+        auto_approve_polls: int = AUTO_APPROVE_POLLS,
+        max_records: int = MAX_CACHED_RECORDS,
+        clock=time.time,
+        storage=None,
+    ):
+        self.store = store
+        self.storage = storage
+        self.auto_approve_polls = auto_approve_polls
+        self.max_records = max_records
+        self._clock = clock
+        self._records = OrderedDict()
+        self._polls = {}
+        self._unreplicated = set()
+        self._locks = weakref.WeakValueDictionary()
+
+    def _lock(self, auth_request_id: str) -> asyncio.Lock:
+        lock = self._locks.get(auth_request_id)
+        if lock is None:
+            lock = self._locks[auth_request_id] = asyncio.Lock()
+        return lock
+
+    async def transition(
+        self, auth_request_id: str, event: str, store=None
+    ) -> Outcome:
+        """
+        Apply "poll", "approve" or "deny" to an auth request. `store`
+        overrides the KV binding for this call (e.g. a per-request
+        instrumented binding).
+        """
+        store = store or self.store
+        # Held in a local so the WeakValueDictionary entry outlives waiters
+        lock = self._lock(auth_request_id)
+        async with lock:
+            outcome = await self._apply(store, auth_request_id, event)
+        if outcome.record is not None:
+            # Callers get a snapshot, not the live authoritative record
+            outcome = outcome._replace(record=dict(outcome.record))
+        return outcome
+
+    async def _apply(self, store, auth_request_id, event) -> Outcome:
+        record = await self._load(store, auth_request_id)
+        if record is None:
+            return Outcome(error="not_found")
+        if auth_request_id in self._unreplicated:
+            await self._replicate(store, record)
+
+        if record["status"] == PENDING and (
+            request_expiry(record) <= self._clock()
+        ):
+            await self._decide(store, record, EXPIRED)
+            return Outcome(record, changed=True)
+
+        if event == "poll":
+            return await self._poll(store, record)
+
+        target = EVENT_TARGETS[event]
+        if record["status"] == target:
+            return Outcome(record)  # idempotent repeat
+        if record["status"] != PENDING:
+            return Outcome(record, error="conflict")
+        await self._decide(store, record, target)
+        return Outcome(record, changed=True)
+
+    async def _poll(self, store, record: dict) -> Outcome:
+        if record["status"] != PENDING or self.auto_approve_polls is None:
+            return Outcome(record)
+        polls = self._polls.get(record["id"], 0) + 1
+        self._polls[record["id"]] = polls
+        if polls < self.auto_approve_polls:
+            return Outcome(record)
+        await self._decide(store, record, APPROVED)
+        return Outcome(record, changed=True)
+
+    async def _load(self, store, auth_request_id: str):
+        record = self._records.get(auth_request_id)
+        if record is not None:
+            self._records.move_to_end(auth_request_id)
+            return record
+        key = f"{AUTH_REQUEST_PREFIX}{auth_request_id}"
+        body = None
+        if self.storage is not None:
+            body = await self.storage.get(key)
+            if body:
+                self._unreplicated.add(auth_request_id)
+        if not body:
+            body = await store.get(key)
+        if not body:
+            return None
+        record = json.loads(body)
+        self._remember(record)
+        return record
+
+    def _remember(self, record: dict):
+        self._records[record["id"]] = record
+        self._records.move_to_end(record["id"])
+        while len(self._records) > self.max_records:
+            evicted, _ = self._records.popitem(last=False)
+            self._polls.pop(evicted, None)
+            self._unreplicated.discard(evicted)
+
+    async def _decide(self, store, record: dict, status: str):
+        """Move a pending record to `status` and persist it."""
+        decided = dict(record, status=status)
+        decided[f"{status}_at"] = get_timestamp()
+        if status == APPROVED:
+            decided["token"] = secrets.token_urlsafe(32)
+            decided["token_expires_at"] = self._clock() + TOKEN_TTL
+
+        if self.storage is None:
+            await self._replicate(store, decided)
+        else:
+            # Decided once stored; a failed KV write is retried on the
+            # next transition instead of deciding again
+            await self.storage.put(
+                f"{AUTH_REQUEST_PREFIX}{record['id']}", json.dumps(decided)
+            )
+            record.update(decided)
+            self._unreplicated.add(record["id"])
+            await self._replicate(store, record)
+
+        # Only visible once persisted; a failed write leaves it pending
+        record.update(decided)
+        self._polls.pop(record["id"], None)
+
+    async def _replicate(self, store, record: dict):
+        """Write a decided record (and its token) to KV."""
+        now = self._clock()
+        writes = []
+        if record.get("token"):
+            # Store token for validation
+            writes.append(
+                store.put(
+                    f"token:{record['token']}",
+                    json.dumps(
+                        {
+                            "auth_request_id": record["id"],
+                            "agent_id": record.get("agent_id"),
+                            "created_at": record["approved_at"],
+                            "expires_at": record["token_expires_at"],
+                        }
+                    ),
+                    expirationTtl=kv_ttl(record["token_expires_at"] - now),
+                )
+            )
+        writes.append(
+            store.put(
+                f"{AUTH_REQUEST_PREFIX}{record['id']}",
+                json.dumps(record),
+                expirationTtl=kv_ttl(request_expiry(record) - now),
+            )
+        )
+        await asyncio.gather(*writes)
+        self._unreplicated.discard(record["id"])
+
+
+class DurableObjectCoordinator:
+    """Forwards transitions to the AuthRequestObject for each request."""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    async def transition(
+        self, auth_request_id: str, event: str, store=None
+    ) -> Outcome:
+        stub = self.namespace.get(self.namespace.idFromName(auth_request_id))
+        response = await stub.fetch(
+            "https://auth-request/transition",
+            method="POST",
+            body=json.dumps({"id": auth_request_id, "event": event}),
+        )
+        return Outcome(**json.loads(await response.text()))
@@ -0,0 +1,181 @@
+"""
+Signed callback delivery for approved auth requests (CIBA push mode).
+
+When an auth request with a `callback_url` is approved, a callback job
+is delivered off the response path: a couple of quick attempts inside
+ctx.waitUntil, then, if the receiver is still failing, the job is stored
+as `callback_job:{id}` in AGENT_AUTH and retried with exponential
+backoff by the cron trigger (see Default.scheduled). Job state lives in
+key metadata, so the cron run lists jobs without reading each one.
+
+Payloads are signed with HMAC-SHA256 over "{timestamp}.{body}"; the
+receiver recomputes it with the shared secret and compares it with the
+X-Agent-Network-Signature header (format: "t={timestamp},v1={hex}").
+
+An agent that gave both an agent_id and a callback_url has the URL
+registered as `agent_callback:{agent_id}` on approval, for as long as
+its token lasts, so other events addressed to the agent (handoffs, see
+handoffs.py) are pushed to the same receiver. Only the key pair that
+owns the agent_id can register it (see peers.claim_agent_id).
+
+HTTP sending is injected (`send(url, body, headers) -> status`) so the
+module runs unchanged under tests with a local stub receiver.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+from utils import (
+    MAX_CONCURRENT_KV,
+    bounded_map,
+    generate_id,
+    key_metadata,
+)
+
+CALLBACK_JOB_PREFIX = "callback_job:"
+AGENT_CALLBACK_PREFIX = "agent_callback:"
+SIGNATURE_HEADER = "X-Agent-Network-Signature"
+
+# Attempts made inside waitUntil before handing the job to the cron
+IMMEDIATE_ATTEMPTS = 2
+IMMEDIATE_BACKOFF = 0.5
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+JOB_TTL = 86400
+
+
+def sign_payload(secret: str, body: str, timestamp: int) -> str:
+    """Signature header value for a callback body."""
+    digest = hmac.new(
+        secret.encode(), f"{timestamp}.{body}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(secret: str, body: str, header: str) -> bool:
+    """Receiver-side check of a signature header (used by tests/examples)."""
+    try:
+        parts = dict(part.split("=", 1) for part in header.split(","))
+        expected = sign_payload(secret, body, int(parts["t"]))
+    except (KeyError, ValueError):
+        return False
+    return hmac.compare_digest(expected, header)
+
+
+def backoff_delay(attempts: int) -> int:
+    """Seconds to wait after `attempts` failed deliveries."""
+    return min(BACKOFF_BASE * 2 ** max(attempts - 1, 0), BACKOFF_MAX)
+
+
+def build_job(url: str, payload: dict) -> dict:
+    """A callback job ready for its first delivery attempt."""
+    return {
+        "id": generate_id(),
+        "url": url,
+        "payload": payload,
+        "attempts": 0,
+        "next_attempt_at": time.time(),
+    }
+
+
+async def register_callback(store, agent_id: str, url: str, ttl: int):
+    """Record the callback URL of an approved agent."""
+    await store.put(
+        f"{AGENT_CALLBACK_PREFIX}{agent_id}", url, expirationTtl=ttl
+    )
+
+
+async def registered_callback(store, agent_id: str):
+    """The callback URL an agent registered, or None."""
+    return await store.get(f"{AGENT_CALLBACK_PREFIX}{agent_id}") or None
+
+
+async def attempt(job: dict, secret: str, send) -> bool:
+    """Make one delivery attempt; any 2xx response counts as delivered."""
+    body = json.dumps(job["payload"], separators=(",", ":"))
+    headers = {
+        "Content-Type": "application/json",
+        SIGNATURE_HEADER: sign_payload(secret, body, int(time.time())),
+    }
+    job["attempts"] += 1
+    try:
+        status = await send(job["url"], body, headers)
+    except Exception:
+        return False
+    return 200 <= status < 300
+
+
+async def save_job(store, job: dict):
+    """Persist a job for the cron to retry."""
+    await store.put(
+        f"{CALLBACK_JOB_PREFIX}{job['id']}",
+        json.dumps(job),
+        expirationTtl=JOB_TTL,
+        metadata={
+            "attempts": job["attempts"],
+            "next_attempt_at": job["next_attempt_at"],
+        },
+    )
+
+
+async def deliver(store, job: dict, secret: str, send, sleep=asyncio.sleep):
+    """
+    Deliver a new job from ctx.waitUntil: try a few times right away,
+    then leave it to the cron with exponential backoff.
+    """
+    for immediate in range(IMMEDIATE_ATTEMPTS):
+        if await attempt(job, secret, send):
+            return True
+        if immediate + 1 < IMMEDIATE_ATTEMPTS:
+            await sleep(IMMEDIATE_BACKOFF * 2**immediate)
+
+    job["next_attempt_at"] = time.time() + backoff_delay(job["attempts"])
+    await save_job(store, job)
+    return False
+
+
+async def process_due_jobs(store, secret: str, send, now: float = None):
+    """
+    Retry stored jobs whose backoff has elapsed (run from the cron).
+
+    Returns (delivered, rescheduled, abandoned) counts.
+    """
+    now = time.time() if now is None else now
+    due = []
+    cursor = None
+    while True:
+        result = await store.list(prefix=CALLBACK_JOB_PREFIX, cursor=cursor)
+        for key in result.keys:
+            metadata = key_metadata(key)
+            if not metadata or metadata["next_attempt_at"] <= now:
+                due.append(key.name)
+        if result.list_complete:
+            break
+        cursor = result.cursor
+
+    async def retry(name):
+        body = await store.get(name)
+        if not body:
+            return None
+        job = json.loads(body)
+        if await attempt(job, secret, send):
+            await store.delete(name)
+            return "delivered"
+        if job["attempts"] >= MAX_ATTEMPTS:
+            await store.delete(name)
+            return "abandoned"
+        job["next_attempt_at"] = now + backoff_delay(job["attempts"])
+        await save_job(store, job)
+        return "rescheduled"
+
+    outcomes = await bounded_map(retry, due, MAX_CONCURRENT_KV)
+    return (
+        outcomes.count("delivered"),
+        outcomes.count("rescheduled"),
+        outcomes.count("abandoned"),
+    )
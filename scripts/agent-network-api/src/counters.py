@@ -0,0 +1,106 @@
+"""
+Lossless daily counters for the Agent Network API.
+
+KV has no atomic increment, so a shared get/increment/put per counter
+loses updates whenever two isolates flush at the same time. Instead,
+each isolate owns its own set of shard keys and writes its cumulative
+total to them:
+
+    counter:{event_type}:{date}:{writer_id}.{shard}
+
+Only one writer ever touches a shard key, so no increments are lost.
+Flushes rotate through the shards so a busy isolate stays under KV's
+one-write-per-second-per-key limit. Totals of a day are only forgotten
+once a flush carries nothing older, so deltas recorded before midnight
+and flushed after it still add to that day's total. Readers list the counter prefix and
+sum every shard; counts travel as key metadata so a single list call
+returns them without per-key gets.
+"""
+
+import asyncio
+
+from retention import ttl_options
+from utils import generate_id, key_metadata
+
+DEFAULT_COUNTER_SHARDS = 4
+
+
+class ShardedCounters:
+    """Per-isolate writer for sharded cumulative counters."""
+
+    def __init__(self, shards: int = DEFAULT_COUNTER_SHARDS, writer_id=None):
+        self.shards = shards
+        self.writer_id = writer_id or generate_id()
+        self._totals = {}
+        self._next_shard = 0
+        self._lock = asyncio.Lock()
+
+    async def apply(self, store, deltas: dict, ttl: int = None):
+        """
+        Add counter deltas ({counter_key: delta}) and persist them, with
+        an optional expirationTtl (see retention.py).
+        """
+        if not deltas:
+            return
+
+        # One flush at a time per isolate keeps cumulative puts ordered
+        async with self._lock:
+            self._prune(min(_date(key) for key in deltas))
+            shard = self._next_shard % self.shards
+            self._next_shard = shard + 1
+
+            ops = []
+            for counter_key, delta in deltas.items():
+                slot = (counter_key, shard)
+                total = self._totals.get(slot, 0) + delta
+                self._totals[slot] = total
+                ops.append(
+                    store.put(
+                        f"{counter_key}:{self.writer_id}.{shard}",
+                        str(total),
+                        metadata={"count": total},
+                        **ttl_options(ttl),
+                    )
+                )
+            # A failed put is not lost: the next write to the same shard
+            # carries the cumulative total.
+            await asyncio.gather(*ops)
+
+    def _prune(self, oldest: str):
+        """Forget totals for days before `oldest`; their keys are final."""
+        stale = [slot for slot in self._totals if _date(slot[0]) < oldest]
+        for slot in stale:
+            del self._totals[slot]
+
+
+def _date(counter_key: str) -> str:
+    """The date of a `counter:{event_type}:{date}` key."""
+    return counter_key.rsplit(":", 1)[1]
+
+
+async def read_counter(store, counter_key: str) -> int:
+    """Sum every shard of a counter (plus any legacy unsharded key)."""
+    total = 0
+    cursor = None
+    while True:
+        result = await store.list(prefix=counter_key, cursor=cursor)
+        for key in result.keys:
+            metadata = key_metadata(key)
+            count = metadata.get("count") if metadata else None
+            if count is None:
+                value = await store.get(key.name)
+                count = int(value) if value else 0
+            total += count
+        if result.list_complete:
+            return total
+        cursor = result.cursor
+
+
+async def read_counters(store, event_types: list, date: str) -> dict:
+    """Read the daily counters for several event types concurrently."""
+    counts = await asyncio.gather(
+        *(read_counter(store, f"counter:{t}:{date}") for t in event_types)
+    )
+    return dict(zip(event_types, counts))
+
+
@@ -0,0 +1,399 @@
+"""
+Task handoffs for the Agent Network API.
+
+A handoff is stored at `handoff:{id}` in AGENT_MESSAGES, with a hash of
+the initiator's token (as for subscriptions), and expires after its TTL.
+It moves through three states:
+
+    initiated -> accepted (by one of its target agents)
+              -> completed (by the agent that accepted it)
+
+Creating a handoff costs one KV write, whatever the number of targets.
+Delivery happens after the response (ctx.waitUntil): each target gets a
+`task_handoff` message in its inbox (a message whose recipient is the
+target) and, when it registered a callback_url at approval, a signed
+callback (see callbacks.py). Targets are delivered concurrently, at most
+MAX_CONCURRENT_KV at a time. An inbox write that fails is retried
+right away, then by the cron trigger with backoff, as callbacks are; the
+message keeps its ID across attempts, so a retry never duplicates it.
+
+Each target's delivery outcome is kept at
+`handoff_delivery:{id}:{target}`, in key metadata, so the status
+endpoint reads all of them with a single list call. Each of those keys
+has one writer at a time: the fan-out, then the cron.
+
+Pending inbox retries are indexed separately, as
+`handoff_retry:{next_attempt_at}:{id}:{target}` holding the message, and
+deleted once they succeed or are abandoned. The cron lists only that
+prefix, in due order, so its cost follows the retries outstanding rather
+than the number of handoffs.
+
+As with questions, KV has no compare-and-set: two targets accepting
+through different isolates within KV's propagation delay can both
+succeed, and the later write wins.
+"""
+
+import asyncio
+import json
+import time
+from urllib.parse import quote
+
+from callbacks import (
+    MAX_ATTEMPTS,
+    backoff_delay,
+    build_job,
+    deliver,
+    registered_callback,
+)
+from messages import build_message, store_message
+from subscriptions import owner_key
+from utils import (
+    MAX_CONCURRENT_KV,
+    bounded_map,
+    generate_id,
+    get_timestamp,
+    key_metadata,
+    kv_ttl,
+    log_failure,
+)
+
+HANDOFF_PREFIX = "handoff:"
+DELIVERY_PREFIX = "handoff_delivery:"
+RETRY_PREFIX = "handoff_retry:"
+
+INITIATED = "initiated"
+ACCEPTED = "accepted"
+COMPLETED = "completed"
+
+HANDOFF_TTL = 7 * 86400
+MAX_TARGETS = 50
+MAX_RESULT_LENGTH = 4000
+
+# Inbox writes made inside waitUntil before handing them to the cron
+IMMEDIATE_ATTEMPTS = 3
+IMMEDIATE_BACKOFF = 0.25
+
+# Delivery states
+DELIVERED = "delivered"
+RETRYING = "retrying"
+FAILED = "failed"
+NO_CALLBACK = "none"
+
+TASK_FIELDS = (
+    "task_description",
+    "recipient_criteria",
+    "context_secret_key",
+    "priority",
+    "deadline",
+)
+
+
+def endpoints(handoff_id: str) -> dict:
+    base = f"/api/v2/agent/handoffs/{handoff_id}"
+    return {
+        "status_endpoint": base,
+        "accept_endpoint": f"{base}/accept",
+        "complete_endpoint": f"{base}/complete",
+    }
+
+
+def build_handoff(
+    body: dict, token: str, from_agent: str = None, now: float = None
+) -> dict:
+    """A new handoff from a validated request body (see schemas.py)."""
+    targets = body.get("target_agents") or [body["target_agent"]]
+    now = time.time() if now is None else now
+    created_at = get_timestamp()
+    return {
+        "handoff_id": generate_id(),
+        "status": INITIATED,
+        "from_agent": from_agent,
+        "owner": owner_key(token),
+        "target_agents": list(dict.fromkeys(targets)),
+        "task": {field: body[field] for field in TASK_FIELDS if field in body},
+        "created_at": created_at,
+        "updated_at": created_at,
+        "expires_at": int(now + HANDOFF_TTL),
+    }
+
+
+def public_view(handoff: dict) -> dict:
+    """The handoff as shown to its initiator and targets."""
+    return {key: value for key, value in handoff.items() if key != "owner"}
+
+
+def is_initiator(handoff: dict, token: str) -> bool:
+    return handoff["owner"] == owner_key(token)
+
+
+def accept_handoff(handoff: dict, agent_id: str) -> dict:
+    """`handoff` accepted by one of its targets."""
+    now = get_timestamp()
+    return {
+        **handoff,
+        "status": ACCEPTED,
+        "accepted_by": agent_id,
+        "accepted_at": now,
+        "updated_at": now,
+    }
+
+
+def complete_handoff(handoff: dict, result: str) -> dict:
+    """`handoff` completed by the agent that accepted it."""
+    now = get_timestamp()
+    return {
+        **handoff,
+        "status": COMPLETED,
+        "result": result,
+        "completed_at": now,
+        "updated_at": now,
+    }
+
+
+def _ttl(handoff: dict, now: float) -> int:
+    return kv_ttl(handoff["expires_at"] - now)
+
+
+async def save_handoff(store, handoff: dict, now: float = None):
+    now = time.time() if now is None else now
+    await store.put(
+        f"{HANDOFF_PREFIX}{handoff['handoff_id']}",
+        json.dumps(handoff),
+        expirationTtl=_ttl(handoff, now),
+    )
+
+
+async def load_handoff(store, handoff_id: str):
+    body = await store.get(f"{HANDOFF_PREFIX}{handoff_id}")
+    return json.loads(body) if body else None
+
+
+def handoff_message(handoff: dict, target: str, now: float = None) -> dict:
+    """The inbox message telling `target` about a handoff."""
+    now = time.time() if now is None else now
+    return build_message(
+        {
+            "content": {
+                "type": "task_handoff",
+                "handoff_id": handoff["handoff_id"],
+                "from_agent": handoff["from_agent"],
+                "payload": handoff["task"],
+                **endpoints(handoff["handoff_id"]),
+            },
+            "recipient": target,
+            "ttl": _ttl(handoff, now),
+        }
+    )
+
+
+def callback_payload(handoff: dict, target: str) -> dict:
+    return {
+        "event": "handoff.initiated",
+        "handoff_id": handoff["handoff_id"],
+        "target_agent": target,
+        "from_agent": handoff["from_agent"],
+        "task": handoff["task"],
+        **endpoints(handoff["handoff_id"]),
+    }
+
+
+def delivery_key(handoff_id: str, target: str) -> str:
+    # Escape ":" so one target's key never prefixes another's
+    return f"{DELIVERY_PREFIX}{handoff_id}:{quote(target, safe='')}"
+
+
+def retry_key(handoff_id: str, target: str, next_attempt_at: float) -> str:
+    # Zero-padded so keys list in due order
+    return (
+        f"{RETRY_PREFIX}{int(next_attempt_at):012d}:"
+        f"{handoff_id}:{quote(target, safe='')}"
+    )
+
+
+async def save_delivery(store, handoff_id: str, state: dict, ttl: int):
+    """Record a target's delivery state (as metadata, for listing)."""
+    await store.put(
+        delivery_key(handoff_id, state["target"]),
+        json.dumps(state),
+        expirationTtl=ttl,
+        metadata=state,
+    )
+
+
+async def schedule_retry(store, handoff_id: str, message: dict, state: dict):
+    """Index an inbox write for the cron to retry at next_attempt_at."""
+    await store.put(
+        retry_key(handoff_id, state["target"], state["next_attempt_at"]),
+        json.dumps(message),
+        expirationTtl=message["ttl"],
+        metadata=state,
+    )
+
+
+async def _write_inbox(store, message: dict, sleep) -> int:
+    """Attempts made; 0 when every immediate attempt failed."""
+    for immediate in range(IMMEDIATE_ATTEMPTS):
+        try:
+            await store_message(store, message)
+            return immediate + 1
+        except Exception as e:
+            log_failure("handoff_inbox_write", e, message_id=message["id"])
+        if immediate + 1 < IMMEDIATE_ATTEMPTS:
+            await sleep(IMMEDIATE_BACKOFF * 2**immediate)
+    return 0
+
+
+async def _callback(store, handoff: dict, target: str, secret, send, sleep):
+    url = await registered_callback(store, target)
+    if url is None:
+        return NO_CALLBACK
+    job = build_job(url, callback_payload(handoff, target))
+    delivered = await deliver(store, job, secret, send, sleep=sleep)
+    # Undelivered jobs are now the cron's (callbacks.process_due_jobs)
+    return DELIVERED if delivered else RETRYING
+
+
+async def deliver_to_target(
+    messages_store,
+    auth_store,
+    handoff: dict,
+    target: str,
+    secret: str,
+    send,
+    sleep=asyncio.sleep,
+) -> dict:
+    """Deliver a handoff to one target; returns its delivery state."""
+    message = handoff_message(handoff, target)
+    attempts, callback = await asyncio.gather(
+        _write_inbox(messages_store, message, sleep),
+        _callback(auth_store, handoff, target, secret, send, sleep),
+    )
+    state = {
+        "target": target,
+        "message_id": message["id"],
+        "callback": callback,
+    }
+    if attempts:
+        state.update(inbox=DELIVERED, attempts=attempts)
+    else:
+        state.update(
+            inbox=RETRYING,
+            attempts=IMMEDIATE_ATTEMPTS,
+            next_attempt_at=time.time() + backoff_delay(IMMEDIATE_ATTEMPTS),
+        )
+        await schedule_retry(
+            messages_store, handoff["handoff_id"], message, state
+        )
+    await save_delivery(
+        messages_store, handoff["handoff_id"], state, message["ttl"]
+    )
+    return state
+
+
+async def fan_out(
+    messages_store, auth_store, handoff: dict, secret: str, send, **kwargs
+) -> list:
+    """
+    Deliver a handoff to all of its targets concurrently (run from
+    ctx.waitUntil). Returns the targets' delivery states.
+    """
+
+    async def target_delivery(target):
+        try:
+            return await deliver_to_target(
+                messages_store,
+                auth_store,
+                handoff,
+                target,
+                secret,
+                send,
+                **kwargs,
+            )
+        except Exception as e:
+            # One target's failure must not stop the others
+            log_failure("handoff_delivery", e, target=target)
+            return {"target": target, "inbox": FAILED}
+
+    return await bounded_map(
+        target_delivery, handoff["target_agents"], MAX_CONCURRENT_KV
+    )
+
+
+async def load_deliveries(store, handoff_id: str) -> dict:
+    """Delivery states of a handoff by target, from one list call."""
+    deliveries = {}
+    cursor = None
+    while True:
+        result = await store.list(
+            prefix=f"{DELIVERY_PREFIX}{handoff_id}:", cursor=cursor
+        )
+        for key in result.keys:
+            state = key_metadata(key)
+            if state:
+                deliveries[state["target"]] = state
+        if result.list_complete:
+            return deliveries
+        cursor = result.cursor
+
+
+async def process_due_deliveries(store, now: float = None):
+    """
+    Retry inbox writes whose backoff has elapsed (run from the cron).
+
+    Returns (delivered, rescheduled, abandoned) counts.
+    """
+    now = time.time() if now is None else now
+    due = []
+    cursor = None
+    listing = True
+    while listing:
+        result = await store.list(prefix=RETRY_PREFIX, cursor=cursor)
+        for key in result.keys:
+            due_at = int(key.name[len(RETRY_PREFIX) :].split(":", 1)[0])
+            if due_at > now:
+                # Keys list in due order: the rest are not due either
+                listing = False
+                break
+            state = key_metadata(key)
+            if state:
+                due.append((key.name, state))
+        if result.list_complete:
+            break
+        cursor = result.cursor
+
+    async def retry(item):
+        name, state = item
+        body = await store.get(name)
+        if not body:
+            return None
+        message = json.loads(body)
+        handoff_id = name[len(RETRY_PREFIX) :].split(":")[1]
+        state = {**state, "attempts": state["attempts"] + 1}
+        try:
+            await store_message(store, message)
+        except Exception:
+            if state["attempts"] >= MAX_ATTEMPTS:
+                state["inbox"] = FAILED
+                del state["next_attempt_at"]
+                outcome = "abandoned"
+            else:
+                state["next_attempt_at"] = now + backoff_delay(
+                    state["attempts"]
+                )
+                # Index the next attempt before dropping this one
+                await schedule_retry(store, handoff_id, message, state)
+                outcome = "rescheduled"
+        else:
+            state["inbox"] = DELIVERED
+            del state["next_attempt_at"]
+            outcome = "delivered"
+        await save_delivery(store, handoff_id, state, message["ttl"])
+        await store.delete(name)
+        return outcome
+
+    outcomes = await bounded_map(retry, due, MAX_CONCURRENT_KV)
+    return (
+        outcomes.count("delivered"),
+        outcomes.count("rescheduled"),
+        outcomes.count("abandoned"),
+    )
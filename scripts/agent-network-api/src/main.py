@@ -12,86 +12,411 @@ Requires KV namespaces:
 - AGENT_EVENTS: Request analytics and auth tracking
 """
 
-import hashlib
+import asyncio
 import json
-import secrets
-from datetime import datetime, timezone
-
-from js import Headers
-from workers import Response, WorkerEntrypoint
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from js import Headers, Object, TransformStream, crypto
+from pyodide.ffi import to_js
+from workers import DurableObject, Response, WorkerEntrypoint, fetch
+
+from analytics import BATCH_INTERVAL, AnalyticsBuffer
+from auth_log import (
+    DEFAULT_PAGE_SIZE as AUTH_LOG_PAGE_SIZE,
+    auth_attempt_metadata,
+    build_auth_attempt,
+    get_auth_attempt,
+    list_auth_attempts,
+)
+from auth_requests import POLL_INTERVAL, PollThrottle
+from auth_state import (
+    APPROVED,
+    AUTH_REQUEST_PREFIX,
+    AUTH_REQUEST_TTL,
+    DENIED,
+    EXPIRED,
+    PENDING,
+    AuthRequestCoordinator,
+    DurableObjectCoordinator,
+    request_expiry,
+)
+from callbacks import (
+    build_job,
+    deliver,
+    process_due_jobs,
+    register_callback,
+)
+from counters import DEFAULT_COUNTER_SHARDS, read_counters
+from handoffs import (
+    ACCEPTED as HANDOFF_ACCEPTED,
+    INITIATED as HANDOFF_INITIATED,
+    accept_handoff,
+    build_handoff,
+    complete_handoff,
+    endpoints as handoff_endpoints,
+    fan_out,
+    is_initiator,
+    load_deliveries,
+    load_handoff,
+    process_due_deliveries,
+    public_view,
+    save_handoff,
+)
+from metrics import (
+    InstrumentedEnv,
+    MetricsRegistry,
+    collect,
+    prometheus_text,
+)
+from messages import (
+    DEFAULT_PAGE_SIZE,
+    build_message,
+    list_messages,
+    parse_cursor,
+    parse_since,
+    store_message,
+    store_messages,
+)
+from peers import (
+    PeerDirectory,
+    agent_id_available,
+    agent_owner,
+    build_peer,
+    claim_agent_id,
+    etag_matches,
+)
+from questions import (
+    PENDING as QUESTION_PENDING,
+    POLL_INTERVAL as QUESTION_POLL_INTERVAL,
+    StatusCache,
+    answer_status,
+    build_question,
+    load_question,
+    load_status,
+    save_question,
+    save_status,
+    status_etag,
+)
+from rate_limit import (
+    SPEC_RATE_LIMITS,
+    RateLimiter,
+    parse_rate_limits,
+    rate_limited,
+)
+from responses import StaticJSON, compress, encode_json, negotiate
+from retention import Sampler, parse_retention
+from router import Router
+from secret_store import (
+    BurnCoordinator,
+    DurableObjectBurnCoordinator,
+    SecretError,
+    as_buffer,
+    encrypt,
+    new_secret_key,
+    parse_secret,
+    reveal_secret,
+    secret_id,
+    store_secret,
+)
+from subscriptions import (
+    FORMATS as STREAM_FORMATS,
+    DurableObjectHub,
+    TopicHub,
+    build_subscription,
+    delete_subscription,
+    load_subscription,
+    run_stream,
+    save_subscription,
+)
+from token_cache import TOKEN_TTL, TokenCache, token_expiry
+from utils import (
+    MetadataEnv,
+    generate_id,
+    get_date,
+    get_timestamp,
+    log_failure,
+)
+from validation import body_limit, validator
+
+# Per-isolate analytics buffer, flushed off the response path after each
+# request (see Default.fetch).
+analytics = AnalyticsBuffer()
+
+# Per-isolate cache of validated bearer tokens (see validate_token)
+token_cache = TokenCache()
+
+# Per-isolate cache of question status records (see handle_question_poll)
+question_cache = StatusCache()
+
+# Per-isolate rate limiter, built on first use (see get_rate_limiter)
+_rate_limiter = None
+
+# Per-isolate retention policy, parsed on first use (see configure_analytics)
+_retention = None
+
+# In-process auth request coordinator (see get_auth_coordinator)
+_auth_coordinator = None
+
+# Per-isolate request metrics, flushed to AGENT_EVENTS periodically
+metrics = MetricsRegistry()
+KV_BINDINGS = ("AGENT_AUTH", "AGENT_MESSAGES", "AGENT_EVENTS")
+
+# Per-isolate snapshot of the peer registry
+peer_directory = PeerDirectory()
+
+# Per-isolate record of recent auth polls, for slow_down responses
+poll_throttle = PollThrottle()
+
+# In-process secret burn coordinator (see get_burn_coordinator)
+_burn_coordinator = None
+
+# In-process topic fan-out (see get_fanout)
+topic_hub = TopicHub()
+
+# Work scheduled by handlers to run after the response (see Default.fetch)
+deferred = []
 
 
 # Helper functions
-def json_response(data: dict, status: int = 200) -> Response:
+# Shared header sets; never mutated (copied when a response adds headers)
+JSON_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+}
+VARY_HEADERS = {**JSON_HEADERS, "Vary": "Accept-Encoding"}
+
+
+def json_response(
+    data: dict, status: int = 200, headers: dict = None
+) -> Response:
     """Create a JSON response with proper headers including CORS."""
-    return Response(
-        json.dumps(data, default=str),
-        status=status,
-        headers={
-            "Content-Type": "application/json",
+    return json_body_response(encode_json(data), status, headers)
+
+
+def json_body_response(
+    body, status: int = 200, headers: dict = None
+) -> Response:
+    """Response for an already encoded JSON body (None for no body)."""
+    response_headers = {**JSON_HEADERS, **headers} if headers else JSON_HEADERS
+    return Response(body, status=status, headers=response_headers)
+
+
+async def read_body(request, schema: str):
+    """
+    (body, None) for a JSON body valid against a request schema (see
+    schemas.py), else (None, error response). Oversized bodies are
+    rejected before they are parsed.
+    """
+    limit = body_limit(schema)
+    length = request.headers.get("Content-Length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        return None, body_too_large(limit)
+    text = await request.text()
+    # Limits are in UTF-8 bytes; a text is never longer in characters, so
+    # the character count rules out most oversized bodies without encoding
+    if len(text) > limit or len(text.encode()) > limit:
+        return None, body_too_large(limit)
+    try:
+        body = json.loads(text)
+    except ValueError:
+        return None, json_response({"error": "Invalid JSON body"}, 400)
+    errors = validator(schema)(body)
+    if errors:
+        return None, json_response(
+            {"error": "Invalid request body", "details": errors}, 400
+        )
+    return body, None
+
+
+def body_too_large(limit: int) -> Response:
+    return json_response(
+        {"error": "Request body too large", "max_bytes": limit}, 413
+    )
+
+
+def list_response(request, env, data: dict) -> Response:
+    """
+    JSON response for potentially large listings, compressed when
+    COMPRESS_RESPONSES is enabled and the client accepts it.
+    """
+    body = encode_json(data)
+    if getattr(env, "COMPRESS_RESPONSES", "false") != "true":
+        return json_body_response(body)
+
+    encoded = body.encode()
+    coding = negotiate(request.headers.get("Accept-Encoding"), len(encoded))
+    if coding is None:
+        return json_body_response(body, headers=VARY_HEADERS)
+    headers = Headers.new({**VARY_HEADERS, "Content-Encoding": coding}.items())
+    # Already encoded: stop the runtime from compressing it again
+    return Response.new(
+        to_js(compress(encoded, coding)),
+        status=200,
+        headers=headers,
+        encodeBody="manual",
+    )
+
+
+def stream_response(fmt: str, run) -> tuple:
+    """
+    A streaming response and the coroutine that writes its body:
+    `run(send)` is awaited with an async `send(text)`. The caller keeps
+    the coroutine running (ctx.waitUntil) while the client reads.
+    """
+    stream = TransformStream.new()
+    writer = stream.writable.getWriter()
+
+    async def send(text: str):
+        await writer.write(to_js(text.encode()))
+
+    async def pump():
+        try:
+            await run(send)
+        except Exception:
+            pass  # The client disconnected
+        finally:
+            try:
+                await writer.close()
+            except Exception:
+                pass
+
+    headers = Headers.new(
+        {
+            "Content-Type": STREAM_FORMATS[fmt],
+            "Cache-Control": "no-cache",
             "Access-Control-Allow-Origin": "*",
-        },
+        }.items()
     )
+    return Response.new(stream.readable, status=200, headers=headers), pump()
 
 
-def generate_id() -> str:
-    """Generate a unique ID (mock UUIDv7-like)."""
-    timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
-    random_part = secrets.token_hex(8)
-    return f"{timestamp:012x}-{random_part}"
+def get_query_params(request) -> dict:
+    """Parse the request's query string (last value wins)."""
+    return dict(parse_qsl(urlsplit(request.url).query))
 
 
-def get_timestamp() -> str:
-    """Get ISO 8601 timestamp."""
-    return datetime.now(timezone.utc).isoformat()
+def get_rate_limiter(env) -> RateLimiter:
+    """Build the isolate's rate limiter from RATE_LIMITS or the spec."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        override = getattr(env, "RATE_LIMITS", None)
+        spec = json.loads(override) if override else SPEC_RATE_LIMITS
+        _rate_limiter = RateLimiter(parse_rate_limits(spec))
+    return _rate_limiter
 
 
-async def log_analytics(env, event_type: str, data: dict):
-    """Log an analytics event to KV."""
-    analytics_key = f"event:{generate_id()}"
-    event = {"type": event_type, "timestamp": get_timestamp(), "data": data}
-    await env.AGENT_EVENTS.put(analytics_key, json.dumps(event))
+def js_object(value):
+    """A dict (nested dicts and lists included) as a JS object."""
+    return to_js(value, dict_converter=Object.fromEntries)
 
-    # Update counters
-    counter_key = f"counter:{event_type}:{datetime.now(timezone.utc).strftime('%Y-%m-%d')}"
-    try:
-        current = await env.AGENT_EVENTS.get(counter_key)
-        count = int(current) + 1 if current else 1
-    except Exception:
-        count = 1
-    await env.AGENT_EVENTS.put(counter_key, str(count))
+
+def kv_env(env):
+    """`env` with KV metadata converted to JS objects on every put."""
+    return MetadataEnv(env, js_object, KV_BINDINGS)
+
+
+def configure_analytics(env) -> dict:
+    """
+    Apply RETENTION_DAYS and EVENT_SAMPLE_RATES (JSON, optional),
+    COUNTER_SHARDS and ANALYTICS_BATCH_INTERVAL to the isolate's analytics
+    buffer, once per isolate. Returns the retention policy.
+    """
+    global _retention
+    if _retention is None:
+        override = getattr(env, "RETENTION_DAYS", None)
+        _retention = parse_retention(
+            json.loads(override) if override else None
+        )
+        rates = getattr(env, "EVENT_SAMPLE_RATES", None)
+        analytics.sampler = Sampler(json.loads(rates) if rates else None)
+        analytics.retention = _retention
+        analytics.counters.shards = int(
+            getattr(env, "COUNTER_SHARDS", DEFAULT_COUNTER_SHARDS)
+        )
+        analytics.batch_interval = float(
+            getattr(env, "ANALYTICS_BATCH_INTERVAL", BATCH_INTERVAL)
+        )
+    return _retention
+
+
+def bearer_token(request):
+    """Return the Bearer token from the Authorization header, if any."""
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    return auth_header[7:]  # Remove "Bearer " prefix
+
+
+def is_admin(request, env) -> bool:
+    """Check the X-Admin-Key header against the configured admin key."""
+    # WARNING: This is a mock/demo admin key - NOT for production use.
+    # In production, use environment variables or proper secret management.
+    expected_admin_key = getattr(env, "ADMIN_KEY", "mock-admin-key")
+    return request.headers.get("X-Admin-Key") == expected_admin_key
+
+
+def get_callback_secret(env) -> str:
+    """Shared secret used to sign auth callbacks."""
+    # WARNING: mock default - set CALLBACK_SIGNING_KEY as a secret.
+    return getattr(env, "CALLBACK_SIGNING_KEY", "mock-callback-signing-key")
+
+
+async def http_post(url: str, body: str, headers: dict) -> int:
+    """POST a body to an external URL and return the response status."""
+    response = await fetch(url, method="POST", body=body, headers=headers)
+    return response.status
+
+
+def log_analytics(event_type: str, data: dict, count: int = 1):
+    """Buffer an analytics event; written to KV when the buffer flushes."""
+    analytics.record(event_type, data, count)
 
 
-async def log_auth_attempt(
-    env, request_data: dict, success: bool, reason: str = None
-):
+def log_auth_attempt(request_data: dict, success: bool, reason: str = None):
     """Log authentication attempt for tracking."""
-    auth_log_key = f"auth_attempt:{generate_id()}"
-    log_entry = {
-        "timestamp": get_timestamp(),
-        "public_key_hash": hashlib.sha256(
-            request_data.get("public_key", "").encode()
-        ).hexdigest()[:16],
-        "purpose": request_data.get("purpose", "unknown"),
-        "success": success,
-        "reason": reason,
-        "agent_id": request_data.get("agent_id"),
-    }
-    await env.AGENT_EVENTS.put(auth_log_key, json.dumps(log_entry))
-    await log_analytics(env, "auth_attempt", {"success": success})
+    auth_log_key, log_entry = build_auth_attempt(request_data, success, reason)
+    analytics.record_put(
+        auth_log_key,
+        json.dumps(log_entry),
+        metadata=auth_attempt_metadata(log_entry),
+        family="auth_log",
+    )
+    log_analytics("auth_attempt", {"success": success})
 
 
 # Route handlers
+def defer(coro):
+    """Run a coroutine after the response is sent (via ctx.waitUntil)."""
+    deferred.append(coro)
+
+
+def valid_callback_url(callback_url) -> bool:
+    """Callbacks are only delivered to absolute http(s) URLs."""
+    if not isinstance(callback_url, str):
+        return False
+    parts = urlsplit(callback_url)
+    return parts.scheme in ("http", "https") and bool(parts.netloc)
+
+
+def record_heartbeat(env, token: str):
+    """Refresh the caller's peer entry, at most once a minute per isolate."""
+    agent_id = token_cache.subject(token)
+    if agent_id and peer_directory.heartbeat_due(agent_id):
+        defer(peer_directory.heartbeat(env.AGENT_AUTH, agent_id))
+
+
 async def handle_auth_request(request, env):
     """
     POST /api/v2/agent/auth
     CIBA flow: Agent registers keypair and purpose.
-    Returns auth_request_id for polling.
+    Returns auth_request_id for polling, or delivers the result to
+    callback_url when one is given.
     """
     try:
         body = await request.json()
     except Exception:
-        await log_auth_attempt(env, {}, False, "invalid_json")
+        log_auth_attempt({}, False, "invalid_json")
         return json_response({"error": "Invalid JSON body"}, 400)
 
     public_key = body.get("public_key")
@@ -99,11 +424,34 @@ async def handle_auth_request(request, env):
     callback_url = body.get("callback_url")
 
     if not public_key or not purpose:
-        await log_auth_attempt(env, body, False, "missing_fields")
+        log_auth_attempt(body, False, "missing_fields")
         return json_response(
             {"error": "Missing required fields: public_key, purpose"}, 400
         )
 
+    if callback_url is not None and not valid_callback_url(callback_url):
+        log_auth_attempt(body, False, "invalid_callback_url")
+        return json_response(
+            {"error": "callback_url must be an absolute http(s) URL"}, 400
+        )
+
+    agent_id = body.get("agent_id")
+    peer = None
+    if agent_id is not None:
+        try:
+            peer = build_peer(agent_id, body)
+        except ValueError as e:
+            log_auth_attempt(body, False, "invalid_agent_details")
+            return json_response({"error": str(e)}, 400)
+        if not await agent_id_available(
+            env.AGENT_AUTH, agent_id, agent_owner(public_key)
+        ):
+            log_auth_attempt(body, False, "agent_id_taken")
+            return json_response(
+                {"error": "agent_id is registered to another public key"},
+                409,
+            )
+
     auth_request_id = generate_id()
 
     # Store auth request
@@ -112,155 +460,312 @@ async def handle_auth_request(request, env):
         "public_key": public_key,
         "purpose": purpose,
         "callback_url": callback_url,
-        "status": "pending",
+        "agent_id": agent_id,
+        # Registered in the peer directory on approval
+        "peer": peer,
+        "status": PENDING,
         "created_at": get_timestamp(),
-        "expires_at": None,  # Would be set in real implementation
+        "expires_at": time.time() + AUTH_REQUEST_TTL,
     }
     await env.AGENT_AUTH.put(
-        f"auth_request:{auth_request_id}",
+        f"{AUTH_REQUEST_PREFIX}{auth_request_id}",
         json.dumps(auth_data),
-        expirationTtl=3600,  # 1 hour TTL
+        expirationTtl=AUTH_REQUEST_TTL,  # 1 hour TTL
     )
 
-    await log_auth_attempt(env, body, True, "request_created")
-    await log_analytics(
-        env, "auth_request_created", {"request_id": auth_request_id}
-    )
+    log_auth_attempt(body, True, "request_created")
+    log_analytics("auth_request_created", {"request_id": auth_request_id})
 
     return json_response(
         {
             "auth_request_id": auth_request_id,
-            "status": "pending",
+            "status": PENDING,
             "poll_endpoint": f"/api/v2/agent/auth/{auth_request_id}",
-            "expires_in": 3600,
+            "interval": POLL_INTERVAL,
+            "expires_in": AUTH_REQUEST_TTL,
             "message": "Awaiting human approval. Poll the endpoint or await callback.",
         },
         202,
     )
 
 
+def enqueue_callback(env, auth_request: dict, payload: dict):
+    """Deliver a signed callback for a decided auth request, if wanted."""
+    if not auth_request.get("callback_url"):
+        return
+    job = build_job(auth_request["callback_url"], payload)
+    defer(deliver(env.AGENT_AUTH, job, get_callback_secret(env), http_post))
+    log_analytics(
+        "auth_callback_enqueued",
+        {"request_id": auth_request["id"], "event": payload["event"]},
+    )
+
+
+def get_auth_coordinator(env):
+    """
+    The single writer for auth request state: the AUTH_REQUESTS Durable
+    Object when bound, else this isolate's in-process stand-in.
+    """
+    global _auth_coordinator
+    namespace = getattr(env, "AUTH_REQUESTS", None)
+    if namespace is not None:
+        return DurableObjectCoordinator(namespace)
+    if _auth_coordinator is None:
+        _auth_coordinator = AuthRequestCoordinator(env.AGENT_AUTH)
+    return _auth_coordinator
+
+
+def get_burn_coordinator(env):
+    """
+    The single writer for secret burn state: the SECRET_BURNS Durable
+    Object when bound, else this isolate's in-process stand-in.
+    """
+    global _burn_coordinator
+    namespace = getattr(env, "SECRET_BURNS", None)
+    if namespace is not None:
+        return DurableObjectBurnCoordinator(namespace)
+    if _burn_coordinator is None:
+        _burn_coordinator = BurnCoordinator()
+    return _burn_coordinator
+
+
+class WebCryptoAesGcm:
+    """AES-256-GCM through the runtime's Web Crypto API (crypto.subtle)."""
+
+    async def _call(self, operation: str, key: bytes, nonce, data, aad):
+        subtle = crypto.subtle
+        crypto_key = await subtle.importKey(
+            "raw", to_js(key), "AES-GCM", False, to_js([operation])
+        )
+        params = to_js(
+            {
+                "name": "AES-GCM",
+                "iv": to_js(nonce),
+                "additionalData": to_js(aad),
+            },
+            dict_converter=Object.fromEntries,
+        )
+        method = getattr(subtle, operation)
+        return as_buffer(await method(params, crypto_key, to_js(data)))
+
+    async def encrypt(self, key: bytes, nonce: bytes, data, aad: bytes):
+        return await self._call("encrypt", key, nonce, data, aad)
+
+    async def decrypt(self, key: bytes, nonce: bytes, data, aad: bytes):
+        return await self._call("decrypt", key, nonce, data, aad)
+
+
+secret_cipher = WebCryptoAesGcm()
+
+
+def get_fanout(env):
+    """
+    Where topic messages are published: the TOPIC_FANOUT Durable Object
+    when bound, else this isolate's in-process hub.
+    """
+    namespace = getattr(env, "TOPIC_FANOUT", None)
+    if namespace is not None:
+        return DurableObjectHub(namespace)
+    return topic_hub
+
+
+async def publish_safely(fanout, topic: str, messages: list):
+    """
+    Publish to one topic, logging failures: a deferred publish has no
+    response left to fail, and one topic must not stop the others.
+    """
+    try:
+        await fanout.publish(topic, messages)
+    except Exception as e:
+        log_failure("publish", e, topic=topic)
+
+
+def publish_messages(env, messages: list):
+    """Push new messages to their topics' streams after the response."""
+    by_topic = {}
+    for message in messages:
+        topic = message.get("topic")
+        if isinstance(topic, str) and topic:
+            by_topic.setdefault(topic, []).append(message)
+    fanout = get_fanout(env)
+    for topic, topic_messages in by_topic.items():
+        defer(publish_safely(fanout, topic, topic_messages))
+
+
+async def register_agent(env, auth_request: dict):
+    """
+    Claim an approved request's agent_id for its public key, then list
+    the agent in the peer directory and register its callback URL (so
+    handoffs to the agent are pushed there). Nothing is written for an
+    agent_id that another key holds.
+    """
+    agent_id = auth_request["agent_id"]
+    owner = agent_owner(auth_request["public_key"])
+    if not await claim_agent_id(env.AGENT_AUTH, agent_id, owner):
+        log_analytics("agent_id_conflict", {"request_id": auth_request["id"]})
+        return
+    writes = []
+    if auth_request.get("peer"):
+        peer = dict(auth_request["peer"], last_seen=get_timestamp())
+        writes.append(peer_directory.register(env.AGENT_AUTH, peer))
+    if auth_request.get("callback_url"):
+        writes.append(
+            register_callback(
+                env.AGENT_AUTH,
+                agent_id,
+                auth_request["callback_url"],
+                TOKEN_TTL,
+            )
+        )
+    await asyncio.gather(*writes)
+
+
+def on_auth_decided(env, auth_request: dict):
+    """Side effects of the transition that decided an auth request."""
+    auth_request_id = auth_request["id"]
+    status = auth_request["status"]
+    poll_throttle.forget(auth_request_id)
+    log_analytics(f"auth_request_{status}", {"request_id": auth_request_id})
+
+    if status == APPROVED:
+        # The agent's next requests may land here before KV propagates
+        token_cache.put_valid(
+            auth_request["token"],
+            auth_request["token_expires_at"],
+            auth_request.get("agent_id"),
+        )
+        if auth_request.get("agent_id"):
+            defer(register_agent(env, auth_request))
+        payload = {
+            "event": "auth_request.approved",
+            "auth_request_id": auth_request_id,
+            "status": status,
+            "access_token": auth_request["token"],
+            "token_type": "Bearer",
+            "expires_in": TOKEN_TTL,
+        }
+    elif status == DENIED:
+        payload = {
+            "event": "auth_request.denied",
+            "auth_request_id": auth_request_id,
+            "status": status,
+        }
+    else:
+        return
+    enqueue_callback(env, auth_request, payload)
+
+
 async def handle_auth_poll(request, env, auth_request_id: str):
     """
     GET /api/v2/agent/auth/{id}
     Poll for auth request status.
+
+    Pending responses carry `interval` and Retry-After; polls sooner than
+    that are answered with 429 slow_down without reading KV. Decided
+    requests are answered from a single KV read.
     """
-    auth_data = await env.AGENT_AUTH.get(f"auth_request:{auth_request_id}")
+    wait = poll_throttle.check(auth_request_id)
+    if wait:
+        log_analytics("auth_poll_slow_down", {"request_id": auth_request_id})
+        return json_response(
+            {"error": "slow_down", "interval": POLL_INTERVAL},
+            429,
+            headers={"Retry-After": str(wait)},
+        )
 
-    if not auth_data:
-        await log_analytics(
-            env, "auth_poll_not_found", {"request_id": auth_request_id}
+    auth_data = await env.AGENT_AUTH.get(
+        f"{AUTH_REQUEST_PREFIX}{auth_request_id}"
+    )
+    auth_request = json.loads(auth_data) if auth_data else None
+
+    # Pending requests go through the coordinator, which also implements
+    # the mock's auto-approval after a few polls (simulated human approval)
+    if auth_request is not None and auth_request["status"] == PENDING:
+        outcome = await get_auth_coordinator(env).transition(
+            auth_request_id, "poll", env.AGENT_AUTH
         )
+        auth_request = outcome.record
+        if outcome.changed:
+            on_auth_decided(env, auth_request)
+
+    if auth_request is None:
+        log_analytics("auth_poll_not_found", {"request_id": auth_request_id})
         return json_response(
             {"error": "Auth request not found or expired"}, 404
         )
 
-    auth_request = json.loads(auth_data)
-    await log_analytics(
-        env,
+    log_analytics(
         "auth_poll",
         {"request_id": auth_request_id, "status": auth_request["status"]},
     )
 
-    # For mock purposes, auto-approve after a few polls (simulate human approval)
-    # In production, this would check a separate approval state
-    if auth_request["status"] == "pending":
-        # Check if we should auto-approve (mock behavior)
-        poll_count_key = f"poll_count:{auth_request_id}"
-        poll_count = await env.AGENT_AUTH.get(poll_count_key)
-        poll_count = int(poll_count) + 1 if poll_count else 1
-        await env.AGENT_AUTH.put(
-            poll_count_key, str(poll_count), expirationTtl=3600
-        )
-
-        # Auto-approve after 3 polls for demo purposes
-        if poll_count >= 3:
-            token = secrets.token_urlsafe(32)
-            auth_request["status"] = "approved"
-            auth_request["token"] = token
-            auth_request["approved_at"] = get_timestamp()
-            await env.AGENT_AUTH.put(
-                f"auth_request:{auth_request_id}",
-                json.dumps(auth_request),
-                expirationTtl=3600,
-            )
-            # Store token for validation
-            await env.AGENT_AUTH.put(
-                f"token:{token}",
-                json.dumps(
-                    {
-                        "auth_request_id": auth_request_id,
-                        "created_at": get_timestamp(),
-                    }
-                ),
-                expirationTtl=86400,  # 24 hour token TTL
-            )
-
     response_data = {
         "auth_request_id": auth_request_id,
         "status": auth_request["status"],
         "created_at": auth_request["created_at"],
     }
 
-    if auth_request["status"] == "approved":
+    if auth_request["status"] == APPROVED:
         response_data["access_token"] = auth_request.get("token")
         response_data["token_type"] = "Bearer"
-        response_data["expires_in"] = 86400
+        response_data["expires_in"] = TOKEN_TTL
+    elif auth_request["status"] == PENDING:
+        response_data["interval"] = POLL_INTERVAL
+        return json_response(
+            response_data, headers={"Retry-After": str(POLL_INTERVAL)}
+        )
 
     return json_response(response_data)
 
 
 async def validate_token(request, env) -> tuple[bool, str]:
     """Validate Bearer token from Authorization header."""
-    auth_header = request.headers.get("Authorization", "")
-    if not auth_header.startswith("Bearer "):
+    token = bearer_token(request)
+    if token is None:
         return False, "missing_bearer_token"
 
-    token = auth_header[7:]  # Remove "Bearer " prefix
+    cached = token_cache.get(token)
+    if cached is not None:
+        return (True, token) if cached else (False, "invalid_token")
+
     token_data = await env.AGENT_AUTH.get(f"token:{token}")
 
     if not token_data:
+        token_cache.put_invalid(token)
         return False, "invalid_token"
 
+    token_data = json.loads(token_data)
+    token_cache.put_valid(
+        token, token_expiry(token_data), token_data.get("agent_id")
+    )
     return True, token
 
 
+@rate_limited("posts")
 async def handle_post_message(request, env):
     """POST /api/v2/agent/messages - Post a message."""
     valid, result = await validate_token(request, env)
     if not valid:
-        await log_analytics(
-            env,
+        log_analytics(
             "unauthorized_request",
             {"endpoint": "post_message", "reason": result},
         )
         return json_response({"error": "Unauthorized", "reason": result}, 401)
 
-    try:
-        body = await request.json()
-    except Exception:
-        return json_response({"error": "Invalid JSON body"}, 400)
-
-    message_id = generate_id()
-    message = {
-        "id": message_id,
-        "content": body.get("content"),
-        "recipient": body.get("recipient"),
-        "topic": body.get("topic"),
-        "created_at": get_timestamp(),
-        "ttl": body.get("ttl", 3600),
-    }
+    body, error = await read_body(request, "message")
+    if error is not None:
+        return error
 
-    await env.AGENT_MESSAGES.put(
-        f"message:{message_id}",
-        json.dumps(message),
-        expirationTtl=message["ttl"],
-    )
+    message = build_message(body)
+    await store_message(env.AGENT_MESSAGES, message)
 
-    await log_analytics(env, "message_posted", {"message_id": message_id})
+    log_analytics("message_posted", {"message_id": message["id"]})
+    record_heartbeat(env, result)
+    publish_messages(env, [message])
 
     return json_response(
         {
-            "message_id": message_id,
+            "message_id": message["id"],
             "status": "delivered",
             "created_at": message["created_at"],
         },
@@ -268,162 +773,282 @@ async def handle_post_message(request, env):
     )
 
 
+async def handle_post_messages_batch(request, env):
+    """
+    POST /api/v2/agent/messages/batch - Post several messages.
+
+    Body: {"messages": [...]}, each item as for a single post. The token
+    is validated once; every item is counted against the "posts" rate
+    limit (so this handler is not tagged with @rate_limited) and gets
+    its own result. Responds 201 when every item was delivered, else 207.
+    """
+    valid, result = await validate_token(request, env)
+    if not valid:
+        log_analytics(
+            "unauthorized_request",
+            {"endpoint": "post_messages_batch", "reason": result},
+        )
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
+
+    body, error = await read_body(request, "message_batch")
+    if error is not None:
+        return error
+    items = body["messages"]
+    validate = validator("message")
+
+    limiter = get_rate_limiter(env)
+    results = [None] * len(items)
+    accepted = []
+    retry_after = 0
+    for index, item in enumerate(items):
+        invalid = validate(item)
+        if invalid:
+            results[index] = {
+                "index": index,
+                "status": 400,
+                "error": "Invalid message",
+                "details": invalid,
+            }
+            continue
+        decision = limiter.check("posts", result)
+        if not decision.allowed:
+            retry_after = max(retry_after, decision.retry_after)
+            results[index] = {
+                "index": index,
+                "status": 429,
+                "error": "Rate limit exceeded",
+                "retry_after": decision.retry_after,
+            }
+            continue
+        accepted.append((index, build_message(item)))
+
+    errors = await store_messages(
+        env.AGENT_MESSAGES, [message for _, message in accepted]
+    )
+    delivered = []
+    published = []
+    for (index, message), error in zip(accepted, errors):
+        if error is not None:
+            results[index] = {
+                "index": index,
+                "status": 500,
+                "error": "Failed to store message",
+            }
+            continue
+        delivered.append(message["id"])
+        published.append(message)
+        results[index] = {
+            "index": index,
+            "status": 201,
+            "message_id": message["id"],
+            "created_at": message["created_at"],
+        }
+
+    # One aggregated event for the whole batch
+    if delivered:
+        log_analytics(
+            "message_posted",
+            {"batch": len(items), "message_ids": delivered},
+            count=len(delivered),
+        )
+    if retry_after:
+        log_analytics("rate_limited", {"bucket": "posts"})
+    record_heartbeat(env, result)
+    publish_messages(env, published)
+
+    return json_response(
+        {
+            "delivered": len(delivered),
+            "failed": len(items) - len(delivered),
+            "results": results,
+        },
+        201 if len(delivered) == len(items) else 207,
+        headers={"Retry-After": str(retry_after)} if retry_after else None,
+    )
+
+
+@rate_limited("reads")
 async def handle_read_messages(request, env):
     """GET /api/v2/agent/messages - Read messages."""
     valid, result = await validate_token(request, env)
     if not valid:
-        await log_analytics(
-            env,
+        log_analytics(
             "unauthorized_request",
             {"endpoint": "read_messages", "reason": result},
         )
         return json_response({"error": "Unauthorized", "reason": result}, 401)
 
-    # Mock: return empty list (would filter by since param in real implementation)
-    await log_analytics(env, "messages_read", {})
+    params = get_query_params(request)
+    agent_id = token_cache.subject(result)
+    recipient = params.get("recipient")
+    if recipient is not None and recipient != agent_id:
+        log_analytics("forbidden_request", {"endpoint": "read_messages"})
+        return json_response(
+            {"error": "Agents can only read their own inbox"}, 403
+        )
+    try:
+        since_ms = parse_since(params["since"]) if "since" in params else None
+        cursor = parse_cursor(params["cursor"]) if "cursor" in params else None
+        limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return json_response(
+            {"error": "Invalid query parameter: since, cursor or limit"}, 400
+        )
 
-    return json_response(
-        {"messages": [], "next_cursor": None, "has_more": False}
+    page = await list_messages(
+        env.AGENT_MESSAGES,
+        since_ms=since_ms,
+        cursor=cursor,
+        limit=limit,
+        recipient=recipient,
+        topic=params.get("topic"),
+        viewer=agent_id,
     )
+    log_analytics("messages_read", {"count": len(page["messages"])})
+
+    return list_response(request, env, page)
 
 
+@rate_limited("posts")
 async def handle_ask_question(request, env):
     """POST /api/v2/agent/questions - Ask a question."""
     valid, result = await validate_token(request, env)
     if not valid:
         return json_response({"error": "Unauthorized", "reason": result}, 401)
 
+    body, error = await read_body(request, "question")
+    if error is not None:
+        return error
+
     try:
-        # Body is validated but not used in this mock - would store question in production
-        await request.json()
-    except Exception:
-        return json_response({"error": "Invalid JSON body"}, 400)
+        question, status = build_question(body, token_cache.subject(result))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
 
-    question_id = generate_id()
-    await log_analytics(env, "question_asked", {"question_id": question_id})
+    await save_question(env.AGENT_MESSAGES, question, status)
+    question_cache.put(status)
+    question_id = question["id"]
+    log_analytics("question_asked", {"question_id": question_id})
 
     return json_response(
         {
             "question_id": question_id,
-            "status": "pending",
+            "status": status["status"],
             "poll_endpoint": f"/api/v2/agent/questions/{question_id}",
+            "interval": QUESTION_POLL_INTERVAL,
+            "expires_at": status["expires_at"],
         },
         202,
+        headers={"ETag": status_etag(status)},
     )
 
 
-async def handle_discover_peers(request, env):
-    """GET /api/v2/agent/peers - Discover other agents."""
+@rate_limited("reads")
+async def handle_question_poll(request, env, question_id: str):
+    """
+    GET /api/v2/agent/questions/{id} - Status of a question, and its
+    answer once there is one. Supports If-None-Match;
+    ?include=question adds the question as asked.
+    """
     valid, result = await validate_token(request, env)
     if not valid:
         return json_response({"error": "Unauthorized", "reason": result}, 401)
 
-    await log_analytics(env, "peers_discovered", {})
+    status = await question_cache.load(env.AGENT_MESSAGES, question_id)
+    if status is None:
+        return json_response({"error": "Question not found or expired"}, 404)
 
-    # Mock peer list - realistic agent network participants
-    peers = [
-        {
-            "agent_id": "claude-code-primary",
-            "name": "Claude Code (Primary)",
-            "provider": "anthropic",
-            "capabilities": ["message", "secret", "handoff", "code_review"],
-            "status": "online",
-            "last_seen": get_timestamp(),
-            "metadata": {
-                "model": "claude-sonnet-4-20250514",
-                "context": "software_development"
-            }
-        },
-        {
-            "agent_id": "github-copilot-workspace",
-            "name": "GitHub Copilot Workspace",
-            "provider": "github",
-            "capabilities": ["message", "handoff", "code_generation"],
-            "status": "online",
-            "last_seen": get_timestamp(),
-            "metadata": {
-                "context": "ide_integration"
-            }
-        },
-        {
-            "agent_id": "devin-dev-agent",
-            "name": "Devin",
-            "provider": "cognition",
-            "capabilities": ["message", "secret", "handoff", "autonomous_coding"],
-            "status": "busy",
-            "last_seen": get_timestamp(),
-            "metadata": {
-                "current_task": "debugging_session",
-                "context": "autonomous_development"
-            }
-        },
-        {
-            "agent_id": "cursor-composer",
-            "name": "Cursor Composer",
-            "provider": "cursor",
-            "capabilities": ["message", "handoff", "multi_file_edit"],
-            "status": "online",
-            "last_seen": get_timestamp(),
-            "metadata": {
-                "context": "editor_integration"
-            }
-        },
-        {
-            "agent_id": "codex-cli-agent",
-            "name": "OpenAI Codex CLI",
-            "provider": "openai",
-            "capabilities": ["message", "secret", "shell_execution"],
-            "status": "offline",
-            "last_seen": "2025-11-28T08:30:00Z",
-            "metadata": {
-                "context": "terminal_automation"
-            }
-        },
-        {
-            "agent_id": "windsurf-cascade",
-            "name": "Windsurf Cascade",
-            "provider": "codeium",
-            "capabilities": ["message", "handoff", "code_flow"],
-            "status": "online",
-            "last_seen": get_timestamp(),
-            "metadata": {
-                "context": "ide_integration"
-            }
-        }
-    ]
+    headers = {
+        "ETag": status_etag(status),
+        "Cache-Control": "private, no-cache",
+    }
+    if status["status"] == QUESTION_PENDING:
+        headers["Retry-After"] = str(QUESTION_POLL_INTERVAL)
+    # The question itself never changes, so the ETag covers ?include too
+    if etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+        return json_body_response(None, 304, headers)
+
+    response_data = dict(status)
+    if get_query_params(request).get("include") == "question":
+        question = await load_question(env.AGENT_MESSAGES, question_id)
+        if question is not None:
+            response_data["question"] = question["question"]
+            response_data["context"] = question["context"]
+    return json_response(response_data, headers=headers)
+
+
+@rate_limited("posts")
+async def handle_answer_question(request, env, question_id: str):
+    """POST /api/v2/agent/questions/{id}/answer - Answer a question."""
+    valid, result = await validate_token(request, env)
+    if not valid:
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
 
-    # Filter by status if requested
-    url = request.url
-    if "status=" in url:
-        status_filter = url.split("status=")[1].split("&")[0]
-        peers = [p for p in peers if p["status"] == status_filter]
+    body, error = await read_body(request, "answer")
+    if error is not None:
+        return error
 
-    return json_response(
-        {
-            "peers": peers,
-            "total": len(peers),
-            "online_count": len([p for p in peers if p["status"] == "online"]),
-            "network_version": "0.1",
-            "discovery_timestamp": get_timestamp()
-        }
+    # Read KV, not the cache: a cached pending record may be stale
+    status = await load_status(env.AGENT_MESSAGES, question_id)
+    if status is None:
+        return json_response({"error": "Question not found or expired"}, 404)
+    if status["status"] != QUESTION_PENDING:
+        return json_response({"error": "Question already answered"}, 409)
+
+    try:
+        status = answer_status(status, body, token_cache.subject(result))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    await save_status(env.AGENT_MESSAGES, status)
+    question_cache.put(status)
+    log_analytics("question_answered", {"question_id": question_id})
+
+    return json_response(status, headers={"ETag": status_etag(status)})
+
+
+@rate_limited("reads")
+async def handle_discover_peers(request, env):
+    """
+    GET /api/v2/agent/peers - Discover other agents.
+    Filters: status, capability, provider. Supports If-None-Match.
+    """
+    valid, result = await validate_token(request, env)
+    if not valid:
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
+
+    log_analytics("peers_discovered", {})
+
+    params = get_query_params(request)
+    snapshot = await peer_directory.snapshot(env.AGENT_AUTH)
+    body, etag = snapshot.body(
+        status=params.get("status"),
+        capability=params.get("capability"),
+        provider=params.get("provider"),
     )
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return json_body_response(None, 304, headers)
+    return json_body_response(body, headers=headers)
 
 
+@rate_limited("posts")
 async def handle_subscribe(request, env):
-    """POST /api/v2/agent/subscribe - Subscribe to topics."""
+    """POST /api/v2/agent/subscribe - Subscribe to a topic."""
     valid, result = await validate_token(request, env)
     if not valid:
         return json_response({"error": "Unauthorized", "reason": result}, 401)
 
-    try:
-        body = await request.json()
-    except Exception:
-        return json_response({"error": "Invalid JSON body"}, 400)
+    body, error = await read_body(request, "subscription")
+    if error is not None:
+        return error
+
+    topic = body["topic"]
 
-    topic = body.get("topic")
-    subscription_id = generate_id()
-    await log_analytics(
-        env,
+    subscription = build_subscription(topic, result)
+    await save_subscription(env.AGENT_MESSAGES, subscription)
+    subscription_id = subscription["id"]
+    log_analytics(
         "subscription_created",
         {"topic": topic, "subscription_id": subscription_id},
     )
@@ -433,97 +1058,336 @@ async def handle_subscribe(request, env):
             "subscription_id": subscription_id,
             "topic": topic,
             "status": "active",
+            "stream_endpoint": (
+                f"/api/v2/agent/subscriptions/{subscription_id}/stream"
+            ),
         },
         201,
     )
 
 
+async def handle_subscription_stream(request, env, subscription_id: str):
+    """
+    GET /api/v2/agent/subscriptions/{id}/stream - Stream the topic's new
+    messages as server-sent events, or NDJSON with ?format=ndjson or
+    Accept: application/x-ndjson. Resumes after Last-Event-ID.
+    """
+    valid, result = await validate_token(request, env)
+    if not valid:
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
+
+    subscription = await load_subscription(
+        env.AGENT_MESSAGES, subscription_id, result
+    )
+    if subscription is None:
+        return json_response({"error": "Subscription not found"}, 404)
+
+    params = get_query_params(request)
+    fmt = params.get("format")
+    if fmt is None:
+        accept = request.headers.get("Accept") or ""
+        fmt = "ndjson" if STREAM_FORMATS["ndjson"] in accept else "sse"
+    if fmt not in STREAM_FORMATS:
+        return json_response({"error": "format must be sse or ndjson"}, 400)
+    last_event_id = request.headers.get("Last-Event-ID") or params.get(
+        "last_event_id"
+    )
+    if last_event_id:
+        try:
+            parse_cursor(last_event_id)
+        except ValueError:
+            return json_response(
+                {"error": "Last-Event-ID must be a message ID"}, 400
+            )
+    topic = subscription["topic"]
+    viewer = token_cache.subject(result)
+    log_analytics("subscription_streamed", {"topic": topic})
+
+    namespace = getattr(env, "TOPIC_FANOUT", None)
+    if namespace is not None:
+        return await DurableObjectHub(namespace).stream(
+            topic, fmt, last_event_id, viewer
+        )
+    response, pump = stream_response(
+        fmt,
+        lambda send: run_stream(
+            topic_hub,
+            env.AGENT_MESSAGES,
+            topic,
+            send,
+            fmt,
+            last_event_id,
+            viewer,
+        ),
+    )
+    defer(pump)
+    return response
+
+
+async def handle_unsubscribe(request, env, subscription_id: str):
+    """DELETE /api/v2/agent/subscriptions/{id} - Remove a subscription."""
+    valid, result = await validate_token(request, env)
+    if not valid:
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
+
+    subscription = await load_subscription(
+        env.AGENT_MESSAGES, subscription_id, result
+    )
+    if subscription is None:
+        return json_response({"error": "Subscription not found"}, 404)
+    await delete_subscription(env.AGENT_MESSAGES, subscription_id)
+    return json_response(
+        {"subscription_id": subscription_id, "status": "deleted"}
+    )
+
+
+@rate_limited("secrets")
 async def handle_create_secret(request, env):
     """POST /api/v2/secret - Create a one-time secret."""
     valid, result = await validate_token(request, env)
     if not valid:
         return json_response({"error": "Unauthorized", "reason": result}, 401)
 
-    try:
-        body = await request.json()
-    except Exception:
-        return json_response({"error": "Invalid JSON body"}, 400)
+    body, error = await read_body(request, "secret")
+    if error is not None:
+        return error
 
-    secret_key = generate_id()
-    await log_analytics(
-        env, "secret_created", {"secret_key": secret_key[:8] + "..."}
+    try:
+        plaintext, ttl, expires_at = parse_secret(body)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    secret_key = new_secret_key()
+    data = await encrypt(secret_cipher, secret_key, plaintext, expires_at)
+    await store_secret(env.AGENT_MESSAGES, secret_key, to_js(data), ttl)
+    log_analytics(
+        "secret_created",
+        {"secret_id": secret_id(secret_key)[:8], "size": len(plaintext)},
     )
 
     return json_response(
         {
             "secret_key": secret_key,
             "secret_url": f"https://onetimesecret.com/secret/{secret_key}",
-            "expires_in": body.get("ttl", 604800),
+            "reveal_endpoint": "/api/v2/secret/reveal",
+            "expires_in": ttl,
             "status": "created",
         },
         201,
     )
 
 
-async def handle_handoff(request, env):
-    """POST /api/v2/agent/handoff - Agent handoff."""
+@rate_limited("reads")
+async def handle_reveal_secret(request, env):
+    """
+    POST /api/v2/secret/reveal - Read a one-time secret, which burns it.
+    The key travels in the body ({"secret_key": ...}) to keep it out of
+    URLs and logs.
+    """
     valid, result = await validate_token(request, env)
     if not valid:
         return json_response({"error": "Unauthorized", "reason": result}, 401)
 
+    body, error = await read_body(request, "secret_reveal")
+    if error is not None:
+        return error
+    secret_key = body["secret_key"]
+
     try:
-        body = await request.json()
-    except Exception:
-        return json_response({"error": "Invalid JSON body"}, 400)
+        plaintext = await reveal_secret(
+            env.AGENT_MESSAGES,
+            get_burn_coordinator(env),
+            secret_cipher,
+            secret_key,
+        )
+    except SecretError:
+        return json_response({"error": "Secret could not be decrypted"}, 500)
+    if plaintext is None:
+        # Missing, expired and already read are indistinguishable on purpose
+        return json_response(
+            {"error": "Secret not found, expired or already read"}, 404
+        )
+
+    log_analytics("secret_revealed", {"secret_id": secret_id(secret_key)[:8]})
+    return json_response(
+        {"secret": plaintext.decode(), "status": "burned"},
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+@rate_limited("posts")
+async def handle_handoff(request, env):
+    """
+    POST /api/v2/agent/handoff - Hand a task off to one or more agents.
+    The handoff is stored, then delivered after the response.
+    """
+    valid, result = await validate_token(request, env)
+    if not valid:
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
 
-    handoff_id = generate_id()
-    await log_analytics(
-        env,
+    body, error = await read_body(request, "handoff")
+    if error is not None:
+        return error
+
+    handoff = build_handoff(body, result, token_cache.subject(result))
+    await save_handoff(env.AGENT_MESSAGES, handoff)
+    # One deferred task whatever the number of targets
+    defer(
+        fan_out(
+            env.AGENT_MESSAGES,
+            env.AGENT_AUTH,
+            handoff,
+            get_callback_secret(env),
+            http_post,
+        )
+    )
+    targets = handoff["target_agents"]
+    log_analytics(
         "handoff_initiated",
-        {"handoff_id": handoff_id, "target_agent": body.get("target_agent")},
+        {"handoff_id": handoff["handoff_id"], "targets": len(targets)},
     )
 
+    response = {
+        "handoff_id": handoff["handoff_id"],
+        "status": HANDOFF_INITIATED,
+        "target_agents": targets,
+        "status_endpoint": handoff_endpoints(handoff["handoff_id"])[
+            "status_endpoint"
+        ],
+    }
+    if "target_agent" in body:
+        response["target_agent"] = body["target_agent"]
+    return json_response(response, 202)
+
+
+async def load_visible_handoff(env, token: str, handoff_id: str):
+    """
+    (handoff, caller's agent_id) when the caller initiated or is a target
+    of the handoff, else (None, agent_id).
+    """
+    # Read KV, not a cache: transitions must see the latest state
+    handoff = await load_handoff(env.AGENT_MESSAGES, handoff_id)
+    agent_id = token_cache.subject(token)
+    if handoff is None or not (
+        is_initiator(handoff, token) or agent_id in handoff["target_agents"]
+    ):
+        return None, agent_id
+    return handoff, agent_id
+
+
+HANDOFF_NOT_FOUND = {"error": "Handoff not found or expired"}
+
+
+@rate_limited("reads")
+async def handle_handoff_status(request, env, handoff_id: str):
+    """
+    GET /api/v2/agent/handoffs/{id} - A handoff's state and its delivery
+    to each target, for its initiator and targets.
+    """
+    valid, result = await validate_token(request, env)
+    if not valid:
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
+
+    handoff, _ = await load_visible_handoff(env, result, handoff_id)
+    if handoff is None:
+        return json_response(HANDOFF_NOT_FOUND, 404)
+
+    deliveries = await load_deliveries(env.AGENT_MESSAGES, handoff_id)
     return json_response(
         {
-            "handoff_id": handoff_id,
-            "status": "initiated",
-            "target_agent": body.get("target_agent"),
+            **public_view(handoff),
+            "deliveries": {
+                target: deliveries.get(target, {"inbox": "pending"})
+                for target in handoff["target_agents"]
+            },
         },
-        202,
+        headers={"Cache-Control": "no-store"},
     )
 
 
+@rate_limited("posts")
+async def handle_accept_handoff(request, env, handoff_id: str):
+    """POST /api/v2/agent/handoffs/{id}/accept - Accept, as a target."""
+    valid, result = await validate_token(request, env)
+    if not valid:
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
+
+    handoff, agent_id = await load_visible_handoff(env, result, handoff_id)
+    if handoff is None:
+        return json_response(HANDOFF_NOT_FOUND, 404)
+    if agent_id not in handoff["target_agents"]:
+        return json_response(
+            {"error": "Only a target agent can accept a handoff"}, 403
+        )
+    if handoff["status"] != HANDOFF_INITIATED:
+        return json_response(
+            {"error": f"Handoff already {handoff['status']}"}, 409
+        )
+
+    handoff = accept_handoff(handoff, agent_id)
+    await save_handoff(env.AGENT_MESSAGES, handoff)
+    log_analytics("handoff_accepted", {"handoff_id": handoff_id})
+    return json_response(public_view(handoff))
+
+
+@rate_limited("posts")
+async def handle_complete_handoff(request, env, handoff_id: str):
+    """
+    POST /api/v2/agent/handoffs/{id}/complete - Complete, as the agent
+    that accepted it, with a `result`.
+    """
+    valid, result = await validate_token(request, env)
+    if not valid:
+        return json_response({"error": "Unauthorized", "reason": result}, 401)
+
+    body, error = await read_body(request, "handoff_complete")
+    if error is not None:
+        return error
+
+    handoff, agent_id = await load_visible_handoff(env, result, handoff_id)
+    if handoff is None:
+        return json_response(HANDOFF_NOT_FOUND, 404)
+    if handoff["status"] != HANDOFF_ACCEPTED:
+        return json_response(
+            {"error": f"Handoff is {handoff['status']}, not accepted"}, 409
+        )
+    if agent_id != handoff["accepted_by"]:
+        return json_response(
+            {"error": "Only the accepting agent can complete a handoff"}, 403
+        )
+
+    handoff = complete_handoff(handoff, body["result"])
+    await save_handoff(env.AGENT_MESSAGES, handoff)
+    log_analytics("handoff_completed", {"handoff_id": handoff_id})
+    return json_response(public_view(handoff))
+
+
+# Event types whose daily counters the analytics summary reports
+SUMMARY_EVENTS = (
+    "auth_request_created",
+    "auth_poll",
+    "auth_attempt",
+    "message_posted",
+    "messages_read",
+    "secret_created",
+    "question_asked",
+    "peers_discovered",
+    "subscription_created",
+    "handoff_initiated",
+    "handoff_accepted",
+    "handoff_completed",
+    "unauthorized_request",
+    "rate_limited",
+)
+
+
 async def handle_analytics(request, env):
     """GET /api/v2/admin/analytics - Get analytics summary (admin endpoint)."""
-    # WARNING: This is a mock/demo admin key - NOT for production use.
-    # In production, use environment variables or proper secret management.
-    expected_admin_key = getattr(env, "ADMIN_KEY", "mock-admin-key")
-    admin_key = request.headers.get("X-Admin-Key")
-    if admin_key != expected_admin_key:
+    if not is_admin(request, env):
         return json_response({"error": "Unauthorized"}, 401)
 
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-
-    # Gather counters
-    event_types = [
-        "auth_request_created",
-        "auth_poll",
-        "auth_attempt",
-        "message_posted",
-        "messages_read",
-        "secret_created",
-        "question_asked",
-        "peers_discovered",
-        "subscription_created",
-        "handoff_initiated",
-        "unauthorized_request",
-    ]
-
-    counters = {}
-    for event_type in event_types:
-        counter_key = f"counter:{event_type}:{today}"
-        count = await env.AGENT_EVENTS.get(counter_key)
-        counters[event_type] = int(count) if count else 0
+    today = get_date()
+    counters = await read_counters(env.AGENT_EVENTS, SUMMARY_EVENTS, today)
 
     return json_response(
         {
@@ -537,29 +1401,401 @@ async def handle_analytics(request, env):
                     "unauthorized_request", 0
                 ),
             },
+            # Per-isolate: reflects only the isolate serving this request
+            "token_cache": token_cache.stats(),
         }
     )
 
 
+async def handle_analytics_range(request, env):
+    """
+    GET /api/v2/admin/analytics/range - Event counts per hour or day over
+    a range, from the rollup documents (admin endpoint).
+    """
+    if not is_admin(request, env):
+        return json_response({"error": "Unauthorized"}, 401)
+
+    # Admin and cron only: imported on first use, not at isolate startup
+    from rollups import parse_range, query_rollups
+
+    params = get_query_params(request)
+    granularity = params.get("granularity", "day")
+    try:
+        buckets = parse_range(granularity, params.get("from"), params.get("to"))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    report = await query_rollups(env.AGENT_EVENTS, granularity, buckets)
+    return list_response(request, env, report)
+
+
+async def handle_metrics(request, env):
+    """
+    GET /api/v2/admin/metrics - Per-route latency, status and KV operation
+    metrics, merged across isolates (admin endpoint).
+    """
+    if not is_admin(request, env):
+        return json_response({"error": "Unauthorized"}, 401)
+
+    isolates, routes = await collect(env.AGENT_EVENTS, metrics)
+    return json_response(
+        {
+            "isolates": isolates,
+            "routes": {
+                route: stats.summary()
+                for route, stats in sorted(routes.items())
+            },
+        }
+    )
+
+
+async def handle_metrics_prometheus(request, env):
+    """GET /api/v2/admin/metrics/prometheus - Prometheus text export."""
+    if not is_admin(request, env):
+        return json_response({"error": "Unauthorized"}, 401)
+
+    _, routes = await collect(env.AGENT_EVENTS, metrics)
+    return Response(
+        prometheus_text(routes),
+        headers={
+            "Content-Type": "text/plain; version=0.0.4",
+            "Access-Control-Allow-Origin": "*",
+        },
+    )
+
+
 async def handle_auth_attempts(request, env):
     """GET /api/v2/admin/auth-attempts - Get auth attempt logs (admin endpoint)."""
-    # WARNING: This is a mock/demo admin key - NOT for production use.
-    expected_admin_key = getattr(env, "ADMIN_KEY", "mock-admin-key")
-    admin_key = request.headers.get("X-Admin-Key")
-    if admin_key != expected_admin_key:
+    if not is_admin(request, env):
+        return json_response({"error": "Unauthorized"}, 401)
+
+    params = get_query_params(request)
+    filters = {
+        field: params[field]
+        for field in ("reason", "agent_id")
+        if field in params
+    }
+    if "success" in params:
+        filters["success"] = params["success"].lower() == "true"
+    try:
+        limit = int(params.get("limit", AUTH_LOG_PAGE_SIZE))
+    except ValueError:
+        return json_response({"error": "Invalid query parameter: limit"}, 400)
+
+    # Newest first, one KV list call per page; rows come from key metadata
+    page = await list_auth_attempts(
+        env.AGENT_EVENTS,
+        cursor=params.get("cursor"),
+        limit=limit,
+        filters=filters,
+    )
+    return list_response(request, env, page)
+
+
+async def handle_auth_attempt_detail(request, env, attempt_id: str):
+    """GET /api/v2/admin/auth-attempts/{id} - Full auth attempt record."""
+    if not is_admin(request, env):
         return json_response({"error": "Unauthorized"}, 401)
 
-    # List auth attempts from KV (limited query in mock)
-    attempts = []
-    # Note: KV list is limited, would use Durable Objects or D1 for production
-    keys = await env.AGENT_EVENTS.list(prefix="auth_attempt:")
+    attempt = await get_auth_attempt(env.AGENT_EVENTS, attempt_id)
+    if attempt is None:
+        return json_response({"error": "Auth attempt not found"}, 404)
+    return json_response({"id": attempt_id, **attempt})
+
+
+async def handle_auth_decision(request, env, auth_request_id: str, event):
+    """Apply an admin approve/deny to a pending auth request."""
+    if not is_admin(request, env):
+        return json_response({"error": "Unauthorized"}, 401)
+
+    coordinator = get_auth_coordinator(env)
+    outcome = await coordinator.transition(
+        auth_request_id, event, env.AGENT_AUTH
+    )
+    if outcome.error == "not_found":
+        return json_response(
+            {"error": "Auth request not found or expired"}, 404
+        )
+    auth_request = outcome.record
+    if outcome.error == "conflict":
+        return json_response(
+            {"error": f"Auth request is already {auth_request['status']}"},
+            409,
+        )
+
+    if outcome.changed:
+        on_auth_decided(env, auth_request)
+    return json_response(
+        {
+            "auth_request_id": auth_request_id,
+            "status": auth_request["status"],
+            "callback": bool(auth_request.get("callback_url")),
+        },
+        # Expired while waiting for a decision
+        409 if auth_request["status"] == EXPIRED else 200,
+    )
+
+
+async def handle_auth_approve(request, env, auth_request_id: str):
+    """
+    POST /api/v2/admin/auth-requests/{id}/approve
+    Human approval of a pending auth request (repeats are no-ops).
+    """
+    return await handle_auth_decision(request, env, auth_request_id, "approve")
+
+
+async def handle_auth_deny(request, env, auth_request_id: str):
+    """
+    POST /api/v2/admin/auth-requests/{id}/deny
+    Human denial of a pending auth request (repeats are no-ops).
+    """
+    return await handle_auth_decision(request, env, auth_request_id, "deny")
+
+
+AUTH_DISCOVERY = StaticJSON(
+    {
+        "auth_method": "ciba",
+        "description": "Client Initiated Backchannel Authentication",
+        "flow": "POST public_key and purpose to initiate auth request, then poll the returned endpoint",
+        "required_fields": {
+            "public_key": "Your agent's public key (PEM or JWK format)",
+            "purpose": "Human-readable description of why access is needed"
+        },
+        "optional_fields": {
+            "callback_url": "URL to receive approval notification",
+            "agent_id": "Optional identifier for your agent",
+            "name": "Display name listed in peer discovery",
+            "provider": "Organisation or product behind the agent",
+            "capabilities": "List of capabilities, filterable in peer discovery"
+        },
+        "example_request": {
+            "public_key": "-----BEGIN PUBLIC KEY-----...",
+            "purpose": "Coordinate task handoff between coding agents",
+            "callback_url": "https://myagent.example/callback"
+        },
+        "next_step": "POST to this endpoint with required fields"
+    }
+)
+
+HEALTH = StaticJSON(
+    {
+        "status": "ok",
+        "service": "agent-network-api",
+        "version": "0.1",
+        "spec_version": "draft-01",
+    }
+)
+
+
+async def handle_auth_discovery(request, env):
+    """GET /api/v2/agent/auth - Describe the CIBA auth flow."""
+    return json_body_response(AUTH_DISCOVERY.body)
+
+
+async def handle_health(request, env):
+    """GET /health - Health check."""
+    return json_body_response(HEALTH.body)
+
+
+def client_address(request) -> str:
+    """The client's IP address, as reported by Cloudflare."""
+    return request.headers.get("CF-Connecting-IP") or "unknown"
+
+
+async def dispatch(request, env, match):
+    """Apply the handler's rate limit, then call it."""
+    bucket = getattr(match.handler, "rate_limit", None)
+    # Requests without a token are rejected by the handler's auth check
+    if bucket is not None and bearer_token(request) is not None:
+        # Cached, so the handler's own check costs nothing more
+        valid, result = await validate_token(request, env)
+        limiter = get_rate_limiter(env)
+        if valid:
+            decision = limiter.check(bucket, result)
+        else:
+            # Invalid tokens share one count per client, kept out of KV
+            decision = limiter.check(
+                bucket, f"unverified:{client_address(request)}", shared=False
+            )
+        if not decision.allowed:
+            log_analytics("rate_limited", {"bucket": bucket})
+            return json_response(
+                {
+                    "error": "Rate limit exceeded",
+                    "limit": decision.limit,
+                    "retry_after": decision.retry_after,
+                },
+                429,
+                headers={"Retry-After": str(decision.retry_after)},
+            )
+    return await match.handler(request, env, **match.params)
+
+
+# Route table
+router = Router()
+
+# Auth endpoints
+router.add("GET", "/api/v2/agent/auth", handle_auth_discovery)
+router.add("POST", "/api/v2/agent/auth", handle_auth_request)
+router.add("GET", "/api/v2/agent/auth/{auth_request_id}", handle_auth_poll)
+
+# Capability endpoints
+router.add("POST", "/api/v2/agent/messages", handle_post_message)
+router.add("GET", "/api/v2/agent/messages", handle_read_messages)
+router.add("POST", "/api/v2/agent/messages/batch", handle_post_messages_batch)
+router.add("POST", "/api/v2/agent/questions", handle_ask_question)
+router.add("GET", "/api/v2/agent/questions/{question_id}", handle_question_poll)
+router.add(
+    "POST",
+    "/api/v2/agent/questions/{question_id}/answer",
+    handle_answer_question,
+)
+router.add("GET", "/api/v2/agent/peers", handle_discover_peers)
+router.add("POST", "/api/v2/agent/subscribe", handle_subscribe)
+router.add(
+    "GET",
+    "/api/v2/agent/subscriptions/{subscription_id}/stream",
+    handle_subscription_stream,
+)
+router.add(
+    "DELETE",
+    "/api/v2/agent/subscriptions/{subscription_id}",
+    handle_unsubscribe,
+)
+router.add("POST", "/api/v2/secret", handle_create_secret)
+router.add("POST", "/api/v2/secret/reveal", handle_reveal_secret)
+router.add("POST", "/api/v2/agent/handoff", handle_handoff)
+router.add(
+    "GET", "/api/v2/agent/handoffs/{handoff_id}", handle_handoff_status
+)
+router.add(
+    "POST",
+    "/api/v2/agent/handoffs/{handoff_id}/accept",
+    handle_accept_handoff,
+)
+router.add(
+    "POST",
+    "/api/v2/agent/handoffs/{handoff_id}/complete",
+    handle_complete_handoff,
+)
+
+# Admin endpoints
+router.add("GET", "/api/v2/admin/analytics", handle_analytics)
+router.add("GET", "/api/v2/admin/analytics/range", handle_analytics_range)
+router.add("GET", "/api/v2/admin/metrics", handle_metrics)
+router.add(
+    "GET", "/api/v2/admin/metrics/prometheus", handle_metrics_prometheus
+)
+router.add("GET", "/api/v2/admin/auth-attempts", handle_auth_attempts)
+router.add(
+    "GET",
+    "/api/v2/admin/auth-attempts/{attempt_id}",
+    handle_auth_attempt_detail,
+)
+router.add(
+    "POST",
+    "/api/v2/admin/auth-requests/{auth_request_id}/approve",
+    handle_auth_approve,
+)
+router.add(
+    "POST",
+    "/api/v2/admin/auth-requests/{auth_request_id}/deny",
+    handle_auth_deny,
+)
+
+# Health check
+router.add("GET", "/", handle_health)
+router.add("GET", "/health", handle_health)
+
+
+class AuthRequestObject(DurableObject):
+    """
+    Durable Object holding one auth request's state. Being the only
+    instance for its request makes its coordinator the single writer
+    across all isolates, and decisions live in its storage, with KV as
+    the read replica (see auth_state.py). The stored decision is removed
+    by an alarm once the request has expired.
+    """
+
+    def __init__(self, ctx, env):
+        self.ctx = ctx
+        self.env = kv_env(env)
+        self.coordinator = AuthRequestCoordinator(
+            self.env.AGENT_AUTH, storage=ctx.storage
+        )
+
+    async def fetch(self, request):
+        body = json.loads(await request.text())
+        outcome = await self.coordinator.transition(body["id"], body["event"])
+        if outcome.changed:
+            await self.ctx.storage.setAlarm(
+                request_expiry(outcome.record) * 1000
+            )
+        return json_response(outcome._asdict())
+
+    async def alarm(self):
+        await self.ctx.storage.deleteAll()
 
-    for key in keys.keys[:50]:  # Limit to 50 most recent
-        attempt_data = await env.AGENT_EVENTS.get(key.name)
-        if attempt_data:
-            attempts.append(json.loads(attempt_data))
 
-    return json_response({"auth_attempts": attempts, "total": len(attempts)})
+class TopicFanoutObject(DurableObject):
+    """
+    Durable Object holding one topic's open streams. Every isolate
+    publishes the topic's messages here, and it fans them out to all
+    subscribers (see subscriptions.py).
+    """
+
+    def __init__(self, ctx, env):
+        self.ctx = ctx
+        self.env = kv_env(env)
+        self.hub = TopicHub()
+
+    async def fetch(self, request):
+        body = json.loads(await request.text())
+        if urlsplit(request.url).path == "/publish":
+            delivered = await self.hub.publish(body["topic"], body["messages"])
+            return json_response({"delivered": delivered})
+
+        fmt = body["format"]
+        response, pump = stream_response(
+            fmt,
+            lambda send: run_stream(
+                self.hub,
+                self.env.AGENT_MESSAGES,
+                body["topic"],
+                send,
+                fmt,
+                body.get("last_event_id"),
+                body.get("viewer"),
+            ),
+        )
+        self.ctx.waitUntil(asyncio.ensure_future(pump))
+        return response
+
+
+class SecretBurnObject(DurableObject):
+    """
+    Durable Object holding one secret's burn state. Its storage is
+    strongly consistent, so exactly one claim of the secret succeeds
+    across all isolates (see secret_store.py). The record is removed by
+    an alarm once the secret has expired.
+    """
+
+    def __init__(self, ctx, env):
+        self.ctx = ctx
+        self.env = env
+
+    async def fetch(self, request):
+        body = json.loads(await request.text())
+        # Storage calls do not yield to other requests in between, so the
+        # check and the write are atomic
+        if await self.ctx.storage.get("burned"):
+            return json_response({"claimed": False})
+        await self.ctx.storage.put("burned", True)
+        await self.ctx.storage.setAlarm(body["expires_at"] * 1000)
+        return json_response({"claimed": True})
+
+    async def alarm(self):
+        await self.ctx.storage.deleteAll()
 
 
 # Main Worker entrypoint class
@@ -568,93 +1804,100 @@ class Default(WorkerEntrypoint):
 
     async def fetch(self, request):
         """Handle incoming HTTP requests."""
-        env = self.env
-        url = request.url
-        path = url.split("//")[1].split("/", 1)[1] if "//" in url else url
-        path = "/" + path.split("?")[0]  # Remove query string
+        env = kv_env(self.env)
+        path = urlsplit(request.url).path or "/"
         method = request.method
+        configure_analytics(env)
 
         # CORS preflight
         if method == "OPTIONS":
             headers = Headers.new(
                 {
                     "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                    "Access-Control-Allow-Methods": "GET, POST, DELETE, OPTIONS",
                     "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Admin-Key",
                 }.items()
             )
             return Response.new(None, status=204, headers=headers)
 
         # Route matching
+        started = time.perf_counter()
+        match = router.route(method, path)
+        route = f"{method} {match.pattern}" if match else "unmatched"
         try:
-            # Auth endpoints
-            if path == "/api/v2/agent/auth" and method == "GET":
-                # Discovery endpoint - describe the CIBA auth flow
-                response = json_response({
-                    "auth_method": "ciba",
-                    "description": "Client Initiated Backchannel Authentication",
-                    "flow": "POST public_key and purpose to initiate auth request, then poll the returned endpoint",
-                    "required_fields": {
-                        "public_key": "Your agent's public key (PEM or JWK format)",
-                        "purpose": "Human-readable description of why access is needed"
-                    },
-                    "optional_fields": {
-                        "callback_url": "URL to receive approval notification",
-                        "agent_id": "Optional identifier for your agent"
-                    },
-                    "example_request": {
-                        "public_key": "-----BEGIN PUBLIC KEY-----...",
-                        "purpose": "Coordinate task handoff between coding agents",
-                        "callback_url": "https://myagent.example/callback"
-                    },
-                    "next_step": "POST to this endpoint with required fields"
-                })
-            elif path == "/api/v2/agent/auth" and method == "POST":
-                response = await handle_auth_request(request, env)
-            elif path.startswith("/api/v2/agent/auth/") and method == "GET":
-                auth_request_id = path.split("/")[-1]
-                response = await handle_auth_poll(request, env, auth_request_id)
-
-            # Capability endpoints
-            elif path == "/api/v2/agent/messages" and method == "POST":
-                response = await handle_post_message(request, env)
-            elif path == "/api/v2/agent/messages" and method == "GET":
-                response = await handle_read_messages(request, env)
-            elif path == "/api/v2/agent/questions" and method == "POST":
-                response = await handle_ask_question(request, env)
-            elif path == "/api/v2/agent/peers" and method == "GET":
-                response = await handle_discover_peers(request, env)
-            elif path == "/api/v2/agent/subscribe" and method == "POST":
-                response = await handle_subscribe(request, env)
-            elif path == "/api/v2/secret" and method == "POST":
-                response = await handle_create_secret(request, env)
-            elif path == "/api/v2/agent/handoff" and method == "POST":
-                response = await handle_handoff(request, env)
-
-            # Admin endpoints
-            elif path == "/api/v2/admin/analytics" and method == "GET":
-                response = await handle_analytics(request, env)
-            elif path == "/api/v2/admin/auth-attempts" and method == "GET":
-                response = await handle_auth_attempts(request, env)
-
-            # Health check
-            elif path == "/" or path == "/health":
+            if match is None:
                 response = json_response(
-                    {
-                        "status": "ok",
-                        "service": "agent-network-api",
-                        "version": "0.1",
-                        "spec_version": "draft-01",
-                    }
+                    {"error": "Not found", "path": path}, 404
                 )
-
-            else:
+            elif match.method_not_allowed:
+                allowed = ", ".join(match.allowed + ("OPTIONS",))
                 response = json_response(
-                    {"error": "Not found", "path": path}, 404
+                    {"error": "Method not allowed", "allowed": allowed},
+                    405,
+                    headers={"Allow": allowed},
                 )
+            else:
+                # KV operations made for this request count against its route
+                request_env = InstrumentedEnv(env, route, metrics, KV_BINDINGS)
+                response = await dispatch(request, request_env, match)
 
         except Exception as e:
-            await log_analytics(env, "error", {"path": path, "error": str(e)})
+            log_analytics("error", {"path": path, "error": str(e)})
             response = json_response({"error": "Internal server error"}, 500)
+        metrics.observe(
+            route, response.status, time.perf_counter() - started
+        )
+
+        # Write buffered state after the response has been sent
+        background = []
+        background_env = InstrumentedEnv(
+            env, "background", metrics, KV_BINDINGS
+        )
+        if analytics.pending:
+            background.append(analytics.flush(background_env.AGENT_EVENTS))
+        if _rate_limiter is not None and _rate_limiter.needs_sync():
+            background.append(_rate_limiter.sync(background_env.AGENT_AUTH))
+        if metrics.needs_flush():
+            background.append(metrics.flush(env.AGENT_EVENTS))
+        background.extend(deferred)
+        deferred.clear()
+        for task in background:
+            self.ctx.waitUntil(asyncio.ensure_future(task))
 
         return response
+
+    async def scheduled(self, controller, env, ctx):
+        """
+        Cron trigger: retry callback deliveries and handoff inbox writes
+        whose backoff elapsed and compact settled analytics event batches
+        into rollups.
+        """
+        from rollups import compact_events
+
+        env = kv_env(env)
+        callbacks, inboxes, _ = await asyncio.gather(
+            process_due_jobs(
+                env.AGENT_AUTH, get_callback_secret(env), http_post
+            ),
+            process_due_deliveries(env.AGENT_MESSAGES),
+            compact_events(
+                env.AGENT_EVENTS,
+                retention=configure_analytics(env),
+                to_binary=to_js,
+            ),
+        )
+        for event_type, (delivered, rescheduled, abandoned) in (
+            ("auth_callback_retry", callbacks),
+            ("handoff_delivery_retry", inboxes),
+        ):
+            if delivered or rescheduled or abandoned:
+                log_analytics(
+                    event_type,
+                    {
+                        "delivered": delivered,
+                        "rescheduled": rescheduled,
+                        "abandoned": abandoned,
+                    },
+                )
+        # Write the open event batch too, whatever its age
+        await analytics.flush(env.AGENT_EVENTS, force=True)
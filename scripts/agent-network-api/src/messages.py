@@ -0,0 +1,309 @@
+"""
+Message storage and time-ordered listing for the Agent Network API.
+
+Messages live at `message:{id}` in AGENT_MESSAGES. IDs start with a
+12-digit hex millisecond timestamp (see utils.generate_id), so KV's
+lexicographic key order is also creation order.
+
+KV list only supports prefix filtering, so a `since` range is covered
+by a small number of timestamp-prefix buckets: the longest hex prefix
+length for which [since, now] spans at most MAX_LIST_BUCKETS prefixes.
+Buckets are listed in order and keys below the lower bound are skipped.
+
+Each message also gets secondary index entries, `inbox:{recipient}:{id}`
+and `topic:{topic}:{id}`, with the same TTL as the message. Filtered
+reads list the index prefix instead of every `message:` key, so their
+cost depends on the size of the inbox or topic, not on total volume.
+Index entries and message keys carry recipient/topic as metadata, so
+any remaining filter is applied to list results and bodies are only
+fetched for the page being returned, with bounded concurrency.
+
+Batches (store_messages) write every message and index entry of a
+request through one bounded pool of puts, so a batch of N messages
+costs one request and about N round-trip times divided by
+MAX_CONCURRENT_KV, instead of N requests. A failed write fails only
+its own message.
+
+Visibility: a message with a recipient is private to that agent. Reads
+and streams (see subscriptions.py) drop messages addressed to anyone
+but the reader (`viewer`), whatever other filter they use.
+
+Consistency: index entries and messages are written concurrently and
+expire together. An index entry whose message is missing (expired a
+moment earlier, or its write failed) is skipped on read and disappears
+with its own TTL.
+"""
+
+import asyncio
+import json
+import math
+import re
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from utils import (
+    MAX_CONCURRENT_KV,
+    bounded_map,
+    generate_id,
+    get_timestamp,
+    key_metadata,
+)
+
+MESSAGE_PREFIX = "message:"
+INBOX_PREFIX = "inbox:"
+TOPIC_PREFIX = "topic:"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+MAX_LIST_BUCKETS = 16
+
+# Up to 3 puts per message; keep a batch well inside the per-invocation
+# KV operation limit
+MAX_BATCH_SIZE = 100
+DEFAULT_MESSAGE_TTL = 3600
+
+# A message ID (utils.generate_id), as passed back in `cursor`
+MESSAGE_ID = re.compile(r"[0-9a-f]{12}-[0-9a-f]{20}")
+
+# Allowance for IDs minted by isolates whose clocks run slightly ahead
+CLOCK_SKEW_MS = 60_000
+
+# KV rejects metadata over 1024 bytes and keys over 512 bytes; longer
+# fields are neither indexed nor kept in metadata
+MAX_METADATA_FIELD = 256
+
+
+def _indexable(value) -> bool:
+    return isinstance(value, str) and 0 < len(value) <= MAX_METADATA_FIELD
+
+
+def _index_prefix(family: str, value: str) -> str:
+    # Escape ":" so "a" and "a:b" never share a prefix
+    return f"{family}{quote(value, safe='')}:"
+
+
+def message_metadata(message: dict):
+    """Key metadata used to filter messages without fetching bodies."""
+    metadata = {
+        "recipient": message.get("recipient"),
+        "topic": message.get("topic"),
+    }
+    for value in metadata.values():
+        if value is not None and not _indexable(value):
+            return None
+    return metadata
+
+
+def index_keys(message: dict) -> list:
+    """Secondary index keys for a message's recipient and topic."""
+    keys = []
+    if _indexable(message.get("recipient")):
+        keys.append(_index_prefix(INBOX_PREFIX, message["recipient"]))
+    if _indexable(message.get("topic")):
+        keys.append(_index_prefix(TOPIC_PREFIX, message["topic"]))
+    return [f"{prefix}{message['id']}" for prefix in keys]
+
+
+def build_message(body: dict) -> dict:
+    """A new message from a posted JSON object."""
+    return {
+        "id": generate_id(),
+        "content": body.get("content"),
+        "recipient": body.get("recipient"),
+        "topic": body.get("topic"),
+        "created_at": get_timestamp(),
+        "ttl": body.get("ttl", DEFAULT_MESSAGE_TTL),
+    }
+
+
+def message_writes(message: dict) -> list:
+    """(key, value) pairs to put for a message and its index entries."""
+    return [
+        (f"{MESSAGE_PREFIX}{message['id']}", json.dumps(message)),
+        *((key, "") for key in index_keys(message)),
+    ]
+
+
+async def store_message(store, message: dict):
+    """Write a message and its index entries to AGENT_MESSAGES."""
+    ttl = message["ttl"]
+    metadata = message_metadata(message)
+    await asyncio.gather(
+        *(
+            store.put(key, value, expirationTtl=ttl, metadata=metadata)
+            for key, value in message_writes(message)
+        )
+    )
+
+
+async def store_messages(store, messages: list) -> list:
+    """
+    Write several messages and their index entries, with at most
+    MAX_CONCURRENT_KV puts in flight. Returns, per message, None if
+    it was stored or the exception one of its writes raised.
+    """
+    writes = []
+    for index, message in enumerate(messages):
+        metadata = message_metadata(message)
+        for key, value in message_writes(message):
+            writes.append((index, key, value, message["ttl"], metadata))
+
+    async def put(write):
+        index, key, value, ttl, metadata = write
+        try:
+            await store.put(key, value, expirationTtl=ttl, metadata=metadata)
+        except Exception as e:
+            return index, e
+        return index, None
+
+    errors = [None] * len(messages)
+    for index, error in await bounded_map(put, writes, MAX_CONCURRENT_KV):
+        if error is not None and errors[index] is None:
+            errors[index] = error
+    return errors
+
+
+def scan_prefix(recipient=None, topic=None) -> str:
+    """The narrowest key family that can answer a filtered read."""
+    if _indexable(recipient):
+        return _index_prefix(INBOX_PREFIX, recipient)
+    if _indexable(topic):
+        return _index_prefix(TOPIC_PREFIX, topic)
+    return MESSAGE_PREFIX
+
+
+def parse_since(value: str) -> int:
+    """
+    Parse a `since` parameter into epoch milliseconds.
+
+    Accepts ISO 8601 timestamps or numeric epoch values (seconds, or
+    milliseconds when the value is too large to be seconds). Raises
+    ValueError for anything else, including infinite or NaN numbers.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return int(parsed.timestamp() * 1000)
+    if not math.isfinite(number):
+        raise ValueError(f"since must be finite: {value!r}")
+    return int(number if number > 1e11 else number * 1000)
+
+
+def parse_cursor(value: str) -> str:
+    """A `cursor` parameter, which must be a message ID; else ValueError."""
+    if not MESSAGE_ID.fullmatch(value):
+        raise ValueError(f"cursor is not a message ID: {value!r}")
+    return value
+
+
+def timestamp_prefix(milliseconds: int) -> str:
+    """The ID prefix for a millisecond timestamp."""
+    return f"{max(milliseconds, 0):012x}"
+
+
+def list_buckets(lower: str, upper: str) -> list:
+    """
+    Cover the hex range [lower, upper] with at most MAX_LIST_BUCKETS
+    key prefixes, choosing the narrowest prefixes that fit.
+    """
+    for length in range(len(lower), 0, -1):
+        first = int(lower[:length], 16)
+        last = int(upper[:length], 16)
+        if last - first < MAX_LIST_BUCKETS:
+            return [f"{value:0{length}x}" for value in range(first, last + 1)]
+    return [""]
+
+
+def visible_to(message: dict, viewer) -> bool:
+    """Whether `viewer` (an agent_id, or None) may read a message."""
+    addressed = message.get("recipient")
+    return addressed is None or addressed == viewer
+
+
+def _matches(message: dict, recipient, topic, viewer) -> bool:
+    if recipient is not None:
+        if message.get("recipient") != recipient:
+            return False
+    elif not visible_to(message, viewer):
+        return False
+    if topic is not None and message.get("topic") != topic:
+        return False
+    return True
+
+
+async def list_messages(
+    store,
+    since_ms: int = None,
+    cursor: str = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    recipient: str = None,
+    topic: str = None,
+    viewer: str = None,
+) -> dict:
+    """
+    Return one page of messages in creation order.
+
+    `cursor` is the ID of the last message already seen (exclusive);
+    `since_ms` is an inclusive lower bound on creation time. Without a
+    `recipient` filter, messages addressed to anyone but `viewer` are
+    left out; callers check that a reader may use `recipient`. The returned
+    `next_cursor` is the ID of the last message in the page, so callers
+    can keep polling for new messages even when `has_more` is false.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    lower = timestamp_prefix(since_ms or 0)
+    if cursor and cursor[:12] > lower:
+        lower = cursor[:12]
+    upper = timestamp_prefix(int(time.time() * 1000) + CLOCK_SKEW_MS)
+
+    prefix = scan_prefix(recipient, topic)
+    selected = []
+    has_more = False
+    for bucket in list_buckets(lower, upper):
+        kv_cursor = None
+        while not has_more:
+            result = await store.list(
+                prefix=f"{prefix}{bucket}", cursor=kv_cursor
+            )
+            for key in result.keys:
+                message_id = key.name[len(prefix):]
+                if message_id < lower or (cursor and message_id <= cursor):
+                    continue
+                metadata = key_metadata(key)
+                if metadata and not _matches(
+                    metadata, recipient, topic, viewer
+                ):
+                    continue
+                if len(selected) == limit:
+                    has_more = True
+                    break
+                selected.append(message_id)
+            if result.list_complete:
+                break
+            kv_cursor = result.cursor
+        if has_more:
+            break
+
+    bodies = await bounded_map(
+        store.get,
+        [f"{MESSAGE_PREFIX}{message_id}" for message_id in selected],
+        MAX_CONCURRENT_KV,
+    )
+    messages = []
+    for body in bodies:
+        # Messages can expire between the list and the get, and index
+        # entries can briefly outlive their message
+        if body:
+            message = json.loads(body)
+            # Messages stored without metadata are filtered here instead
+            if _matches(message, recipient, topic, viewer):
+                messages.append(message)
+
+    next_cursor = selected[-1] if selected else cursor
+    return {
+        "messages": messages,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
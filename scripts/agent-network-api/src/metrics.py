@@ -0,0 +1,362 @@
+"""
+Request metrics for the Agent Network API.
+
+Each isolate keeps a MetricsRegistry with, per route (method + pattern,
+e.g. "GET /api/v2/agent/auth/{auth_request_id}"):
+
+- request counts by status class, and the error (5xx) rate;
+- a latency Histogram with HDR-style log-linear buckets: SUB_BUCKETS
+  buckets per power of two, so quantiles carry a bounded relative error
+  (about 1/SUB_BUCKETS) at any scale while memory stays fixed;
+- KV operations by binding and operation, counted by the InstrumentedKV
+  wrappers handed to that route's handler. Background work started by a
+  handler (waitUntil) is counted against the route too; analytics
+  flushes and rate limiter syncs are counted under "background".
+
+Every FLUSH_INTERVAL seconds the registry is written, off the response
+path, to `metrics:{writer_id}` in AGENT_EVENTS. The values are
+cumulative since the isolate started, and each key has one writer. The
+admin endpoint merges all isolates' snapshots. Snapshots expire
+SNAPSHOT_TTL seconds after an isolate's last flush.
+
+Workers only advance the clock across I/O, so latencies measure time
+spent waiting on KV and other subrequests, not CPU time.
+"""
+
+import bisect
+import json
+import time
+from collections import Counter
+
+from utils import MAX_CONCURRENT_KV, bounded_map, generate_id
+
+METRICS_PREFIX = "metrics:"
+FLUSH_INTERVAL = 60
+SNAPSHOT_TTL = 3600
+
+SUB_BUCKETS = 4
+MIN_EXPONENT = -4  # 1/16 ms
+MAX_EXPONENT = 17  # ~131 s
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open
+BUCKET_BOUNDS = tuple(
+    2**exponent * (1 + sub / SUB_BUCKETS)
+    for exponent in range(MIN_EXPONENT, MAX_EXPONENT)
+    for sub in range(SUB_BUCKETS)
+)
+
+QUANTILES = (0.5, 0.9, 0.99)
+KV_OPERATIONS = ("get", "put", "list", "delete", "getWithMetadata")
+
+
+class Histogram:
+    """Fixed log-linear bucket histogram of millisecond latencies."""
+
+    __slots__ = ("counts", "total", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value_ms: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value_ms)] += 1
+        self.total += 1
+        self.sum += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th value."""
+        if not self.total:
+            return 0.0
+        rank = max(1, round(q * self.total))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if index == len(BUCKET_BOUNDS):
+                    return self.max
+                return min(BUCKET_BOUNDS[index], self.max)
+        return self.max
+
+    def merge(self, other: "Histogram"):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict:
+        # Sparse: most buckets are empty
+        return {
+            "buckets": {str(i): c for i, c in enumerate(self.counts) if c},
+            "total": self.total,
+            "sum": self.sum,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        histogram = cls()
+        for index, count in data["buckets"].items():
+            histogram.counts[int(index)] = count
+        histogram.total = data["total"]
+        histogram.sum = data["sum"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class RouteStats:
+    """Counters for one route."""
+
+    __slots__ = ("statuses", "latency", "kv")
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.latency = Histogram()
+        self.kv = Counter()
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    def merge(self, other: "RouteStats"):
+        self.statuses.update(other.statuses)
+        self.latency.merge(other.latency)
+        self.kv.update(other.kv)
+
+    def to_dict(self) -> dict:
+        return {
+            "statuses": dict(self.statuses),
+            "latency": self.latency.to_dict(),
+            # "binding.op" keys keep the snapshot plain JSON
+            "kv": {f"{b}.{op}": n for (b, op), n in self.kv.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RouteStats":
+        stats = cls()
+        stats.statuses.update(data["statuses"])
+        stats.latency = Histogram.from_dict(data["latency"])
+        for key, count in data["kv"].items():
+            binding, _, op = key.rpartition(".")
+            stats.kv[(binding, op)] = count
+        return stats
+
+    def summary(self) -> dict:
+        requests = self.requests
+        errors = self.statuses.get("5xx", 0)
+        kv_total = sum(self.kv.values())
+        return {
+            "requests": requests,
+            "statuses": dict(sorted(self.statuses.items())),
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "latency_ms": {
+                **{
+                    f"p{round(q * 100)}": round(self.latency.quantile(q), 3)
+                    for q in QUANTILES
+                },
+                "mean": (
+                    round(self.latency.sum / self.latency.total, 3)
+                    if self.latency.total
+                    else 0.0
+                ),
+                "max": round(self.latency.max, 3),
+            },
+            "kv_ops": {
+                f"{binding}.{op}": count
+                for (binding, op), count in sorted(self.kv.items())
+            },
+            "kv_ops_per_request": (
+                round(kv_total / requests, 3) if requests else 0.0
+            ),
+        }
+
+
+class MetricsRegistry:
+    """Per-isolate request metrics."""
+
+    def __init__(
+        self,
+        writer_id: str = None,
+        flush_interval: float = FLUSH_INTERVAL,
+        clock=time.time,
+    ):
+        self.writer_id = writer_id or generate_id()
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self.started_at = clock()
+        self.routes = {}
+        self._last_flush = self.started_at
+        self._dirty = False
+
+    def _stats(self, route: str) -> RouteStats:
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = RouteStats()
+        return stats
+
+    def observe(self, route: str, status: int, seconds: float):
+        """Record one request."""
+        stats = self._stats(route)
+        stats.statuses[f"{status // 100}xx"] += 1
+        stats.latency.record(seconds * 1000)
+        self._dirty = True
+
+    def count_kv(self, route: str, binding: str, op: str):
+        self._stats(route).kv[(binding, op)] += 1
+        self._dirty = True
+
+    def needs_flush(self) -> bool:
+        return self._dirty and (
+            self._clock() - self._last_flush >= self.flush_interval
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "writer_id": self.writer_id,
+            "started_at": self.started_at,
+            "routes": {r: s.to_dict() for r, s in self.routes.items()},
+        }
+
+    async def flush(self, store):
+        """Publish this isolate's cumulative snapshot."""
+        self._last_flush = self._clock()
+        self._dirty = False
+        await store.put(
+            f"{METRICS_PREFIX}{self.writer_id}",
+            json.dumps(self.to_dict()),
+            expirationTtl=SNAPSHOT_TTL,
+        )
+
+
+def merge_snapshots(snapshots) -> dict:
+    """Merge isolate snapshots into {route: RouteStats}."""
+    merged = {}
+    for snapshot in snapshots:
+        for route, data in snapshot["routes"].items():
+            stats = RouteStats.from_dict(data)
+            if route in merged:
+                merged[route].merge(stats)
+            else:
+                merged[route] = stats
+    return merged
+
+
+async def collect(store, registry: MetricsRegistry) -> tuple:
+    """
+    All isolates' snapshots plus this isolate's live registry (which
+    replaces its own, older, stored snapshot). Returns (isolates, routes).
+    """
+    names = []
+    cursor = None
+    while True:
+        result = await store.list(prefix=METRICS_PREFIX, cursor=cursor)
+        names.extend(key.name for key in result.keys)
+        if result.list_complete:
+            break
+        cursor = result.cursor
+
+    own = f"{METRICS_PREFIX}{registry.writer_id}"
+    others = [name for name in names if name != own]
+    bodies = await bounded_map(store.get, others, MAX_CONCURRENT_KV)
+    snapshots = [json.loads(body) for body in bodies if body]
+    snapshots.append(registry.to_dict())
+    return len(snapshots), merge_snapshots(snapshots)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(routes: dict) -> str:
+    """Prometheus text exposition (format 0.0.4) of merged route stats."""
+    lines = [
+        "# HELP agent_network_requests_total Requests by route and status.",
+        "# TYPE agent_network_requests_total counter",
+    ]
+    for route, stats in sorted(routes.items()):
+        for status, count in sorted(stats.statuses.items()):
+            lines.append(
+                f'agent_network_requests_total{{route="{_escape(route)}",'
+                f'status="{status}"}} {count}'
+            )
+
+    lines += [
+        "# HELP agent_network_request_duration_ms Request latency.",
+        "# TYPE agent_network_request_duration_ms histogram",
+    ]
+    for route, stats in sorted(routes.items()):
+        label = f'route="{_escape(route)}"'
+        histogram = stats.latency
+        cumulative = 0
+        for bound, count in zip(BUCKET_BOUNDS, histogram.counts):
+            cumulative += count
+            if count:
+                lines.append(
+                    f"agent_network_request_duration_ms_bucket"
+                    f'{{{label},le="{bound:g}"}} {cumulative}'
+                )
+        lines += [
+            f'agent_network_request_duration_ms_bucket{{{label},le="+Inf"}} '
+            f"{histogram.total}",
+            f"agent_network_request_duration_ms_sum{{{label}}} "
+            f"{histogram.sum:.3f}",
+            f"agent_network_request_duration_ms_count{{{label}}} "
+            f"{histogram.total}",
+        ]
+
+    lines += [
+        "# HELP agent_network_kv_operations_total KV operations by route.",
+        "# TYPE agent_network_kv_operations_total counter",
+    ]
+    for route, stats in sorted(routes.items()):
+        for (binding, op), count in sorted(stats.kv.items()):
+            lines.append(
+                f'agent_network_kv_operations_total{{route="{_escape(route)}",'
+                f'binding="{binding}",op="{op}"}} {count}'
+            )
+    return "\n".join(lines) + "\n"
+
+
+class InstrumentedKV:
+    """KV binding wrapper that counts operations against a route."""
+
+    __slots__ = ("_store", "_binding", "_route", "_registry")
+
+    def __init__(self, store, binding: str, route: str, registry):
+        self._store = store
+        self._binding = binding
+        self._route = route
+        self._registry = registry
+
+    def __getattr__(self, name):
+        attribute = getattr(self._store, name)
+        if name not in KV_OPERATIONS:
+            return attribute
+
+        def counted(*args, **kwargs):
+            self._registry.count_kv(self._route, self._binding, name)
+            return attribute(*args, **kwargs)
+
+        return counted
+
+
+class InstrumentedEnv:
+    """Worker env whose KV bindings count operations for one route."""
+
+    def __init__(self, env, route: str, registry, bindings: tuple):
+        self._env = env
+        self._route = route
+        self._registry = registry
+        self._bindings = bindings
+
+    def __getattr__(self, name):
+        value = getattr(self._env, name)
+        if name in self._bindings:
+            value = InstrumentedKV(value, name, self._route, self._registry)
+            # Cache so later lookups skip __getattr__
+            setattr(self, name, value)
+        return value
@@ -0,0 +1,436 @@
+"""
+Peer directory for the Agent Network API.
+
+Agents are registered as `peer:{agent_id}` in AGENT_AUTH when their auth
+request is approved, and their `last_seen` is refreshed (at most once per
+HEARTBEAT_INTERVAL per isolate) when they post. The full peer record is
+also the key's metadata, so the directory is loaded with list calls
+alone; records too large for metadata are fetched individually.
+
+Each isolate keeps a snapshot of the directory, reloaded from KV every
+SNAPSHOT_TTL seconds (one load at a time, shared by concurrent requests).
+A snapshot holds:
+
+- each peer's JSON pre-encoded once, with its effective status (peers not
+  seen for OFFLINE_AFTER seconds are reported offline);
+- status, capability and provider indexes, so a filtered listing only
+  touches the matching peers;
+- response bodies and ETags, built eagerly for every status filter and
+  lazily (bounded) for other filter combinations.
+
+ETags are weak and leave out the snapshot's discovery_timestamp (and the
+"now" last_seen of demo peers), so they only change when the listed peers
+do, and every isolate computes the same tag for the same directory.
+
+Registrations made in this isolate are applied to its snapshot right
+away; other isolates see them on their next reload.
+
+An agent_id belongs to the key pair that first registered it: approval
+records a hash of the auth request's public_key at `agent_owner:{id}`
+(refreshed by each approval, expiring with the peer record), and a
+request for an agent_id owned by another key is refused, as are the demo
+peers' IDs. The directory entry and the agent's callback URL are only
+written once the approved request holds the claim.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+
+from utils import (
+    MAX_CONCURRENT_KV,
+    bounded_map,
+    get_timestamp,
+    key_metadata,
+    public_key_digest,
+)
+
+PEER_PREFIX = "peer:"
+OWNER_PREFIX = "agent_owner:"
+PEER_TTL = 7 * 86400
+SNAPSHOT_TTL = 30
+HEARTBEAT_INTERVAL = 60
+OFFLINE_AFTER = 600
+NETWORK_VERSION = "0.1"
+
+PEER_STATUSES = ("online", "busy", "offline")
+
+MAX_CAPABILITIES = 32
+MAX_FIELD_LENGTH = 128
+MAX_METADATA_BYTES = 1024
+MAX_CACHED_BODIES = 64
+
+# Demo participants of the mock network; always listed, seen "now"
+DEMO_PEERS = (
+    {
+        "agent_id": "claude-code-primary",
+        "name": "Claude Code (Primary)",
+        "provider": "anthropic",
+        "capabilities": ["message", "secret", "handoff", "code_review"],
+        "status": "online",
+        "metadata": {
+            "model": "claude-sonnet-4-20250514",
+            "context": "software_development",
+        },
+    },
+    {
+        "agent_id": "github-copilot-workspace",
+        "name": "GitHub Copilot Workspace",
+        "provider": "github",
+        "capabilities": ["message", "handoff", "code_generation"],
+        "status": "online",
+        "metadata": {"context": "ide_integration"},
+    },
+    {
+        "agent_id": "devin-dev-agent",
+        "name": "Devin",
+        "provider": "cognition",
+        "capabilities": ["message", "secret", "handoff", "autonomous_coding"],
+        "status": "busy",
+        "metadata": {
+            "current_task": "debugging_session",
+            "context": "autonomous_development",
+        },
+    },
+    {
+        "agent_id": "cursor-composer",
+        "name": "Cursor Composer",
+        "provider": "cursor",
+        "capabilities": ["message", "handoff", "multi_file_edit"],
+        "status": "online",
+        "metadata": {"context": "editor_integration"},
+    },
+    {
+        "agent_id": "codex-cli-agent",
+        "name": "OpenAI Codex CLI",
+        "provider": "openai",
+        "capabilities": ["message", "secret", "shell_execution"],
+        "status": "offline",
+        "last_seen": "2025-11-28T08:30:00Z",
+        "metadata": {"context": "terminal_automation"},
+    },
+    {
+        "agent_id": "windsurf-cascade",
+        "name": "Windsurf Cascade",
+        "provider": "codeium",
+        "capabilities": ["message", "handoff", "code_flow"],
+        "status": "online",
+        "metadata": {"context": "ide_integration"},
+    },
+)
+
+
+RESERVED_AGENT_IDS = frozenset(peer["agent_id"] for peer in DEMO_PEERS)
+
+
+def _short(value) -> bool:
+    return isinstance(value, str) and 0 < len(value) <= MAX_FIELD_LENGTH
+
+
+def build_peer(agent_id: str, details: dict) -> dict:
+    """
+    A peer record from an agent's self-description (e.g. the optional
+    fields of its auth request). Raises ValueError for invalid input.
+    """
+    if not _short(agent_id):
+        raise ValueError("agent_id must be a non-empty string")
+    capabilities = details.get("capabilities") or []
+    if not isinstance(capabilities, list) or len(capabilities) > (
+        MAX_CAPABILITIES
+    ):
+        raise ValueError(
+            f"capabilities must be a list of at most {MAX_CAPABILITIES}"
+        )
+    if not all(_short(capability) for capability in capabilities):
+        raise ValueError("capabilities must be short strings")
+    for field in ("name", "provider"):
+        if details.get(field) is not None and not _short(details[field]):
+            raise ValueError(f"{field} must be a short string")
+    status = details.get("status", "online")
+    if status not in PEER_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(PEER_STATUSES)}")
+    metadata = details.get("metadata") or {}
+    if not isinstance(metadata, dict):
+        raise ValueError("metadata must be an object")
+
+    return {
+        "agent_id": agent_id,
+        "name": details.get("name") or agent_id,
+        "provider": details.get("provider") or "unknown",
+        "capabilities": list(dict.fromkeys(capabilities)),
+        "status": status,
+        "last_seen": get_timestamp(),
+        "metadata": metadata,
+    }
+
+
+def peer_metadata(peer: dict):
+    """The record as KV key metadata, or None when it is too large."""
+    if len(json.dumps(peer).encode()) > MAX_METADATA_BYTES:
+        return None
+    return peer
+
+
+async def store_peer(store, peer: dict):
+    """Write a peer record to the registry."""
+    await store.put(
+        f"{PEER_PREFIX}{peer['agent_id']}",
+        json.dumps(peer),
+        expirationTtl=PEER_TTL,
+        metadata=peer_metadata(peer),
+    )
+
+
+def agent_owner(public_key) -> str:
+    """Owner of the agent_ids registered with a public key (PEM or JWK)."""
+    return public_key_digest(public_key)
+
+
+async def agent_id_available(store, agent_id: str, owner: str) -> bool:
+    """True when `agent_id` is unclaimed or already claimed by `owner`."""
+    if agent_id in RESERVED_AGENT_IDS:
+        return False
+    current = await store.get(f"{OWNER_PREFIX}{agent_id}")
+    return not current or current == owner
+
+
+async def claim_agent_id(store, agent_id: str, owner: str) -> bool:
+    """
+    Claim (or renew) `agent_id` for `owner`; False when another owner
+    holds it. KV has no compare-and-set, so two owners approved within
+    its propagation delay can both succeed, and the later claim is kept.
+    """
+    if not await agent_id_available(store, agent_id, owner):
+        return False
+    await store.put(f"{OWNER_PREFIX}{agent_id}", owner, expirationTtl=PEER_TTL)
+    return True
+
+
+def _seen_at(peer: dict, now: float) -> float:
+    last_seen = peer.get("last_seen")
+    if last_seen is None:
+        return now
+    try:
+        parsed = datetime.fromisoformat(last_seen.replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    return parsed.timestamp()
+
+
+def effective_status(peer: dict, now: float) -> str:
+    """The peer's status, or offline when it has not been seen lately."""
+    if now - _seen_at(peer, now) > OFFLINE_AFTER:
+        return "offline"
+    return peer.get("status", "online")
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+class Snapshot:
+    """Immutable, indexed view of the directory at one point in time."""
+
+    def __init__(self, records: dict, now: float):
+        self.built_at = now
+        self.timestamp = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        self.fragments = []
+        self.versions = []
+        self.statuses = []
+        self.by_status = {}
+        self.by_capability = {}
+        self.by_provider = {}
+        for agent_id in sorted(records):
+            peer = dict(records[agent_id])
+            peer["status"] = effective_status(peer, now)
+            position = len(self.fragments)
+            version = json.dumps(peer, separators=(",", ":"))
+            if peer.get("last_seen") is None:
+                peer["last_seen"] = self.timestamp
+                self.fragments.append(json.dumps(peer, separators=(",", ":")))
+            else:
+                self.fragments.append(version)
+            self.versions.append(version)
+            self.statuses.append(peer["status"])
+            self.by_status.setdefault(peer["status"], []).append(position)
+            self.by_provider.setdefault(peer.get("provider"), []).append(
+                position
+            )
+            for capability in peer.get("capabilities", ()):
+                self.by_capability.setdefault(capability, []).append(position)
+
+        self._sets = {}
+        self._bodies = {}
+        for status in (None, *PEER_STATUSES):
+            self.body(status=status)
+
+    def select(self, status=None, capability=None, provider=None) -> list:
+        """Positions of matching peers, in agent_id order."""
+        candidates = [
+            (index, value)
+            for index, value in (
+                (self.by_status, status),
+                (self.by_capability, capability),
+                (self.by_provider, provider),
+            )
+            if value is not None
+        ]
+        if not candidates:
+            return list(range(len(self.fragments)))
+        candidates.sort(key=lambda c: len(c[0].get(c[1], ())))
+        index, value = candidates[0]
+        selected = index.get(value, [])
+        for index, value in candidates[1:]:
+            members = self._members(index, value)
+            selected = [p for p in selected if p in members]
+        return list(selected)
+
+    def _members(self, index: dict, value) -> frozenset:
+        if value not in index:
+            return frozenset()
+        key = (id(index), value)
+        members = self._sets.get(key)
+        if members is None:
+            members = self._sets[key] = frozenset(index[value])
+        return members
+
+    def body(self, status=None, capability=None, provider=None):
+        """(JSON body, ETag) for a filtered listing."""
+        key = (status, capability, provider)
+        cached = self._bodies.get(key)
+        if cached is not None:
+            return cached
+
+        positions = self.select(status, capability, provider)
+        online = sum(1 for p in positions if self.statuses[p] == "online")
+        body = (
+            '{"peers":['
+            + ",".join(self.fragments[p] for p in positions)
+            + f'],"total":{len(positions)},"online_count":{online},'
+            + f'"network_version":"{NETWORK_VERSION}",'
+            + f'"discovery_timestamp":"{self.timestamp}"}}'
+        )
+        digest = hashlib.sha256(
+            "\n".join(self.versions[p] for p in positions).encode()
+        ).hexdigest()
+        cached = (body, f'W/"{digest[:16]}"')
+        if len(self._bodies) < MAX_CACHED_BODIES:
+            self._bodies[key] = cached
+        return cached
+
+
+class PeerDirectory:
+    """Per-isolate peer directory with a periodically rebuilt snapshot."""
+
+    def __init__(
+        self,
+        snapshot_ttl: float = SNAPSHOT_TTL,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        demo_peers=DEMO_PEERS,
+        clock=time.time,
+    ):
+        self.snapshot_ttl = snapshot_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.demo_peers = {peer["agent_id"]: peer for peer in demo_peers}
+        self._clock = clock
+        self._records = None
+        self._loaded_at = 0.0
+        self._loading = None
+        self._snapshot = None
+        self._last_written = {}
+
+    async def snapshot(self, store) -> Snapshot:
+        """The current snapshot, reloading the registry when stale."""
+        now = self._clock()
+        if self._records is None or now - self._loaded_at >= self.snapshot_ttl:
+            if self._loading is None:
+                self._loading = asyncio.ensure_future(self._load(store))
+            loading = self._loading
+            try:
+                await loading
+            finally:
+                if self._loading is loading:
+                    self._loading = None
+        if self._snapshot is None:
+            self._snapshot = Snapshot(
+                {**self.demo_peers, **self._records}, self._clock()
+            )
+        return self._snapshot
+
+    async def _load(self, store):
+        records = {}
+        missing = []
+        cursor = None
+        while True:
+            result = await store.list(prefix=PEER_PREFIX, cursor=cursor)
+            for key in result.keys:
+                metadata = key_metadata(key)
+                if metadata:
+                    records[metadata["agent_id"]] = metadata
+                else:
+                    missing.append(key.name)
+            if result.list_complete:
+                break
+            cursor = result.cursor
+
+        bodies = await bounded_map(store.get, missing, MAX_CONCURRENT_KV)
+        for body in bodies:
+            if body:
+                peer = json.loads(body)
+                records[peer["agent_id"]] = peer
+
+        # Keep local registrations newer than what KV returned
+        for agent_id, peer in (self._records or {}).items():
+            if peer.get("last_seen", "") > records.get(agent_id, {}).get(
+                "last_seen", ""
+            ):
+                records[agent_id] = peer
+        self._records = records
+        self._loaded_at = self._clock()
+        self._snapshot = None
+
+    def upsert(self, peer: dict):
+        """Apply a registration to this isolate's view immediately."""
+        if self._records is not None:
+            self._records[peer["agent_id"]] = peer
+            self._snapshot = None
+        self._last_written[peer["agent_id"]] = self._clock()
+
+    async def register(self, store, peer: dict):
+        """Register (or re-register) a peer."""
+        self.upsert(peer)
+        await store_peer(store, peer)
+
+    def heartbeat_due(self, agent_id: str) -> bool:
+        """
+        True when this isolate has not refreshed the peer recently; the
+        caller is then expected to run heartbeat().
+        """
+        now = self._clock()
+        last = self._last_written.get(agent_id)
+        if last is not None and now - last < self.heartbeat_interval:
+            return False
+        self._last_written[agent_id] = now
+        return True
+
+    async def heartbeat(self, store, agent_id: str):
+        """Refresh a registered peer's last_seen."""
+        peer = (self._records or {}).get(agent_id)
+        if peer is None:
+            body = await store.get(f"{PEER_PREFIX}{agent_id}")
+            if not body:
+                return  # not registered; nothing to refresh
+            peer = json.loads(body)
+        peer = dict(peer, last_seen=get_timestamp())
+        await self.register(store, peer)
@@ -0,0 +1,204 @@
+"""
+Questions and answers for the Agent Network API.
+
+A question is stored as two keys in AGENT_MESSAGES, both expiring with
+the question:
+
+    question:{id}         the question as asked; never changes
+    question_status:{id}  a compact status record: status, version,
+                          timestamps and, once answered, the answer
+
+Polls only read the status record, so a poll is one small KV get, and
+StatusCache keeps recently read records in the isolate: pending ones for
+PENDING_CACHE_TTL (an answer given through another isolate shows up
+within that), answered ones for up to ANSWERED_CACHE_TTL, since they no
+longer change. The record's version is its ETag, so a poller that sends
+If-None-Match gets an empty 304 until the question is answered.
+
+A question takes one answer; answering an answered question is a
+conflict. KV has no compare-and-set, so two answers submitted through
+different isolates within KV's propagation delay can both be accepted,
+and the later write wins.
+"""
+
+import json
+import time
+from collections import OrderedDict
+
+from utils import generate_id, get_timestamp, kv_ttl
+
+QUESTION_PREFIX = "question:"
+STATUS_PREFIX = "question_status:"
+
+PENDING = "pending"
+ANSWERED = "answered"
+
+DEFAULT_QUESTION_TTL = 86400
+MIN_QUESTION_TTL = 60
+MAX_QUESTION_TTL = 7 * 86400
+MAX_QUESTION_LENGTH = 4000
+MAX_ANSWER_LENGTH = 4000
+
+# Suggested interval between polls of a pending question
+POLL_INTERVAL = 5
+
+MAX_CACHE_SIZE = 1024
+PENDING_CACHE_TTL = 2
+ANSWERED_CACHE_TTL = 300
+
+
+def _text(body: dict, field: str, max_length: int) -> str:
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{field}' is required")
+    if len(value) > max_length:
+        raise ValueError(f"'{field}' is longer than {max_length} characters")
+    return value
+
+
+def build_question(body: dict, asked_by: str = None, now: float = None):
+    """
+    (question, status record) for a posted JSON object. Raises ValueError
+    when the question or its TTL is invalid.
+    """
+    text = _text(body, "question", MAX_QUESTION_LENGTH)
+    ttl = body.get("ttl", DEFAULT_QUESTION_TTL)
+    if (
+        not isinstance(ttl, int)
+        or isinstance(ttl, bool)
+        or not MIN_QUESTION_TTL <= ttl <= MAX_QUESTION_TTL
+    ):
+        raise ValueError(
+            f"'ttl' must be between {MIN_QUESTION_TTL} and "
+            f"{MAX_QUESTION_TTL} seconds"
+        )
+
+    now = time.time() if now is None else now
+    created_at = get_timestamp()
+    question = {
+        "id": generate_id(),
+        "question": text,
+        "context": body.get("context"),
+        "asked_by": asked_by,
+        "created_at": created_at,
+        "expires_at": int(now + ttl),
+    }
+    status = {
+        "question_id": question["id"],
+        "status": PENDING,
+        "version": 1,
+        "created_at": created_at,
+        "expires_at": question["expires_at"],
+    }
+    return question, status
+
+
+def answer_status(
+    status: dict, body: dict, answered_by: str = None
+) -> dict:
+    """
+    The status record of `status` answered with a posted JSON object.
+    Raises ValueError when the answer is invalid.
+    """
+    return {
+        **status,
+        "status": ANSWERED,
+        "version": status["version"] + 1,
+        "answer": _text(body, "answer", MAX_ANSWER_LENGTH),
+        "answered_by": answered_by,
+        "answered_at": get_timestamp(),
+    }
+
+
+def status_etag(status: dict) -> str:
+    return f'W/"{status["question_id"]}.{status["version"]}"'
+
+
+def _ttl(status: dict, now: float) -> int:
+    return kv_ttl(status["expires_at"] - now)
+
+
+async def save_question(store, question: dict, status: dict, now=None):
+    now = time.time() if now is None else now
+    ttl = _ttl(status, now)
+    await store.put(
+        f"{QUESTION_PREFIX}{question['id']}",
+        json.dumps(question),
+        expirationTtl=ttl,
+    )
+    await save_status(store, status, now)
+
+
+async def save_status(store, status: dict, now=None):
+    now = time.time() if now is None else now
+    await store.put(
+        f"{STATUS_PREFIX}{status['question_id']}",
+        json.dumps(status),
+        expirationTtl=_ttl(status, now),
+    )
+
+
+async def load_question(store, question_id: str):
+    body = await store.get(f"{QUESTION_PREFIX}{question_id}")
+    return json.loads(body) if body else None
+
+
+async def load_status(store, question_id: str):
+    body = await store.get(f"{STATUS_PREFIX}{question_id}")
+    return json.loads(body) if body else None
+
+
+class StatusCache:
+    """LRU cache mapping question_id -> (status record, cached_until)."""
+
+    def __init__(
+        self,
+        max_size: int = MAX_CACHE_SIZE,
+        pending_ttl: float = PENDING_CACHE_TTL,
+        answered_ttl: float = ANSWERED_CACHE_TTL,
+        clock=time.time,
+    ):
+        self.max_size = max_size
+        self.pending_ttl = pending_ttl
+        self.answered_ttl = answered_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question_id: str):
+        """The cached status record, or None."""
+        entry = self._entries.get(question_id)
+        if entry is None or entry[1] <= self._clock():
+            if entry is not None:
+                del self._entries[question_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(question_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, status: dict):
+        now = self._clock()
+        ttl = (
+            self.pending_ttl
+            if status["status"] == PENDING
+            else self.answered_ttl
+        )
+        cached_until = min(now + ttl, status["expires_at"])
+        if cached_until <= now:
+            return
+        question_id = status["question_id"]
+        self._entries[question_id] = (status, cached_until)
+        self._entries.move_to_end(question_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def load(self, store, question_id: str):
+        """The status record, from the cache or else from KV."""
+        status = self.get(question_id)
+        if status is None:
+            status = await load_status(store, question_id)
+            if status is not None:
+                self.put(status)
+        return status
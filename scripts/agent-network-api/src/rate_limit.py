@@ -0,0 +1,249 @@
+"""
+Sliding-window rate limiting for the Agent Network API.
+
+Limits come from the `rate_limits` section of agent-network.json
+(mirrored in SPEC_RATE_LIMITS, overridable with the RATE_LIMITS var) and
+are applied per validated bearer token to the handlers tagged with
+@rate_limited. Requests with a token that does not validate are counted
+per client address instead, in the isolate only (never synced), so
+made-up tokens cannot create KV keys.
+
+The window is the usual two-counter approximation: the previous fixed
+window's count, weighted by how much of it still overlaps the sliding
+window, plus the current window's count.
+
+Checks are answered in the isolate with no I/O. Isolates share their
+counts through KV, off the response path: each isolate writes its own
+count for a window to `rate:{bucket}:{key}:{window}:{writer}` (single
+writer, so no lost updates) and periodically lists the other writers'
+keys. Other isolates' traffic is therefore seen with up to
+SYNC_INTERVAL seconds of lag, which is the trade for a zero-I/O fast path.
+
+At most MAX_WINDOWS keys are tracked per isolate; past that, the oldest
+key is forgotten.
+"""
+
+import asyncio
+import hashlib
+import math
+import time
+from functools import lru_cache
+from typing import NamedTuple
+
+from utils import generate_id, key_metadata, kv_ttl
+
+# Mirror of public/.well-known/agent-network.json "rate_limits"
+SPEC_RATE_LIMITS = {
+    "posts_per_minute": 10,
+    "reads_per_minute": 60,
+    "secrets_per_hour": 100,
+}
+
+WINDOW_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+SYNC_INTERVAL = 5
+RATE_KEY_PREFIX = "rate:"
+
+# Each synced key costs a put and a list; keep one sync well inside the
+# per-invocation KV operation limit. Leftover keys wait for the next sync.
+MAX_SYNC_KEYS = 200
+
+# Keys tracked per isolate
+MAX_WINDOWS = 10_000
+
+
+def parse_rate_limits(spec: dict) -> dict:
+    """Turn {"posts_per_minute": 10} into {"posts": (10, 60)}."""
+    limits = {}
+    for name, limit in spec.items():
+        bucket, _, unit = name.rpartition("_per_")
+        if not bucket or unit not in WINDOW_UNITS:
+            raise ValueError(f"Unrecognised rate limit: {name}")
+        limits[bucket] = (int(limit), WINDOW_UNITS[unit])
+    return limits
+
+
+def rate_limited(bucket: str):
+    """Tag a route handler with the rate limit bucket it draws from."""
+
+    def decorate(handler):
+        handler.rate_limit = bucket
+        return handler
+
+    return decorate
+
+
+class Decision(NamedTuple):
+    """Outcome of a rate limit check."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int
+
+
+class _Window:
+    __slots__ = (
+        "index",
+        "current",
+        "previous",
+        "remote_current",
+        "remote_previous",
+    )
+
+    def __init__(self, index: int):
+        self.index = index
+        self.current = 0
+        self.previous = 0
+        self.remote_current = 0
+        self.remote_previous = 0
+
+    def roll(self, index: int):
+        if index == self.index:
+            return
+        if index == self.index + 1:
+            self.previous, self.remote_previous = (
+                self.current,
+                self.remote_current,
+            )
+        else:
+            self.previous = self.remote_previous = 0
+        self.current = self.remote_current = 0
+        self.index = index
+
+
+class RateLimiter:
+    """Per-key sliding-window limiter with KV-shared counts."""
+
+    def __init__(
+        self,
+        limits: dict,
+        writer_id: str = None,
+        sync_interval: float = SYNC_INTERVAL,
+        clock=time.time,
+        max_windows: int = MAX_WINDOWS,
+    ):
+        self.limits = limits
+        self.writer_id = writer_id or generate_id()
+        self.sync_interval = sync_interval
+        self.max_windows = max_windows
+        self._clock = clock
+        self._windows = {}
+        self._dirty = set()
+        self._last_sync = 0.0
+
+    def check(
+        self, bucket: str, token: str, shared: bool = True
+    ) -> Decision:
+        """
+        Count a request against `bucket` for `token` if it fits. Counts
+        that are not `shared` stay in this isolate.
+        """
+        limit, window = self.limits[bucket]
+        now = self._clock()
+        index = int(now // window)
+        state_key = (bucket, _key_for(token))
+        state = self._windows.get(state_key)
+        if state is None:
+            if len(self._windows) >= self.max_windows:
+                # Insertion order: forget the oldest key
+                oldest = next(iter(self._windows))
+                del self._windows[oldest]
+                self._dirty.discard(oldest)
+            state = self._windows[state_key] = _Window(index)
+        state.roll(index)
+
+        elapsed = (now - index * window) / window
+        previous = state.previous + state.remote_previous
+        current = state.current + state.remote_current
+        estimate = previous * (1 - elapsed) + current
+
+        if estimate + 1 > limit:
+            return Decision(
+                False,
+                limit,
+                0,
+                _retry_after(limit, window, elapsed, previous, current),
+            )
+
+        state.current += 1
+        if shared:
+            self._dirty.add(state_key)
+        return Decision(True, limit, int(limit - estimate - 1), 0)
+
+    def needs_sync(self) -> bool:
+        """True when counts changed and the last sync is old enough."""
+        return bool(self._dirty) and (
+            self._clock() - self._last_sync >= self.sync_interval
+        )
+
+    async def sync(self, store):
+        """Publish this isolate's counts and refresh other isolates'."""
+        now = self._clock()
+        self._last_sync = now
+        due, self._dirty = self._dirty, set()
+
+        for state_key, state in list(self._windows.items()):
+            _, window = self.limits[state_key[0]]
+            if int(now // window) > state.index + 1:
+                # Idle for over a window: nothing left to enforce
+                del self._windows[state_key]
+                due.discard(state_key)
+
+        while len(due) > MAX_SYNC_KEYS:
+            self._dirty.add(due.pop())
+
+        await asyncio.gather(
+            *(self._sync_one(store, key) for key in due),
+            return_exceptions=True,
+        )
+
+    async def _sync_one(self, store, state_key):
+        bucket, key = state_key
+        _, window = self.limits[bucket]
+        state = self._windows[state_key]
+        index = state.index
+        prefix = f"{RATE_KEY_PREFIX}{bucket}:{key}:{index}:"
+        own_key = f"{prefix}{self.writer_id}"
+        count = state.current
+        try:
+            await store.put(
+                own_key,
+                str(count),
+                expirationTtl=kv_ttl(2 * window),
+                metadata={"count": count},
+            )
+        except Exception:
+            self._dirty.add(state_key)  # retry on the next sync
+            raise
+
+        remote = 0
+        cursor = None
+        while True:
+            result = await store.list(prefix=prefix, cursor=cursor)
+            for entry in result.keys:
+                if entry.name != own_key:
+                    metadata = key_metadata(entry)
+                    remote += int(metadata.get("count", 0)) if metadata else 0
+            if result.list_complete:
+                break
+            cursor = result.cursor
+        # The window may have rolled while we were waiting on KV
+        if state.index == index:
+            state.remote_current = remote
+
+
+@lru_cache(maxsize=4096)
+def _key_for(token: str) -> str:
+    """Never put raw bearer tokens in KV key names."""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def _retry_after(limit, window, elapsed, previous, current) -> int:
+    """Seconds until the estimate leaves room for one more request."""
+    if current + 1 > limit:
+        # Wait for this window to become the (decaying) previous one
+        return max(1, math.ceil((1 - elapsed) * window))
+    # Wait for enough of the previous window to slide out
+    needed = 1 - (limit - 1 - current) / previous
+    return max(1, math.ceil((needed - elapsed) * window))
@@ -0,0 +1,88 @@
+"""
+JSON response encoding for the Agent Network API.
+
+- encode_json uses one shared compact encoder (no whitespace, no
+  circular-reference check, non-ASCII left as UTF-8), which is both
+  smaller and cheaper than json.dumps with default settings.
+- StaticJSON encodes a constant document once per isolate; handlers for
+  fixed documents (auth discovery, health) return the cached body.
+- negotiate/compress implement optional gzip/br content coding for
+  large listings. Cloudflare already compresses JSON at the edge, so
+  this is off unless COMPRESS_RESPONSES is set (useful when the worker
+  is reached without the edge, or to trade worker CPU for edge CPU).
+  Brotli is used only when the `brotli` package is importable; gzip is
+  imported on first use, so isolates that never compress skip it.
+"""
+
+import json
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_encoder = json.JSONEncoder(
+    separators=(",", ":"),
+    default=str,
+    ensure_ascii=False,
+    check_circular=False,
+)
+
+
+def encode_json(data) -> str:
+    """Compact JSON text for a response body."""
+    return _encoder.encode(data)
+
+
+class StaticJSON:
+    """A constant JSON document, encoded once."""
+
+    __slots__ = ("body", "data")
+
+    def __init__(self, data):
+        self.data = data
+        self.body = encode_json(data)
+
+
+def accepted_encodings(header) -> set:
+    """Content codings a client accepts (q=0 entries excluded)."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding)
+    return accepted
+
+
+def negotiate(accept_encoding, size: int):
+    """The coding to use for a body of `size` bytes, or None."""
+    if size < MIN_COMPRESS_SIZE or not accept_encoding:
+        return None
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    """Encode a body with a coding returned by negotiate()."""
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    import gzip
+
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -0,0 +1,93 @@
+"""
+Retention and sampling for analytics data in AGENT_EVENTS.
+
+Every key family written to AGENT_EVENTS gets a TTL from the retention
+policy, so KV expires old entries itself and prefix listings stay short:
+
+    event        raw event batches (normally compacted within minutes;
+                 the TTL bounds them if the cron trigger stops)
+    archive      compressed NDJSON segments of raw events (archive.py);
+                 0 disables archiving
+    auth_log     auth attempt log entries
+    counter      daily counter shards
+    rollup_hour  hourly rollup documents
+    rollup_day   daily rollup documents
+
+Values are days, overridable per family with the RETENTION_DAYS var
+(JSON); null keeps a family forever. TTLs apply to keys written from
+then on; KV cannot add a TTL to an existing key without rewriting it.
+
+High-volume, low-information events (polls, discovery) are sampled: the
+Sampler keeps a fraction of them in the raw event log and tags each kept
+event with its sample_rate, so the full volume can be estimated from the
+archive. Counters and rollups always count every event.
+"""
+
+import random
+
+from utils import kv_ttl
+
+DAY = 86400
+
+DEFAULT_RETENTION_DAYS = {
+    "event": 7,
+    "archive": 365,
+    "auth_log": 30,
+    "counter": 90,
+    "rollup_hour": 35,
+    "rollup_day": 400,
+}
+
+DEFAULT_SAMPLE_RATES = {
+    "auth_poll": 0.1,
+    "auth_poll_slow_down": 0.1,
+    "peers_discovered": 0.1,
+}
+
+
+def parse_retention(days: dict = None) -> dict:
+    """
+    Retention in seconds per key family (None: no expiry), from the
+    defaults overridden by `days`. Raises ValueError for unknown families
+    or invalid values.
+    """
+    merged = {**DEFAULT_RETENTION_DAYS, **(days or {})}
+    policy = {}
+    for family, value in merged.items():
+        if family not in DEFAULT_RETENTION_DAYS:
+            raise ValueError(f"Unrecognised retention family: {family}")
+        if value is None:
+            policy[family] = None
+            continue
+        if not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"Invalid retention for {family}: {value!r}")
+        if value == 0 and family != "archive":
+            raise ValueError(f"Retention for {family} must be positive")
+        policy[family] = kv_ttl(round(value * DAY)) if value else 0
+    return policy
+
+
+DEFAULT_RETENTION = parse_retention()
+
+
+def ttl_options(ttl) -> dict:
+    """KV put options for a TTL from the policy (None: no expiry)."""
+    return {"expirationTtl": ttl} if ttl else {}
+
+
+class Sampler:
+    """Decides which raw events are kept in the event log."""
+
+    def __init__(self, rates: dict = None, random=random.random):
+        self.rates = DEFAULT_SAMPLE_RATES if rates is None else rates
+        for event_type, rate in self.rates.items():
+            if not 0 <= rate <= 1:
+                raise ValueError(f"Invalid sample rate for {event_type}")
+        self._random = random
+
+    def sample(self, event_type: str):
+        """The event type's sample rate if this event is kept, else None."""
+        rate = self.rates.get(event_type, 1.0)
+        if rate >= 1 or self._random() < rate:
+            return rate
+        return None
@@ -0,0 +1,304 @@
+"""
+Hourly and daily analytics rollups for the Agent Network API.
+
+Analytics flushes write raw event batches to `event:{id}` (see
+analytics.py). Each batch carries its per-hour event counts as key
+metadata, so they can be read from a list call without fetching the
+batch itself:
+
+    event:{id}  metadata {"hours": {"2025-01-28T14": {"auth_poll": 3}}}
+
+The cron trigger compacts batches into one document per bucket holding
+every event type's count:
+
+    rollup:hour:2025-01-28T14   rollup:day:2025-01-28
+
+Compaction takes batches older than COMPACT_DELAY (so KV listings have
+caught up with them), oldest first. It adds their counts to the bucket
+documents, writes the documents and then deletes the batches (after
+packing their events into archive segments, see archive.py). Batch IDs
+are time-ordered, and each document records the newest batch it has
+absorbed (`through`). Batches at or before that point are skipped, so a
+run that stops between writing documents and deleting batches does not
+count them twice when the next run sees them again. Runs are expected
+not to overlap (a run is bounded by MAX_BATCHES_PER_RUN).
+
+Range queries read one document per bucket, plus the batches not yet
+compacted (normally a single list call), so a 30 day report is about
+31 reads.
+"""
+
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from analytics import EVENT_PREFIX, HOUR_LENGTH
+from archive import build_segments
+from retention import DEFAULT_RETENTION, ttl_options
+from utils import MAX_CONCURRENT_KV, bounded_map, key_metadata
+
+ROLLUP_PREFIX = "rollup:"
+
+# Length of the "YYYY-MM-DD" prefix of ISO timestamps
+DAY_LENGTH = 10
+
+GRANULARITIES = {
+    "hour": ("%Y-%m-%dT%H", timedelta(hours=1)),
+    "day": ("%Y-%m-%d", timedelta(days=1)),
+}
+DEFAULT_SPAN = {"hour": 24, "day": 30}
+MAX_BUCKETS = {"hour": 24 * 31, "day": 366}
+
+COMPACT_DELAY = 300
+# Each compacted batch costs a get (when archiving) and a delete; keep a
+# run well inside the per-invocation KV operation limit
+MAX_BATCHES_PER_RUN = 300
+MAX_PENDING_READ = 1000
+
+
+def batch_counts(events: list) -> dict:
+    """Event counts of a batch, by hour: {hour: {event_type: count}}."""
+    hours = {}
+    for event in events:
+        counts = hours.setdefault(event["timestamp"][:HOUR_LENGTH], {})
+        counts[event["type"]] = counts.get(event["type"], 0) + 1
+    return hours
+
+
+def rollup_key(granularity: str, bucket: str) -> str:
+    return f"{ROLLUP_PREFIX}{granularity}:{bucket}"
+
+
+def _batch_time(name: str) -> int:
+    """Millisecond timestamp from an `event:{id}` key."""
+    return int(name[len(EVENT_PREFIX) : len(EVENT_PREFIX) + 12], 16)
+
+
+async def pending_batches(store, before: int = None, limit: int = None):
+    """
+    Event batch keys not yet compacted, oldest first: (keys, complete).
+    `before` (milliseconds) stops the listing at newer batches.
+    """
+    keys = []
+    cursor = None
+    while True:
+        result = await store.list(prefix=EVENT_PREFIX, cursor=cursor)
+        for key in result.keys:
+            if before is not None and _batch_time(key.name) >= before:
+                return keys, True
+            if limit is not None and len(keys) >= limit:
+                return keys, False
+            keys.append(key)
+        if result.list_complete:
+            return keys, True
+        cursor = result.cursor
+
+
+def parse_batch(body: str) -> tuple:
+    """(hours, events) of a stored event batch."""
+    batch = json.loads(body)
+    if isinstance(batch, list):
+        # Written before batches carried their counts (and sampling)
+        return batch_counts(batch), batch
+    return batch["hours"], batch["events"]
+
+
+async def _read_batches(store, keys: list, events: bool = False) -> list:
+    """
+    [(name, {hour: counts}, events)] for event batch keys. Counts come
+    from key metadata where present; bodies are fetched for batches
+    without it, and for every batch when `events` is set (else None).
+    """
+
+    async def read(key):
+        metadata = key_metadata(key)
+        hours = metadata.get("hours") if metadata else None
+        if hours is not None and not events:
+            return hours, None
+        body = await store.get(key.name)
+        if not body:
+            return hours or {}, []
+        counts, batch_events = parse_batch(body)
+        return (counts if hours is None else hours), batch_events
+
+    batches = await bounded_map(read, keys, MAX_CONCURRENT_KV)
+    return [(key.name, *batch) for key, batch in zip(keys, batches)]
+
+
+def _buckets_of(hour: str):
+    return (("hour", hour), ("day", hour[:DAY_LENGTH]))
+
+
+async def _load_rollups(store, keys) -> dict:
+    bodies = await bounded_map(store.get, keys, MAX_CONCURRENT_KV)
+    return {
+        key: json.loads(body) if body else {"counts": {}, "through": ""}
+        for key, body in zip(keys, bodies)
+    }
+
+
+async def compact_events(
+    store,
+    now: float = None,
+    retention: dict = DEFAULT_RETENTION,
+    to_binary=bytes,
+) -> int:
+    """
+    Fold settled event batches into rollups, archiving their events
+    unless the "archive" retention is 0, then delete them. Returns the
+    number of batches compacted. `to_binary` converts archive segments
+    for KV (pyodide.ffi.to_js in the worker).
+    """
+    now = time.time() if now is None else now
+    keys, _ = await pending_batches(
+        store,
+        before=int((now - COMPACT_DELAY) * 1000),
+        limit=MAX_BATCHES_PER_RUN,
+    )
+    if not keys:
+        return 0
+
+    archive_ttl = retention["archive"]
+    batches = await _read_batches(store, keys, events=archive_ttl != 0)
+    rollup_keys = sorted(
+        {
+            rollup_key(granularity, bucket)
+            for _, hours, _ in batches
+            for hour in hours
+            for granularity, bucket in _buckets_of(hour)
+        }
+    )
+    rollups = await _load_rollups(store, rollup_keys)
+    absorbed = {key: doc["through"] for key, doc in rollups.items()}
+
+    # Segments before rollups: a batch already in its hour's rollup was
+    # archived by the run that put it there
+    if archive_ttl != 0:
+        fresh = [
+            (name, events)
+            for name, hours, events in batches
+            if any(name > absorbed[rollup_key("hour", h)] for h in hours)
+        ]
+        await bounded_map(
+            lambda segment: store.put(
+                segment[0],
+                to_binary(segment[1]),
+                metadata=segment[2],
+                **ttl_options(archive_ttl),
+            ),
+            build_segments(fresh),
+            MAX_CONCURRENT_KV,
+        )
+
+    changed = set()
+    for name, hours, _ in batches:
+        for hour, counts in hours.items():
+            for granularity, bucket in _buckets_of(hour):
+                key = rollup_key(granularity, bucket)
+                if name <= absorbed[key]:
+                    continue
+                doc = rollups[key]
+                for event_type, count in counts.items():
+                    doc["counts"][event_type] = (
+                        doc["counts"].get(event_type, 0) + count
+                    )
+                doc["through"] = max(doc["through"], name)
+                changed.add((key, granularity))
+
+    # Documents before deletes: if the deletes fail, `through` keeps the
+    # batches from being counted again
+    await bounded_map(
+        lambda item: store.put(
+            item[0],
+            json.dumps(rollups[item[0]]),
+            **ttl_options(retention[f"rollup_{item[1]}"]),
+        ),
+        sorted(changed),
+        MAX_CONCURRENT_KV,
+    )
+    await bounded_map(
+        store.delete,
+        [name for name, _, _ in batches],
+        MAX_CONCURRENT_KV,
+    )
+    return len(batches)
+
+
+def parse_range(granularity: str, start=None, end=None, now=None) -> list:
+    """
+    Buckets from `start` to `end` inclusive ("YYYY-MM-DD" for days,
+    "YYYY-MM-DDTHH" for hours). Defaults to the last DEFAULT_SPAN
+    buckets. Raises ValueError for bad input or too long a range.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError("granularity must be 'hour' or 'day'")
+    fmt, step = GRANULARITIES[granularity]
+
+    def parse(value):
+        try:
+            return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            raise ValueError(f"expected {granularity} as {fmt}") from None
+
+    if end:
+        last = parse(end)
+    else:
+        now = datetime.now(timezone.utc) if now is None else now
+        last = parse(now.strftime(fmt))
+    first = parse(start) if start else last - step * (
+        DEFAULT_SPAN[granularity] - 1
+    )
+    if first > last:
+        raise ValueError("'from' is after 'to'")
+    count = (last - first) // step + 1
+    if count > MAX_BUCKETS[granularity]:
+        raise ValueError(
+            f"at most {MAX_BUCKETS[granularity]} {granularity} buckets"
+        )
+    return [(first + step * i).strftime(fmt) for i in range(count)]
+
+
+async def query_rollups(store, granularity: str, buckets: list) -> dict:
+    """Event counts per bucket, including batches not yet compacted."""
+    keys = [rollup_key(granularity, bucket) for bucket in buckets]
+    rollups = await _load_rollups(store, keys)
+    counts, through = {}, {}
+    for bucket, key in zip(buckets, keys):
+        counts[bucket] = rollups[key]["counts"]
+        through[bucket] = rollups[key]["through"]
+
+    pending, complete = await pending_batches(store, limit=MAX_PENDING_READ)
+    length = HOUR_LENGTH if granularity == "hour" else DAY_LENGTH
+    for name, hours, _ in await _read_batches(store, pending):
+        for hour, hour_counts in hours.items():
+            bucket = hour[:length]
+            if bucket not in counts or name <= through[bucket]:
+                continue
+            bucket_counts = counts[bucket]
+            for event_type, count in hour_counts.items():
+                bucket_counts[event_type] = (
+                    bucket_counts.get(event_type, 0) + count
+                )
+
+    totals = {}
+    for bucket_counts in counts.values():
+        for event_type, count in bucket_counts.items():
+            totals[event_type] = totals.get(event_type, 0) + count
+    report = {
+        "granularity": granularity,
+        "from": buckets[0],
+        "to": buckets[-1],
+        "buckets": [
+            {"bucket": bucket, "counts": counts[bucket]} for bucket in buckets
+        ],
+        "totals": dict(sorted(totals.items())),
+        "pending_batches": len(pending),
+        # False when more un-compacted batches exist than were read
+        "complete": complete,
+    }
+    if not complete:
+        report["warning"] = (
+            f"More than {MAX_PENDING_READ} event batches await compaction; "
+            "counts for recent buckets are lower bounds"
+        )
+    return report
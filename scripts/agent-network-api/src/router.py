@@ -0,0 +1,190 @@
+"""
+Table-driven request router for the Agent Network API.
+
+Routes are declared once as (method, pattern, handler) and compiled into:
+
+- a dict keyed by path for static routes (one lookup per request)
+- for parameterised routes such as /api/v2/agent/auth/{auth_request_id},
+  a dict per layout (segment count and parameter positions), keyed by
+  the literal part of the path before the first parameter plus any
+  literal segments after it
+
+A parameterised lookup counts the path's slashes to pick the layouts
+that can match, then peels segments off the end with str.rpartition
+until it reaches the literal prefix, and looks that up. The hot poll
+routes (.../{id}) take one rpartition and one dict lookup; nothing is
+split or copied. Layouts with the same segment count are tried with
+literal segments before parameters, so /api/v2/agent/questions/stats
+would win over /api/v2/agent/questions/{id}. Parameters never match an
+empty segment.
+
+A path that matches but has no handler for the request method yields a
+405 with the allowed methods, instead of falling through to 404. See
+benchmarks/bench_router.py for a comparison with the old if/elif chain.
+"""
+
+from typing import Callable, NamedTuple, Optional
+
+# Shared by every static match; handlers receive params as **kwargs, so
+# it is never mutated.
+_NO_PARAMS = {}
+
+
+class RouteMatch(NamedTuple):
+    """Result of a route lookup."""
+
+    handler: Optional[Callable]
+    params: dict
+    allowed: tuple
+    # The matched route's pattern, e.g. /api/v2/agent/auth/{auth_request_id}
+    pattern: Optional[str] = None
+
+    @property
+    def method_not_allowed(self) -> bool:
+        return self.handler is None
+
+
+# RouteMatch without the Python-level __new__ that NamedTuple generates;
+# used on the per-request path
+_new_match = tuple.__new__
+
+
+class _Node:
+    __slots__ = (
+        "pattern",
+        "methods",
+        "allowed",
+        "matches",
+        "not_allowed",
+        "param_names",
+    )
+
+    def __init__(self):
+        self.pattern = None
+        self.methods = None
+        self.allowed = ()
+        self.matches = {}
+        self.not_allowed = None
+        self.param_names = ()
+
+    def add_method(self, method: str, pattern: str, handler: Callable):
+        self.pattern = pattern
+        if self.methods is None:
+            self.methods = {}
+        self.methods[method] = handler
+        self.allowed = tuple(self.methods)
+        # Prebuilt results so static routes dispatch without allocating
+        self.matches = {
+            m: RouteMatch(h, _NO_PARAMS, self.allowed, pattern)
+            for m, h in self.methods.items()
+        }
+        self.not_allowed = RouteMatch(
+            None, _NO_PARAMS, self.allowed, pattern
+        )
+
+
+class _Layout:
+    """
+    Parameterised routes with the same segment count and parameter
+    positions. `tail` holds, last segment first, whether each segment
+    from the first parameter on is a parameter.
+    """
+
+    __slots__ = ("shape", "tail", "single", "table")
+
+    def __init__(self, shape: tuple):
+        self.shape = shape
+        self.tail = shape[shape.index(True):][::-1]
+        # Just one parameter, in the last segment: .../{id}
+        self.single = self.tail == (True,)
+        self.table = {}
+
+    def key(self, segments: list):
+        """Table key of a route's (or a path's) segments."""
+        first = len(segments) - len(self.tail)
+        prefix = "/".join(segments[:first])
+        if self.single:
+            return prefix
+        literals = segments[first:]
+        return prefix, tuple(
+            segment
+            for segment, param in zip(literals, self.tail[::-1])
+            if not param
+        )
+
+
+def _is_param(segment: str) -> bool:
+    return segment.startswith("{") and segment.endswith("}")
+
+
+class Router:
+    """Compiled route table with static and parameterised routes."""
+
+    def __init__(self):
+        self._static = {}
+        # Slash count -> layouts, literal segments first
+        self._layouts = {}
+
+    def add(self, method: str, pattern: str, handler: Callable):
+        """Register `handler` for `method` requests to `pattern`."""
+        if "{" not in pattern:
+            node = self._static.setdefault(pattern, _Node())
+            node.add_method(method, pattern, handler)
+            return
+
+        segments = pattern.split("/")
+        shape = tuple(_is_param(segment) for segment in segments)
+        layouts = self._layouts.setdefault(pattern.count("/"), [])
+        for layout in layouts:
+            if layout.shape == shape:
+                break
+        else:
+            layout = _Layout(shape)
+            layouts.append(layout)
+            layouts.sort(key=lambda layout: layout.shape)
+
+        key = layout.key(segments)
+        node = layout.table.get(key)
+        if node is None:
+            node = layout.table[key] = _Node()
+            # In the order route() collects them: last first
+            node.param_names = tuple(
+                segment[1:-1]
+                for segment in reversed(segments)
+                if _is_param(segment)
+            )
+        elif node.pattern != pattern:
+            raise ValueError(
+                f"Conflicting parameter names: {node.pattern} vs {pattern}"
+            )
+        node.add_method(method, pattern, handler)
+
+    def route(self, method: str, path: str) -> Optional[RouteMatch]:
+        """Find the handler for a request; None when no path matches."""
+        node = self._static.get(path)
+        if node is not None:
+            return node.matches.get(method, node.not_allowed)
+
+        for layout in self._layouts.get(path.count("/"), ()):
+            if layout.single:
+                prefix, _, value = path.rpartition("/")
+                node = layout.table.get(prefix)
+                if node is None or not value:
+                    continue
+                params = {node.param_names[0]: value}
+            else:
+                prefix, values, literals = path, [], []
+                for param in layout.tail:
+                    prefix, _, segment = prefix.rpartition("/")
+                    (values if param else literals).append(segment)
+                node = layout.table.get((prefix, tuple(literals[::-1])))
+                if node is None or "" in values:
+                    continue
+                params = dict(zip(node.param_names, values))
+            handler = node.methods.get(method)
+            if handler is None:
+                return node.not_allowed
+            return _new_match(
+                RouteMatch, (handler, params, node.allowed, node.pattern)
+            )
+        return None
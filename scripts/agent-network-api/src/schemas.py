@@ -0,0 +1,358 @@
+"""
+Schemas for request bodies of the Agent Network API.
+
+AGENT_MESSAGE_SCHEMA mirrors public/agent-message.schema.json, the
+published format of messages between agents, without its annotations
+(titles, descriptions, defaults). The request schemas below reuse its
+definitions: a posted message's content is either plain text or an
+agent message, and a handoff carries the fields of a task_handoff
+payload plus its target agent (or agents). validation.py compiles them.
+
+BODY_LIMITS caps the size of each body in bytes; larger bodies are
+rejected before they are parsed.
+"""
+
+from handoffs import MAX_RESULT_LENGTH, MAX_TARGETS
+from messages import MAX_BATCH_SIZE
+from questions import MAX_ANSWER_LENGTH, MAX_QUESTION_LENGTH
+from secret_store import MAX_SECRET_SIZE, MAX_SECRET_TTL, MIN_SECRET_TTL
+
+
+def _uuid7(prefix: str) -> str:
+    return (
+        f"^{prefix}[0-9a-f]{{8}}-[0-9a-f]{{4}}-7[0-9a-f]{{3}}"
+        "-[89ab][0-9a-f]{3}-[0-9a-f]{12}$"
+    )
+
+
+_AGENT_ID = _uuid7("agent_")
+_SECRET_KEY = "^[a-zA-Z0-9]{40,}$"
+_STRINGS = {"type": "array", "items": {"type": "string"}}
+
+AGENT_MESSAGE_SCHEMA = {
+    "type": "object",
+    "required": ["version", "type", "agent_id", "timestamp", "payload"],
+    "properties": {
+        "version": {"type": "string", "const": "1.0"},
+        "type": {
+            "type": "string",
+            "enum": [
+                "status_update",
+                "task_handoff",
+                "question",
+                "answer",
+                "discovery",
+                "heartbeat",
+                "secret_share",
+                "audit_log",
+            ],
+        },
+        "agent_id": {"type": "string", "pattern": _AGENT_ID},
+        "timestamp": {"type": "string", "format": "date-time"},
+        "correlation_id": {"type": "string", "pattern": _uuid7("corr_")},
+        "in_reply_to": {"type": "string", "pattern": _uuid7("msg_")},
+        "ttl": {"type": "integer", "minimum": 60, "maximum": 604800},
+        "burn_after_reading": {"type": "boolean"},
+        "payload": {
+            "type": "object",
+            "oneOf": [
+                {"$ref": "#/$defs/status_update_payload"},
+                {"$ref": "#/$defs/task_handoff_payload"},
+                {"$ref": "#/$defs/question_payload"},
+                {"$ref": "#/$defs/answer_payload"},
+                {"$ref": "#/$defs/discovery_payload"},
+                {"$ref": "#/$defs/heartbeat_payload"},
+                {"$ref": "#/$defs/secret_share_payload"},
+                {"$ref": "#/$defs/audit_log_payload"},
+            ],
+        },
+        "metadata": {
+            "type": "object",
+            "properties": {
+                "agent_name": {"type": "string"},
+                "agent_type": {"type": "string"},
+                "model": {"type": "string"},
+                "organization": {"type": "string"},
+                "capabilities": _STRINGS,
+            },
+            "additionalProperties": True,
+        },
+    },
+    "$defs": {
+        "status_update_payload": {
+            "type": "object",
+            "required": ["status"],
+            "additionalProperties": False,
+            "properties": {
+                "status": {
+                    "type": "string",
+                    "enum": [
+                        "idle",
+                        "working",
+                        "blocked",
+                        "completed",
+                        "failed",
+                        "waiting_for_human",
+                    ],
+                },
+                "task_id": {"type": "string"},
+                "progress": {"type": "number", "minimum": 0, "maximum": 100},
+                "summary": {"type": "string", "maxLength": 500},
+                "details": {"type": "string"},
+            },
+        },
+        "task_handoff_payload": {
+            "type": "object",
+            "required": ["task_description", "recipient_criteria"],
+            "additionalProperties": False,
+            "properties": {
+                "task_description": {"type": "string"},
+                "context_secret_key": {
+                    "type": "string",
+                    "pattern": _SECRET_KEY,
+                },
+                "recipient_criteria": {
+                    "type": "object",
+                    "properties": {
+                        "capabilities": _STRINGS,
+                        "specific_agent": {
+                            "type": "string",
+                            "pattern": _AGENT_ID,
+                        },
+                    },
+                },
+                "priority": {
+                    "type": "string",
+                    "enum": ["low", "normal", "high", "urgent"],
+                },
+                "deadline": {"type": "string", "format": "date-time"},
+            },
+        },
+        "question_payload": {
+            "type": "object",
+            "required": ["question"],
+            "additionalProperties": False,
+            "properties": {
+                "question": {"type": "string"},
+                "context": {"type": "string"},
+                "addressed_to": {
+                    "type": "array",
+                    "items": {"type": "string", "pattern": _AGENT_ID},
+                },
+                "accept_multiple_answers": {"type": "boolean"},
+            },
+        },
+        "answer_payload": {
+            "type": "object",
+            "required": ["answer", "question_message_id"],
+            "additionalProperties": False,
+            "properties": {
+                "answer": {"type": "string"},
+                "question_message_id": {
+                    "type": "string",
+                    "pattern": _uuid7("msg_"),
+                },
+                "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+                "sources": _STRINGS,
+            },
+        },
+        "discovery_payload": {
+            "type": "object",
+            "required": ["action"],
+            "additionalProperties": False,
+            "properties": {
+                "action": {
+                    "type": "string",
+                    "enum": ["announce", "query", "respond"],
+                },
+                "seeking_capabilities": _STRINGS,
+                "offering_capabilities": _STRINGS,
+            },
+        },
+        "heartbeat_payload": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "uptime_seconds": {"type": "integer", "minimum": 0},
+                "tasks_completed": {"type": "integer", "minimum": 0},
+                "current_load": {
+                    "type": "string",
+                    "enum": [
+                        "idle",
+                        "light",
+                        "moderate",
+                        "heavy",
+                        "overloaded",
+                    ],
+                },
+            },
+        },
+        "secret_share_payload": {
+            "type": "object",
+            "required": ["secret_key"],
+            "additionalProperties": False,
+            "properties": {
+                "secret_key": {"type": "string", "pattern": _SECRET_KEY},
+                "content_type": {"type": "string"},
+                "description": {"type": "string"},
+            },
+        },
+        "audit_log_payload": {
+            "type": "object",
+            "required": ["action", "outcome"],
+            "additionalProperties": False,
+            "properties": {
+                "action": {"type": "string"},
+                "outcome": {
+                    "type": "string",
+                    "enum": ["success", "failure", "partial", "skipped"],
+                },
+                "affected_resources": _STRINGS,
+                "human_approved": {"type": "boolean"},
+                "reversible": {"type": "boolean"},
+            },
+        },
+    },
+    "additionalProperties": False,
+}
+
+# Recipient, topic and agent names; KV keys and metadata bound their length
+MAX_NAME_LENGTH = 256
+MAX_CONTENT_LENGTH = 32768
+
+_NAME = {"type": "string", "minLength": 1, "maxLength": MAX_NAME_LENGTH}
+_MESSAGE_PROPERTIES = AGENT_MESSAGE_SCHEMA["properties"]
+_PAYLOADS = AGENT_MESSAGE_SCHEMA["$defs"]
+
+MESSAGE_SCHEMA = {
+    "type": "object",
+    "required": ["content"],
+    "properties": {
+        "content": {
+            "anyOf": [
+                {
+                    "type": "string",
+                    "minLength": 1,
+                    "maxLength": MAX_CONTENT_LENGTH,
+                },
+                {"$ref": "#/$defs/agent_message"},
+            ]
+        },
+        "recipient": _NAME,
+        "topic": _NAME,
+        "ttl": _MESSAGE_PROPERTIES["ttl"],
+    },
+    "additionalProperties": False,
+    "$defs": {
+        **_PAYLOADS,
+        "agent_message": {
+            key: value
+            for key, value in AGENT_MESSAGE_SCHEMA.items()
+            if key != "$defs"
+        },
+    },
+}
+
+REQUEST_SCHEMAS = {
+    "message": MESSAGE_SCHEMA,
+    # Items are validated one by one, each with its own result
+    "message_batch": {
+        "type": "object",
+        "required": ["messages"],
+        "properties": {
+            "messages": {
+                "type": "array",
+                "minItems": 1,
+                "maxItems": MAX_BATCH_SIZE,
+            }
+        },
+        "additionalProperties": False,
+    },
+    "question": {
+        "type": "object",
+        "required": ["question"],
+        "properties": {
+            "question": {
+                "type": "string",
+                "minLength": 1,
+                "maxLength": MAX_QUESTION_LENGTH,
+            },
+            "context": _PAYLOADS["question_payload"]["properties"]["context"],
+            "ttl": _MESSAGE_PROPERTIES["ttl"],
+        },
+        "additionalProperties": False,
+    },
+    "answer": {
+        "type": "object",
+        "required": ["answer"],
+        "properties": {
+            "answer": {
+                "type": "string",
+                "minLength": 1,
+                "maxLength": MAX_ANSWER_LENGTH,
+            }
+        },
+        "additionalProperties": False,
+    },
+    "subscription": {
+        "type": "object",
+        "required": ["topic"],
+        "properties": {"topic": _NAME},
+        "additionalProperties": False,
+    },
+    "handoff": {
+        "type": "object",
+        "required": ["task_description"],
+        "properties": {
+            "target_agent": _NAME,
+            "target_agents": {
+                "type": "array",
+                "items": _NAME,
+                "minItems": 1,
+                "maxItems": MAX_TARGETS,
+            },
+            **_PAYLOADS["task_handoff_payload"]["properties"],
+        },
+        "additionalProperties": False,
+        "oneOf": [
+            {"required": ["target_agent"]},
+            {"required": ["target_agents"]},
+        ],
+    },
+    "handoff_complete": {
+        "type": "object",
+        "required": ["result"],
+        "properties": {
+            "result": {"type": "string", "maxLength": MAX_RESULT_LENGTH}
+        },
+        "additionalProperties": False,
+    },
+    "secret": {
+        "type": "object",
+        "required": ["secret"],
+        "properties": {
+            "secret": {"type": "string", "minLength": 1},
+            "ttl": {
+                "type": "integer",
+                "minimum": MIN_SECRET_TTL,
+                "maximum": MAX_SECRET_TTL,
+            },
+        },
+        "additionalProperties": False,
+    },
+    "secret_reveal": {
+        "type": "object",
+        "required": ["secret_key"],
+        "properties": {
+            "secret_key": {"type": "string", "pattern": _SECRET_KEY}
+        },
+        "additionalProperties": False,
+    },
+}
+
+BODY_LIMITS = {
+    "default": 64 << 10,
+    "message_batch": 1 << 20,
+    # JSON escaping can double a secret's size
+    "secret": 2 * MAX_SECRET_SIZE + 1024,
+}
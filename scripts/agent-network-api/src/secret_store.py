@@ -0,0 +1,231 @@
+"""
+One-time secrets for the Agent Network API.
+
+A secret is identified by its secret_key, a random token only the creator
+(and whoever they share it with) knows. Everything else derives from it:
+
+- the storage ID, a keyed hash, so `secret:{id}` in AGENT_MESSAGES does
+  not reveal the key;
+- the encryption key, so KV only ever holds ciphertext that cannot be
+  read without the secret_key.
+
+Payloads are encrypted with AES-256-GCM, with the version and expiry
+header as associated data, and stored as a single binary value expiring
+with the secret:
+
+    version (1) | expires_at (8) | nonce (12) | ciphertext | tag (16)
+
+The AEAD itself is injected (`cipher`, with async encrypt and decrypt):
+the worker uses the runtime's Web Crypto API (see main.py), and CPython
+uses AesGcm below, built on the `cryptography` package. Binary values
+avoid base64.
+
+Reading a secret burns it, exactly once. KV alone cannot guarantee that:
+concurrent readers would all find the value before any delete lands. So
+a reader that found and decrypted the payload must also claim the
+secret from the single writer for its burn state, and only the first
+claim wins. Decrypting first means a payload that fails to decrypt is
+never burned:
+
+- BurnCoordinator remembers burned IDs in the isolate; it is the
+  in-process stand-in (tests, `wrangler dev`, deployments without the
+  Durable Object binding) and only exactly-once within one isolate.
+- DurableObjectBurnCoordinator asks the SecretBurnObject for the secret
+  (see main.py), which records the burn in its own strongly consistent
+  storage. Only the ID and expiry cross to the Durable Object, never
+  the payload.
+"""
+
+import hashlib
+import json
+import secrets
+import struct
+import time
+from collections import OrderedDict
+
+SECRET_PREFIX = "secret:"
+
+DEFAULT_SECRET_TTL = 604800
+MIN_SECRET_TTL = 60
+MAX_SECRET_TTL = 604800
+MAX_SECRET_SIZE = 1 << 20
+
+MAX_TOMBSTONES = 4096
+
+VERSION = 2
+NONCE_SIZE = 12
+TAG_SIZE = 16
+_HEADER = struct.Struct(">BQ")
+_CIPHERTEXT_OFFSET = _HEADER.size + NONCE_SIZE
+
+
+class SecretError(ValueError):
+    """A stored payload that does not decrypt with the given key."""
+
+
+def _derive(secret_key: str, purpose: bytes, size: int = 32) -> bytes:
+    return hashlib.blake2b(
+        secret_key.encode(), digest_size=size, person=purpose
+    ).digest()
+
+
+def new_secret_key() -> str:
+    # Alphanumeric, as agent-message.schema.json expects of secret keys
+    return secrets.token_hex(24)
+
+
+def secret_id(secret_key: str) -> str:
+    """Storage ID of a secret; does not reveal the key."""
+    return _derive(secret_key, b"ans-secret-id", 16).hex()
+
+
+class AesGcm:
+    """AES-256-GCM from the `cryptography` package, for CPython."""
+
+    async def encrypt(self, key: bytes, nonce: bytes, data, aad: bytes):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        return AESGCM(key).encrypt(nonce, bytes(data), aad)
+
+    async def decrypt(self, key: bytes, nonce: bytes, data, aad: bytes):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        return AESGCM(key).decrypt(nonce, bytes(data), aad)
+
+
+async def encrypt(
+    cipher, secret_key: str, plaintext: bytes, expires_at: int
+) -> bytes:
+    """Stored form of a payload."""
+    header = _HEADER.pack(VERSION, expires_at)
+    nonce = secrets.token_bytes(NONCE_SIZE)
+    sealed = await cipher.encrypt(
+        _derive(secret_key, b"ans-secret-enc"), nonce, plaintext, header
+    )
+    return header + nonce + bytes(sealed)
+
+
+def expires_at(data) -> int:
+    """Epoch expiry recorded in a stored payload."""
+    return _HEADER.unpack_from(data)[1]
+
+
+async def decrypt(cipher, secret_key: str, data) -> bytes:
+    """Plaintext of a stored payload; raises SecretError if tampered."""
+    view = memoryview(data)
+    if len(view) < _CIPHERTEXT_OFFSET + TAG_SIZE or view[0] != VERSION:
+        raise SecretError("Unrecognised secret payload")
+    try:
+        plaintext = await cipher.decrypt(
+            _derive(secret_key, b"ans-secret-enc"),
+            bytes(view[_HEADER.size : _CIPHERTEXT_OFFSET]),
+            view[_CIPHERTEXT_OFFSET:],
+            bytes(view[: _HEADER.size]),
+        )
+    except Exception as e:
+        # InvalidTag from `cryptography`, OperationError from Web Crypto
+        raise SecretError("Secret payload failed authentication") from e
+    return bytes(plaintext)
+
+
+def parse_secret(body: dict, now: float = None):
+    """
+    (plaintext bytes, ttl, expires_at) for a posted JSON object. Raises
+    ValueError when the secret or its TTL is invalid.
+    """
+    value = body.get("secret")
+    if not isinstance(value, str) or not value:
+        raise ValueError("'secret' is required")
+    plaintext = value.encode()
+    if len(plaintext) > MAX_SECRET_SIZE:
+        raise ValueError(f"'secret' is larger than {MAX_SECRET_SIZE} bytes")
+    ttl = body.get("ttl", DEFAULT_SECRET_TTL)
+    if (
+        not isinstance(ttl, int)
+        or isinstance(ttl, bool)
+        or not MIN_SECRET_TTL <= ttl <= MAX_SECRET_TTL
+    ):
+        raise ValueError(
+            f"'ttl' must be between {MIN_SECRET_TTL} and "
+            f"{MAX_SECRET_TTL} seconds"
+        )
+    now = time.time() if now is None else now
+    return plaintext, ttl, int(now + ttl)
+
+
+def as_buffer(value):
+    """Python buffer for a JS ArrayBuffer; the emulator returns bytes."""
+    to_py = getattr(value, "to_py", None)
+    return to_py() if to_py is not None else value
+
+
+async def store_secret(store, secret_key: str, data: bytes, ttl: int):
+    await store.put(
+        f"{SECRET_PREFIX}{secret_id(secret_key)}", data, expirationTtl=ttl
+    )
+
+
+async def load_secret(store, secret_key: str):
+    """The stored payload, or None when missing or expired."""
+    value = await store.get(
+        f"{SECRET_PREFIX}{secret_id(secret_key)}", type="arrayBuffer"
+    )
+    return None if value is None else as_buffer(value)
+
+
+async def reveal_secret(store, coordinator, cipher, secret_key: str):
+    """
+    The plaintext of a secret, burning it; None when it does not exist,
+    expired or was already revealed. Of concurrent callers, at most one
+    gets the plaintext. Raises SecretError, leaving the secret in place,
+    when the payload does not decrypt.
+    """
+    data = await load_secret(store, secret_key)
+    if data is None:
+        return None
+    # Decrypt before burning: a failure must not destroy the secret
+    plaintext = await decrypt(cipher, secret_key, data)
+    storage_id = secret_id(secret_key)
+    if not await coordinator.claim(storage_id, expires_at(data)):
+        return None
+    await store.delete(f"{SECRET_PREFIX}{storage_id}")
+    return plaintext
+
+
+class BurnCoordinator:
+    """Single writer for secret burn state (in-process stand-in)."""
+
+    def __init__(self, max_tombstones: int = MAX_TOMBSTONES, clock=time.time):
+        self.max_tombstones = max_tombstones
+        self._clock = clock
+        self._burned = OrderedDict()
+
+    async def claim(self, storage_id: str, expires_at: int) -> bool:
+        """True for the first claim of a secret, False afterwards."""
+        # No await between the check and the write: atomic in the isolate
+        if storage_id in self._burned:
+            return False
+        self._burned[storage_id] = expires_at
+        # Evicted tombstones belong to secrets already deleted from KV
+        now = self._clock()
+        while len(self._burned) > self.max_tombstones or (
+            self._burned and next(iter(self._burned.values())) <= now
+        ):
+            self._burned.popitem(last=False)
+        return True
+
+
+class DurableObjectBurnCoordinator:
+    """Claims secrets from the SecretBurnObject of each secret."""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    async def claim(self, storage_id: str, expires_at: int) -> bool:
+        stub = self.namespace.get(self.namespace.idFromName(storage_id))
+        response = await stub.fetch(
+            "https://secret-burn/claim",
+            method="POST",
+            body=json.dumps({"expires_at": expires_at}),
+        )
+        return json.loads(await response.text())["claimed"]
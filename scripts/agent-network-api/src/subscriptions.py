@@ -0,0 +1,271 @@
+"""
+Topic subscriptions and streaming delivery for the Agent Network API.
+
+Subscriptions are stored at `subscription:{id}` in AGENT_MESSAGES, with
+the topic and a hash of the subscriber's token (never the token itself),
+and expire after SUBSCRIPTION_TTL.
+
+Delivery is push, not poll. A subscriber opens a stream (server-sent
+events, or NDJSON), which registers a Listener with the TopicHub for its
+topic. Posting a message publishes it to the hub once, and the hub
+hands it to every listener of the topic, so N subscribers cost one
+publish rather than N KV polls. In production each topic's hub lives in
+a Durable Object (TopicFanoutObject in main.py), the single place all
+isolates publish to and stream from. Without that binding, each isolate
+uses its own in-process hub, which only sees messages posted to that
+isolate (the local stand-in, as for auth_state.py).
+
+Streams are resumable. A reconnecting client sends the last event ID it
+saw (Last-Event-ID), and the stream first replays newer messages of the
+topic from KV, then continues live. The listener is registered before
+the replay, and recently sent IDs are remembered, so nothing is missed
+or sent twice across the switch. Streams end after STREAM_MAX_SECONDS,
+and a listener that falls MAX_QUEUED batches behind is dropped; in both
+cases the client reconnects and catches up from KV.
+
+A stream only carries the messages its subscriber may read: messages
+addressed to another agent are dropped, live and on replay (see
+messages.visible_to).
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import deque
+
+from messages import list_messages, visible_to
+from utils import generate_id, get_timestamp
+
+SUBSCRIPTION_PREFIX = "subscription:"
+SUBSCRIPTION_TTL = 86400
+
+STREAM_MAX_SECONDS = 300
+KEEPALIVE_INTERVAL = 15
+MAX_QUEUED = 256
+RECENT_IDS = 1024
+MAX_REPLAY = 500
+# Tells SSE clients how long to wait before reconnecting (milliseconds)
+RETRY_MS = 2000
+
+FORMATS = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def owner_key(token: str) -> str:
+    """Subscriptions are bound to a hash of the subscriber's token."""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def build_subscription(topic: str, token: str) -> dict:
+    return {
+        "id": generate_id(),
+        "topic": topic,
+        "owner": owner_key(token),
+        "created_at": get_timestamp(),
+    }
+
+
+async def save_subscription(store, subscription: dict):
+    await store.put(
+        f"{SUBSCRIPTION_PREFIX}{subscription['id']}",
+        json.dumps(subscription),
+        expirationTtl=SUBSCRIPTION_TTL,
+    )
+
+
+async def load_subscription(store, subscription_id: str, token: str):
+    """The subscription if it exists and belongs to `token`, else None."""
+    body = await store.get(f"{SUBSCRIPTION_PREFIX}{subscription_id}")
+    if not body:
+        return None
+    subscription = json.loads(body)
+    if subscription["owner"] != owner_key(token):
+        return None
+    return subscription
+
+
+async def delete_subscription(store, subscription_id: str):
+    await store.delete(f"{SUBSCRIPTION_PREFIX}{subscription_id}")
+
+
+class Listener:
+    """One open stream's queue of published message batches."""
+
+    __slots__ = ("topic", "viewer", "queue", "dropped")
+
+    def __init__(self, topic: str, viewer: str = None):
+        self.topic = topic
+        self.viewer = viewer
+        self.queue = asyncio.Queue(MAX_QUEUED)
+        self.dropped = False
+
+    def offer(self, messages: list) -> bool:
+        """
+        Queue the messages of a batch the subscriber may read; a full
+        queue drops the listener.
+        """
+        if self.dropped:
+            return False
+        messages = [m for m in messages if visible_to(m, self.viewer)]
+        if not messages:
+            return True
+        try:
+            self.queue.put_nowait(messages)
+        except asyncio.QueueFull:
+            self.dropped = True
+            # Wake the stream so it can end
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+        return True
+
+
+class TopicHub:
+    """Fans published messages out to the open streams of each topic."""
+
+    def __init__(self):
+        self._listeners = {}
+
+    def listen(self, topic: str, viewer: str = None) -> Listener:
+        listener = Listener(topic, viewer)
+        self._listeners.setdefault(topic, set()).add(listener)
+        return listener
+
+    def unlisten(self, listener: Listener):
+        listeners = self._listeners.get(listener.topic)
+        if listeners is not None:
+            listeners.discard(listener)
+            if not listeners:
+                del self._listeners[listener.topic]
+
+    def listeners(self, topic: str) -> int:
+        return len(self._listeners.get(topic, ()))
+
+    async def publish(self, topic: str, messages: list) -> int:
+        """Deliver messages to every listener of a topic; returns how many."""
+        delivered = 0
+        for listener in list(self._listeners.get(topic, ())):
+            if listener.offer(messages):
+                delivered += 1
+            else:
+                self.unlisten(listener)
+        return delivered
+
+
+def format_event(message: dict, fmt: str) -> str:
+    """One message as an SSE event or an NDJSON line."""
+    data = json.dumps(message, separators=(",", ":"))
+    if fmt == "ndjson":
+        return data + "\n"
+    return f"id: {message['id']}\nevent: message\ndata: {data}\n\n"
+
+
+def _keepalive(fmt: str) -> str:
+    # SSE comments are ignored by clients; NDJSON readers skip blank lines
+    return ": keep-alive\n\n" if fmt == "sse" else "\n"
+
+
+async def run_stream(
+    hub: TopicHub,
+    store,
+    topic: str,
+    send,
+    fmt: str = "sse",
+    last_event_id: str = None,
+    viewer: str = None,
+    max_seconds: float = STREAM_MAX_SECONDS,
+    keepalive: float = KEEPALIVE_INTERVAL,
+    clock=time.monotonic,
+) -> int:
+    """
+    Write a topic's messages to a stream through `send(text)` until
+    max_seconds pass, the listener is dropped or `send` raises (the
+    client went away). Returns the number of messages sent. Only
+    messages `viewer` may read are sent.
+    """
+    listener = hub.listen(topic, viewer)
+    recent = deque(maxlen=RECENT_IDS)
+    seen = set()
+    sent = 0
+
+    async def deliver(message):
+        nonlocal sent
+        if message["id"] in seen:
+            return
+        if len(recent) == recent.maxlen:
+            seen.discard(recent[0])
+        recent.append(message["id"])
+        seen.add(message["id"])
+        await send(format_event(message, fmt))
+        sent += 1
+
+    try:
+        if fmt == "sse":
+            await send(f"retry: {RETRY_MS}\n\n")
+        if last_event_id:
+            cursor = last_event_id
+            replayed = 0
+            while replayed < MAX_REPLAY:
+                page = await list_messages(
+                    store, cursor=cursor, topic=topic, viewer=viewer
+                )
+                for message in page["messages"]:
+                    await deliver(message)
+                replayed += len(page["messages"])
+                cursor = page["next_cursor"]
+                if not page["has_more"]:
+                    break
+
+        deadline = clock() + max_seconds
+        while True:
+            remaining = deadline - clock()
+            if remaining <= 0:
+                break
+            try:
+                messages = await asyncio.wait_for(
+                    listener.queue.get(), min(keepalive, remaining)
+                )
+            except asyncio.TimeoutError:
+                await send(_keepalive(fmt))
+                continue
+            if messages is None:
+                break
+            for message in messages:
+                await deliver(message)
+    finally:
+        hub.unlisten(listener)
+    return sent
+
+
+class DurableObjectHub:
+    """Publishes to, and streams from, the TopicFanoutObject of a topic."""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def _stub(self, topic: str):
+        return self.namespace.get(self.namespace.idFromName(topic))
+
+    async def publish(self, topic: str, messages: list) -> int:
+        response = await self._stub(topic).fetch(
+            "https://topic-fanout/publish",
+            method="POST",
+            body=json.dumps({"topic": topic, "messages": messages}),
+        )
+        return json.loads(await response.text())["delivered"]
+
+    async def stream(
+        self, topic: str, fmt: str, last_event_id=None, viewer=None
+    ):
+        """The Durable Object's streaming response for `viewer`."""
+        query = {"topic": topic, "format": fmt, "viewer": viewer}
+        if last_event_id:
+            query["last_event_id"] = last_event_id
+        return await self._stub(topic).fetch(
+            "https://topic-fanout/stream",
+            method="POST",
+            body=json.dumps(query),
+        )
@@ -0,0 +1,115 @@
+"""
+In-isolate cache of bearer token validation results.
+
+Every authenticated endpoint validates its token, and agents reuse the
+same token for many requests, so caching the result per isolate removes
+the AGENT_AUTH read from most requests.
+
+- Valid tokens are cached until the token expires, capped at
+  MAX_POSITIVE_TTL so tokens deleted from KV stop working reasonably soon.
+- Invalid tokens are cached for NEGATIVE_TTL, which absorbs repeated
+  attempts with the same bad token. It is kept short because a token
+  minted in another isolate may take a while to become visible in KV.
+- The cache is a size-bounded LRU; the oldest entry is evicted first.
+- Valid entries can carry the token's subject (the agent_id it was
+  issued to), so handlers can identify the caller without a KV read.
+"""
+
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+TOKEN_TTL = 86400
+MAX_CACHE_SIZE = 1024
+MAX_POSITIVE_TTL = 300
+NEGATIVE_TTL = 10
+
+
+class TokenCache:
+    """LRU cache mapping token -> (valid, cached_until, subject)."""
+
+    def __init__(
+        self,
+        max_size: int = MAX_CACHE_SIZE,
+        max_positive_ttl: float = MAX_POSITIVE_TTL,
+        negative_ttl: float = NEGATIVE_TTL,
+        clock=time.time,
+    ):
+        self.max_size = max_size
+        self.max_positive_ttl = max_positive_ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+        """True/False for a cached result, None when not cached."""
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        valid, cached_until, _ = entry
+        if cached_until <= self._clock():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        if valid:
+            self.hits += 1
+        else:
+            self.negative_hits += 1
+        return valid
+
+    def subject(self, token: str):
+        """Cached subject of a valid token; not counted as a lookup."""
+        entry = self._entries.get(token)
+        return entry[2] if entry is not None and entry[0] else None
+
+    def put_valid(self, token: str, expires_at: float, subject: str = None):
+        """Cache a valid token; `expires_at` is the token's epoch expiry."""
+        now = self._clock()
+        ttl = min(expires_at - now, self.max_positive_ttl)
+        if ttl > 0:
+            self._store(token, True, now + ttl, subject)
+
+    def put_invalid(self, token: str):
+        """Cache a token that KV does not know about."""
+        self._store(token, False, self._clock() + self.negative_ttl)
+
+    def _store(
+        self, token: str, valid: bool, cached_until: float, subject=None
+    ):
+        self._entries[token] = (valid, cached_until, subject)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this isolate since it started."""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (
+                round((self.hits + self.negative_hits) / lookups, 4)
+                if lookups
+                else 0.0
+            ),
+        }
+
+
+def token_expiry(token_data: dict) -> float:
+    """Epoch expiry of a stored token record."""
+    if "expires_at" in token_data:
+        return float(token_data["expires_at"])
+    # Tokens minted before expires_at was recorded
+    created = datetime.fromisoformat(token_data["created_at"])
+    return created.timestamp() + TOKEN_TTL
@@ -0,0 +1,226 @@
+"""
+Shared helpers for the Agent Network API worker.
+
+Kept free of `js` and `workers` imports so that support modules (and
+their tests) can use them outside the Workers runtime.
+
+IDs are the 128 bits of a UUIDv7 (RFC 9562), written as the 12 hex digit
+millisecond timestamp, a dash, then the remaining 20 hex digits: version
+and sequence (4), variant and random bits (16).
+
+    0194a6b3c2d1-7a3f9f8e7d6c5b4a3921
+
+Keys built from them (`message:`, `event:`, ...) therefore sort by time,
+and ID prefixes can be compared as timestamps (see messages.py). The
+12-bit rand_a field holds a per-isolate sequence (RFC 9562 method 1), so
+IDs generated in the same millisecond also sort in generation order.
+That matters on Workers, where the clock does not advance while a
+request runs, so every ID of a batch carries the same timestamp. The
+sequence starts at a random value below 2048 each millisecond; if it
+runs out, the generator moves on to the next millisecond early. Order
+is only guaranteed within an isolate; IDs from different isolates in the
+same millisecond sort arbitrarily.
+
+The remaining 62 bits are random, taken from a pool of CSPRNG words
+refilled ENTROPY_POOL_SIZE words at a time instead of one read per ID.
+"""
+
+import asyncio
+import hashlib
+import json
+import secrets
+import struct
+import time
+from datetime import datetime, timezone
+
+# Workers allow six simultaneous connections per invocation; concurrent
+# KV calls are bounded to that (see bounded_map)
+MAX_CONCURRENT_KV = 6
+
+# KV's minimum expirationTtl
+MIN_KV_TTL = 60
+
+# Largest millisecond timestamp that fits in the 12 hex digit ID prefix
+MAX_TIMESTAMP = 0xFFFFFFFFFFFF
+
+MAX_SEQUENCE = 0xFFF
+RANDOM_BITS = 62
+ENTROPY_POOL_SIZE = 256
+
+# Version 7 and variant 0b10 in place in the 80 bits after the timestamp
+_FIXED_BITS = (0x7 << 76) | (0x2 << 62)
+_RANDOM_MASK = (1 << RANDOM_BITS) - 1
+
+
+class IdGenerator:
+    """Per-isolate source of monotonic UUIDv7 IDs."""
+
+    def __init__(self, clock=time.time_ns, pool_size=ENTROPY_POOL_SIZE):
+        self._clock = clock
+        self._pool = struct.Struct(f">{pool_size}Q")
+        self._words = iter(())
+        self._last_ms = -1
+        self._sequence = 0
+        # Hex timestamp prefixes, formatted once per millisecond
+        self._prefix_ms = None
+        self._prefix = self._reverse_prefix = ""
+
+    def _random(self) -> int:
+        word = next(self._words, None)
+        if word is None:
+            self._words = iter(
+                self._pool.unpack(secrets.token_bytes(self._pool.size))
+            )
+            word = next(self._words)
+        return word
+
+    def _advance(self):
+        now = self._clock() // 1_000_000
+        if now > self._last_ms:
+            self._last_ms = now
+            # Leaves at least half the counter for this millisecond
+            self._sequence = self._random() >> 53
+        elif self._sequence < MAX_SEQUENCE:
+            # Same millisecond, or the clock went back: keep counting
+            self._sequence += 1
+        else:
+            self._last_ms += 1
+            self._sequence = 0
+        if self._last_ms != self._prefix_ms:
+            self._prefix_ms = self._last_ms
+            self._prefix = f"{self._last_ms:012x}-"
+            self._reverse_prefix = f"{MAX_TIMESTAMP - self._last_ms:012x}-"
+
+    def _tail(self, sequence: int) -> str:
+        bits = (sequence << 64) | _FIXED_BITS | (self._random() & _RANDOM_MASK)
+        # Much cheaper than format() for an 80-bit int
+        return bits.to_bytes(10, "big").hex()
+
+    def generate(self) -> str:
+        self._advance()
+        return self._prefix + self._tail(self._sequence)
+
+    def generate_reverse(self) -> str:
+        self._advance()
+        return self._reverse_prefix + self._tail(MAX_SEQUENCE - self._sequence)
+
+
+_ids = IdGenerator()
+
+
+def generate_id() -> str:
+    """Generate a unique, time-ordered ID (UUIDv7, see above)."""
+    return _ids.generate()
+
+
+def generate_reverse_id() -> str:
+    """
+    Generate an ID whose timestamp and sequence count down, so that newer
+    IDs sort first in KV's lexicographic key order. Not a valid UUIDv7.
+    """
+    return _ids.generate_reverse()
+
+
+def get_timestamp() -> str:
+    """Get ISO 8601 timestamp."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def get_date() -> str:
+    """Get the current UTC date (YYYY-MM-DD), used for daily buckets."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def public_key_digest(public_key) -> str:
+    """
+    SHA-256 of a public key as given in an auth request: a PEM string is
+    hashed as is, a JWK object in its sorted-keys JSON form.
+    """
+    if public_key is None:
+        public_key = ""
+    elif not isinstance(public_key, str):
+        public_key = json.dumps(public_key, sort_keys=True)
+    return hashlib.sha256(public_key.encode()).hexdigest()
+
+
+async def bounded_map(func, items, limit: int) -> list:
+    """
+    Await `func(item)` for every item with at most `limit` in flight.
+
+    Takes a function rather than awaitables because KV binding calls
+    start their request as soon as they are made; deferring the call is
+    what actually bounds concurrency. Results keep the input order.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+def kv_ttl(seconds: float) -> int:
+    """An expirationTtl of `seconds`, raised to KV's minimum."""
+    return max(MIN_KV_TTL, int(seconds))
+
+
+def key_metadata(key):
+    """
+    Metadata of a key from a KV list call, as a dict (a JS object in the
+    Workers runtime, a dict in the emulator), or None.
+    """
+    metadata = getattr(key, "metadata", None)
+    if metadata is not None and hasattr(metadata, "to_py"):
+        metadata = metadata.to_py()
+    return metadata
+
+
+class MetadataKV:
+    """
+    KV binding wrapper whose `put` converts `metadata` with `convert`.
+    Pyodide does not turn a Python dict into a JS object on its own, so
+    in the Workers runtime an unconverted dict is not stored as metadata.
+    """
+
+    __slots__ = ("_store", "_convert")
+
+    def __init__(self, store, convert):
+        self._store = store
+        self._convert = convert
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+    def put(self, key, value, metadata=None, **options):
+        if metadata is not None:
+            options["metadata"] = self._convert(metadata)
+        return self._store.put(key, value, **options)
+
+
+class MetadataEnv:
+    """Worker env whose KV bindings are MetadataKV wrappers."""
+
+    def __init__(self, env, convert, bindings: tuple):
+        self._env = env
+        self._convert = convert
+        self._bindings = bindings
+
+    def __getattr__(self, name):
+        value = getattr(self._env, name)
+        if name in self._bindings:
+            value = MetadataKV(value, self._convert)
+            # Cache so later lookups skip __getattr__
+            setattr(self, name, value)
+        return value
+
+
+def log_failure(operation: str, error: Exception, **fields):
+    """
+    Log a failure that is handled rather than raised (a background write,
+    a publish, one target of a fan-out) as one JSON line, which Workers
+    Logs indexes by field.
+    """
+    entry = {"level": "error", "operation": operation, "error": repr(error)}
+    entry.update(fields)
+    print(json.dumps(entry, default=str))
@@ -0,0 +1,368 @@
+"""
+JSON Schema validation for request bodies, compiled ahead of time.
+
+compile_schema turns a schema into a tree of small closures once, so
+validating a body runs only the checks that schema needs: keywords are
+looked up, patterns compiled and $refs resolved at compile time, never
+per request. validator(name) compiles a request schema from schemas.py
+on first use and keeps it for the life of the isolate.
+
+Supported keywords, the subset the published schemas use: type, const,
+enum, required, properties, additionalProperties, pattern, minLength,
+maxLength, minimum, maximum, minItems, maxItems, items, oneOf, anyOf,
+$ref (local, "#/$defs/..."), and format "date-time". Annotations such as
+description and default are ignored.
+
+Errors are dicts with a JSON Pointer `path` to the offending value and a
+`message`; at most MAX_ERRORS are reported per body.
+"""
+
+import re
+from datetime import datetime
+
+from schemas import BODY_LIMITS, REQUEST_SCHEMAS
+
+MAX_ERRORS = 10
+
+_TYPES = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float))
+    and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "null": lambda v: v is None,
+}
+
+
+def _date_time(value) -> bool:
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return "T" in value
+
+
+_FORMATS = {"date-time": _date_time}
+
+
+def _segment(key) -> str:
+    return "/" + str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _error(path: str, message: str) -> dict:
+    return {"path": path, "message": message}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _Invalid(Exception):
+    pass
+
+
+class _FailFast(list):
+    """Error list for trial matches: the first error ends the check."""
+
+    def append(self, error):
+        raise _Invalid
+
+    def extend(self, errors):
+        if errors:
+            raise _Invalid
+
+
+class _Compiler:
+    def __init__(self, root: dict):
+        self.root = root
+        self.refs = {}
+
+    def ref(self, ref: str):
+        check = self.refs.get(ref)
+        if check is not None:
+            return check
+        if not ref.startswith("#/"):
+            raise ValueError(f"Unsupported $ref: {ref}")
+        target = self.root
+        for part in ref[2:].split("/"):
+            target = target[part.replace("~1", "/").replace("~0", "~")]
+        # Late-bound through `self.refs` so recursive schemas terminate
+        self.refs[ref] = lambda value, path, errors: compiled(
+            value, path, errors
+        )
+        compiled = self.compile(target)
+        self.refs[ref] = compiled
+        return compiled
+
+    def compile(self, schema: dict):
+        checks = []
+        if "$ref" in schema:
+            checks.append(self.ref(schema["$ref"]))
+
+        if "type" in schema:
+            names = schema["type"]
+            names = [names] if isinstance(names, str) else names
+            tests = [_TYPES[name] for name in names]
+            if len(tests) == 1:
+                (test,) = tests
+            else:
+
+                def test(value):
+                    return any(test(value) for test in tests)
+
+            expected = " or ".join(names)
+
+            def check_type(value, path, errors):
+                if not test(value):
+                    errors.append(_error(path, f"must be {expected}"))
+                    return False
+                return True
+
+            # A value of the wrong type skips the remaining checks
+            type_check = check_type
+        else:
+            type_check = None
+
+        if "const" in schema:
+            const = schema["const"]
+
+            def check_const(value, path, errors):
+                if value != const:
+                    errors.append(_error(path, f"must be {const!r}"))
+
+            checks.append(check_const)
+
+        if "enum" in schema:
+            allowed = schema["enum"]
+            try:
+                allowed_set = frozenset(allowed)
+            except TypeError:
+                allowed_set = None
+            listed = ", ".join(map(str, allowed))
+
+            def check_enum(value, path, errors):
+                try:
+                    found = (
+                        value in allowed_set
+                        if allowed_set is not None
+                        else value in allowed
+                    )
+                except TypeError:
+                    found = False
+                if not found:
+                    errors.append(_error(path, f"must be one of: {listed}"))
+
+            checks.append(check_enum)
+
+        checks.extend(self._string_checks(schema))
+        checks.extend(self._number_checks(schema))
+        checks.extend(self._object_checks(schema))
+        checks.extend(self._array_checks(schema))
+
+        for keyword, exactly_one in (("oneOf", True), ("anyOf", False)):
+            if keyword in schema:
+                checks.append(
+                    self._combination(schema[keyword], exactly_one)
+                )
+
+        if type_check is None:
+            if len(checks) == 1:
+                return checks[0]
+
+            def check_all(value, path, errors):
+                for check in checks:
+                    check(value, path, errors)
+
+            return check_all
+
+        def check_typed(value, path, errors):
+            if type_check(value, path, errors):
+                for check in checks:
+                    check(value, path, errors)
+
+        return check_typed
+
+    def _string_checks(self, schema):
+        checks = []
+        min_length = schema.get("minLength")
+        max_length = schema.get("maxLength")
+        if min_length is not None or max_length is not None:
+            low = min_length or 0
+            high = max_length
+
+            def check_length(value, path, errors):
+                if not isinstance(value, str):
+                    return
+                if len(value) < low:
+                    message = f"must have at least {low} characters"
+                    errors.append(_error(path, message))
+                elif high is not None and len(value) > high:
+                    message = f"must have at most {high} characters"
+                    errors.append(_error(path, message))
+
+            checks.append(check_length)
+
+        if "pattern" in schema:
+            pattern = schema["pattern"]
+            search = re.compile(pattern).search
+
+            def check_pattern(value, path, errors):
+                if isinstance(value, str) and search(value) is None:
+                    errors.append(_error(path, f"must match {pattern}"))
+
+            checks.append(check_pattern)
+
+        if "format" in schema and schema["format"] in _FORMATS:
+            name = schema["format"]
+            test = _FORMATS[name]
+
+            def check_format(value, path, errors):
+                if isinstance(value, str) and not test(value):
+                    errors.append(_error(path, f"must be a {name}"))
+
+            checks.append(check_format)
+        return checks
+
+    def _number_checks(self, schema):
+        low = schema.get("minimum")
+        high = schema.get("maximum")
+        if low is None and high is None:
+            return []
+
+        def check_range(value, path, errors):
+            if not _is_number(value):
+                return
+            if low is not None and value < low:
+                errors.append(_error(path, f"must be at least {low}"))
+            elif high is not None and value > high:
+                errors.append(_error(path, f"must be at most {high}"))
+
+        return [check_range]
+
+    def _object_checks(self, schema):
+        required = tuple(schema.get("required", ()))
+        # Pointer segments are escaped once, here
+        properties = {
+            name: (self.compile(subschema), _segment(name))
+            for name, subschema in schema.get("properties", {}).items()
+        }
+        additional = schema.get("additionalProperties", True)
+        if additional is True:
+            additional_check = None
+        elif additional is False:
+            additional_check = False
+        else:
+            additional_check = self.compile(additional)
+        if not required and not properties and additional_check is None:
+            return []
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append(_error(path + _segment(name), "is required"))
+            for name, item in value.items():
+                known = properties.get(name)
+                if known is not None:
+                    known[0](item, path + known[1], errors)
+                elif additional_check is False:
+                    message = "is not allowed"
+                    errors.append(_error(path + _segment(name), message))
+                elif additional_check is not None:
+                    additional_check(item, path + _segment(name), errors)
+
+        return [check_object]
+
+    def _array_checks(self, schema):
+        low = schema.get("minItems")
+        high = schema.get("maxItems")
+        items = self.compile(schema["items"]) if "items" in schema else None
+        if low is None and high is None and items is None:
+            return []
+
+        def check_array(value, path, errors):
+            if not isinstance(value, list):
+                return
+            if low is not None and len(value) < low:
+                errors.append(_error(path, f"must have at least {low} items"))
+            elif high is not None and len(value) > high:
+                errors.append(_error(path, f"must have at most {high} items"))
+            if items is not None:
+                for index, item in enumerate(value):
+                    items(item, f"{path}/{index}", errors)
+                    if len(errors) >= MAX_ERRORS:
+                        return
+
+        return [check_array]
+
+    def _combination(self, subschemas, exactly_one: bool):
+        options = [self.compile(subschema) for subschema in subschemas]
+        keyword = "exactly one" if exactly_one else "at least one"
+
+        def check_combination(value, path, errors):
+            matched = 0
+            for option in options:
+                try:
+                    option(value, path, _FailFast())
+                except _Invalid:
+                    continue
+                matched += 1
+                if not exactly_one or matched > 1:
+                    break
+            if matched == 1 or (matched and not exactly_one):
+                return
+            if matched == 0:
+                # Only invalid bodies pay for full error lists; report the
+                # option that got the type right and failed least
+                closest = None
+                for option in options:
+                    option_errors = []
+                    option(value, path, option_errors)
+                    score = (
+                        any(error["path"] == path for error in option_errors),
+                        len(option_errors),
+                    )
+                    if closest is None or score < closest[0]:
+                        closest = (score, option_errors)
+                if closest and not closest[0][0]:
+                    errors.extend(closest[1])
+                    return
+            message = f"must match {keyword} of the allowed schemas"
+            errors.append(_error(path, message))
+
+        return check_combination
+
+
+def compile_schema(schema: dict, root: dict = None):
+    """
+    A function validating a value against `schema` that returns a list
+    of errors (empty when valid). $refs resolve against `root`, which
+    defaults to the schema itself.
+    """
+    check = _Compiler(root if root is not None else schema).compile(schema)
+
+    def validate(value) -> list:
+        errors = []
+        check(value, "", errors)
+        return errors[:MAX_ERRORS]
+
+    return validate
+
+
+_validators = {}
+
+
+def validator(name: str):
+    """The compiled validator of a request schema, built on first use."""
+    validate = _validators.get(name)
+    if validate is None:
+        validate = _validators[name] = compile_schema(REQUEST_SCHEMAS[name])
+    return validate
+
+
+def body_limit(name: str) -> int:
+    """Largest body, in bytes, accepted for a request schema."""
+    return BODY_LIMITS.get(name, BODY_LIMITS["default"])
@@ -0,0 +1,75 @@
+"""
+Pytest setup: put src/ and the emulator on the import path, and share
+the fixtures several test modules need.
+"""
+
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+
+class FakeClock:
+    """A clock that only moves when a test sets `now`."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class EventBatches:
+    """
+    Analytics events and event batches, with times given in seconds
+    after `base` (2025-01-28T14:00:00Z).
+    """
+
+    base = datetime(2025, 1, 28, 14, tzinfo=timezone.utc).timestamp()
+
+    def event(self, event_type, seconds, **data):
+        timestamp = datetime.fromtimestamp(self.base + seconds, timezone.utc)
+        return {
+            "type": event_type,
+            "timestamp": timestamp.isoformat(),
+            "data": data,
+        }
+
+    def events(self, event_type, seconds, count):
+        """`count` events, one per second from `seconds` on."""
+        return [
+            self.event(event_type, seconds + i, n=i) for i in range(count)
+        ]
+
+    def put(self, store, flushed_at, events, with_metadata=True, suffix="0"):
+        """Write a batch as AnalyticsBuffer.flush would at `flushed_at`."""
+        from analytics import batch_metadata
+        from rollups import batch_counts
+
+        name = f"event:{int((self.base + flushed_at) * 1000):012x}-{suffix}"
+        if with_metadata:
+            hours = batch_counts(events)
+            body = json.dumps({"hours": hours, "events": events})
+            asyncio.run(store.put(name, body, metadata=batch_metadata(hours)))
+        else:
+            # A batch written before batches carried their counts
+            asyncio.run(store.put(name, json.dumps(events)))
+        return name
+
+
+@pytest.fixture
+def clock():
+    """A settable clock for anything that takes a `clock` callable."""
+    return FakeClock()
+
+
+@pytest.fixture
+def batches():
+    return EventBatches()
@@ -0,0 +1,121 @@
+"""Tests for the buffered analytics writer."""
+
+import asyncio
+import json
+
+from analytics import MAX_BATCH_EVENTS, AnalyticsBuffer
+from memory_kv import MemoryKV
+from counters import read_counter
+from utils import get_date
+
+
+def record_auth_request(buffer):
+    """Mirror what handle_auth_request records for a successful POST."""
+    buffer.record_put("auth_attempt:1", json.dumps({"success": True}))
+    buffer.record("auth_attempt", {"success": True})
+    buffer.record("auth_request_created", {"request_id": "1"})
+
+
+def test_record_does_not_touch_kv():
+    store = MemoryKV()
+    buffer = AnalyticsBuffer()
+    record_auth_request(buffer)
+
+    assert buffer.pending
+    assert store.total_ops == 0
+
+
+def test_flush_batches_events_and_counters():
+    store = MemoryKV()
+    buffer = AnalyticsBuffer(batch_interval=0)
+    record_auth_request(buffer)
+
+    asyncio.run(buffer.flush(store))
+
+    # 1 event batch + 1 auth attempt + 2 counter shards. The unbuffered
+    # path cost 8 serial operations for the same request.
+    assert store.ops == {"put": 4}
+    assert not buffer.pending
+
+    event_keys = [k for k in store._data if k.startswith("event:")]
+    assert len(event_keys) == 1
+    events = json.loads(store._data[event_keys[0]]["value"])["events"]
+    assert [e["type"] for e in events] == [
+        "auth_attempt",
+        "auth_request_created",
+    ]
+
+
+def test_counter_deltas_are_aggregated():
+    store = MemoryKV()
+    buffer = AnalyticsBuffer(batch_interval=0)
+    for _ in range(25):
+        buffer.record("auth_poll", {})
+
+    asyncio.run(buffer.flush(store))
+
+    # 25 events collapse into one batch put and one counter put
+    assert store.ops == {"put": 2}
+    counter = asyncio.run(read_counter(store, f"counter:auth_poll:{get_date()}"))
+    assert counter == 25
+
+    buffer.record("auth_poll", {})
+    asyncio.run(buffer.flush(store))
+    counter = asyncio.run(read_counter(store, f"counter:auth_poll:{get_date()}"))
+    assert counter == 26
+
+
+def test_records_during_flush_go_to_next_batch():
+    store = MemoryKV()
+    buffer = AnalyticsBuffer()
+    buffer.record("message_posted", {})
+
+    async def scenario():
+        flush = asyncio.ensure_future(buffer.flush(store))
+        await asyncio.sleep(0)  # let the flush drain the buffer
+        buffer.record("message_posted", {})
+        await flush
+        assert buffer.pending
+        await buffer.flush(store)
+
+    asyncio.run(scenario())
+    counter = asyncio.run(
+        read_counter(store, f"counter:message_posted:{get_date()}")
+    )
+    assert counter == 2
+
+
+def test_event_batches_are_coalesced_across_flushes(clock):
+    store = MemoryKV()
+    buffer = AnalyticsBuffer(batch_interval=10, clock=clock)
+
+    async def scenario():
+        for _ in range(4):
+            record_auth_request(buffer)
+            await buffer.flush(store)
+            clock.now += 4
+        return [k for k in store._data if k.startswith("event:")]
+
+    batches = asyncio.run(scenario())
+
+    # Records and counters are written on every flush, the event batch
+    # only once it is 10 seconds old (at the fourth flush)
+    assert len(batches) == 1
+    batch = json.loads(store._data[batches[0]]["value"])
+    assert len(batch["events"]) == 8
+    assert store._data["auth_attempt:1"]
+    assert not buffer.pending
+
+    asyncio.run(buffer.flush(store, force=True))
+    assert len([k for k in store._data if k.startswith("event:")]) == 1
+
+
+def test_full_batches_are_written_before_the_interval(clock):
+    store = MemoryKV()
+    buffer = AnalyticsBuffer(batch_interval=3600, clock=clock)
+    for _ in range(MAX_BATCH_EVENTS):
+        buffer.record("auth_poll", {})
+
+    assert buffer.pending
+    asyncio.run(buffer.flush(store))
+    assert any(k.startswith("event:") for k in store._data)
@@ -0,0 +1,82 @@
+"""Tests for archiving raw events into compressed NDJSON segments."""
+
+import asyncio
+
+from archive import SEGMENT_PREFIX, build_segments, read_segment
+from memory_kv import MemoryKV
+from retention import parse_retention
+from rollups import compact_events
+
+def segments(store):
+    return {
+        name: entry
+        for name, entry in store._data.items()
+        if name.startswith(SEGMENT_PREFIX)
+    }
+
+
+def test_segments_are_hourly_and_round_trip(batches):
+    first = batches.events("auth_poll", 3500, 200)  # crosses into 15:00
+    second = batches.events("message_posted", 3700, 5)
+
+    built = build_segments([("event:a", first), ("event:b", second)])
+
+    assert [key for key, _, _ in built] == [
+        "archive:2025-01-28T14:a",
+        "archive:2025-01-28T15:a",
+    ]
+    assert read_segment(built[0][1]) + read_segment(built[1][1]) == (
+        first + second
+    )
+    _, data, metadata = built[1]
+    assert metadata["events"] == 105
+    assert metadata["bytes"] == len(data) < metadata["raw_bytes"] / 5
+
+
+def test_compaction_archives_before_deleting(batches):
+    store = MemoryKV()
+    batches.put(store, 100, batches.events("auth_poll", 10, 50))
+    batches.put(store, 200, batches.events("message_posted", 150, 3))
+
+    compacted = asyncio.run(compact_events(store, now=batches.base + 3600))
+
+    assert compacted == 2
+    ((name, entry),) = segments(store).items()
+    assert name.startswith("archive:2025-01-28T14:")
+    assert len(read_segment(entry["value"])) == 53
+    assert entry["metadata"]["events"] == 53
+    assert entry["expires_at"] is not None
+    assert not [k for k in store._data if k.startswith("event:")]
+
+
+def test_absorbed_batches_are_not_archived_again(batches):
+    store = MemoryKV()
+    name = batches.put(store, 100, batches.events("auth_poll", 10, 5))
+    entry = store._data[name]
+    asyncio.run(compact_events(store, now=batches.base + 3600))
+
+    # The previous run stopped before deleting the batch
+    asyncio.run(store.put(name, entry["value"], metadata=entry["metadata"]))
+    store.reset_ops()
+    asyncio.run(compact_events(store, now=batches.base + 3600))
+
+    assert len(segments(store)) == 1
+    assert store.ops["put"] == 0
+
+
+def test_archiving_can_be_disabled(batches):
+    store = MemoryKV()
+    batches.put(store, 100, batches.events("auth_poll", 10, 5))
+    store.reset_ops()
+
+    asyncio.run(
+        compact_events(
+            store,
+            now=batches.base + 3600,
+            retention=parse_retention({"archive": 0}),
+        )
+    )
+
+    assert not segments(store)
+    # Counts come from metadata: no batch bodies are read
+    assert store.ops["get"] == 2  # the hour and day rollups
@@ -0,0 +1,145 @@
+"""Tests for the newest-first auth attempt log."""
+
+import asyncio
+import json
+import time
+
+from auth_log import (
+    AUTH_LOG_PREFIX,
+    auth_attempt_metadata,
+    build_auth_attempt,
+    get_auth_attempt,
+    list_auth_attempts,
+)
+from memory_kv import MemoryKV
+from utils import MAX_TIMESTAMP
+
+
+def populate(store, count, start_ms=1_700_000_000_000, with_metadata=True):
+    async def write():
+        for seq in range(count):
+            _, entry = build_auth_attempt(
+                {
+                    "public_key": "pk",
+                    "purpose": str(seq),
+                    "agent_id": f"agent-{seq % 4}",
+                },
+                success=seq % 3 != 0,
+                reason="request_created" if seq % 3 else "missing_fields",
+            )
+            key = f"{AUTH_LOG_PREFIX}{MAX_TIMESTAMP - start_ms - seq:012x}-0"
+            metadata = auth_attempt_metadata(entry) if with_metadata else None
+            await store.put(key, json.dumps(entry), metadata=metadata)
+
+    asyncio.run(write())
+    store.reset_ops()
+
+
+def test_keys_sort_newest_first():
+    first, _ = build_auth_attempt({}, True)
+    time.sleep(0.002)
+    second, _ = build_auth_attempt({}, True)
+    assert second < first
+
+
+def test_pages_are_newest_first_and_cursor_driven():
+    store = MemoryKV()
+    populate(store, 45)
+
+    seqs = []
+    cursor = None
+    while True:
+        page = asyncio.run(list_auth_attempts(store, cursor=cursor, limit=20))
+        seqs += [int(a["purpose"]) for a in page["auth_attempts"]]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+
+    assert seqs == list(range(44, -1, -1))
+
+
+def test_filters():
+    store = MemoryKV()
+    populate(store, 30)
+
+    page = asyncio.run(
+        list_auth_attempts(
+            store, filters={"success": False, "agent_id": "agent-0"}
+        )
+    )
+    assert [a["purpose"] for a in page["auth_attempts"]] == ["24", "12", "0"]
+
+
+def test_page_cost_depends_on_page_size_not_log_volume():
+    def page_ops(volume):
+        store = MemoryKV()
+        populate(store, volume)
+        page = asyncio.run(list_auth_attempts(store, limit=25))
+        assert len(page["auth_attempts"]) == 25
+        return dict(store.ops)
+
+    # Rows come from key metadata: one list call and no gets per page
+    assert page_ops(100) == page_ops(5000) == {"list": 1}
+
+
+def test_full_record_is_fetched_on_demand():
+    store = MemoryKV()
+    populate(store, 3)
+    page = asyncio.run(list_auth_attempts(store, limit=1))
+    row = page["auth_attempts"][0]
+
+    attempt = asyncio.run(get_auth_attempt(store, row["id"]))
+    assert attempt["purpose"] == row["purpose"] == "2"
+    assert asyncio.run(get_auth_attempt(store, "missing")) is None
+
+
+def test_long_text_is_truncated_in_metadata():
+    _, entry = build_auth_attempt({"purpose": "x" * 500}, True)
+    assert len(auth_attempt_metadata(entry)["purpose"]) == 128
+
+
+def test_multibyte_text_is_truncated_on_utf8_bytes():
+    _, entry = build_auth_attempt({"purpose": "\u00e9" * 500}, True)
+    purpose = auth_attempt_metadata(entry)["purpose"]
+    assert purpose == "\u00e9" * 64
+    assert len(purpose.encode()) == 128
+
+    # A 3-byte character that would straddle the limit is dropped whole
+    _, entry = build_auth_attempt({"purpose": "a" + "\u20ac" * 100}, True)
+    purpose = auth_attempt_metadata(entry)["purpose"]
+    assert purpose == "a" + "\u20ac" * 42
+
+
+def test_jwk_and_missing_public_keys_are_hashed():
+    from peers import agent_owner
+
+    jwk = {"kty": "OKP", "crv": "Ed25519", "x": "11qYAYKxCrfVS_7TyWQHOg"}
+    _, entry = build_auth_attempt({"public_key": jwk}, True)
+    assert entry["public_key_hash"] == agent_owner(jwk)[:16]
+    _, reordered = build_auth_attempt(
+        {"public_key": dict(reversed(jwk.items()))}, True
+    )
+    assert reordered["public_key_hash"] == entry["public_key_hash"]
+
+    _, missing = build_auth_attempt({"public_key": None}, False)
+    _, absent = build_auth_attempt({}, False)
+    assert missing["public_key_hash"] == absent["public_key_hash"]
+
+
+def test_metadata_over_the_kv_limit_is_omitted(monkeypatch):
+    monkeypatch.setattr("auth_log.MAX_METADATA_BYTES", 64)
+    _, entry = build_auth_attempt({"purpose": "x" * 100}, True)
+    assert auth_attempt_metadata(entry) is None
+
+
+def test_entries_without_metadata_fall_back_to_concurrent_gets():
+    store = MemoryKV()
+    populate(store, 200, with_metadata=False)
+    store.latency = 0.01
+
+    started = time.perf_counter()
+    page = asyncio.run(list_auth_attempts(store, limit=50))
+    # 50 serial gets would take at least 0.5s
+    assert time.perf_counter() - started < 0.3
+    assert store.ops == {"list": 1, "get": 50}
+    assert page["auth_attempts"][0]["purpose"] == "199"
@@ -0,0 +1,235 @@
+"""Tests for the single-writer auth request state machine."""
+
+import asyncio
+import json
+import time
+
+from auth_state import (
+    AUTH_REQUEST_PREFIX,
+    AUTO_APPROVE_POLLS,
+    AuthRequestCoordinator,
+    Outcome,
+)
+from memory_kv import MemoryKV
+
+
+def pending_request(store, auth_request_id="req-1", expires_in=3600):
+    record = {
+        "id": auth_request_id,
+        "public_key": "pk",
+        "purpose": "tests",
+        "callback_url": None,
+        "status": "pending",
+        "created_at": "2025-01-28T00:00:00+00:00",
+        "expires_at": time.time() + expires_in,
+    }
+    asyncio.run(
+        store.put(f"{AUTH_REQUEST_PREFIX}{auth_request_id}", json.dumps(record))
+    )
+    store.reset_ops()
+    return record
+
+
+class MemoryStorage:
+    """Stand-in for a Durable Object's ctx.storage."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def put(self, key, value):
+        self.data[key] = value
+
+
+def token_keys(store):
+    return asyncio.run(store.list(prefix="token:")).keys
+
+
+def test_concurrent_polls_mint_one_token():
+    store = MemoryKV(latency=0.001)
+    pending_request(store)
+    coordinator = AuthRequestCoordinator(store)
+
+    async def poll_storm():
+        return await asyncio.gather(
+            *(coordinator.transition("req-1", "poll") for _ in range(50))
+        )
+
+    outcomes = asyncio.run(poll_storm())
+
+    assert sum(outcome.changed for outcome in outcomes) == 1
+    assert len(token_keys(store)) == 1
+    tokens = {outcome.record.get("token") for outcome in outcomes}
+    assert tokens - {None} == {outcomes[-1].record["token"]}
+    # One read to load the record, two writes for the approval
+    assert store.ops["get"] == 1
+    assert store.ops["put"] == 2
+
+
+def test_pending_polls_do_not_write():
+    store = MemoryKV()
+    pending_request(store)
+    coordinator = AuthRequestCoordinator(store)
+
+    async def polls():
+        return [
+            await coordinator.transition("req-1", "poll")
+            for _ in range(AUTO_APPROVE_POLLS)
+        ]
+
+    outcomes = asyncio.run(polls())
+
+    assert [o.record["status"] for o in outcomes[:-1]] == ["pending"] * (
+        AUTO_APPROVE_POLLS - 1
+    )
+    assert outcomes[-1].changed
+    assert outcomes[-1].record["status"] == "approved"
+    assert store.ops["put"] == 2
+
+
+def test_approve_is_idempotent():
+    store = MemoryKV()
+    pending_request(store)
+    coordinator = AuthRequestCoordinator(store, auto_approve_polls=None)
+
+    first = asyncio.run(coordinator.transition("req-1", "approve"))
+    second = asyncio.run(coordinator.transition("req-1", "approve"))
+
+    assert first.changed and not second.changed
+    assert second.error is None
+    assert first.record["token"] == second.record["token"]
+    assert len(token_keys(store)) == 1
+    stored = json.loads(asyncio.run(store.get(f"{AUTH_REQUEST_PREFIX}req-1")))
+    assert stored["status"] == "approved"
+    assert stored["token"] == first.record["token"]
+
+
+def test_decided_request_rejects_other_decision():
+    store = MemoryKV()
+    pending_request(store)
+    coordinator = AuthRequestCoordinator(store, auto_approve_polls=None)
+
+    asyncio.run(coordinator.transition("req-1", "deny"))
+    outcome = asyncio.run(coordinator.transition("req-1", "approve"))
+
+    assert outcome.error == "conflict"
+    assert outcome.record["status"] == "denied"
+    assert token_keys(store) == []
+
+
+def test_manual_mode_polls_never_approve():
+    store = MemoryKV()
+    pending_request(store)
+    coordinator = AuthRequestCoordinator(store, auto_approve_polls=None)
+
+    for _ in range(AUTO_APPROVE_POLLS * 2):
+        outcome = asyncio.run(coordinator.transition("req-1", "poll"))
+    assert outcome == Outcome(outcome.record)
+    assert outcome.record["status"] == "pending"
+    assert store.ops["put"] == 0
+
+
+def test_expired_request_cannot_be_approved():
+    store = MemoryKV()
+    now = [time.time()]
+    pending_request(store, expires_in=60)
+    coordinator = AuthRequestCoordinator(
+        store, auto_approve_polls=None, clock=lambda: now[0]
+    )
+
+    now[0] += 61
+    expired = asyncio.run(coordinator.transition("req-1", "approve"))
+    again = asyncio.run(coordinator.transition("req-1", "approve"))
+
+    assert expired.changed and expired.record["status"] == "expired"
+    assert again.error == "conflict"
+    assert token_keys(store) == []
+
+
+def test_unknown_request():
+    coordinator = AuthRequestCoordinator(MemoryKV())
+    outcome = asyncio.run(coordinator.transition("missing", "poll"))
+    assert outcome.error == "not_found"
+    assert outcome.record is None
+
+
+def test_failed_write_leaves_request_pending():
+    class FlakyKV(MemoryKV):
+        fail = False
+
+        async def put(self, key, value, **kwargs):
+            if self.fail and key.startswith(AUTH_REQUEST_PREFIX):
+                raise RuntimeError("KV unavailable")
+            await super().put(key, value, **kwargs)
+
+    store = FlakyKV()
+    pending_request(store)
+    store.fail = True
+    coordinator = AuthRequestCoordinator(store, auto_approve_polls=None)
+
+    try:
+        asyncio.run(coordinator.transition("req-1", "approve"))
+    except RuntimeError:
+        pass
+    store.fail = False
+    outcome = asyncio.run(coordinator.transition("req-1", "approve"))
+
+    assert outcome.changed
+    assert outcome.record["status"] == "approved"
+
+
+def test_restarted_coordinator_does_not_trust_stale_kv():
+    store = MemoryKV()
+    pending = pending_request(store)
+    storage = MemoryStorage()
+    first = AuthRequestCoordinator(
+        store, auto_approve_polls=None, storage=storage
+    )
+    approved = asyncio.run(first.transition("req-1", "approve"))
+
+    # Evicted; the new instance reads a replica that still says pending
+    asyncio.run(
+        store.put(f"{AUTH_REQUEST_PREFIX}req-1", json.dumps(pending))
+    )
+    restarted = AuthRequestCoordinator(
+        store, auto_approve_polls=None, storage=storage
+    )
+    again = asyncio.run(restarted.transition("req-1", "approve"))
+
+    assert not again.changed
+    assert again.record["token"] == approved.record["token"]
+    assert len(token_keys(store)) == 1
+    # The replica is repaired from storage
+    stored = json.loads(asyncio.run(store.get(f"{AUTH_REQUEST_PREFIX}req-1")))
+    assert stored["status"] == "approved"
+
+
+def test_stored_decision_survives_a_failed_replica_write():
+    class FlakyKV(MemoryKV):
+        fail = True
+
+        async def put(self, key, value, **kwargs):
+            if self.fail:
+                raise RuntimeError("KV unavailable")
+            await super().put(key, value, **kwargs)
+
+    store = FlakyKV()
+    coordinator = AuthRequestCoordinator(
+        store, auto_approve_polls=None, storage=MemoryStorage()
+    )
+    store.fail = False
+    pending_request(store)
+    store.fail = True
+
+    try:
+        asyncio.run(coordinator.transition("req-1", "approve"))
+    except RuntimeError:
+        pass
+    store.fail = False
+    outcome = asyncio.run(coordinator.transition("req-1", "approve"))
+
+    assert not outcome.changed
+    (token_key,) = token_keys(store)
+    assert token_key.name == f"token:{outcome.record['token']}"
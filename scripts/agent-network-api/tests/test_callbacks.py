@@ -0,0 +1,225 @@
+"""Tests for signed auth callbacks, delivered to a local stub receiver."""
+
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from auth_requests import PollThrottle
+from callbacks import (
+    CALLBACK_JOB_PREFIX,
+    IMMEDIATE_ATTEMPTS,
+    MAX_ATTEMPTS,
+    SIGNATURE_HEADER,
+    backoff_delay,
+    build_job,
+    deliver,
+    process_due_jobs,
+    sign_payload,
+    verify_signature,
+)
+from memory_kv import MemoryKV
+
+SECRET = "test-signing-key"
+
+
+class StubReceiver:
+    """HTTP server that records callbacks and fails the first `failures`."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.received = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                body = self.rfile.read(length).decode()
+                receiver.received.append((body, dict(self.headers)))
+                if receiver.failures > 0:
+                    receiver.failures -= 1
+                    self.send_response(503)
+                else:
+                    self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/callback"
+        self.thread = threading.Thread(target=self.server.serve_forever)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _post(url, body, headers):
+    request = urllib.request.Request(
+        url, data=body.encode(), headers=headers, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+async def send(url, body, headers):
+    return await asyncio.to_thread(_post, url, body, headers)
+
+
+async def no_sleep(seconds):
+    pass
+
+
+def approved_payload():
+    return {
+        "event": "auth_request.approved",
+        "auth_request_id": "req-1",
+        "status": "approved",
+        "access_token": "tok",
+        "token_type": "Bearer",
+        "expires_in": 86400,
+    }
+
+
+def test_signature_round_trip():
+    body = json.dumps({"a": 1})
+    header = sign_payload(SECRET, body, 1_700_000_000)
+
+    assert verify_signature(SECRET, body, header)
+    assert not verify_signature("other-key", body, header)
+    assert not verify_signature(SECRET, body + " ", header)
+    assert not verify_signature(SECRET, body, "garbage")
+
+
+def test_delivers_signed_payload():
+    store = MemoryKV()
+    with StubReceiver() as receiver:
+        job = build_job(receiver.url, approved_payload())
+        delivered = asyncio.run(deliver(store, job, SECRET, send))
+
+    assert delivered
+    assert len(receiver.received) == 1
+    body, headers = receiver.received[0]
+    assert json.loads(body) == approved_payload()
+    assert verify_signature(SECRET, body, headers[SIGNATURE_HEADER])
+    # Nothing left for the cron
+    assert store.ops["put"] == 0
+
+
+def test_retries_immediately_before_persisting():
+    store = MemoryKV()
+    with StubReceiver(failures=IMMEDIATE_ATTEMPTS - 1) as receiver:
+        job = build_job(receiver.url, approved_payload())
+        delivered = asyncio.run(
+            deliver(store, job, SECRET, send, sleep=no_sleep)
+        )
+
+    assert delivered
+    assert len(receiver.received) == IMMEDIATE_ATTEMPTS
+    assert store.ops["put"] == 0
+
+
+def test_failed_job_is_retried_by_cron_with_backoff():
+    store = MemoryKV()
+    with StubReceiver(failures=IMMEDIATE_ATTEMPTS) as receiver:
+        job = build_job(receiver.url, approved_payload())
+        delivered = asyncio.run(
+            deliver(store, job, SECRET, send, sleep=no_sleep)
+        )
+        assert not delivered
+        stored = json.loads(
+            asyncio.run(store.get(f"{CALLBACK_JOB_PREFIX}{job['id']}"))
+        )
+        assert stored["attempts"] == IMMEDIATE_ATTEMPTS
+
+        # Not due yet: the job is only listed, never fetched or sent
+        store.reset_ops()
+        counts = asyncio.run(
+            process_due_jobs(store, SECRET, send, now=job["next_attempt_at"] - 1)
+        )
+        assert counts == (0, 0, 0)
+        assert store.ops["get"] == 0
+
+        counts = asyncio.run(
+            process_due_jobs(store, SECRET, send, now=stored["next_attempt_at"])
+        )
+
+    assert counts == (1, 0, 0)
+    assert len(receiver.received) == IMMEDIATE_ATTEMPTS + 1
+    assert asyncio.run(store.get(f"{CALLBACK_JOB_PREFIX}{job['id']}")) is None
+
+
+def test_cron_gives_up_after_max_attempts():
+    store = MemoryKV()
+    with StubReceiver(failures=MAX_ATTEMPTS) as receiver:
+        job = build_job(receiver.url, approved_payload())
+        asyncio.run(deliver(store, job, SECRET, send, sleep=no_sleep))
+
+        outcomes = []
+        now = job["next_attempt_at"]
+        for _ in range(MAX_ATTEMPTS):
+            counts = asyncio.run(process_due_jobs(store, SECRET, send, now=now))
+            outcomes.append(counts)
+            if counts[2]:
+                break
+            now += backoff_delay(MAX_ATTEMPTS)
+
+    assert outcomes[-1] == (0, 0, 1)
+    assert len(receiver.received) == MAX_ATTEMPTS
+    assert asyncio.run(store.list(prefix=CALLBACK_JOB_PREFIX)).keys == []
+
+
+def test_unreachable_receiver_counts_as_failure():
+    store = MemoryKV()
+    with StubReceiver() as receiver:
+        url = receiver.url
+    # The server is shut down, so connections are refused
+    job = build_job(url, approved_payload())
+    assert not asyncio.run(deliver(store, job, SECRET, send, sleep=no_sleep))
+    assert job["attempts"] == IMMEDIATE_ATTEMPTS
+
+
+def test_backoff_grows_and_is_capped():
+    delays = [backoff_delay(attempts) for attempts in range(1, 12)]
+    assert delays == sorted(delays)
+    assert delays[1] == 2 * delays[0]
+    assert delays[-1] == backoff_delay(100)
+
+
+@pytest.mark.parametrize("elapsed, expected_wait", [(0, 4), (1, 3), (3.6, 1)])
+def test_poll_throttle_slows_early_polls(elapsed, expected_wait):
+    now = [1000.0]
+    throttle = PollThrottle(min_spacing=4, clock=lambda: now[0])
+
+    assert throttle.check("req") == 0
+    now[0] += elapsed
+    assert throttle.check("req") == expected_wait
+
+
+def test_poll_throttle_allows_spaced_polls_and_forgets():
+    now = [1000.0]
+    throttle = PollThrottle(min_spacing=4, max_size=2, clock=lambda: now[0])
+
+    assert throttle.check("a") == 0
+    now[0] += 4
+    assert throttle.check("a") == 0
+    assert throttle.check("a") > 0
+    throttle.forget("a")
+    assert throttle.check("a") == 0
+
+    # Bounded: the oldest request is dropped first
+    throttle.check("b")
+    throttle.check("c")
+    assert throttle.check("a") == 0
@@ -0,0 +1,111 @@
+"""Concurrency tests for sharded daily counters."""
+
+import asyncio
+import random
+
+from analytics import AnalyticsBuffer
+from counters import ShardedCounters, read_counter, read_counters
+from memory_kv import MemoryKV
+from utils import get_date
+
+ISOLATES = 8
+REQUESTS = 4000
+
+
+async def naive_increment(store, counter_key):
+    """The pre-sharding read-modify-write, kept for comparison."""
+    current = await store.get(counter_key)
+    await store.put(counter_key, str(int(current) + 1 if current else 1))
+
+
+async def simulate_requests(store, isolates, requests):
+    """Fire `requests` simultaneous requests spread across isolates."""
+
+    async def request(buffer):
+        buffer.record("auth_poll", {})
+        await asyncio.sleep(0)
+        await buffer.flush(store)
+
+    await asyncio.gather(
+        *(request(random.choice(isolates)) for _ in range(requests))
+    )
+
+
+def test_naive_increment_loses_updates():
+    store = MemoryKV()
+    counter_key = f"counter:auth_poll:{get_date()}"
+
+    async def scenario():
+        await asyncio.gather(
+            *(naive_increment(store, counter_key) for _ in range(REQUESTS))
+        )
+        return await store.get(counter_key)
+
+    assert int(asyncio.run(scenario())) < REQUESTS
+
+
+def test_sharded_counters_are_exact_under_concurrency():
+    store = MemoryKV()
+    isolates = [AnalyticsBuffer() for _ in range(ISOLATES)]
+
+    async def scenario():
+        await simulate_requests(store, isolates, REQUESTS)
+        return await read_counter(store, f"counter:auth_poll:{get_date()}")
+
+    assert asyncio.run(scenario()) == REQUESTS
+
+
+def test_shard_count_bounds_keys_per_isolate():
+    store = MemoryKV()
+    isolates = [
+        AnalyticsBuffer(ShardedCounters(shards=3)) for _ in range(ISOLATES)
+    ]
+    asyncio.run(simulate_requests(store, isolates, 500))
+
+    shard_keys = [k for k in store._data if k.startswith("counter:")]
+    assert len(shard_keys) <= ISOLATES * 3
+
+
+def test_read_merges_legacy_key_and_uses_metadata():
+    store = MemoryKV()
+    today = get_date()
+    counters = ShardedCounters(shards=2)
+
+    async def scenario():
+        await store.put(f"counter:auth_poll:{today}", "5")
+        await counters.apply(store, {f"counter:auth_poll:{today}": 3})
+        await counters.apply(store, {f"counter:auth_poll:{today}": 4})
+        await counters.apply(store, {f"counter:message_posted:{today}": 1})
+        store.reset_ops()
+        return await read_counters(
+            store, ["auth_poll", "message_posted", "secret_created"], today
+        )
+
+    assert asyncio.run(scenario()) == {
+        "auth_poll": 12,
+        "message_posted": 1,
+        "secret_created": 0,
+    }
+    # One list per event type, plus a get only for the legacy key
+    assert store.ops == {"list": 3, "get": 1}
+
+
+def test_deltas_flushed_after_midnight_keep_the_day_total():
+    store = MemoryKV()
+    counters = ShardedCounters(shards=1)
+    yesterday = "counter:auth_poll:2025-01-27"
+    today = "counter:auth_poll:2025-01-28"
+
+    async def scenario():
+        await counters.apply(store, {yesterday: 100})
+        # Recorded before midnight, flushed after it
+        await counters.apply(store, {yesterday: 2, today: 1})
+        await counters.apply(store, {today: 1})
+        return (
+            await read_counter(store, yesterday),
+            await read_counter(store, today),
+        )
+
+    assert asyncio.run(scenario()) == (102, 2)
+    # Once a flush carries nothing older, the previous day is forgotten
+    assert {slot[0] for slot in counters._totals} == {today}
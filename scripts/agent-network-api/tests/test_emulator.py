@@ -0,0 +1,775 @@
+"""End-to-end tests of src/main.py running in the local emulator."""
+
+import asyncio
+import json
+
+from emulator import Emulator
+
+ADMIN = {"X-Admin-Key": "mock-admin-key"}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def authenticate(emulator, agent_id="agent-a", isolate=None):
+    """auth -> admin approve -> poll; returns Authorization headers."""
+    response = await emulator.request(
+        "POST",
+        "/api/v2/agent/auth",
+        json={
+            "public_key": "pk",
+            "purpose": "tests",
+            "agent_id": agent_id,
+            "capabilities": ["message", "review"],
+        },
+        isolate=isolate,
+    )
+    assert response.status == 202
+    auth_request_id = json.loads(response.body)["auth_request_id"]
+
+    response = await emulator.request(
+        "POST",
+        f"/api/v2/admin/auth-requests/{auth_request_id}/approve",
+        headers=ADMIN,
+        isolate=isolate,
+    )
+    assert response.status == 200
+    response = await emulator.request(
+        "GET", f"/api/v2/agent/auth/{auth_request_id}", isolate=isolate
+    )
+    token = json.loads(response.body)["access_token"]
+    await emulator.drain()
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_auth_flow_with_polling():
+    async def flow():
+        emulator = Emulator()
+        response = await emulator.request(
+            "POST",
+            "/api/v2/agent/auth",
+            json={"public_key": "pk", "purpose": "tests"},
+        )
+        poll = json.loads(response.body)["poll_endpoint"]
+
+        pending = await emulator.request("GET", poll)
+        too_soon = await emulator.request("GET", poll)
+        return pending, too_soon
+
+    pending, too_soon = run(flow())
+
+    assert pending.status == 200
+    assert pending.headers["Retry-After"] == "5"
+    assert json.loads(pending.body)["status"] == "pending"
+    assert too_soon.status == 429
+    assert json.loads(too_soon.body) == {"error": "slow_down", "interval": 5}
+
+
+def test_post_read_and_discover():
+    async def flow():
+        emulator = Emulator()
+        auth = await authenticate(emulator)
+        posted = await emulator.request(
+            "POST",
+            "/api/v2/agent/messages",
+            json={"content": "hello", "topic": "general"},
+            headers=auth,
+        )
+        read = await emulator.request(
+            "GET", "/api/v2/agent/messages?topic=general", headers=auth
+        )
+        peers = await emulator.request(
+            "GET", "/api/v2/agent/peers?capability=review", headers=auth
+        )
+        cached = await emulator.request(
+            "GET",
+            "/api/v2/agent/peers?capability=review",
+            headers={**auth, "If-None-Match": peers.headers["ETag"]},
+        )
+        return posted, read, peers, cached
+
+    posted, read, peers, cached = run(flow())
+
+    assert posted.status == 201
+    messages = json.loads(read.body)["messages"]
+    assert [m["content"] for m in messages] == ["hello"]
+    listed = json.loads(peers.body)["peers"]
+    assert [p["agent_id"] for p in listed] == ["agent-a"]
+    assert cached.status == 304
+    assert cached.body is None
+
+
+def test_isolates_share_kv_but_not_memory():
+    async def flow():
+        emulator = Emulator(isolates=2)
+        auth = await authenticate(emulator, isolate=0)
+        # Token minted in isolate 0 is found in KV by isolate 1
+        posted = await emulator.request(
+            "POST",
+            "/api/v2/agent/messages",
+            json={"content": "from isolate 1"},
+            headers=auth,
+            isolate=1,
+        )
+        first, second = (isolate.module for isolate in emulator.isolates)
+        return posted, first, second
+
+    posted, first, second = run(flow())
+
+    assert posted.status == 201
+    assert first.token_cache is not second.token_cache
+    assert second.token_cache.stats()["misses"] == 1
+
+
+def test_errors_and_metrics():
+    async def flow():
+        emulator = Emulator()
+        missing = await emulator.request("GET", "/nope")
+        wrong_method = await emulator.request("DELETE", "/health")
+        unauthorized = await emulator.request("GET", "/api/v2/agent/peers")
+        metrics = await emulator.request(
+            "GET", "/api/v2/admin/metrics", headers=ADMIN
+        )
+        prometheus = await emulator.request(
+            "GET", "/api/v2/admin/metrics/prometheus", headers=ADMIN
+        )
+        return missing, wrong_method, unauthorized, metrics, prometheus
+
+    missing, wrong_method, unauthorized, metrics, prometheus = run(flow())
+
+    assert missing.status == 404
+    assert wrong_method.status == 405
+    assert wrong_method.headers["Allow"] == "GET, OPTIONS"
+    assert unauthorized.status == 401
+    routes = json.loads(metrics.body)["routes"]
+    assert routes["unmatched"]["statuses"] == {"4xx": 1}
+    assert routes["GET /api/v2/agent/peers"]["requests"] == 1
+    assert prometheus.headers["Content-Type"].startswith("text/plain")
+    assert 'route="GET /api/v2/agent/peers"' in prometheus.body
+
+
+def test_background_work_runs_on_drain():
+    async def flow():
+        emulator = Emulator()
+        await emulator.request(
+            "POST",
+            "/api/v2/agent/auth",
+            json={"public_key": "pk", "purpose": "tests"},
+        )
+        before = emulator.kv["AGENT_EVENTS"].ops["put"]
+        await emulator.drain()
+        return before, emulator.kv["AGENT_EVENTS"].ops["put"]
+
+    before, after = run(flow())
+
+    # Analytics and the auth log are written after the response
+    assert before == 0
+    assert after > 0
+
+
+def test_analytics_range_includes_uncompacted_events():
+    async def flow():
+        emulator = Emulator(ANALYTICS_BATCH_INTERVAL="0")
+        await emulator.request(
+            "POST",
+            "/api/v2/agent/auth",
+            json={"public_key": "pk", "purpose": "tests"},
+        )
+        await emulator.drain()
+        report = await emulator.request(
+            "GET",
+            "/api/v2/admin/analytics/range?granularity=hour",
+            headers=ADMIN,
+        )
+        bad = await emulator.request(
+            "GET",
+            "/api/v2/admin/analytics/range?granularity=week",
+            headers=ADMIN,
+        )
+        return report, bad
+
+    report, bad = run(flow())
+
+    assert report.status == 200
+    data = json.loads(report.body)
+    assert len(data["buckets"]) == 24
+    assert data["totals"]["auth_request_created"] == 1
+    assert bad.status == 400
+
+
+def test_batch_post_counts_each_item_against_the_rate_limit():
+    async def flow():
+        emulator = Emulator(ANALYTICS_BATCH_INTERVAL="0")
+        auth = await authenticate(emulator)
+        items = [{"content": f"m{i}", "topic": "batch"} for i in range(11)]
+        batch = await emulator.request(
+            "POST",
+            "/api/v2/agent/messages/batch",
+            json={"messages": [*items[:5], "not an object", *items[5:]]},
+            headers=auth,
+        )
+        read = await emulator.request(
+            "GET", "/api/v2/agent/messages?topic=batch", headers=auth
+        )
+        empty = await emulator.request(
+            "POST",
+            "/api/v2/agent/messages/batch",
+            json={"messages": []},
+            headers=auth,
+        )
+        await emulator.drain()
+        report = await emulator.request(
+            "GET", "/api/v2/admin/analytics/range", headers=ADMIN
+        )
+        return batch, read, empty, report
+
+    batch, read, empty, report = run(flow())
+
+    assert batch.status == 207
+    assert "Retry-After" in batch.headers
+    data = json.loads(batch.body)
+    statuses = [item["status"] for item in data["results"]]
+    # posts_per_minute is 10: the 11th message is rejected
+    assert statuses == [201] * 5 + [400] + [201] * 5 + [429]
+    assert (data["delivered"], data["failed"]) == (10, 2)
+    assert len(json.loads(read.body)["messages"]) == 10
+    assert empty.status == 400
+    totals = json.loads(report.body)["totals"]
+    assert totals["message_posted"] == 10
+
+
+def test_subscription_stream_receives_posted_messages():
+    async def flow():
+        emulator = Emulator()
+        auth = await authenticate(emulator)
+        response = await emulator.request(
+            "POST",
+            "/api/v2/agent/subscribe",
+            json={"topic": "builds"},
+            headers=auth,
+        )
+        stream_endpoint = json.loads(response.body)["stream_endpoint"]
+        stream = await emulator.request("GET", stream_endpoint, headers=auth)
+        retry = await stream.body.read_text()
+
+        await emulator.request(
+            "POST",
+            "/api/v2/agent/messages",
+            json={"content": "single", "topic": "builds"},
+            headers=auth,
+        )
+        await emulator.request(
+            "POST",
+            "/api/v2/agent/messages/batch",
+            json={
+                "messages": [
+                    {"content": "batched", "topic": "builds"},
+                    {"content": "elsewhere", "topic": "deploys"},
+                ]
+            },
+            headers=auth,
+        )
+        received = [await stream.body.read_text() for _ in range(2)]
+        stream.body.cancel()
+        # Wakes the stream so it notices the disconnect
+        await emulator.request(
+            "POST",
+            "/api/v2/agent/messages",
+            json={"content": "after", "topic": "builds"},
+            headers=auth,
+        )
+        await emulator.drain()
+
+        missing = await emulator.request(
+            "GET", "/api/v2/agent/subscriptions/nope/stream", headers=auth
+        )
+        return stream, retry, received, missing
+
+    stream, retry, received, missing = run(flow())
+
+    assert stream.status == 200
+    assert stream.headers["Content-Type"] == "text/event-stream"
+    assert retry.startswith("retry: ")
+    contents = [
+        json.loads(chunk.split("data: ", 1)[1])["content"]
+        for chunk in received
+    ]
+    assert contents == ["single", "batched"]
+    assert missing.status == 404
+
+
+def test_messages_to_other_agents_are_left_out_of_reads_and_streams():
+    async def flow():
+        emulator = Emulator()
+        agents = {
+            agent_id: await authenticate(emulator, agent_id)
+            for agent_id in ("agent-a", "agent-b")
+        }
+        response = await emulator.request(
+            "POST",
+            "/api/v2/agent/subscribe",
+            json={"topic": "builds"},
+            headers=agents["agent-a"],
+        )
+        stream_endpoint = json.loads(response.body)["stream_endpoint"]
+        stream = await emulator.request(
+            "GET", stream_endpoint, headers=agents["agent-a"]
+        )
+        await stream.body.read_text()
+
+        for body in (
+            {"content": "for c", "recipient": "agent-c", "topic": "builds"},
+            {"content": "for a", "recipient": "agent-a", "topic": "builds"},
+            {"content": "public", "topic": "builds"},
+        ):
+            await emulator.request(
+                "POST",
+                "/api/v2/agent/messages",
+                json=body,
+                headers=agents["agent-b"],
+            )
+        streamed = [await stream.body.read_text() for _ in range(2)]
+        stream.body.cancel()
+        # Wakes the stream so it notices the disconnect
+        await emulator.request(
+            "POST",
+            "/api/v2/agent/messages",
+            json={"content": "after", "topic": "builds"},
+            headers=agents["agent-b"],
+        )
+        await emulator.drain()
+
+        reads = {}
+        for agent_id, auth in agents.items():
+            for query in ("", "?topic=builds"):
+                response = await emulator.request(
+                    "GET", f"/api/v2/agent/messages{query}", headers=auth
+                )
+                reads[agent_id, query] = [
+                    m["content"] for m in json.loads(response.body)["messages"]
+                ]
+        return streamed, reads
+
+    streamed, reads = run(flow())
+
+    assert [
+        json.loads(chunk.split("data: ", 1)[1])["content"]
+        for chunk in streamed
+    ] == ["for a", "public"]
+    assert reads == {
+        ("agent-a", ""): ["for a", "public", "after"],
+        ("agent-a", "?topic=builds"): ["for a", "public", "after"],
+        ("agent-b", ""): ["public", "after"],
+        ("agent-b", "?topic=builds"): ["public", "after"],
+    }
+
+
+def test_malformed_since_and_cursor_are_rejected():
+    async def flow():
+        emulator = Emulator()
+        auth = await authenticate(emulator)
+        return [
+            await emulator.request(
+                "GET", f"/api/v2/agent/messages?{query}", headers=auth
+            )
+            for query in ("since=inf", "since=1e400", "cursor=zzzz")
+        ]
+
+    for response in run(flow()):
+        assert response.status == 400
+
+
+def test_question_answer_and_conditional_polls():
+    async def flow():
+        emulator = Emulator()
+        asker = await authenticate(emulator, "agent-a")
+        answerer = await authenticate(emulator, "agent-b")
+        response = await emulator.request(
+            "POST",
+            "/api/v2/agent/questions",
+            json={"question": "Ship it?"},
+            headers=asker,
+        )
+        created = json.loads(response.body)
+        poll = created["poll_endpoint"]
+
+        pending = await emulator.request("GET", poll, headers=asker)
+        emulator.reset_ops()
+        unchanged = await emulator.request(
+            "GET",
+            poll,
+            headers={**asker, "If-None-Match": pending.headers["ETag"]},
+        )
+        unchanged_ops = dict(emulator.kv["AGENT_MESSAGES"].ops)
+
+        full = await emulator.request(
+            "GET", f"{poll}?include=question", headers=answerer
+        )
+        answered = await emulator.request(
+            "POST", f"{poll}/answer", json={"answer": "Yes"}, headers=answerer
+        )
+        again = await emulator.request(
+            "POST", f"{poll}/answer", json={"answer": "No"}, headers=answerer
+        )
+        changed = await emulator.request(
+            "GET",
+            poll,
+            headers={**asker, "If-None-Match": pending.headers["ETag"]},
+        )
+        missing = await emulator.request(
+            "GET", "/api/v2/agent/questions/nope", headers=asker
+        )
+        invalid = await emulator.request(
+            "POST", "/api/v2/agent/questions", json={}, headers=asker
+        )
+        return (
+            response,
+            pending,
+            unchanged,
+            unchanged_ops,
+            full,
+            answered,
+            again,
+            changed,
+            missing,
+            invalid,
+        )
+
+    (
+        response,
+        pending,
+        unchanged,
+        unchanged_ops,
+        full,
+        answered,
+        again,
+        changed,
+        missing,
+        invalid,
+    ) = run(flow())
+
+    assert response.status == 202
+    assert json.loads(pending.body)["status"] == "pending"
+    assert pending.headers["Retry-After"] == "5"
+    assert unchanged.status == 304
+    # Served from the isolate's status cache
+    assert not any(unchanged_ops.values())
+    assert json.loads(full.body)["question"] == "Ship it?"
+    assert answered.status == 200
+    assert again.status == 409
+    assert changed.status == 200
+    body = json.loads(changed.body)
+    assert body["status"] == "answered"
+    assert body["answer"] == "Yes"
+    assert body["answered_by"] == "agent-b"
+    assert missing.status == 404
+    assert invalid.status == 400
+
+
+def test_secret_is_revealed_once():
+    async def flow():
+        emulator = Emulator(isolates=1)
+        auth = await authenticate(emulator)
+        response = await emulator.request(
+            "POST",
+            "/api/v2/secret",
+            json={"secret": "hunter2", "ttl": 600},
+            headers=auth,
+        )
+        created = json.loads(response.body)
+        stored = [
+            entry["value"]
+            for key, entry in emulator.kv["AGENT_MESSAGES"]._data.items()
+            if key.startswith("secret:")
+        ]
+        reveals = await asyncio.gather(
+            *(
+                emulator.request(
+                    "POST",
+                    created["reveal_endpoint"],
+                    json={"secret_key": created["secret_key"]},
+                    headers=auth,
+                )
+                for _ in range(5)
+            )
+        )
+        invalid = await emulator.request(
+            "POST", "/api/v2/secret", json={"ttl": 600}, headers=auth
+        )
+        return response, stored, reveals, invalid
+
+    response, stored, reveals, invalid = run(flow())
+
+    assert response.status == 201
+    assert len(stored) == 1 and b"hunter2" not in stored[0]
+    assert sorted(r.status for r in reveals) == [200, 404, 404, 404, 404]
+    (revealed,) = [r for r in reveals if r.status == 200]
+    assert json.loads(revealed.body)["secret"] == "hunter2"
+    assert invalid.status == 400
+
+
+def test_invalid_and_oversized_bodies_are_rejected():
+    async def flow():
+        emulator = Emulator()
+        auth = await authenticate(emulator)
+        invalid = await emulator.request(
+            "POST",
+            "/api/v2/agent/messages",
+            json={"content": "hi", "ttl": 5},
+            headers=auth,
+        )
+        oversized = await emulator.request(
+            "POST",
+            "/api/v2/agent/messages",
+            json={"content": "x" * (70 << 10)},
+            headers=auth,
+        )
+        # Under the limit in characters, over it in UTF-8 bytes
+        multibyte = await emulator.request(
+            "POST",
+            "/api/v2/agent/messages",
+            json='{"content": "%s"}' % ("\u00e9" * (40 << 10)),
+            headers={**auth, "Transfer-Encoding": "chunked"},
+        )
+        batch = await emulator.request(
+            "POST",
+            "/api/v2/agent/messages/batch",
+            json={"messages": [{"content": "ok"}, {"content": ""}]},
+            headers=auth,
+        )
+        return invalid, oversized, multibyte, batch
+
+    invalid, oversized, multibyte, batch = run(flow())
+
+    assert invalid.status == 400
+    assert json.loads(invalid.body)["details"] == [
+        {"path": "/ttl", "message": "must be at least 60"}
+    ]
+    assert oversized.status == 413
+    assert multibyte.status == 413
+    assert batch.status == 207
+    results = json.loads(batch.body)["results"]
+    assert [r["status"] for r in results] == [201, 400]
+    assert results[1]["details"][0]["path"] == "/content"
+
+
+def test_handoff_fan_out_accept_and_complete():
+    async def flow():
+        emulator = Emulator(isolates=2)
+        agents = {
+            name: await authenticate(emulator, name)
+            for name in ("agent-a", "agent-b", "agent-c", "agent-d")
+        }
+
+        emulator.reset_ops()
+        created = await emulator.request(
+            "POST",
+            "/api/v2/agent/handoff",
+            json={
+                "target_agents": ["agent-b", "agent-c"],
+                "task_description": "Review the parser change",
+                "priority": "high",
+            },
+            headers=agents["agent-a"],
+        )
+        # Targets are delivered after the response, not before it
+        ops_before_drain = emulator.kv["AGENT_MESSAGES"].ops.copy()
+        await emulator.drain()
+        handoff = json.loads(created.body)
+        status_path = handoff["status_endpoint"]
+
+        inbox = await emulator.request(
+            "GET",
+            "/api/v2/agent/messages?recipient=agent-c",
+            headers=agents["agent-c"],
+        )
+        snooped = await emulator.request(
+            "GET",
+            "/api/v2/agent/messages?recipient=agent-c",
+            headers=agents["agent-b"],
+        )
+        hidden = await emulator.request(
+            "GET", status_path, headers=agents["agent-d"]
+        )
+        accepted = await emulator.request(
+            "POST", f"{status_path}/accept", headers=agents["agent-b"]
+        )
+        again = await emulator.request(
+            "POST", f"{status_path}/accept", headers=agents["agent-c"]
+        )
+        not_yours = await emulator.request(
+            "POST",
+            f"{status_path}/complete",
+            json={"result": "done"},
+            headers=agents["agent-c"],
+        )
+        completed = await emulator.request(
+            "POST",
+            f"{status_path}/complete",
+            json={"result": "LGTM"},
+            headers=agents["agent-b"],
+        )
+        status = await emulator.request(
+            "GET", status_path, headers=agents["agent-a"]
+        )
+        return (
+            created,
+            ops_before_drain,
+            inbox,
+            snooped,
+            hidden,
+            accepted,
+            again,
+            not_yours,
+            completed,
+            status,
+        )
+
+    (
+        created,
+        ops_before_drain,
+        inbox,
+        snooped,
+        hidden,
+        accepted,
+        again,
+        not_yours,
+        completed,
+        status,
+    ) = run(flow())
+
+    assert created.status == 202
+    assert json.loads(created.body)["status"] == "initiated"
+    assert ops_before_drain == {"put": 1}
+
+    (message,) = json.loads(inbox.body)["messages"]
+    assert message["content"]["type"] == "task_handoff"
+    assert message["content"]["from_agent"] == "agent-a"
+    assert snooped.status == 403
+
+    assert hidden.status == 404
+    assert accepted.status == 200
+    assert json.loads(accepted.body)["accepted_by"] == "agent-b"
+    assert again.status == 409
+    assert not_yours.status == 403
+    assert completed.status == 200
+
+    body = json.loads(status.body)
+    assert body["status"] == "completed"
+    assert body["result"] == "LGTM"
+    assert "owner" not in body
+    assert {
+        target: delivery["inbox"]
+        for target, delivery in body["deliveries"].items()
+    } == {"agent-b": "delivered", "agent-c": "delivered"}
+
+
+def test_invalid_tokens_are_rate_limited_without_kv_writes():
+    async def flow():
+        emulator = Emulator()
+        responses = [
+            await emulator.request(
+                "GET",
+                "/api/v2/agent/messages",
+                headers={"Authorization": f"Bearer made-up-{i}"},
+            )
+            for i in range(70)
+        ]
+        await emulator.drain()
+        rate_keys = [
+            key
+            for key in emulator.kv["AGENT_AUTH"]._data
+            if key.startswith("rate:")
+        ]
+        return responses, rate_keys
+
+    responses, rate_keys = run(flow())
+
+    statuses = [response.status for response in responses]
+    # reads_per_minute is 60, shared by every invalid token of a client
+    assert statuses == [401] * 60 + [429] * 10
+    assert rate_keys == []
+
+
+def test_agent_ids_cannot_be_taken_over_by_another_key():
+    async def flow():
+        emulator = Emulator()
+        await authenticate(emulator, "agent-a")
+        taken = await emulator.request(
+            "POST",
+            "/api/v2/agent/auth",
+            json={
+                "public_key": "mallory-pk",
+                "purpose": "tests",
+                "agent_id": "agent-a",
+                "callback_url": "https://mallory.example/hook",
+            },
+        )
+
+        # Two keys asking for a free agent_id at once: the first approval
+        # claims it, the second is approved without touching its records
+        requests = []
+        for public_key in ("first-pk", "second-pk"):
+            response = await emulator.request(
+                "POST",
+                "/api/v2/agent/auth",
+                json={
+                    "public_key": public_key,
+                    "purpose": "tests",
+                    "agent_id": "agent-z",
+                    "name": public_key,
+                    "callback_url": f"https://{public_key}.example/hook",
+                },
+            )
+            requests.append(json.loads(response.body)["auth_request_id"])
+        for auth_request_id in requests:
+            await emulator.request(
+                "POST",
+                f"/api/v2/admin/auth-requests/{auth_request_id}/approve",
+                headers=ADMIN,
+            )
+            await emulator.drain()
+        return taken, emulator.kv["AGENT_AUTH"]._data
+
+    taken, auth_data = run(flow())
+
+    assert taken.status == 409
+    assert "agent_callback:agent-a" not in auth_data
+    assert json.loads(auth_data["peer:agent-z"]["value"])["name"] == "first-pk"
+    assert (
+        auth_data["agent_callback:agent-z"]["value"]
+        == "https://first-pk.example/hook"
+    )
+
+
+def test_jwk_public_keys_register_agent_ids():
+    jwk = {"kty": "OKP", "crv": "Ed25519", "x": "11qYAYKxCrfVS_7TyWQHOg"}
+
+    async def request(emulator, public_key):
+        return await emulator.request(
+            "POST",
+            "/api/v2/agent/auth",
+            json={
+                "public_key": public_key,
+                "purpose": "tests",
+                "agent_id": "agent-j",
+            },
+        )
+
+    async def flow():
+        emulator = Emulator()
+        created = await request(emulator, jwk)
+        auth_request_id = json.loads(created.body)["auth_request_id"]
+        await emulator.request(
+            "POST",
+            f"/api/v2/admin/auth-requests/{auth_request_id}/approve",
+            headers=ADMIN,
+        )
+        await emulator.drain()
+        # The same JWK with its members reordered is the same owner
+        same = await request(emulator, dict(reversed(jwk.items())))
+        other = await request(emulator, {"kty": "EC"})
+        return created.status, same.status, other.status
+
+    assert run(flow()) == (202, 202, 409)
@@ -0,0 +1,206 @@
+"""Tests for handoff records and their fan-out to target agents."""
+
+import asyncio
+import json
+
+from callbacks import CALLBACK_JOB_PREFIX, register_callback
+from handoffs import (
+    DELIVERED,
+    FAILED,
+    IMMEDIATE_ATTEMPTS,
+    NO_CALLBACK,
+    RETRY_PREFIX,
+    RETRYING,
+    build_handoff,
+    fan_out,
+    load_deliveries,
+    process_due_deliveries,
+    public_view,
+)
+from memory_kv import MemoryKV
+from messages import MESSAGE_PREFIX, list_messages
+
+SECRET = "test-signing-key"
+
+
+class FlakyKV(MemoryKV):
+    """MemoryKV whose message puts fail while `failing` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+
+    async def put(self, key, value, **kwargs):
+        if self.failing and key.startswith(MESSAGE_PREFIX):
+            raise RuntimeError("KV unavailable")
+        await super().put(key, value, **kwargs)
+
+
+class Receiver:
+    def __init__(self, status=204):
+        self.status = status
+        self.received = []
+
+    async def __call__(self, url, body, headers):
+        self.received.append((url, json.loads(body)))
+        return self.status
+
+
+async def no_sleep(seconds):
+    pass
+
+
+def new_handoff(targets):
+    return build_handoff(
+        {"target_agents": targets, "task_description": "review the PR"},
+        token="initiator-token",
+        from_agent="agent-a",
+    )
+
+
+def test_targets_are_deduplicated_and_the_owner_is_hidden():
+    handoff = build_handoff(
+        {"target_agents": ["b", "c", "b"], "task_description": "x"},
+        token="tok",
+    )
+    assert handoff["target_agents"] == ["b", "c"]
+    assert handoff["status"] == "initiated"
+    assert "owner" not in public_view(handoff)
+
+    single = build_handoff(
+        {"target_agent": "b", "task_description": "x", "priority": "high"},
+        token="tok",
+    )
+    assert single["target_agents"] == ["b"]
+    assert single["task"] == {"task_description": "x", "priority": "high"}
+
+
+def test_fan_out_delivers_to_every_inbox_and_registered_callback():
+    messages, auth = MemoryKV(), MemoryKV()
+    receiver = Receiver()
+    handoff = new_handoff(["b", "c", "d"])
+
+    async def flow():
+        await register_callback(auth, "c", "https://c.example/hook", 60)
+        states = await fan_out(
+            messages, auth, handoff, SECRET, receiver, sleep=no_sleep
+        )
+        inbox = await list_messages(messages, recipient="d")
+        return states, inbox, await load_deliveries(
+            messages, handoff["handoff_id"]
+        )
+
+    states, inbox, deliveries = asyncio.run(flow())
+
+    assert [state["inbox"] for state in states] == [DELIVERED] * 3
+    assert set(deliveries) == {"b", "c", "d"}
+    assert deliveries["c"]["callback"] == DELIVERED
+    assert deliveries["b"]["callback"] == NO_CALLBACK
+
+    (message,) = inbox["messages"]
+    assert message["content"]["type"] == "task_handoff"
+    assert message["content"]["handoff_id"] == handoff["handoff_id"]
+    assert message["content"]["payload"] == handoff["task"]
+
+    ((url, payload),) = receiver.received
+    assert url == "https://c.example/hook"
+    assert payload["event"] == "handoff.initiated"
+    assert payload["target_agent"] == "c"
+
+
+def test_failed_callbacks_are_left_to_the_cron():
+    messages, auth = MemoryKV(), MemoryKV()
+    handoff = new_handoff(["b"])
+
+    async def flow():
+        await register_callback(auth, "b", "https://b.example/hook", 60)
+        await fan_out(
+            messages, auth, handoff, SECRET, Receiver(503), sleep=no_sleep
+        )
+        jobs = await auth.list(prefix=CALLBACK_JOB_PREFIX)
+        deliveries = await load_deliveries(messages, handoff["handoff_id"])
+        return jobs.keys, deliveries
+
+    jobs, deliveries = asyncio.run(flow())
+
+    assert len(jobs) == 1
+    assert deliveries["b"]["callback"] == RETRYING
+    assert deliveries["b"]["inbox"] == DELIVERED
+
+
+def test_failed_inbox_writes_are_retried_by_the_cron():
+    messages, auth = FlakyKV(), MemoryKV()
+    handoff = new_handoff(["b", "c"])
+
+    async def flow():
+        messages.failing = True
+        await fan_out(
+            messages, auth, handoff, SECRET, Receiver(), sleep=no_sleep
+        )
+        pending = await load_deliveries(messages, handoff["handoff_id"])
+        too_soon = await process_due_deliveries(messages)
+
+        messages.failing = False
+        retried = await process_due_deliveries(messages, now=2e9)
+        done = await load_deliveries(messages, handoff["handoff_id"])
+        inbox = await list_messages(messages, recipient="b")
+        left = await messages.list(prefix=RETRY_PREFIX)
+        return pending, too_soon, retried, done, inbox, left.keys
+
+    pending, too_soon, retried, done, inbox, left = asyncio.run(flow())
+
+    assert pending["b"]["inbox"] == RETRYING
+    assert pending["b"]["attempts"] == IMMEDIATE_ATTEMPTS
+    assert too_soon == (0, 0, 0)
+    assert retried == (2, 0, 0)
+    assert done["b"]["inbox"] == DELIVERED
+    assert left == []
+    # The retried message keeps the ID recorded at the first attempt
+    (message,) = inbox["messages"]
+    assert message["id"] == pending["b"]["message_id"]
+
+
+def test_inbox_retries_are_abandoned_after_max_attempts():
+    messages, auth = FlakyKV(), MemoryKV()
+    handoff = new_handoff(["b"])
+    messages.failing = True
+
+    async def flow():
+        await fan_out(
+            messages, auth, handoff, SECRET, Receiver(), sleep=no_sleep
+        )
+        outcomes = []
+        for hour in range(10):
+            now = 2e9 + hour * 3600
+            outcomes.append(await process_due_deliveries(messages, now=now))
+        return outcomes, await load_deliveries(
+            messages, handoff["handoff_id"]
+        )
+
+    outcomes, deliveries = asyncio.run(flow())
+
+    assert sum(outcome[2] for outcome in outcomes) == 1
+    assert deliveries["b"]["inbox"] == FAILED
+
+
+def test_cron_does_not_list_delivered_handoffs():
+    messages, auth = MemoryKV(), MemoryKV()
+
+    async def flow():
+        for _ in range(5):
+            await fan_out(
+                messages,
+                auth,
+                new_handoff(["b", "c"]),
+                SECRET,
+                Receiver(),
+                sleep=no_sleep,
+            )
+        messages.reset_ops()
+        outcome = await process_due_deliveries(messages, now=2e9)
+        return outcome, dict(messages.ops)
+
+    outcome, ops = asyncio.run(flow())
+
+    assert outcome == (0, 0, 0)
+    assert ops == {"list": 1}
@@ -0,0 +1,239 @@
+"""Tests for message storage and cursor pagination."""
+
+import asyncio
+import time
+
+import pytest
+
+from memory_kv import MemoryKV
+from messages import (
+    MAX_LIST_BUCKETS,
+    index_keys,
+    list_buckets,
+    list_messages,
+    parse_cursor,
+    parse_since,
+    store_message,
+    store_messages,
+)
+from utils import MAX_CONCURRENT_KV, generate_id
+
+NOW_MS = int(time.time() * 1000)
+
+
+def make_message(offset_ms, seq, recipient=None, topic=None):
+    return {
+        "id": f"{NOW_MS - offset_ms:012x}-{seq:016x}",
+        "content": f"message {seq}",
+        "recipient": recipient,
+        "topic": topic,
+        "created_at": "",
+        "ttl": 3600,
+    }
+
+
+def populate(store, messages):
+    async def write():
+        for message in messages:
+            await store_message(store, message)
+
+    asyncio.run(write())
+    store.reset_ops()
+
+
+def test_parse_since_accepts_iso_and_epoch():
+    assert parse_since("2025-01-28T00:00:00Z") == 1738022400000
+    assert parse_since("1738022400") == 1738022400000
+    assert parse_since("1738022400000") == 1738022400000
+    for value in ("yesterday", "inf", "1e400", "nan"):
+        with pytest.raises(ValueError):
+            parse_since(value)
+
+
+def test_cursor_must_be_a_message_id():
+    message_id = generate_id()
+    assert parse_cursor(message_id) == message_id
+    for value in ("zzzz", message_id[:-1], message_id.upper()):
+        with pytest.raises(ValueError):
+            parse_cursor(value)
+
+
+def test_list_buckets_stay_bounded():
+    lower, upper = "018f00000000", "019a12345678"
+    buckets = list_buckets(lower, upper)
+    assert len(buckets) <= MAX_LIST_BUCKETS
+    assert lower.startswith(buckets[0]) and upper.startswith(buckets[-1])
+    assert list_buckets("018f12345678", "018f1234567a") == [
+        "018f12345678",
+        "018f12345679",
+        "018f1234567a",
+    ]
+
+
+def test_pages_follow_creation_order():
+    store = MemoryKV()
+    messages = [make_message(1000 - i, i) for i in range(25)]
+    populate(store, messages)
+
+    seen = []
+    cursor = None
+    while True:
+        page = asyncio.run(list_messages(store, cursor=cursor, limit=10))
+        seen += [m["id"] for m in page["messages"]]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+
+    assert seen == [m["id"] for m in messages]
+    # The last cursor still points at the newest message for later polls
+    assert cursor == messages[-1]["id"]
+
+
+def test_since_is_an_inclusive_lower_bound():
+    store = MemoryKV()
+    messages = [make_message(5000 - i * 100, i) for i in range(50)]
+    populate(store, messages)
+
+    since_ms = NOW_MS - 5000 + 2000
+    page = asyncio.run(list_messages(store, since_ms=since_ms))
+    assert [m["id"] for m in page["messages"]] == [
+        m["id"] for m in messages[20:]
+    ]
+
+
+def test_filters_use_metadata_and_skip_body_reads():
+    store = MemoryKV()
+    messages = [
+        make_message(1000 - i, i, recipient="agent-a" if i % 5 == 0 else "b")
+        for i in range(50)
+    ]
+    populate(store, messages)
+
+    page = asyncio.run(list_messages(store, recipient="agent-a"))
+    assert len(page["messages"]) == 10
+    assert {m["recipient"] for m in page["messages"]} == {"agent-a"}
+    # Only the matching bodies are fetched
+    assert store.ops["get"] == 10
+
+
+def test_messages_without_metadata_are_filtered_after_fetch():
+    store = MemoryKV()
+    message = make_message(10, 1, topic="x" * 300)
+    populate(store, [message, make_message(5, 2, topic="short")])
+
+    page = asyncio.run(list_messages(store, topic="short"))
+    assert [m["content"] for m in page["messages"]] == ["message 2"]
+
+
+def test_body_reads_are_concurrent():
+    store = MemoryKV(latency=0.01)
+    populate(store, [make_message(1000 - i, i) for i in range(60)])
+
+    started = time.perf_counter()
+    page = asyncio.run(list_messages(store, limit=60))
+    elapsed = time.perf_counter() - started
+
+    assert len(page["messages"]) == 60
+    # 60 serial gets would take >= 0.6s
+    assert elapsed < 0.4
+
+
+def test_index_keys_escape_separators():
+    message = make_message(0, 1, recipient="team:ops", topic="deploys")
+    assert index_keys(message) == [
+        f"inbox:team%3Aops:{message['id']}",
+        f"topic:deploys:{message['id']}",
+    ]
+    assert index_keys(make_message(0, 2)) == []
+
+
+def test_index_entries_share_the_message_ttl():
+    store = MemoryKV()
+    message = make_message(0, 1, recipient="agent-a", topic="general")
+    message["ttl"] = 120
+    populate(store, [message])
+
+    expiries = {entry["expires_at"] for entry in store._data.values()}
+    assert len(store._data) == 3
+    assert len(expiries) == 1 or max(expiries) - min(expiries) < 1
+
+
+def test_filtered_read_cost_is_independent_of_volume():
+    def filtered_read_ops(noise):
+        store = MemoryKV()
+        messages = [
+            make_message(5000 - i, i, recipient="agent-b", topic="t")
+            for i in range(noise)
+        ]
+        messages += [
+            make_message(100 - i, 10_000 + i, recipient="agent-a")
+            for i in range(20)
+        ]
+        populate(store, messages)
+        page = asyncio.run(list_messages(store, recipient="agent-a"))
+        assert len(page["messages"]) == 20
+        return dict(store.ops)
+
+    assert filtered_read_ops(10) == filtered_read_ops(3000)
+
+
+def test_combined_filters_use_index_and_metadata():
+    store = MemoryKV()
+    messages = [
+        make_message(100 - i, i, recipient="agent-a", topic=f"t{i % 2}")
+        for i in range(10)
+    ]
+    populate(store, messages)
+
+    page = asyncio.run(list_messages(store, recipient="agent-a", topic="t1"))
+    assert [m["topic"] for m in page["messages"]] == ["t1"] * 5
+    assert store.ops["get"] == 5
+
+
+def test_dangling_index_entries_are_skipped():
+    store = MemoryKV()
+    messages = [make_message(100 - i, i, topic="general") for i in range(3)]
+    populate(store, messages)
+    asyncio.run(store.delete(f"message:{messages[1]['id']}"))
+
+    page = asyncio.run(list_messages(store, topic="general"))
+    assert [m["id"] for m in page["messages"]] == [
+        messages[0]["id"],
+        messages[2]["id"],
+    ]
+
+
+class FailingKV(MemoryKV):
+    """MemoryKV whose puts fail for keys containing `poison`."""
+
+    def __init__(self, poison):
+        super().__init__()
+        self.poison = poison
+        self.in_flight = 0
+        self.peak = 0
+
+    async def put(self, key, value, **options):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0)
+            if self.poison in key:
+                raise RuntimeError("KV put failed")
+            await super().put(key, value, **options)
+        finally:
+            self.in_flight -= 1
+
+
+def test_store_messages_is_bounded_and_fails_per_message():
+    store = FailingKV(poison="topic:bad:")
+    messages = [
+        make_message(0, seq, topic="bad" if seq == 3 else "ok")
+        for seq in range(20)
+    ]
+
+    errors = asyncio.run(store_messages(store, messages))
+
+    assert [i for i, error in enumerate(errors) if error] == [3]
+    assert store.peak == MAX_CONCURRENT_KV
+    # Message body plus topic index entry per message
+    assert store.ops["put"] == 39
@@ -0,0 +1,138 @@
+"""Tests for per-route metrics, KV op accounting and their export."""
+
+import asyncio
+import random
+from types import SimpleNamespace
+
+from memory_kv import MemoryKV
+from metrics import (
+    SUB_BUCKETS,
+    Histogram,
+    InstrumentedEnv,
+    MetricsRegistry,
+    collect,
+    prometheus_text,
+)
+
+
+def test_histogram_quantiles_have_bounded_error():
+    random.seed(7)
+    values = sorted(random.lognormvariate(3, 1.2) for _ in range(10_000))
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+
+    for q in (0.5, 0.9, 0.99):
+        exact = values[round(q * len(values)) - 1]
+        estimate = histogram.quantile(q)
+        assert exact <= estimate <= exact * (1 + 1 / SUB_BUCKETS) + 1e-9
+    assert histogram.quantile(1.0) == values[-1]
+
+
+def test_histogram_merge_and_round_trip():
+    first, second = Histogram(), Histogram()
+    for value in (0.01, 1, 5, 5, 250):
+        first.record(value)
+    second.record(100_000_000)  # beyond the last bound
+
+    first.merge(Histogram.from_dict(second.to_dict()))
+
+    assert first.total == 6
+    assert first.max == 100_000_000
+    assert first.quantile(1.0) == 100_000_000
+    assert Histogram.from_dict(first.to_dict()).counts == first.counts
+
+
+def test_instrumented_env_counts_kv_ops_per_route():
+    registry = MetricsRegistry(writer_id="w")
+    store = MemoryKV()
+    env = SimpleNamespace(AGENT_AUTH=store, ADMIN_KEY="secret")
+    request_env = InstrumentedEnv(env, "GET /x", registry, ("AGENT_AUTH",))
+
+    async def handler():
+        await request_env.AGENT_AUTH.put("k", "v")
+        await request_env.AGENT_AUTH.get("k")
+        await request_env.AGENT_AUTH.get("k")
+        await request_env.AGENT_AUTH.list(prefix="k")
+
+    asyncio.run(handler())
+    registry.observe("GET /x", 200, 0.004)
+
+    summary = registry.routes["GET /x"].summary()
+    assert summary["kv_ops"] == {
+        "AGENT_AUTH.get": 2,
+        "AGENT_AUTH.list": 1,
+        "AGENT_AUTH.put": 1,
+    }
+    assert summary["kv_ops_per_request"] == 4
+    # Non-KV attributes pass through untouched
+    assert request_env.ADMIN_KEY == "secret"
+    assert getattr(request_env, "MISSING", None) is None
+
+
+def test_error_rate_and_status_classes():
+    registry = MetricsRegistry(writer_id="w")
+    for status in (200, 201, 404, 500):
+        registry.observe("POST /y", status, 0.001)
+
+    summary = registry.routes["POST /y"].summary()
+    assert summary["statuses"] == {"2xx": 2, "4xx": 1, "5xx": 1}
+    assert summary["error_rate"] == 0.25
+
+
+def test_flush_is_periodic_and_collect_merges_isolates():
+    now = [1000.0]
+    store = MemoryKV()
+    isolates = [
+        MetricsRegistry(writer_id=f"w{i}", clock=lambda: now[0])
+        for i in range(3)
+    ]
+    for registry in isolates:
+        registry.observe("GET /z", 200, 0.010)
+        assert not registry.needs_flush()
+    now[0] += 61
+    for registry in isolates:
+        assert registry.needs_flush()
+        asyncio.run(registry.flush(store))
+        assert not registry.needs_flush()
+
+    # The live registry replaces its own stored snapshot
+    isolates[0].observe("GET /z", 500, 0.020)
+    count, routes = asyncio.run(collect(store, isolates[0]))
+
+    assert count == 3
+    assert routes["GET /z"].requests == 4
+    assert routes["GET /z"].statuses["5xx"] == 1
+
+
+def test_prometheus_text():
+    registry = MetricsRegistry(writer_id="w")
+    registry.observe("GET /api/{id}", 200, 0.003)
+    registry.observe("GET /api/{id}", 200, 0.050)
+    registry.count_kv("GET /api/{id}", "AGENT_AUTH", "get")
+
+    text = prometheus_text(registry.routes)
+
+    assert (
+        'agent_network_requests_total{route="GET /api/{id}",status="2xx"} 2'
+        in text
+    )
+    assert (
+        'agent_network_request_duration_ms_bucket{route="GET /api/{id}",'
+        'le="+Inf"} 2' in text
+    )
+    assert (
+        'agent_network_request_duration_ms_count{route="GET /api/{id}"} 2'
+        in text
+    )
+    assert (
+        'agent_network_kv_operations_total{route="GET /api/{id}",'
+        'binding="AGENT_AUTH",op="get"} 1' in text
+    )
+    buckets = [
+        int(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith("agent_network_request_duration_ms_bucket")
+    ]
+    assert buckets == sorted(buckets)
+    assert text.endswith("\n")
@@ -0,0 +1,204 @@
+"""Tests for the peer registry and its discovery snapshots."""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from memory_kv import MemoryKV
+from peers import (
+    DEMO_PEERS,
+    OFFLINE_AFTER,
+    PEER_PREFIX,
+    PeerDirectory,
+    agent_owner,
+    build_peer,
+    claim_agent_id,
+    etag_matches,
+    store_peer,
+)
+
+
+def register(store, count, **details):
+    async def write():
+        for i in range(count):
+            peer = build_peer(
+                f"agent-{i:04d}",
+                {
+                    "provider": f"provider-{i % 5}",
+                    "capabilities": ["message", f"skill-{i % 10}"],
+                    **details,
+                },
+            )
+            await store_peer(store, peer)
+
+    asyncio.run(write())
+    store.reset_ops()
+
+
+def listing(snapshot, **filters):
+    body, etag = snapshot.body(**filters)
+    return json.loads(body), etag
+
+
+def test_build_peer_validates_input():
+    peer = build_peer("agent", {"capabilities": ["a", "a", "b"]})
+    assert peer["capabilities"] == ["a", "b"]
+    assert peer["name"] == "agent"
+
+    with pytest.raises(ValueError):
+        build_peer("", {})
+    with pytest.raises(ValueError):
+        build_peer("agent", {"capabilities": "message"})
+    with pytest.raises(ValueError):
+        build_peer("agent", {"status": "asleep"})
+
+
+def test_snapshot_loads_from_list_metadata_only():
+    store = MemoryKV()
+    register(store, 2500)
+    directory = PeerDirectory(demo_peers=())
+
+    snapshot = asyncio.run(directory.snapshot(store))
+
+    data, _ = listing(snapshot)
+    assert data["total"] == 2500
+    assert store.ops["get"] == 0
+    assert store.ops["list"] == 3  # 1000 keys per page
+
+
+def test_oversized_records_are_fetched():
+    store = MemoryKV()
+    register(store, 3)
+    peer = build_peer("big", {"metadata": {"notes": "x" * 2000}})
+    asyncio.run(store_peer(store, peer))
+    store.reset_ops()
+
+    snapshot = asyncio.run(PeerDirectory(demo_peers=()).snapshot(store))
+
+    data, _ = listing(snapshot)
+    assert data["total"] == 4
+    assert store.ops["get"] == 1
+
+
+def test_filters_use_indexes():
+    store = MemoryKV()
+    register(store, 1000)
+    snapshot = asyncio.run(PeerDirectory(demo_peers=()).snapshot(store))
+
+    data, _ = listing(snapshot, capability="skill-3", provider="provider-1")
+    ids = [peer["agent_id"] for peer in data["peers"]]
+    expected = [
+        f"agent-{i:04d}" for i in range(1000) if i % 10 == 3 and i % 5 == 1
+    ]
+    assert ids == expected
+    assert listing(snapshot, capability="nope")[0]["total"] == 0
+
+
+def test_demo_peers_keep_their_status():
+    snapshot = asyncio.run(PeerDirectory().snapshot(MemoryKV()))
+
+    data, _ = listing(snapshot)
+    assert data["total"] == len(DEMO_PEERS)
+    statuses = {p["agent_id"]: p["status"] for p in data["peers"]}
+    assert statuses["devin-dev-agent"] == "busy"
+    assert statuses["codex-cli-agent"] == "offline"
+    online, _ = listing(snapshot, status="online")
+    assert online["total"] == online["online_count"] == 4
+
+
+def test_stale_peers_are_reported_offline(clock):
+    store = MemoryKV()
+    register(store, 1)
+    directory = PeerDirectory(demo_peers=(), clock=clock)
+
+    clock.now = time.time() + OFFLINE_AFTER + 1
+    data, _ = listing(asyncio.run(directory.snapshot(store)))
+    assert data["peers"][0]["status"] == "offline"
+
+
+def test_etag_is_stable_until_peers_change(clock):
+    store = MemoryKV()
+    register(store, 10)
+    directory = PeerDirectory(snapshot_ttl=30, clock=clock)
+
+    _, first = listing(asyncio.run(directory.snapshot(store)))
+    clock.now += 31  # reload; demo peers get a new last_seen
+    data, second = listing(asyncio.run(directory.snapshot(store)))
+    assert second == first
+
+    peer = build_peer("newcomer", {})
+    asyncio.run(directory.register(store, peer))
+    data, third = listing(asyncio.run(directory.snapshot(store)))
+    assert third != first
+    assert "newcomer" in {p["agent_id"] for p in data["peers"]}
+
+
+def test_etag_matching():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"abc", W/"def"', 'W/"abc"')
+    assert etag_matches("*", 'W/"abc"')
+    assert not etag_matches('"abd"', 'W/"abc"')
+    assert not etag_matches(None, 'W/"abc"')
+
+
+def test_snapshot_is_cached_between_reloads(clock):
+    store = MemoryKV()
+    register(store, 10)
+    directory = PeerDirectory(snapshot_ttl=30, clock=clock)
+
+    first = asyncio.run(directory.snapshot(store))
+    clock.now += 10
+    assert asyncio.run(directory.snapshot(store)) is first
+    assert store.ops["list"] == 1
+
+
+def test_concurrent_requests_share_one_load():
+    store = MemoryKV(latency=0.002)
+    register(store, 10)
+    directory = PeerDirectory()
+
+    async def burst():
+        return await asyncio.gather(
+            *(directory.snapshot(store) for _ in range(20))
+        )
+
+    snapshots = asyncio.run(burst())
+    assert len({id(snapshot) for snapshot in snapshots}) == 1
+    assert store.ops["list"] == 1
+
+
+def test_heartbeats_are_throttled(clock):
+    store = MemoryKV()
+    register(store, 1)
+    directory = PeerDirectory(heartbeat_interval=60, clock=clock)
+
+    assert directory.heartbeat_due("agent-0000")
+    asyncio.run(directory.heartbeat(store, "agent-0000"))
+    assert not directory.heartbeat_due("agent-0000")
+    clock.now += 61
+    assert directory.heartbeat_due("agent-0000")
+    assert store.ops["put"] == 1
+
+    stored = json.loads(asyncio.run(store.get(f"{PEER_PREFIX}agent-0000")))
+    assert stored["provider"] == "provider-0"
+
+    # Unregistered agents are ignored
+    asyncio.run(directory.heartbeat(store, "stranger"))
+    assert asyncio.run(store.get(f"{PEER_PREFIX}stranger")) is None
+
+
+def test_agent_ids_belong_to_the_first_key_that_claims_them():
+    store = MemoryKV()
+    alice, mallory = agent_owner("alice-pk"), agent_owner({"kty": "OKP"})
+
+    async def claims():
+        return [
+            await claim_agent_id(store, "agent-a", alice),
+            await claim_agent_id(store, "agent-a", mallory),
+            await claim_agent_id(store, "agent-a", alice),
+            await claim_agent_id(store, DEMO_PEERS[0]["agent_id"], alice),
+        ]
+
+    assert asyncio.run(claims()) == [True, False, True, False]
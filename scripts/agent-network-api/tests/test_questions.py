@@ -0,0 +1,91 @@
+"""Tests for question storage, answers and the status cache."""
+
+import asyncio
+
+import pytest
+
+from memory_kv import MemoryKV
+from questions import (
+    ANSWERED,
+    PENDING,
+    StatusCache,
+    answer_status,
+    build_question,
+    load_question,
+    load_status,
+    save_question,
+    save_status,
+    status_etag,
+)
+
+
+def test_question_and_status_are_stored_separately():
+    store = MemoryKV()
+    question, status = build_question(
+        {"question": "Ship it?", "context": {"pr": 7}, "ttl": 120}, "agent-a"
+    )
+    asyncio.run(save_question(store, question, status))
+
+    stored = asyncio.run(load_question(store, question["id"]))
+    polled = asyncio.run(load_status(store, question["id"]))
+
+    assert stored["question"] == "Ship it?"
+    assert stored["asked_by"] == "agent-a"
+    assert polled == status
+    assert polled["status"] == PENDING
+    assert "question" not in polled
+
+
+def test_answer_bumps_version_and_etag():
+    _, status = build_question({"question": "Ship it?"})
+    answered = answer_status(status, {"answer": "Yes"}, "agent-b")
+
+    assert answered["status"] == ANSWERED
+    assert answered["answer"] == "Yes"
+    assert answered["answered_by"] == "agent-b"
+    assert status_etag(answered) != status_etag(status)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {},
+        {"question": "  "},
+        {"question": "x" * 4001},
+        {"question": "ok", "ttl": 10},
+        {"question": "ok", "ttl": "60"},
+    ],
+)
+def test_invalid_questions_are_rejected(body):
+    with pytest.raises(ValueError):
+        build_question(body)
+
+
+def test_status_cache_keeps_answered_records_longer(clock):
+    cache = StatusCache(pending_ttl=2, answered_ttl=300, clock=clock)
+    _, pending = build_question({"question": "a"}, now=clock.now)
+    _, other = build_question({"question": "b"}, now=clock.now)
+    answered = answer_status(other, {"answer": "yes"})
+    cache.put(pending)
+    cache.put(answered)
+
+    clock.now += 5
+
+    assert cache.get(pending["question_id"]) is None
+    assert cache.get(answered["question_id"]) == answered
+
+
+def test_status_cache_reads_kv_once():
+    store = MemoryKV()
+    cache = StatusCache()
+    question, status = build_question({"question": "a"})
+    asyncio.run(save_question(store, question, status))
+    asyncio.run(save_status(store, answer_status(status, {"answer": "b"})))
+    store.reset_ops()
+
+    for _ in range(3):
+        polled = asyncio.run(cache.load(store, question["id"]))
+
+    assert polled["answer"] == "b"
+    assert store.ops == {"get": 1}
+    assert asyncio.run(cache.load(store, "missing")) is None
@@ -0,0 +1,149 @@
+"""Tests for the sliding-window rate limiter."""
+
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from memory_kv import MemoryKV
+from rate_limit import SPEC_RATE_LIMITS, RateLimiter, parse_rate_limits
+
+SPEC_PATH = (
+    Path(__file__).resolve().parents[3]
+    / "public"
+    / ".well-known"
+    / "agent-network.json"
+)
+
+
+@pytest.fixture
+def clock(clock):
+    # Start on a window boundary
+    clock.now = 6_000_000.0
+    return clock
+
+
+def make_limiter(clock, **kwargs):
+    limits = parse_rate_limits(SPEC_RATE_LIMITS)
+    return RateLimiter(limits, clock=clock, **kwargs)
+
+
+def test_spec_mirror_matches_published_spec():
+    spec = json.loads(SPEC_PATH.read_text())
+    assert SPEC_RATE_LIMITS == spec["rate_limits"]
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits(SPEC_RATE_LIMITS) == {
+        "posts": (10, 60),
+        "reads": (60, 60),
+        "secrets": (100, 3600),
+    }
+    with pytest.raises(ValueError):
+        parse_rate_limits({"posts_per_fortnight": 1})
+
+
+def test_limit_is_enforced_with_retry_after(clock):
+    limiter = make_limiter(clock)
+
+    decisions = [limiter.check("posts", "tok") for _ in range(11)]
+    assert all(d.allowed for d in decisions[:10])
+    assert decisions[9].remaining == 0
+    denied = decisions[10]
+    assert not denied.allowed
+    assert 1 <= denied.retry_after <= 60
+
+
+def test_tokens_and_buckets_are_independent(clock):
+    limiter = make_limiter(clock)
+    for _ in range(10):
+        limiter.check("posts", "a")
+
+    assert not limiter.check("posts", "a").allowed
+    assert limiter.check("posts", "b").allowed
+    assert limiter.check("reads", "a").allowed
+
+
+def test_previous_window_slides_out_gradually(clock):
+    limiter = make_limiter(clock)
+    for _ in range(10):
+        assert limiter.check("posts", "tok").allowed
+
+    # Halfway through the next window, half of the previous window's
+    # requests still count: 10 * 0.5 = 5, leaving room for 5 more
+    clock.now += 90
+    allowed = 0
+    while limiter.check("posts", "tok").allowed:
+        allowed += 1
+    assert allowed == 5
+
+    # Two windows later, nothing carries over
+    clock.now += 120
+    assert limiter.check("posts", "tok").remaining == 9
+
+
+def test_isolates_share_counts_through_sync(clock):
+    store = MemoryKV()
+    isolate_a = make_limiter(clock, writer_id="a")
+    isolate_b = make_limiter(clock, writer_id="b")
+
+    for _ in range(6):
+        isolate_a.check("posts", "tok")
+    for _ in range(3):
+        isolate_b.check("posts", "tok")
+    assert isolate_a.needs_sync() and isolate_b.needs_sync()
+
+    async def sync_both():
+        await isolate_a.sync(store)
+        await isolate_b.sync(store)
+        await isolate_a.sync(store)
+
+    clock.now += 0.5  # same window
+    isolate_a._last_sync = isolate_b._last_sync = 0
+    asyncio.run(sync_both())
+
+    # 6 + 3 = 9 requests seen in total: one more is allowed across both
+    assert isolate_b.check("posts", "tok").allowed
+    assert not isolate_b.check("posts", "tok").allowed
+    # Isolate A only learns about B's 10th request on a later sync
+    assert isolate_a.check("posts", "tok").allowed
+
+
+def test_sync_is_throttled_and_prunes_idle_keys(clock):
+    store = MemoryKV()
+    limiter = make_limiter(clock, sync_interval=5)
+    limiter.check("posts", "tok")
+    asyncio.run(limiter.sync(store))
+
+    limiter.check("posts", "tok")
+    assert not limiter.needs_sync()
+    clock.now += 5
+    assert limiter.needs_sync()
+
+    clock.now += 300
+    asyncio.run(limiter.sync(store))
+    assert limiter._windows == {}
+
+
+def test_unshared_counts_are_never_synced(clock):
+    store = MemoryKV()
+    limiter = make_limiter(clock)
+
+    for _ in range(11):
+        decision = limiter.check("posts", "unverified:1.2.3.4", shared=False)
+    assert not decision.allowed
+    assert not limiter.needs_sync()
+
+    asyncio.run(limiter.sync(store))
+    assert store._data == {}
+
+
+def test_tracked_windows_are_capped(clock):
+    limiter = make_limiter(clock, max_windows=3)
+    limiter.check("posts", "a")
+    for token in ("b", "c", "d"):
+        limiter.check("posts", token)
+
+    assert len(limiter._windows) == 3
+    assert limiter._dirty <= set(limiter._windows)
@@ -0,0 +1,74 @@
+"""Tests for JSON response encoding and content negotiation."""
+
+import gzip
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import responses
+from responses import (
+    MIN_COMPRESS_SIZE,
+    StaticJSON,
+    accepted_encodings,
+    compress,
+    encode_json,
+    negotiate,
+)
+
+
+def test_encoding_is_compact_and_equivalent():
+    data = {"a": [1, 2, {"b": None}], "text": "héllo ✓", "ok": True}
+
+    body = encode_json(data)
+
+    assert json.loads(body) == data
+    assert " " not in body.replace("héllo ✓", "")
+    assert len(body) < len(json.dumps(data))
+
+
+def test_unserialisable_values_fall_back_to_str():
+    moment = datetime(2025, 1, 28, tzinfo=timezone.utc)
+    assert json.loads(encode_json({"at": moment})) == {"at": str(moment)}
+
+
+def test_static_documents_are_encoded_once():
+    doc = StaticJSON({"status": "ok"})
+    assert doc.body == '{"status":"ok"}'
+    assert doc.body is doc.body
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate, br", {"gzip", "deflate", "br"}),
+        ("gzip;q=0, br;q=0.5", {"br"}),
+        ("GZIP", {"gzip"}),
+        ("identity;q=bogus", set()),
+        ("", set()),
+        (None, set()),
+    ],
+)
+def test_accepted_encodings(header, expected):
+    assert accepted_encodings(header) == expected
+
+
+def test_negotiation(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+    large = MIN_COMPRESS_SIZE
+
+    assert negotiate("gzip", large) == "gzip"
+    assert negotiate("gzip", large - 1) is None
+    assert negotiate("br", large) is None  # brotli not installed
+    assert negotiate("gzip;q=0", large) is None
+    assert negotiate("*", large) == "gzip"
+    assert negotiate(None, large) is None
+
+
+def test_gzip_round_trip():
+    body = encode_json({"messages": [{"id": i} for i in range(200)]}).encode()
+    encoded = compress(body, "gzip")
+    assert gzip.decompress(encoded) == body
+    assert len(encoded) < len(body) // 3
+    # Deterministic output (no timestamp in the header)
+    assert compress(body, "gzip") == encoded
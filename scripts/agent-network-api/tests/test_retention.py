@@ -0,0 +1,78 @@
+"""Tests for retention policies and event sampling."""
+
+import asyncio
+import itertools
+import json
+
+import pytest
+
+from analytics import AnalyticsBuffer
+from memory_kv import MemoryKV
+from retention import DAY, Sampler, parse_retention
+
+
+def test_parse_retention():
+    policy = parse_retention({"auth_log": 7, "counter": None, "archive": 0})
+
+    assert policy["auth_log"] == 7 * DAY
+    assert policy["counter"] is None
+    assert policy["archive"] == 0
+    assert policy["event"] == 7 * DAY
+    for bad in ({"events": 1}, {"auth_log": 0}, {"auth_log": -1}):
+        with pytest.raises(ValueError):
+            parse_retention(bad)
+
+
+def test_sampler_keeps_a_fraction_and_counts_everything():
+    # Alternates 0.0, 0.5, 0.0, 0.5...: keeps every other auth_poll
+    values = itertools.cycle((0.0, 0.5))
+    store = MemoryKV()
+    buffer = AnalyticsBuffer(
+        sampler=Sampler({"auth_poll": 0.25}, random=lambda: next(values)),
+        batch_interval=0,
+    )
+    for _ in range(10):
+        buffer.record("auth_poll", {})
+    buffer.record("message_posted", {})
+
+    asyncio.run(buffer.flush(store))
+
+    (key,) = [k for k in store._data if k.startswith("event:")]
+    batch = json.loads(store._data[key]["value"])
+    polls = [e for e in batch["events"] if e["type"] == "auth_poll"]
+    assert len(polls) == 5
+    assert all(e["sample_rate"] == 0.25 for e in polls)
+    assert "sample_rate" not in batch["events"][-1]
+    # Counts (metadata, counters) include sampled-out events
+    assert list(store._data[key]["metadata"]["hours"].values()) == [
+        {"auth_poll": 10, "message_posted": 1}
+    ]
+    counts = [
+        entry["metadata"]["count"]
+        for name, entry in store._data.items()
+        if name.startswith("counter:auth_poll:")
+    ]
+    assert counts == [10]
+
+
+def test_writes_carry_retention_ttls():
+    store = MemoryKV()
+    buffer = AnalyticsBuffer(
+        retention=parse_retention({"auth_log": 1, "counter": None}),
+        batch_interval=0,
+    )
+    buffer.record_put("auth_log:1", "{}", family="auth_log")
+    buffer.record_put("other:1", "{}")
+    buffer.record("auth_attempt", {})
+
+    asyncio.run(buffer.flush(store))
+
+    expiry = {
+        name.split(":")[0]: entry["expires_at"]
+        for name, entry in store._data.items()
+    }
+    assert expiry["auth_log"] == pytest.approx(
+        expiry["event"] - 6 * DAY, abs=5
+    )
+    assert expiry["counter"] is None
+    assert expiry["other"] is None
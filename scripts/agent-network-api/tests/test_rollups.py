@@ -0,0 +1,156 @@
+"""Tests for hourly/daily analytics rollups and range queries."""
+
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import rollups
+from analytics import AnalyticsBuffer
+from memory_kv import MemoryKV
+from rollups import (
+    COMPACT_DELAY,
+    compact_events,
+    parse_range,
+    query_rollups,
+    rollup_key,
+)
+
+def stored(store, key):
+    return json.loads(store._data[key]["value"])
+
+
+def test_flush_stores_hourly_counts_as_metadata():
+    store = MemoryKV()
+    buffer = AnalyticsBuffer(batch_interval=0)
+    buffer.record("auth_poll", {})
+    buffer.record("auth_poll", {})
+    buffer.record("message_posted", {})
+
+    asyncio.run(buffer.flush(store))
+
+    (key,) = [k for k in store._data if k.startswith("event:")]
+    hours = store._data[key]["metadata"]["hours"]
+    assert list(hours.values()) == [{"auth_poll": 2, "message_posted": 1}]
+
+
+def test_compaction_builds_hour_and_day_rollups(batches):
+    store = MemoryKV()
+    event = batches.event
+    batches.put(store, 10, [event("auth_poll", 1), event("auth_poll", 2)])
+    # Straddles 14:00-15:00 and 15:00-16:00
+    batches.put(
+        store, 3601, [event("message_posted", 3590), event("auth_poll", 3600)]
+    )
+    recent = batches.put(store, 7200, [event("auth_poll", 7199)])
+
+    compacted = asyncio.run(
+        compact_events(store, now=batches.base + 7200 + COMPACT_DELAY - 1)
+    )
+
+    assert compacted == 2
+    assert stored(store, rollup_key("hour", "2025-01-28T14"))["counts"] == {
+        "auth_poll": 2,
+        "message_posted": 1,
+    }
+    assert stored(store, rollup_key("hour", "2025-01-28T15"))["counts"] == {
+        "auth_poll": 1
+    }
+    assert stored(store, rollup_key("day", "2025-01-28"))["counts"] == {
+        "auth_poll": 3,
+        "message_posted": 1,
+    }
+    # Batches newer than COMPACT_DELAY stay until a later run
+    assert [k for k in store._data if k.startswith("event:")] == [recent]
+
+
+def test_batches_seen_again_are_not_counted_twice(batches):
+    store = MemoryKV()
+    name = batches.put(store, 10, [batches.event("auth_poll", 1)])
+    entry = store._data[name]
+    asyncio.run(compact_events(store, now=batches.base + 3600))
+
+    # A run that wrote the rollups but failed to delete the batch
+    asyncio.run(
+        store.put(name, entry["value"], metadata=entry["metadata"])
+    )
+    batches.put(store, 20, [batches.event("auth_poll", 15)], suffix="1")
+    asyncio.run(compact_events(store, now=batches.base + 3600))
+
+    assert stored(store, rollup_key("day", "2025-01-28"))["counts"] == {
+        "auth_poll": 2
+    }
+    assert not [k for k in store._data if k.startswith("event:")]
+
+
+def test_query_merges_rollups_and_pending_batches(batches):
+    store = MemoryKV()
+    batches.put(store, -86400, [batches.event("auth_poll", -86400)])
+    asyncio.run(compact_events(store, now=batches.base + 3600))
+    # Not yet compacted: one with metadata, one written without it
+    batches.put(store, 60, [batches.event("auth_poll", 30)], suffix="1")
+    batches.put(
+        store,
+        61,
+        [batches.event("message_posted", 31)],
+        with_metadata=False,
+        suffix="2",
+    )
+    store.reset_ops()
+
+    buckets = parse_range("day", "2025-01-26", "2025-01-28")
+    report = asyncio.run(query_rollups(store, "day", buckets))
+
+    assert report["buckets"] == [
+        {"bucket": "2025-01-26", "counts": {}},
+        {"bucket": "2025-01-27", "counts": {"auth_poll": 1}},
+        {
+            "bucket": "2025-01-28",
+            "counts": {"auth_poll": 1, "message_posted": 1},
+        },
+    ]
+    assert report["totals"] == {"auth_poll": 2, "message_posted": 1}
+    assert report["pending_batches"] == 2
+    assert report["complete"]
+    # 3 rollup gets, 1 list, 1 get for the batch without metadata
+    assert store.ops == {"get": 4, "list": 1}
+
+    assert "warning" not in report
+
+
+def test_query_flags_a_partial_read_of_pending_batches(batches, monkeypatch):
+    monkeypatch.setattr(rollups, "MAX_PENDING_READ", 1)
+    store = MemoryKV()
+    for second in (60, 61):
+        batch = [batches.event("auth_poll", second)]
+        batches.put(store, second, batch, suffix="1")
+
+    buckets = parse_range("day", "2025-01-28", "2025-01-28")
+    report = asyncio.run(query_rollups(store, "day", buckets))
+
+    assert report["totals"] == {"auth_poll": 1}
+    assert not report["complete"]
+    assert "lower bounds" in report["warning"]
+
+
+def test_parse_range():
+    now = datetime(2025, 1, 28, 14, 30, tzinfo=timezone.utc)
+
+    days = parse_range("day", now=now)
+    assert len(days) == 30
+    assert days[-1] == "2025-01-28"
+    assert parse_range("hour", "2025-01-28T22", "2025-01-29T01") == [
+        "2025-01-28T22",
+        "2025-01-28T23",
+        "2025-01-29T00",
+        "2025-01-29T01",
+    ]
+    for bad in (
+        ("week", None, None),
+        ("day", "2025-01-28T14", None),
+        ("day", "2025-02-01", "2025-01-01"),
+        ("day", "2020-01-01", "2025-01-01"),
+    ):
+        with pytest.raises(ValueError):
+            parse_range(*bad, now=now)
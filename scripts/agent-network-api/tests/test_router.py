@@ -0,0 +1,89 @@
+"""Tests for the compiled route table."""
+
+import pytest
+
+from router import Router
+
+
+def handler(name):
+    def _handler(request, env, **params):
+        return name
+
+    return _handler
+
+
+@pytest.fixture
+def router():
+    r = Router()
+    r.add("GET", "/api/v2/agent/auth", handler("discovery"))
+    r.add("POST", "/api/v2/agent/auth", handler("auth_request"))
+    r.add("GET", "/api/v2/agent/auth/{auth_request_id}", handler("poll"))
+    r.add("GET", "/api/v2/agent/questions/{question_id}", handler("question"))
+    r.add("GET", "/api/v2/agent/questions/stats", handler("stats"))
+    r.add(
+        "POST",
+        "/api/v2/agent/questions/{question_id}/answer",
+        handler("answer"),
+    )
+    r.add("GET", "/", handler("health"))
+    return r
+
+
+def test_static_route(router):
+    match = router.route("POST", "/api/v2/agent/auth")
+    assert match.handler(None, None) == "auth_request"
+    assert match.params == {}
+
+
+def test_parameterised_route_extracts_params(router):
+    match = router.route("GET", "/api/v2/agent/auth/018f-abc")
+    assert match.handler(None, None) == "poll"
+    assert match.params == {"auth_request_id": "018f-abc"}
+
+
+def test_nested_parameterised_route(router):
+    match = router.route("POST", "/api/v2/agent/questions/q1/answer")
+    assert match.handler(None, None) == "answer"
+    assert match.params == {"question_id": "q1"}
+
+
+def test_literal_segment_beats_parameter(router):
+    assert router.route("GET", "/api/v2/agent/questions/stats").params == {}
+    match = router.route("GET", "/api/v2/agent/questions/q1")
+    assert match.params == {"question_id": "q1"}
+
+
+def test_unknown_path_returns_none(router):
+    assert router.route("GET", "/api/v2/agent/unknown") is None
+    assert router.route("GET", "/api/v2/agent/auth/a/b") is None
+    assert router.route("GET", "/api/v2/agent/auth/") is None
+
+
+def test_wrong_method_reports_allowed_methods(router):
+    match = router.route("DELETE", "/api/v2/agent/auth")
+    assert match.method_not_allowed
+    assert set(match.allowed) == {"GET", "POST"}
+
+    match = router.route("POST", "/api/v2/agent/auth/018f-abc")
+    assert match.method_not_allowed
+    assert match.allowed == ("GET",)
+
+
+def test_conflicting_parameter_names_are_rejected(router):
+    with pytest.raises(ValueError):
+        router.add("DELETE", "/api/v2/agent/auth/{id}", handler("x"))
+
+
+def test_several_parameters_and_empty_segments():
+    r = Router()
+    r.add("GET", "/teams/{team}/members/{member}", handler("member"))
+    r.add("GET", "/teams/{team}/members/owner", handler("owner"))
+
+    match = r.route("GET", "/teams/t1/members/m2")
+    assert match.handler(None, None) == "member"
+    assert match.params == {"team": "t1", "member": "m2"}
+    assert r.route("GET", "/teams/t1/members/owner").params == {
+        "team": "t1"
+    }
+    assert r.route("GET", "/teams//members/m2") is None
+    assert r.route("GET", "/teams/t1/members/") is None
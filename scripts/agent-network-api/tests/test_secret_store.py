@@ -0,0 +1,142 @@
+"""Tests for one-time secret encryption and burn-on-read."""
+
+import asyncio
+
+import pytest
+
+from memory_kv import MemoryKV
+from secret_store import (
+    SECRET_PREFIX,
+    AesGcm,
+    BurnCoordinator,
+    SecretError,
+    decrypt,
+    encrypt,
+    expires_at,
+    new_secret_key,
+    parse_secret,
+    reveal_secret,
+    secret_id,
+    store_secret,
+)
+
+pytest.importorskip("cryptography")
+
+CIPHER = AesGcm()
+
+
+def seal(key, plaintext, expiry):
+    return asyncio.run(encrypt(CIPHER, key, plaintext, expiry))
+
+
+def unseal(key, data):
+    return asyncio.run(decrypt(CIPHER, key, data))
+
+
+def create(store, plaintext=b"hunter2", ttl=600):
+    key = new_secret_key()
+    data = seal(key, plaintext, 2_000_000_000)
+    asyncio.run(store_secret(store, key, data, ttl))
+    return key
+
+
+def test_round_trip_and_stored_form():
+    key = new_secret_key()
+    plaintext = "pässwörd ".encode() * 10_000
+    data = seal(key, plaintext, 1_700_000_000)
+
+    assert unseal(key, data) == plaintext
+    assert unseal(key, memoryview(data)) == plaintext
+    assert expires_at(data) == 1_700_000_000
+    assert plaintext[:64] not in data
+    assert key not in secret_id(key)
+    # A fresh nonce every time
+    assert seal(key, plaintext, 1_700_000_000) != data
+
+
+def test_tampering_and_wrong_keys_are_detected():
+    key = new_secret_key()
+    data = bytearray(seal(key, b"hunter2", 1_700_000_000))
+
+    with pytest.raises(SecretError):
+        unseal(new_secret_key(), bytes(data))
+    data[-1] ^= 1
+    with pytest.raises(SecretError):
+        unseal(key, bytes(data))
+    with pytest.raises(SecretError):
+        unseal(key, b"\x02short")
+
+    # The expiry is authenticated too
+    data = bytearray(seal(key, b"hunter2", 1_700_000_000))
+    data[8] ^= 1
+    with pytest.raises(SecretError):
+        unseal(key, bytes(data))
+
+
+def test_a_payload_that_fails_to_decrypt_is_not_burned():
+    store = MemoryKV()
+    coordinator = BurnCoordinator()
+    key = create(store)
+    (name,) = store._data
+    entry = store._data[name]
+    entry["value"] = entry["value"][:-1] + bytes([entry["value"][-1] ^ 1])
+
+    with pytest.raises(SecretError):
+        asyncio.run(reveal_secret(store, coordinator, CIPHER, key))
+
+    assert name.startswith(SECRET_PREFIX)
+    assert name in store._data
+    assert not coordinator._burned
+
+
+def test_concurrent_readers_get_the_secret_exactly_once():
+    store = MemoryKV(latency=0.001)
+    coordinator = BurnCoordinator()
+    key = create(store)
+
+    async def race():
+        return await asyncio.gather(
+            *(
+                reveal_secret(store, coordinator, CIPHER, key)
+                for _ in range(50)
+            )
+        )
+
+    results = asyncio.run(race())
+
+    assert [r for r in results if r is not None] == [b"hunter2"]
+    assert not store._data
+    assert (
+        asyncio.run(reveal_secret(store, coordinator, CIPHER, key)) is None
+    )
+
+
+def test_tombstones_are_bounded():
+    coordinator = BurnCoordinator(max_tombstones=2, clock=lambda: 100)
+
+    async def claims():
+        return [
+            await coordinator.claim("a", 200),
+            await coordinator.claim("a", 200),
+            await coordinator.claim("b", 50),
+            await coordinator.claim("c", 200),
+            await coordinator.claim("d", 200),
+        ]
+
+    assert asyncio.run(claims()) == [True, False, True, True, True]
+    assert list(coordinator._burned) == ["c", "d"]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {},
+        {"secret": ""},
+        {"secret": "x" * ((1 << 20) + 1)},
+        {"secret": "x", "ttl": 30},
+        {"secret": "x", "ttl": True},
+    ],
+)
+def test_invalid_secrets_are_rejected(body):
+    with pytest.raises(ValueError):
+        parse_secret(body)
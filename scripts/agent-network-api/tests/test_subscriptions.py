@@ -0,0 +1,150 @@
+"""Tests for topic subscriptions, fan-out and resumable streams."""
+
+import asyncio
+import json
+
+from memory_kv import MemoryKV
+from messages import build_message, store_message
+from subscriptions import (
+    MAX_QUEUED,
+    TopicHub,
+    build_subscription,
+    format_event,
+    load_subscription,
+    run_stream,
+    save_subscription,
+)
+
+
+def message(topic, content):
+    return build_message({"topic": topic, "content": content})
+
+
+def events(chunks):
+    """Messages in SSE chunks, in order."""
+    found = []
+    for chunk in chunks:
+        for line in chunk.splitlines():
+            if line.startswith("data: "):
+                found.append(json.loads(line[len("data: "):]))
+    return found
+
+
+def test_publish_reaches_every_listener_of_the_topic():
+    async def scenario():
+        hub = TopicHub()
+        listeners = [hub.listen("builds") for _ in range(3)]
+        other = hub.listen("deploys")
+        delivered = await hub.publish("builds", [message("builds", "ok")])
+        return delivered, listeners, other
+
+    delivered, listeners, other = asyncio.run(scenario())
+
+    assert delivered == 3
+    assert all(listener.queue.qsize() == 1 for listener in listeners)
+    assert other.queue.empty()
+
+
+def test_slow_listener_is_dropped():
+    async def scenario():
+        hub = TopicHub()
+        listener = hub.listen("builds")
+        for n in range(MAX_QUEUED + 1):
+            await hub.publish("builds", [message("builds", str(n))])
+        return hub, listener
+
+    hub, listener = asyncio.run(scenario())
+
+    assert listener.dropped
+    assert hub.listeners("builds") == 0
+
+
+def test_stream_replays_then_delivers_live_without_duplicates():
+    async def scenario():
+        store = MemoryKV()
+        hub = TopicHub()
+        first, second = message("builds", "1"), message("builds", "2")
+        await store_message(store, first)
+        await store_message(store, second)
+        chunks = []
+
+        async def send(text):
+            chunks.append(text)
+
+        stream = asyncio.ensure_future(
+            run_stream(
+                hub,
+                store,
+                "builds",
+                send,
+                last_event_id=first["id"],
+                max_seconds=0.2,
+                keepalive=0.05,
+            )
+        )
+        await asyncio.sleep(0.01)
+        third = message("builds", "3")
+        await store_message(store, third)
+        # `second` is published live too, after it was replayed
+        await hub.publish("builds", [second, third])
+        sent = await stream
+        return chunks, sent, hub
+
+    chunks, sent, hub = asyncio.run(scenario())
+
+    assert [m["content"] for m in events(chunks)] == ["2", "3"]
+    assert sent == 2
+    assert chunks[0].startswith("retry: ")
+    assert ": keep-alive\n\n" in chunks
+    assert hub.listeners("builds") == 0
+
+
+def test_stream_ends_when_the_client_disconnects():
+    async def scenario():
+        hub = TopicHub()
+        chunks = []
+
+        async def send(text):
+            if len(chunks) == 2:
+                raise ConnectionError("client went away")
+            chunks.append(text)
+
+        stream = asyncio.ensure_future(
+            run_stream(hub, MemoryKV(), "builds", send, fmt="ndjson")
+        )
+        await asyncio.sleep(0)
+        for n in range(3):
+            await hub.publish("builds", [message("builds", str(n))])
+        try:
+            await stream
+        except ConnectionError:
+            pass
+        return chunks, hub
+
+    chunks, hub = asyncio.run(scenario())
+
+    assert [json.loads(line)["content"] for line in chunks] == ["0", "1"]
+    assert hub.listeners("builds") == 0
+
+
+def test_subscriptions_belong_to_their_token():
+    store = MemoryKV()
+    subscription = build_subscription("builds", "token-a")
+    asyncio.run(save_subscription(store, subscription))
+
+    mine = asyncio.run(load_subscription(store, subscription["id"], "token-a"))
+    theirs = asyncio.run(
+        load_subscription(store, subscription["id"], "token-b")
+    )
+
+    assert mine["topic"] == "builds"
+    assert theirs is None
+    assert "token-a" not in json.dumps(store._data)
+
+
+def test_format_event():
+    msg = {"id": "018f-1", "content": "hi"}
+    assert format_event(msg, "sse") == (
+        'id: 018f-1\nevent: message\ndata: {"id":"018f-1","content":"hi"}\n\n'
+    )
+    assert format_event(msg, "ndjson") == '{"id":"018f-1","content":"hi"}\n'
@@ -0,0 +1,67 @@
+"""Tests for the in-isolate token validation cache."""
+
+from token_cache import TokenCache, token_expiry
+
+
+def test_valid_tokens_are_cached_until_capped_ttl(clock):
+    cache = TokenCache(max_positive_ttl=300, clock=clock)
+    cache.put_valid("tok", expires_at=clock.now + 86400)
+
+    assert cache.get("tok") is True
+    clock.now += 299
+    assert cache.get("tok") is True
+    clock.now += 2
+    assert cache.get("tok") is None
+
+
+def test_positive_ttl_never_outlives_the_token(clock):
+    cache = TokenCache(max_positive_ttl=300, clock=clock)
+    cache.put_valid("tok", expires_at=clock.now + 30)
+
+    clock.now += 31
+    assert cache.get("tok") is None
+
+    cache.put_valid("expired", expires_at=clock.now - 1)
+    assert cache.get("expired") is None
+
+
+def test_invalid_tokens_are_negatively_cached(clock):
+    cache = TokenCache(negative_ttl=10, clock=clock)
+    cache.put_invalid("bad")
+
+    assert cache.get("bad") is False
+    clock.now += 11
+    assert cache.get("bad") is None
+
+
+def test_lru_eviction_keeps_recently_used_tokens(clock):
+    cache = TokenCache(max_size=2, clock=clock)
+    cache.put_valid("a", clock.now + 100)
+    cache.put_valid("b", clock.now + 100)
+    cache.get("a")
+    cache.put_valid("c", clock.now + 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is True
+    assert cache.get("c") is True
+    assert cache.stats()["evictions"] == 1
+
+
+def test_stats_report_hits_and_misses(clock):
+    cache = TokenCache(clock=clock)
+    cache.get("tok")
+    cache.put_valid("tok", clock.now + 100)
+    cache.get("tok")
+    cache.put_invalid("bad")
+    cache.get("bad")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["negative_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == round(2 / 3, 4)
+
+
+def test_token_expiry_falls_back_to_created_at():
+    assert token_expiry({"expires_at": 123.5}) == 123.5
+    assert token_expiry({"created_at": "2025-01-28T00:00:00+00:00"}) == (
+        1738022400 + 86400
+    )
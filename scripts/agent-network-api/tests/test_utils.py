@@ -0,0 +1,130 @@
+"""Tests for the time-ordered ID generator and shared helpers."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+import uuid
+
+import pytest
+
+from utils import (
+    MAX_SEQUENCE,
+    MAX_TIMESTAMP,
+    IdGenerator,
+    MetadataEnv,
+    generate_id,
+    generate_reverse_id,
+    log_failure,
+)
+
+MS = 1_000_000
+
+
+@pytest.fixture
+def clock(clock):
+    # The generator reads nanoseconds
+    clock.now = 1_737_000_000_000 * MS
+    return clock
+
+
+def test_ids_are_uuid7():
+    value = uuid.UUID(hex=generate_id().replace("-", ""))
+
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+
+
+def test_ids_generated_in_one_millisecond_keep_their_order():
+    ids = [generate_id() for _ in range(5000)]
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_reverse_ids_sort_newest_first():
+    ids = [generate_reverse_id() for _ in range(5000)]
+
+    assert ids == sorted(ids, reverse=True)
+    ms = int(ids[-1][:12], 16)
+    assert abs(MAX_TIMESTAMP - ms - int(generate_id()[:12], 16)) < 1000
+
+
+def fields(value: str) -> tuple:
+    """(timestamp ms, sequence) of an ID."""
+    return int(value[:12], 16), int(value[14:17], 16)
+
+
+def test_sequence_counts_within_a_millisecond_and_restarts_after(clock):
+    ids = IdGenerator(clock=clock)
+
+    first, sequence = fields(ids.generate())
+    assert first == clock.now // MS
+    assert sequence < 2048
+    assert fields(ids.generate()) == (first, sequence + 1)
+
+    clock.now += MS
+    assert fields(ids.generate())[0] == first + 1
+
+
+def test_exhausted_sequence_moves_to_the_next_millisecond(clock):
+    ids = IdGenerator(clock=clock)
+
+    seen = [ids.generate() for _ in range(MAX_SEQUENCE + 2)]
+
+    assert seen == sorted(seen)
+    assert (clock.now // MS + 1, 0) in map(fields, seen)
+
+
+def test_clock_going_back_does_not_reorder_ids(clock):
+    ids = IdGenerator(clock=clock)
+    before = ids.generate()
+
+    clock.now -= 5 * MS
+    assert ids.generate() > before
+
+    newest = ids.generate_reverse()
+    clock.now -= MS
+    assert ids.generate_reverse() < newest
+
+
+def test_entropy_pool_refills(clock):
+    ids = IdGenerator(clock=clock, pool_size=4)
+
+    generated = [ids.generate() for _ in range(20)]
+
+    # Only the sequence would differ if random words were reused
+    assert len({value[17:] for value in generated}) == 20
+    assert all(
+        uuid.UUID(hex=value.replace("-", "")).version == 7
+        for value in generated
+    )
+
+
+def test_failures_are_logged_as_json(capsys):
+    log_failure("publish", ValueError("boom"), topic="news")
+    entry = json.loads(capsys.readouterr().out)
+    assert entry == {
+        "level": "error",
+        "operation": "publish",
+        "error": "ValueError('boom')",
+        "topic": "news",
+    }
+
+
+def test_kv_metadata_is_converted_on_put():
+    from memory_kv import MemoryKV
+
+    store = MemoryKV()
+    env = MetadataEnv(
+        SimpleNamespace(AGENT_AUTH=store, SECRET="s"),
+        lambda metadata: ("converted", metadata),
+        ("AGENT_AUTH",),
+    )
+    assert env.SECRET == "s"
+    assert env.AGENT_AUTH is env.AGENT_AUTH
+
+    asyncio.run(env.AGENT_AUTH.put("a", "1", metadata={"n": 1}))
+    asyncio.run(env.AGENT_AUTH.put("b", "2", expirationTtl=60))
+    assert store._data["a"]["metadata"] == ("converted", {"n": 1})
+    assert store._data["b"]["metadata"] is None
+    assert asyncio.run(env.AGENT_AUTH.get("b")) == "2"
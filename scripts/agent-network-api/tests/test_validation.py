@@ -0,0 +1,129 @@
+"""Tests for compiled request body validation."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from schemas import AGENT_MESSAGE_SCHEMA, REQUEST_SCHEMAS
+from validation import MAX_ERRORS, compile_schema, validator
+
+SCHEMA_PATH = (
+    Path(__file__).resolve().parents[3]
+    / "public"
+    / "agent-message.schema.json"
+)
+ANNOTATIONS = {"$schema", "$id", "title", "description", "default"}
+
+AGENT_ID = "agent_018f1234-5678-7abc-8def-0123456789ab"
+
+
+def without_annotations(schema, names=False):
+    """A schema without annotation keywords (`names`: a name -> schema map)."""
+    if isinstance(schema, list):
+        return [without_annotations(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    return {
+        key: without_annotations(
+            value, names=not names and key in ("properties", "$defs")
+        )
+        for key, value in schema.items()
+        if names or key not in ANNOTATIONS
+    }
+
+
+def agent_message(**overrides):
+    message = {
+        "version": "1.0",
+        "type": "status_update",
+        "agent_id": AGENT_ID,
+        "timestamp": "2025-01-28T14:00:00Z",
+        "payload": {"status": "working", "progress": 40},
+    }
+    message.update(overrides)
+    return message
+
+
+def test_mirror_matches_published_schema():
+    published = json.loads(SCHEMA_PATH.read_text())
+    assert AGENT_MESSAGE_SCHEMA == without_annotations(published)
+
+
+def test_valid_agent_message():
+    validate = compile_schema(AGENT_MESSAGE_SCHEMA)
+    assert validate(agent_message()) == []
+    assert validate(
+        agent_message(
+            type="secret_share",
+            payload={"secret_key": "a" * 48, "description": "db creds"},
+            metadata={"agent_name": "builder", "extra": 1},
+        )
+    ) == []
+
+
+def test_errors_point_at_the_offending_values():
+    validate = compile_schema(AGENT_MESSAGE_SCHEMA)
+    errors = validate(
+        agent_message(
+            version="2.0",
+            agent_id="agent-a",
+            timestamp="yesterday",
+            ttl=10,
+            unknown=True,
+        )
+    )
+    assert {error["path"] for error in errors} == {
+        "/version",
+        "/agent_id",
+        "/timestamp",
+        "/ttl",
+        "/unknown",
+    }
+
+
+def test_one_of_reports_the_closest_option():
+    validate = compile_schema(AGENT_MESSAGE_SCHEMA)
+
+    errors = validate(agent_message(payload={"status": "asleep"}))
+
+    assert errors == [
+        {
+            "path": "/payload/status",
+            "message": (
+                "must be one of: idle, working, blocked, completed, failed, "
+                "waiting_for_human"
+            ),
+        }
+    ]
+
+
+def test_message_requests():
+    validate = validator("message")
+
+    assert validate({"content": "hello", "topic": "builds", "ttl": 600}) == []
+    assert validate({"content": agent_message()}) == []
+    assert validate({"content": agent_message(version=1)}) == [
+        {"path": "/content/version", "message": "must be string"}
+    ]
+    assert validate({"topic": "builds", "priority": 1}) == [
+        {"path": "/content", "message": "is required"},
+        {"path": "/priority", "message": "is not allowed"},
+    ]
+    assert validate([]) == [{"path": "", "message": "must be object"}]
+
+
+def test_errors_are_capped():
+    validate = compile_schema(
+        {"type": "array", "items": {"type": "string"}}
+    )
+    assert len(validate(list(range(50)))) == MAX_ERRORS
+
+
+def test_validators_are_compiled_once():
+    assert validator("handoff") is validator("handoff")
+
+
+@pytest.mark.parametrize("name", sorted(REQUEST_SCHEMAS))
+def test_request_schemas_compile(name):
+    assert validator(name)({}) != []